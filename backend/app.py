@@ -5,6 +5,16 @@ from dotenv import load_dotenv
 
 # Database connection
 from utils.db import db_instance
+from utils.rate_limit import ensure_indexes as ensure_rate_limit_indexes
+from utils.idempotency import ensure_indexes as ensure_idempotency_indexes
+from utils.user_import import ensure_indexes as ensure_user_indexes
+from utils.user_search import ensure_indexes as ensure_user_search_indexes
+from utils.change_feed import ensure_indexes as ensure_change_feed_indexes
+from models.appointment import ensure_indexes as ensure_appointment_indexes
+from utils.archival import ensure_indexes as ensure_archival_indexes
+from utils.shadow import ensure_indexes as ensure_shadow_indexes
+from utils.review_queue import ensure_indexes as ensure_review_queue_indexes
+from utils.json_utils import MongoJSONProvider
 
 # Route blueprints
 from routes.auth import auth_bp
@@ -12,6 +22,8 @@ from routes.admin import admin_bp
 from routes.doctor import doctor_bp
 from routes.patient import patient_bp
 from routes.ml import ml_bp  # ML prediction routes
+from routes.reports import reports_bp
+from routes.events import events_bp
 
 # Load environment variables from .env
 load_dotenv()
@@ -19,19 +31,22 @@ load_dotenv()
 def create_app():
     """Create and configure Flask application"""
     app = Flask(__name__)
+    app.json = MongoJSONProvider(app)
 
     # Basic configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
-    app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # Allow up to 32MB for MRI images
+    # Allow up to 32MB by default for MRI images; raise it for large volume uploads
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_MB', '32')) * 1024 * 1024
 
     # Enable CORS for frontend applications
     CORS(app,
          origins=['http://localhost:3000', 'http://127.0.0.1:3000'],
          allow_headers=[
              'Content-Type', 'Authorization', 'Access-Control-Allow-Headers',
-             'Origin', 'Accept', 'X-Requested-With'
+             'Origin', 'Accept', 'X-Requested-With', 'Idempotency-Key'
          ],
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+         expose_headers=['Retry-After', 'Idempotent-Replayed'],
          supports_credentials=True
     )
 
@@ -40,12 +55,25 @@ def create_app():
         print("Failed to connect to database!")
         return None
 
+    # Create indexes for supporting collections
+    ensure_rate_limit_indexes()
+    ensure_idempotency_indexes()
+    ensure_user_indexes()
+    ensure_user_search_indexes()
+    ensure_change_feed_indexes()
+    ensure_appointment_indexes()
+    ensure_archival_indexes()
+    ensure_shadow_indexes()
+    ensure_review_queue_indexes()
+
     # Register all blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(doctor_bp, url_prefix='/api/doctor')
     app.register_blueprint(patient_bp, url_prefix='/api/patient')
     app.register_blueprint(ml_bp, url_prefix='/api/ml')
+    app.register_blueprint(reports_bp, url_prefix='/api/reports')
+    app.register_blueprint(events_bp, url_prefix='/api/events')
 
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
@@ -0,0 +1,47 @@
+"""
+Move old completed, cancelled and rejected appointments to appointments_history.
+
+Usage:
+    python archive_appointments.py                 # archive everything past the cutoff
+    python archive_appointments.py --days 365 --batch-size 1000 --pause 0.2
+    python archive_appointments.py --status
+
+Runs are checkpointed after every batch; rerunning after an interruption
+resumes from the last batch with the original cutoff. Archived appointments
+remain readable through the appointment endpoints with ?include_history=true.
+"""
+import argparse
+import sys
+
+from utils.db import db_instance
+from utils.archival import AppointmentArchiver, ensure_indexes, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive old appointments')
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help='Archive appointments finished this many days ago')
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument('--max-batches', type=int, help='Stop after this many batches (resume later)')
+    parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+    parser.add_argument('--status', action='store_true', help='Show the current checkpoint and exit')
+    args = parser.parse_args()
+
+    if not db_instance.connect():
+        sys.exit(1)
+    ensure_indexes()
+
+    archiver = AppointmentArchiver(after_days=args.days, batch_size=args.batch_size)
+    if args.status:
+        print(archiver.status() or 'No archival run yet')
+        return
+
+    def progress(checkpoint):
+        print(f"batch {checkpoint['batches']}: {checkpoint['moved']} appointments archived")
+
+    checkpoint = archiver.run(max_batches=args.max_batches, pause_seconds=args.pause, progress=progress)
+    state = 'finished' if checkpoint.get('finished_at') else 'paused (rerun to resume)'
+    print(f"Archival {state}: {checkpoint['moved']} appointments older than {checkpoint['cutoff']:%Y-%m-%d} moved")
+
+
+if __name__ == '__main__':
+    main()
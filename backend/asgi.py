@@ -0,0 +1,48 @@
+"""
+ASGI serving mode.
+
+I/O-bound dashboard and list endpoints (routes/async_api.py) run as
+coroutines on the async Mongo driver and fan out independent queries
+concurrently. The server-sent event stream is served the same way, so each
+process holds any number of open streams without tying up threads. Every
+other endpoint is served by the regular Flask app.
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port 5001 --workers 4
+
+The sync entry point (python app.py) is unchanged.
+"""
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Mount
+
+from app import create_app
+from routes.async_api import async_routes
+from utils.async_db import async_db_instance
+
+flask_app = create_app()
+if flask_app is None:
+    raise RuntimeError("Failed to create application!")
+
+app = Starlette(
+    routes=async_routes + [
+        # Everything not served asynchronously falls through to Flask
+        Mount('/', app=WSGIMiddleware(flask_app))
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=['http://localhost:3000', 'http://127.0.0.1:3000'],
+            allow_headers=[
+                'Content-Type', 'Authorization', 'Access-Control-Allow-Headers',
+                'Origin', 'Accept', 'X-Requested-With', 'Idempotency-Key'
+            ],
+            allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+            expose_headers=['Retry-After', 'Idempotent-Replayed'],
+            allow_credentials=True
+        )
+    ],
+    on_shutdown=[async_db_instance.close_connection]
+)
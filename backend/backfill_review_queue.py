@@ -0,0 +1,40 @@
+"""
+Add review queue fields to predictions created before the queue existed.
+
+Usage:
+    python backfill_review_queue.py
+    python backfill_review_queue.py --batch-size 5000
+
+New predictions get their queue fields on write; run this once after
+deploying the review queue. Unreviewed predictions without a doctor become
+claimable through /api/doctor/review-queue/claim.
+
+It also rebuilds the per-doctor claim counters from the claims held in
+predictions; run it while no one is claiming.
+"""
+import argparse
+import sys
+
+from utils.db import db_instance
+from utils.review_queue import backfill, recount_claims, ensure_indexes, BACKFILL_BATCH_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill review queue fields')
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if not db_instance.connect():
+        sys.exit(1)
+    ensure_indexes()
+
+    def progress(updated):
+        print(f"{updated} predictions updated")
+
+    updated = backfill(batch_size=args.batch_size, progress=progress)
+    print(f"Backfill finished: {updated} predictions updated")
+    print(f"Claim counters rebuilt for {recount_claims()} doctors")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Compute the search fields used by /api/admin/users/search for existing users.
+
+Usage:
+    python backfill_user_search.py                  # recompute for every user
+    python backfill_user_search.py --missing-only   # only users created before search existed
+    python backfill_user_search.py --batch-size 5000
+
+New and updated users get their search fields on write; run this once after
+deploying search, and again whenever the tokenization in utils/user_search.py changes.
+"""
+import argparse
+import sys
+
+from utils.db import db_instance
+from utils.user_search import backfill, ensure_indexes, BACKFILL_BATCH_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill user search fields')
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument('--missing-only', action='store_true', help='Skip users that already have search fields')
+    args = parser.parse_args()
+
+    if not db_instance.connect():
+        sys.exit(1)
+    ensure_indexes()
+
+    def progress(updated):
+        print(f"{updated} users updated")
+
+    updated = backfill(batch_size=args.batch_size, missing_only=args.missing_only, progress=progress)
+    print(f"Backfill finished: {updated} users updated")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark request coalescing for identical concurrent reads.
+
+Fires N concurrent identical requests at a simulated heavy aggregation,
+first without coalescing and then through SingleFlight, and reports how
+many backend computations ran and the wall-clock time.
+
+Usage:
+    python benchmarks/bench_single_flight.py --requests 100 --work-ms 200
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.single_flight import SingleFlight
+
+
+def run(concurrency, work_seconds, coalescer=None):
+    executions = 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency)
+
+    def heavy_aggregation():
+        nonlocal executions
+        with lock:
+            executions += 1
+        time.sleep(work_seconds)
+        return b'{"appointments": []}'
+
+    def request():
+        barrier.wait()
+        if coalescer:
+            coalescer.do('admin.get_all_appointments|admin', heavy_aggregation)
+        else:
+            heavy_aggregation()
+
+    threads = [threading.Thread(target=request) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return executions, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark single-flight coalescing')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--work-ms', type=float, default=200)
+    args = parser.parse_args()
+
+    work_seconds = args.work_ms / 1000
+    baseline_runs, baseline_time = run(args.requests, work_seconds)
+    coalescer = SingleFlight()
+    coalesced_runs, coalesced_time = run(args.requests, work_seconds, coalescer)
+
+    print(f"{args.requests} concurrent identical requests, {args.work_ms:.0f} ms aggregation each")
+    print(f"  without coalescing: {baseline_runs:4d} backend computations, {baseline_time * 1000:7.1f} ms wall")
+    print(f"  with coalescing:    {coalesced_runs:4d} backend computations, {coalesced_time * 1000:7.1f} ms wall")
+    print(f"  backend load reduction: {baseline_runs / max(coalesced_runs, 1):.0f}x")
+    print(f"  metrics: {coalescer.metrics()}")
+
+
+if __name__ == '__main__':
+    main()
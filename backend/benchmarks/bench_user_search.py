@@ -0,0 +1,143 @@
+"""
+Benchmark the admin user search against a large synthetic user base.
+
+Seeds N users with precomputed search fields into a separate database
+(MONGODB_URI, database --database), creates the search indexes and times
+User.search_users for a mix of exact, prefix, typo, email and phone
+queries. Reports latency percentiles per query kind and how often the
+candidate limit truncated the result. The target is single-digit
+milliseconds at 1M users.
+
+Usage:
+    python benchmarks/bench_user_search.py --users 1000000 --queries 200
+    python benchmarks/bench_user_search.py --skip-seed --queries 500
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import db_instance
+
+FIRST_NAMES = [
+    'james', 'mary', 'robert', 'patricia', 'john', 'jennifer', 'michael', 'linda', 'david', 'elizabeth',
+    'william', 'barbara', 'richard', 'susan', 'joseph', 'jessica', 'thomas', 'sarah', 'charles', 'karen',
+    'amir', 'fatima', 'wei', 'mei', 'hiroshi', 'yuki', 'carlos', 'lucia', 'olga', 'ivan', 'priya', 'arjun'
+]
+LAST_NAMES = [
+    'smith', 'johnson', 'williams', 'brown', 'jones', 'garcia', 'miller', 'davis', 'rodriguez', 'martinez',
+    'hernandez', 'lopez', 'gonzalez', 'wilson', 'anderson', 'thomas', 'taylor', 'moore', 'jackson', 'martin',
+    'nguyen', 'kim', 'patel', 'chen', 'tanaka', 'ivanova', 'silva', 'kowalski', 'okafor', 'haddad'
+]
+# Appended to surnames so most are rare, like real ones (digits would be read as phone numbers)
+SYLLABLES = ['ba', 'ko', 'ri', 'men', 'sa', 'lo', 'ter', 'vi', 'dan', 'wu',
+             'ne', 'por', 'ga', 'li', 'shu', 'ra', 'tov', 'mi', 'zel', 'ha']
+SEED_BATCH_SIZE = 10000
+
+
+def synthetic_user(i, rng):
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES) + rng.choice(SYLLABLES) + rng.choice(SYLLABLES)
+    return {
+        'email': f"{first}.{last}.{i}@example.com",
+        'first_name': first.title(),
+        'last_name': last.title(),
+        'phone': f"+1555{i:07d}",
+        'user_type': 'patient' if i % 20 else 'doctor',
+        'is_active': True
+    }
+
+
+def seed(collection, count, rng):
+    from utils.user_search import search_fields
+
+    collection.drop()
+    start = time.perf_counter()
+    for offset in range(0, count, SEED_BATCH_SIZE):
+        batch = []
+        for i in range(offset, min(offset + SEED_BATCH_SIZE, count)):
+            user = synthetic_user(i, rng)
+            user.update(search_fields(user))
+            batch.append(user)
+        collection.insert_many(batch, ordered=False)
+        print(f"\r  seeded {offset + len(batch)}/{count}", end='', flush=True)
+    print(f"\n  seeding took {time.perf_counter() - start:.0f} s")
+
+
+def queries(collection, count, rng):
+    """(kind, query) pairs built from users that exist"""
+    sample = list(collection.aggregate([
+        {'$sample': {'size': count}},
+        {'$project': {'first_name': 1, 'last_name': 1, 'email': 1, 'phone': 1}}
+    ]))
+    mix = []
+    for user in sample:
+        first, last = user['first_name'].lower(), user['last_name'].lower()
+        typo = last[1] + last[0] + last[2:] if len(last) > 3 else last
+        mix += [
+            ('exact name', f"{first} {last}"),
+            ('prefix', f"{first[:3]} {last[:4]}"),
+            ('typo', typo),
+            ('email', user['email'].split('@')[0]),
+            ('phone', user['phone'][-10:]),
+            # Matches a large share of users: exercises the candidate limit
+            ('common', first[:2])
+        ]
+    rng.shuffle(mix)
+    return mix
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the admin user search')
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200, help='Sampled users; each yields one query per kind')
+    parser.add_argument('--database', default='user_search_bench')
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse users seeded by a previous run')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if not db_instance.connect():
+        sys.exit(1)
+    # Point the models at the benchmark database, never the application's
+    db_instance.db = db_instance.client[args.database]
+
+    from models.user import User
+    from utils.user_search import ensure_indexes, SEARCH_CANDIDATE_LIMIT
+
+    rng = random.Random(args.seed)
+    user_model = User()
+    if not args.skip_seed:
+        seed(user_model.collection, args.users, rng)
+    ensure_indexes()
+    users = user_model.collection.estimated_document_count()
+
+    mix = queries(user_model.collection, args.queries, rng)
+    for kind, query in mix[:20]:
+        # Warm the indexes into the cache
+        user_model.search_users(query)
+
+    timings, totals, truncated = {}, {}, {}
+    for kind, query in mix:
+        start = time.perf_counter()
+        _, total, was_truncated = user_model.search_users(query)
+        timings.setdefault(kind, []).append((time.perf_counter() - start) * 1000)
+        totals.setdefault(kind, []).append(total)
+        truncated[kind] = truncated.get(kind, 0) + was_truncated
+
+    print(f"{users} users, candidate limit {SEARCH_CANDIDATE_LIMIT}, {len(mix)} queries")
+    print(f"{'kind':>12} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'mean total':>11} {'truncated':>10}")
+    for kind, values in timings.items():
+        print(f"{kind:>12} {percentile(values, 0.5):>8.1f} {percentile(values, 0.95):>8.1f} {max(values):>8.1f} "
+              f"{sum(totals[kind]) / len(totals[kind]):>11.1f} {truncated[kind] / len(values):>9.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Report memory use of gunicorn workers (Linux only).
+
+Reads /proc/<pid>/smaps_rollup for every child of the gunicorn master and
+prints RSS, PSS (RSS with shared pages divided among the processes sharing
+them) and the shared/private split. Preload is on by default only with
+ML_BACKEND=tflite; compare GUNICORN_PRELOAD=true against GUNICORN_PRELOAD=false
+on the same backend to see the copy-on-write savings.
+
+Usage:
+    python benchmarks/measure_worker_rss.py <gunicorn master pid>
+"""
+import argparse
+import os
+
+FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def read_rollup(pid):
+    """Memory counters (kB) for one process"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts and parts[0].rstrip(':') in FIELDS:
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values
+
+
+def child_pids(pid):
+    """Direct children of a process"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, so split after it
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure gunicorn worker memory')
+    parser.add_argument('master_pid', type=int)
+    args = parser.parse_args()
+
+    print(f"{'pid':>8} {'role':>7} {'RSS MB':>8} {'PSS MB':>8} {'shared MB':>10} {'private MB':>11}")
+    totals = {'Rss': 0, 'Pss': 0}
+    workers = child_pids(args.master_pid)
+    for pid, role in [(args.master_pid, 'master')] + [(pid, 'worker') for pid in workers]:
+        values = read_rollup(pid)
+        shared = values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0)
+        private = values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+        totals['Rss'] += values.get('Rss', 0)
+        totals['Pss'] += values.get('Pss', 0)
+        print(f"{pid:>8} {role:>7} {values.get('Rss', 0) / 1024:>8.1f} {values.get('Pss', 0) / 1024:>8.1f} "
+              f"{shared / 1024:>10.1f} {private / 1024:>11.1f}")
+
+    print(f"{len(workers)} workers; total RSS {totals['Rss'] / 1024:.1f} MB, "
+          f"total PSS (actual footprint) {totals['Pss'] / 1024:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
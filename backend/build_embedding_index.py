@@ -0,0 +1,96 @@
+"""
+Maintain the embedding stores behind /api/ml/predictions/<id>/similar.
+
+Usage:
+    python build_embedding_index.py --backfill          # embed scored images that have no embedding yet
+    python build_embedding_index.py --ivf [--nlist 1000]
+    python build_embedding_index.py --status
+
+New predictions are embedded as they are scored. The IVF index covers the
+rows present when it was built; rows appended later are scanned exactly
+until the next --ivf run, so rebuild it periodically as the store grows.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from pymongo import UpdateOne
+
+from utils.db import db_instance
+from utils.embeddings import embedding_stores
+from models.ml_backends import load_image_array
+
+
+def backfill(model, batch_size, progress=None):
+    """Embed predictions lacking an embedding from the given model; returns the count added"""
+    predictions = db_instance.get_collection('predictions')
+    store = embedding_stores.get(model.version)
+    query = {'embedding_version': {'$ne': model.version}, 'image_path': {'$exists': True}}
+    added, skipped, last_id = 0, 0, None
+    while True:
+        batch_query = dict(query, _id={'$gt': last_id}) if last_id is not None else query
+        batch = list(predictions.find(batch_query, {'image_path': 1}).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return added, skipped
+        last_id = batch[-1]['_id']
+
+        readable = [p for p in batch if os.path.exists(p['image_path'])]
+        skipped += len(batch) - len(readable)
+        if not readable:
+            continue
+        images = np.stack([load_image_array(p['image_path'], model.input_size) for p in readable])
+        embeddings = model.embed_batch(images)
+        if embeddings is None:
+            raise RuntimeError(f"The {model.backend.name} backend of model {model.version} does not expose embeddings")
+
+        first_row = store.append([p['_id'] for p in readable], embeddings)
+        predictions.bulk_write([
+            UpdateOne({'_id': p['_id']}, {'$set': {'embedding_version': model.version, 'embedding_row': first_row + i}})
+            for i, p in enumerate(readable)
+        ], ordered=False)
+        added += len(readable)
+        if progress:
+            progress(added, skipped)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill embeddings and build the similar-case index')
+    parser.add_argument('--backfill', action='store_true', help='Embed scored images with the active model')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--ivf', action='store_true', help='(Re)build the IVF index')
+    parser.add_argument('--nlist', type=int, help='IVF lists (default sqrt(rows))')
+    parser.add_argument('--version', help='Model version of the store (default: active version)')
+    parser.add_argument('--status', action='store_true', help='Show store sizes and exit')
+    args = parser.parse_args()
+
+    if not db_instance.connect():
+        sys.exit(1)
+
+    if args.backfill:
+        # Imported here: loading the active model is only needed to embed images
+        from models.ml_model import registry
+        model = registry.active()
+
+        def progress(added, skipped):
+            print(f"{added} embeddings added, {skipped} images missing")
+
+        added, skipped = backfill(model, args.batch_size, progress)
+        print(f"Backfill finished: {added} embeddings added for model {model.version}, {skipped} images missing")
+        version = model.version
+    else:
+        version = args.version
+        if not version:
+            from models.model_registry import ModelRegistry, REGISTRY_DIR
+            version = ModelRegistry(REGISTRY_DIR, legacy_model_path=None, legacy_labels=[],
+                                    legacy_regions=[]).active_version_name()
+
+    store = embedding_stores.get(version)
+    if args.ivf:
+        print(f"IVF index built: {store.build_ivf(nlist=args.nlist)}")
+    if args.status or not (args.backfill or args.ivf):
+        print(store.status())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Export the Keras model to TFLite and gate it with a parity check.
+
+Usage:
+    python export_model.py --quantize float16 --validation-dir data/validation
+    python export_model.py --quantize int8 --calibration-dir uploads/mri_images --validation-dir data/validation
+
+The parity report is written next to the exported model
+(models/model.tflite.parity.json). Set ML_BACKEND=tflite to serve the
+exported model; it is only activated if the report passed.
+"""
+import argparse
+import itertools
+import json
+import numpy as np
+
+from models.ml_backends import (
+    KerasBackend, TFLiteBackend, iter_image_paths, load_image_array,
+    parity_report_path, run_parity_check,
+    PARITY_MIN_AGREEMENT, PARITY_MAX_CONFIDENCE_DELTA
+)
+from models.model_config import MODEL_PATH, TFLITE_MODEL_PATH, IMAGE_SIZE
+
+
+def convert(keras_model, quantize, calibration_dir, calibration_samples):
+    """Convert a loaded Keras model to TFLite bytes"""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+
+    if quantize == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == 'int8':
+        if not calibration_dir:
+            raise ValueError('int8 quantization requires --calibration-dir')
+
+        def representative_dataset():
+            paths = itertools.islice(iter_image_paths(calibration_dir), calibration_samples)
+            for path in paths:
+                yield [np.expand_dims(load_image_array(path, IMAGE_SIZE), axis=0)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    return converter.convert()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the MRI model to TFLite')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--output', default=TFLITE_MODEL_PATH)
+    parser.add_argument('--quantize', choices=['none', 'float16', 'int8'], default='float16')
+    parser.add_argument('--calibration-dir', default='uploads/mri_images')
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    parser.add_argument('--validation-dir', required=True)
+    parser.add_argument('--min-agreement', type=float, default=PARITY_MIN_AGREEMENT)
+    parser.add_argument('--max-confidence-delta', type=float, default=PARITY_MAX_CONFIDENCE_DELTA)
+    args = parser.parse_args()
+
+    reference = KerasBackend(args.model)
+    tflite_model = convert(reference.model, args.quantize, args.calibration_dir, args.calibration_samples)
+
+    with open(args.output, 'wb') as f:
+        f.write(tflite_model)
+    print(f"Exported {args.model} -> {args.output} ({len(tflite_model) / 1024 / 1024:.1f} MB, {args.quantize})")
+
+    candidate = TFLiteBackend(args.output)
+    report = run_parity_check(
+        reference, candidate, args.validation_dir, IMAGE_SIZE,
+        min_agreement=args.min_agreement,
+        max_confidence_delta=args.max_confidence_delta
+    )
+    report['quantize'] = args.quantize
+    report['source_model'] = args.model
+
+    with open(parity_report_path(args.output), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    if not report['passed']:
+        print("Parity check FAILED: the TFLite backend will not be activated")
+        raise SystemExit(1)
+    print("Parity check passed: set ML_BACKEND=tflite to serve this model")
+
+
+if __name__ == '__main__':
+    main()
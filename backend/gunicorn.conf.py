@@ -0,0 +1,65 @@
+"""
+Gunicorn configuration for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Settings can be overridden through the environment:
+    GUNICORN_BIND                 address to bind (default 0.0.0.0:5001)
+    GUNICORN_WORKERS              worker processes (default: CPU count)
+    GUNICORN_THREADS              threads per worker (default 4)
+    GUNICORN_MAX_REQUESTS         recycle a worker after N requests (default 1000, 0 = never)
+    GUNICORN_MAX_REQUESTS_JITTER  random spread so workers do not recycle together (default 100)
+    GUNICORN_GRACEFUL_TIMEOUT     seconds to drain in-flight requests on reload/stop (default 30)
+    GUNICORN_TIMEOUT              seconds before a silent worker is killed (default 120)
+    GUNICORN_PRELOAD              load app and model in the master before forking
+                                  (default: true with ML_BACKEND=tflite, false otherwise)
+
+Send HUP to the master to replace workers gracefully; old workers finish
+their in-flight requests (up to the graceful timeout) before exiting.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+
+# Load the app (and the model) once in the master; workers share it copy-on-write.
+# Only the TFLite backend is fork-safe; the full TensorFlow runtime can hang
+# workers on their first prediction, so Keras loads the model in every worker
+# unless GUNICORN_PRELOAD=true is set explicitly.
+ML_BACKEND = os.getenv('ML_BACKEND', 'keras').lower()
+preload_app = os.getenv('GUNICORN_PRELOAD', str(ML_BACKEND == 'tflite')).lower() == 'true'
+
+# Recycle workers to bound memory creep; with preload, recycled workers are
+# re-forked from the master, so they start with the model already loaded
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # Move everything loaded so far (app, model) out of the garbage collector's
+    # view, so collections in the workers do not touch and un-share those pages
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+    server.log.info(f"Serving with {workers} workers x {threads} threads (preload={preload_app})")
+
+
+def post_fork(server, worker):
+    # Per-process state (inference scheduler threads, registry reload threads)
+    # starts lazily in each worker; PyMongo resets its connection pools after fork
+    server.log.info(f"Worker {worker.pid} forked")
+
+
+def worker_exit(server, worker):
+    server.log.info(f"Worker {worker.pid} exited after serving its requests")
@@ -0,0 +1,62 @@
+"""
+Bulk-import doctors and patients from a CSV or NDJSON file.
+
+Usage:
+    python import_users.py users.csv
+    python import_users.py users.ndjson --report errors.json
+
+Columns/keys: email, password, user_type (doctor|patient), first_name,
+last_name, phone, and role fields (specialization, license_number,
+experience_years, available_time_slots separated by ';' in CSV,
+date_of_birth, gender). Imported doctors are approved immediately.
+"""
+import argparse
+import json
+import sys
+
+from utils.db import db_instance
+from utils.doctor_directory import doctor_directory
+from utils.user_import import UserImporter, parse_rows, detect_format, ensure_indexes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-import users')
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+    parser.add_argument('--chunk-size', type=int, help='Users per insert_many')
+    parser.add_argument('--hash-workers', type=int, help='Threads hashing passwords')
+    parser.add_argument('--report', help='Write the full report as JSON to this file')
+    args = parser.parse_args()
+
+    if not db_instance.connect():
+        sys.exit(1)
+    ensure_indexes()
+
+    with open(args.path, 'rb') as f:
+        rows, errors = parse_rows(f.read(), detect_format(args.path, args.format))
+
+    importer = UserImporter()
+    if args.chunk_size:
+        importer.chunk_size = args.chunk_size
+    if args.hash_workers:
+        importer.hash_workers = args.hash_workers
+
+    report = importer.import_rows(rows, errors)
+    if report['created_by_type']['doctor']:
+        doctor_directory.invalidate()
+
+    print(f"{report['created']} of {report['total']} users created "
+          f"({report['created_by_type']['doctor']} doctors, {report['created_by_type']['patient']} patients), "
+          f"{report['failed']} failed")
+    for error in report['errors'][:20]:
+        print(f"  row {error['row']} ({error['email']}): {error['error']}")
+    if report['failed'] > 20:
+        print(f"  ... {report['failed'] - 20} more")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
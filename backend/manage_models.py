@@ -0,0 +1,65 @@
+"""
+Manage the versioned model registry.
+
+Usage:
+    python manage_models.py list
+    python manage_models.py register v2 path/to/model.h5 --labels pituitary,glioma,notumor,meningioma
+    python manage_models.py activate v2
+
+Running workers pick up a new active version on their next poll
+(MODEL_REGISTRY_POLL_SECONDS), load and warm it in the background and
+swap it in without a restart.
+"""
+import argparse
+import json
+
+from models.model_registry import ModelRegistry, REGISTRY_DIR
+from models.model_config import MODEL_PATH, CLASS_LABELS, REGIONS, IMAGE_SIZE
+
+DEFAULT_LABELS = ','.join(CLASS_LABELS)
+DEFAULT_REGIONS = ','.join(REGIONS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the model registry')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help='List registered versions')
+
+    register_parser = subparsers.add_parser('register', help='Register a new model version')
+    register_parser.add_argument('version')
+    register_parser.add_argument('model_path')
+    register_parser.add_argument('--labels', default=DEFAULT_LABELS)
+    register_parser.add_argument('--regions', default=DEFAULT_REGIONS)
+    register_parser.add_argument('--input-size', type=int, default=IMAGE_SIZE)
+    register_parser.add_argument('--tflite', help='Exported TFLite model (with its parity report)')
+
+    activate_parser = subparsers.add_parser('activate', help='Make a version active')
+    activate_parser.add_argument('version')
+
+    args = parser.parse_args()
+    registry = ModelRegistry(REGISTRY_DIR, MODEL_PATH, DEFAULT_LABELS.split(','), DEFAULT_REGIONS.split(','))
+
+    if args.command == 'list':
+        active = registry.active_version_name()
+        for metadata in registry.list_versions():
+            marker = '*' if metadata['version'] == active else ' '
+            print(f"{marker} {metadata['version']}  {metadata.get('created_at', '')}  {metadata['sha256'][:12]}")
+        if active == 'legacy':
+            print(f"* legacy  {MODEL_PATH}")
+    elif args.command == 'register':
+        metadata = registry.register(
+            args.version, args.model_path,
+            labels=args.labels.split(','),
+            regions=args.regions.split(',') if args.regions else [],
+            input_size=args.input_size,
+            tflite_path=args.tflite
+        )
+        print(json.dumps(metadata, indent=2))
+    elif args.command == 'activate':
+        registry.set_active_version(args.version)
+        print(f"Active model version set to {args.version}")
+
+
+if __name__ == '__main__':
+    main()
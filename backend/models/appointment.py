@@ -1,7 +1,140 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import UpdateOne
 from utils.db import db_instance
 
+# Most urgent first
+PRIORITY_ORDER = ['emergency', 'urgent', 'normal']
+
+# Status changes allowed through bulk actions (current status -> new statuses)
+STATUS_TRANSITIONS = {
+    'pending': ['approved', 'rejected', 'cancelled'],
+    'approved': ['completed', 'rejected', 'cancelled']
+}
+
+def _lookup_user(local_field, as_field):
+    return {'$lookup': {
+        'from': 'users',
+        'localField': local_field,
+        'foreignField': '_id',
+        'as': as_field
+    }}
+
+# Terminal-state appointments past ARCHIVE_AFTER_DAYS live here (see utils/archival.py)
+HISTORY_COLLECTION = 'appointments_history'
+
+def match_with_history(query, include_history=False):
+    """$match on the active collection, plus the same match on history when requested"""
+    stages = [{'$match': query}]
+    if include_history:
+        stages.append({'$unionWith': {'coll': HISTORY_COLLECTION, 'pipeline': [{'$match': query}]}})
+    return stages
+
+# Pipelines are shared by the sync model and its async mirror
+
+def patient_appointments_pipeline(patient_id, include_history=False):
+    return match_with_history({'patient_id': ObjectId(patient_id)}, include_history) + [
+        _lookup_user('doctor_id', 'doctor_info'),
+        {'$sort': {'appointment_date': 1}}
+    ]
+
+def doctor_appointments_pipeline(doctor_id, include_history=False):
+    return match_with_history({'doctor_id': ObjectId(doctor_id)}, include_history) + [
+        _lookup_user('patient_id', 'patient_info'),
+        {'$sort': {'appointment_date': 1}}
+    ]
+
+def appointment_by_id_pipeline(appointment_id, include_history=False):
+    return match_with_history({'_id': ObjectId(appointment_id)}, include_history) + [
+        {'$limit': 1},
+        _lookup_user('doctor_id', 'doctor_info'),
+        _lookup_user('patient_id', 'patient_info')
+    ]
+
+def all_appointments_pipeline(match=None, include_history=False):
+    return match_with_history(match or {}, include_history) + [
+        _lookup_user('doctor_id', 'doctor_info'),
+        _lookup_user('patient_id', 'patient_info'),
+        {'$sort': {'created_at': -1}}
+    ]
+
+def pending_appointments_pipeline():
+    return all_appointments_pipeline({'status': 'pending'})
+
+# Patient fields shown on the doctor's schedule and calendar
+SCHEDULE_PATIENT_FIELDS = {'first_name': 1, 'last_name': 1, 'phone': 1, 'gender': 1, 'date_of_birth': 1}
+
+def _lookup_patient_summary():
+    return {'$lookup': {
+        'from': 'users',
+        'let': {'patient_id': '$patient_id'},
+        'pipeline': [
+            {'$match': {'$expr': {'$eq': ['$_id', '$$patient_id']}}},
+            {'$project': SCHEDULE_PATIENT_FIELDS}
+        ],
+        'as': 'patient_info'
+    }}
+
+def doctor_schedule_pipeline(doctor_id, date, statuses):
+    return [
+        {'$match': {
+            'doctor_id': ObjectId(doctor_id),
+            'appointment_date': date,
+            'status': {'$in': statuses}
+        }},
+        _lookup_patient_summary(),
+        {'$sort': {'time_slot': 1}}
+    ]
+
+def doctor_calendar_pipeline(doctor_id, start_date, end_date, statuses):
+    """A doctor's appointments in [start_date, end_date], grouped by day and time slot"""
+    return [
+        # Served by the (doctor_id, appointment_date, time_slot) index
+        {'$match': {
+            'doctor_id': ObjectId(doctor_id),
+            'appointment_date': {'$gte': start_date, '$lte': end_date},
+            'status': {'$in': statuses}
+        }},
+        _lookup_patient_summary(),
+        {'$project': {
+            'appointment_date': 1,
+            'time_slot': 1,
+            'status': 1,
+            'priority': 1,
+            'reason': 1,
+            'patient_id': 1,
+            'patient': {'$arrayElemAt': ['$patient_info', 0]}
+        }},
+        {'$group': {
+            '_id': {'date': '$appointment_date', 'time_slot': '$time_slot'},
+            'appointments': {'$push': {
+                'id': '$_id',
+                'status': '$status',
+                'priority': '$priority',
+                'reason': '$reason',
+                'patient_id': '$patient_id',
+                'patient': '$patient'
+            }}
+        }},
+        {'$sort': {'_id.date': 1, '_id.time_slot': 1}},
+        {'$group': {
+            '_id': '$_id.date',
+            'slots': {'$push': {'time_slot': '$_id.time_slot', 'appointments': '$appointments'}},
+            'total': {'$sum': {'$size': '$appointments'}}
+        }},
+        {'$sort': {'_id': 1}},
+        {'$project': {'_id': 0, 'date': '$_id', 'slots': 1, 'total': 1}}
+    ]
+
+def ensure_indexes():
+    """Indexes behind the doctor schedule and calendar queries"""
+    try:
+        db_instance.get_collection('appointments').create_index(
+            [('doctor_id', 1), ('appointment_date', 1), ('time_slot', 1)]
+        )
+    except Exception as e:
+        print(f"Error creating appointment indexes: {e}")
+
 class Appointment:
     def __init__(self):
         self.collection = db_instance.get_collection('appointments')
@@ -29,38 +162,18 @@ class Appointment:
             print(f"Error creating appointment: {e}")
             return None
     
-    def get_patient_appointments(self, patient_id):
+    def get_patient_appointments(self, patient_id, include_history=False):
         """Get all appointments for a patient"""
         try:
-            pipeline = [
-                {'$match': {'patient_id': ObjectId(patient_id)}},
-                {'$lookup': {
-                    'from': 'users',
-                    'localField': 'doctor_id',
-                    'foreignField': '_id',
-                    'as': 'doctor_info'
-                }},
-                {'$sort': {'appointment_date': 1}}
-            ]
-            return list(self.collection.aggregate(pipeline))
+            return list(self.collection.aggregate(patient_appointments_pipeline(patient_id, include_history)))
         except Exception as e:
             print(f"Error getting patient appointments: {e}")
             return []
     
-    def get_doctor_appointments(self, doctor_id):
+    def get_doctor_appointments(self, doctor_id, include_history=False):
         """Get all appointments for a doctor"""
         try:
-            pipeline = [
-                {'$match': {'doctor_id': ObjectId(doctor_id)}},
-                {'$lookup': {
-                    'from': 'users',
-                    'localField': 'patient_id',
-                    'foreignField': '_id',
-                    'as': 'patient_info'
-                }},
-                {'$sort': {'appointment_date': 1}}
-            ]
-            return list(self.collection.aggregate(pipeline))
+            return list(self.collection.aggregate(doctor_appointments_pipeline(doctor_id, include_history)))
         except Exception as e:
             print(f"Error getting doctor appointments: {e}")
             return []
@@ -84,30 +197,48 @@ class Appointment:
             print(f"Error updating appointment status: {e}")
             return False
     
-    def get_appointment_by_id(self, appointment_id):
+    def get_appointment_by_id(self, appointment_id, include_history=False):
         """Get appointment by ID"""
         try:
-            pipeline = [
-                {'$match': {'_id': ObjectId(appointment_id)}},
-                {'$lookup': {
-                    'from': 'users',
-                    'localField': 'doctor_id',
-                    'foreignField': '_id',
-                    'as': 'doctor_info'
-                }},
-                {'$lookup': {
-                    'from': 'users',
-                    'localField': 'patient_id',
-                    'foreignField': '_id',
-                    'as': 'patient_info'
-                }}
-            ]
-            result = list(self.collection.aggregate(pipeline))
+            result = list(self.collection.aggregate(appointment_by_id_pipeline(appointment_id, include_history)))
             return result[0] if result else None
         except Exception as e:
             print(f"Error getting appointment by ID: {e}")
             return None
     
+    def get_doctor_schedule(self, doctor_id, date, statuses=('pending', 'approved')):
+        """A doctor's appointments on one date, by time slot"""
+        try:
+            return list(self.collection.aggregate(doctor_schedule_pipeline(doctor_id, date, list(statuses))))
+        except Exception as e:
+            print(f"Error getting doctor schedule: {e}")
+            return []
+    
+    def get_doctor_calendar(self, doctor_id, start_date, end_date, statuses=('pending', 'approved')):
+        """A doctor's appointments between two dates (inclusive), bucketed by day and slot"""
+        try:
+            return list(self.collection.aggregate(
+                doctor_calendar_pipeline(doctor_id, start_date, end_date, list(statuses))
+            ))
+        except Exception as e:
+            print(f"Error getting doctor calendar: {e}")
+            return []
+    
+    def get_booked_slots(self, doctor_id, start_date, end_date):
+        """{'YYYY-MM-DD': [time slots]} held by pending/approved appointments in a date range"""
+        try:
+            booked = {}
+            for apt in self.collection.find({
+                'doctor_id': ObjectId(doctor_id),
+                'appointment_date': {'$gte': start_date, '$lte': end_date},
+                'status': {'$in': ['pending', 'approved']}
+            }, {'_id': 0, 'appointment_date': 1, 'time_slot': 1}):
+                booked.setdefault(apt['appointment_date'], []).append(apt['time_slot'])
+            return booked
+        except Exception as e:
+            print(f"Error getting booked slots: {e}")
+            return {}
+    
     def check_time_slot_availability(self, doctor_id, appointment_date, time_slot):
         """Check if time slot is available for doctor"""
         try:
@@ -125,23 +256,90 @@ class Appointment:
     def get_pending_appointments(self):
         """Get all pending appointments for admin view"""
         try:
-            pipeline = [
-                {'$match': {'status': 'pending'}},
-                {'$lookup': {
-                    'from': 'users',
-                    'localField': 'doctor_id',
-                    'foreignField': '_id',
-                    'as': 'doctor_info'
-                }},
-                {'$lookup': {
-                    'from': 'users',
-                    'localField': 'patient_id',
-                    'foreignField': '_id',
-                    'as': 'patient_info'
-                }},
-                {'$sort': {'created_at': -1}}
-            ]
-            return list(self.collection.aggregate(pipeline))
+            return list(self.collection.aggregate(pending_appointments_pipeline()))
         except Exception as e:
             print(f"Error getting pending appointments: {e}")
-            return []
\ No newline at end of file
+            return []
+    
+    def get_linked_appointment(self, patient_id, appointment_id=None):
+        """
+        A patient's active appointment: the given one if it belongs to them,
+        otherwise their most urgent active appointment.
+        """
+        try:
+            query = {
+                'patient_id': ObjectId(patient_id),
+                'status': {'$in': ['pending', 'approved']}
+            }
+            if appointment_id:
+                query['_id'] = ObjectId(appointment_id)
+            
+            appointments = list(self.collection.find(query, {'priority': 1, 'doctor_id': 1}))
+            if not appointments:
+                return None
+            return min(appointments, key=lambda apt: PRIORITY_ORDER.index(apt.get('priority'))
+                       if apt.get('priority') in PRIORITY_ORDER else len(PRIORITY_ORDER))
+        except Exception as e:
+            print(f"Error getting linked appointment: {e}")
+            return None
+    
+    def get_patient_priority(self, patient_id, appointment_id=None):
+        """Priority of a patient's linked appointment ('normal' if none)"""
+        appointment = self.get_linked_appointment(patient_id, appointment_id)
+        return appointment.get('priority', 'normal') if appointment else 'normal'
+    
+    def bulk_update_status(self, actions, doctor_id=None):
+        """
+        Apply [{'id', 'status', 'notes'}] status changes in one bulk_write.
+        Ownership (when doctor_id is given) and current statuses are checked
+        with a single query; returns one result per action, in order.
+        """
+        results = [{'id': action['id'], 'status': action['status']} for action in actions]
+        try:
+            ids = [ObjectId(action['id']) for action in actions]
+            current = {apt['_id']: apt for apt in self.collection.find(
+                {'_id': {'$in': ids}}, {'doctor_id': 1, 'status': 1}
+            )}
+            
+            operations, op_results = [], []
+            for oid, action, result in zip(ids, actions, results):
+                appointment = current.get(oid)
+                if not appointment or (doctor_id and appointment.get('doctor_id') != ObjectId(doctor_id)):
+                    result['error'] = 'Appointment not found'
+                    continue
+                if action['status'] not in STATUS_TRANSITIONS.get(appointment['status'], []):
+                    result['error'] = f"Cannot change status from {appointment['status']} to {action['status']}"
+                    continue
+                
+                update_data = {'status': action['status'], 'updated_at': datetime.utcnow()}
+                if action.get('notes'):
+                    update_data['doctor_notes'] = action['notes']
+                # Only applies if nobody changed the status since it was read
+                operations.append(UpdateOne({'_id': oid, 'status': appointment['status']}, {'$set': update_data}))
+                op_results.append((oid, result))
+            
+            if operations:
+                outcome = self.collection.bulk_write(operations, ordered=False)
+                changed = set()
+                if outcome.matched_count < len(operations):
+                    # Some filters no longer matched: find which items lost the race
+                    targets = {oid: result['status'] for oid, result in op_results}
+                    changed = {apt['_id'] for apt in self.collection.find(
+                        {'_id': {'$in': list(targets)}}, {'status': 1}
+                    ) if apt['status'] != targets[apt['_id']]}
+                for oid, result in op_results:
+                    if oid in changed:
+                        result['error'] = 'Appointment was modified by another request'
+                    else:
+                        result['updated'] = True
+            
+            for result in results:
+                result.setdefault('updated', False)
+            return results
+        except Exception as e:
+            print(f"Error bulk updating appointment status: {e}")
+            for result in results:
+                if not result.get('updated'):
+                    result.setdefault('error', 'Update failed')
+                    result['updated'] = False
+            return results
@@ -0,0 +1,45 @@
+from utils.async_db import async_db_instance
+from models.appointment import (
+    patient_appointments_pipeline, doctor_appointments_pipeline, all_appointments_pipeline
+)
+
+class AsyncAppointment:
+    """asyncio mirror of the read paths of models.appointment.Appointment"""
+
+    def __init__(self):
+        self.collection = async_db_instance.get_collection('appointments')
+    
+    async def _aggregate(self, pipeline):
+        return await self.collection.aggregate(pipeline).to_list(None)
+    
+    async def get_patient_appointments(self, patient_id, include_history=False):
+        """Get all appointments for a patient"""
+        try:
+            return await self._aggregate(patient_appointments_pipeline(patient_id, include_history))
+        except Exception as e:
+            print(f"Error getting patient appointments: {e}")
+            return []
+    
+    async def get_doctor_appointments(self, doctor_id, include_history=False):
+        """Get all appointments for a doctor"""
+        try:
+            return await self._aggregate(doctor_appointments_pipeline(doctor_id, include_history))
+        except Exception as e:
+            print(f"Error getting doctor appointments: {e}")
+            return []
+    
+    async def get_all_appointments(self, include_history=False):
+        """Get all appointments for admin view"""
+        try:
+            return await self._aggregate(all_appointments_pipeline(include_history=include_history))
+        except Exception as e:
+            print(f"Error getting appointments: {e}")
+            return []
+    
+    async def count_appointments(self, query=None):
+        """Count appointments matching a query"""
+        try:
+            return await self.collection.count_documents(query or {})
+        except Exception as e:
+            print(f"Error counting appointments: {e}")
+            return 0
@@ -0,0 +1,65 @@
+from bson import ObjectId
+from utils.async_db import async_db_instance
+from models.prediction import (
+    predictions_stats_pipeline, format_predictions_stats, doctor_review_counts_pipeline, format_doctor_review_counts
+)
+from utils.review_queue import claimable_query
+
+
+class AsyncPrediction:
+    """asyncio mirror of the read paths of models.prediction.Prediction"""
+
+    def __init__(self):
+        self.collection = async_db_instance.get_collection('predictions')
+
+    async def get_all_predictions(self):
+        """Get all predictions, newest first"""
+        try:
+            return await self.collection.find().sort('created_at', -1).to_list(None)
+        except Exception as e:
+            print(f"Error getting predictions: {e}")
+            return []
+
+    async def get_patient_predictions(self, patient_id):
+        """Get all predictions for a patient, newest first"""
+        try:
+            cursor = self.collection.find({'patient_id': ObjectId(patient_id)}).sort('created_at', -1)
+            return await cursor.to_list(None)
+        except Exception as e:
+            print(f"Error getting patient predictions: {e}")
+            return []
+
+    async def get_doctor_predictions(self, doctor_id):
+        """Get all predictions assigned to a doctor, newest first"""
+        try:
+            cursor = self.collection.find({'doctor_id': ObjectId(doctor_id)}).sort('created_at', -1)
+            return await cursor.to_list(None)
+        except Exception as e:
+            print(f"Error getting doctor predictions: {e}")
+            return []
+
+    async def get_doctor_review_counts(self, doctor_id):
+        """Counts of a doctor's predictions: total, pending_review, reviewed, claimed"""
+        try:
+            result = await self.collection.aggregate(doctor_review_counts_pipeline(doctor_id)).to_list(None)
+            return format_doctor_review_counts(result)
+        except Exception as e:
+            print(f"Error getting doctor review counts: {e}")
+            return format_doctor_review_counts([])
+
+    async def count_review_queue(self):
+        """Predictions waiting to be claimed"""
+        try:
+            return await self.collection.count_documents(claimable_query())
+        except Exception as e:
+            print(f"Error counting review queue: {e}")
+            return 0
+
+    async def get_predictions_stats(self):
+        """Get prediction counts by review state and predicted class"""
+        try:
+            result = await self.collection.aggregate(predictions_stats_pipeline()).to_list(None)
+            return format_predictions_stats(result)
+        except Exception as e:
+            print(f"Error getting prediction stats: {e}")
+            return format_predictions_stats([])
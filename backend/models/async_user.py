@@ -0,0 +1,23 @@
+from utils.async_db import async_db_instance
+
+class AsyncUser:
+    """asyncio mirror of the read paths of models.user.User"""
+
+    def __init__(self):
+        self.collection = async_db_instance.get_collection('users')
+    
+    async def get_all_doctors(self):
+        """Get all doctors"""
+        try:
+            return await self.collection.find({'user_type': 'doctor'}).to_list(None)
+        except Exception as e:
+            print(f"Error getting doctors: {e}")
+            return []
+    
+    async def count_patients(self):
+        """Count patients"""
+        try:
+            return await self.collection.count_documents({'user_type': 'patient'})
+        except Exception as e:
+            print(f"Error counting patients: {e}")
+            return 0
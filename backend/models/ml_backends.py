@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from PIL import Image
+
+# Parity gate defaults (overridable through the environment)
+PARITY_MIN_AGREEMENT = float(os.getenv('ML_PARITY_MIN_AGREEMENT', '0.99'))
+PARITY_MAX_CONFIDENCE_DELTA = float(os.getenv('ML_PARITY_MAX_CONFIDENCE_DELTA', '2.0'))
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff')
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Compute the SHA-256 checksum of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_image_array(image_path, image_size):
+    """
+    Load an image as a normalized float32 array of shape (size, size, 3).
+    Mirrors keras' load_img (RGB, nearest resize) without importing TensorFlow.
+    """
+    with Image.open(image_path) as img:
+        img = img.convert('RGB').resize((image_size, image_size), Image.NEAREST)
+        return np.asarray(img, dtype=np.float32) / 255.0
+
+
+class KerasBackend:
+    """Full TensorFlow/Keras runtime for the original .h5 model"""
+    name = 'keras'
+
+    def __init__(self, model_path):
+        from tensorflow.keras.models import load_model
+        self.model_path = model_path
+        self.model = load_model(model_path)
+        self._embedding_model = None
+        self._gradcam_model = None
+
+    def predict_batch(self, batch):
+        """Return class probabilities for a batch of preprocessed images"""
+        return np.asarray(self.model.predict(batch, verbose=0))
+
+    def predict_batch_with_embeddings(self, batch):
+        """Class probabilities and penultimate-layer activations from one forward pass"""
+        if self._embedding_model is None:
+            from tensorflow.keras.models import Model
+            self._embedding_model = Model(
+                inputs=self.model.inputs,
+                outputs=[self.model.output, self.model.layers[-2].output]
+            )
+        probabilities, embeddings = self._embedding_model.predict(batch, verbose=0)
+        return np.asarray(probabilities), np.asarray(embeddings).reshape(len(batch), -1)
+
+    def saliency_batch(self, batch, class_indices=None):
+        """
+        Grad-CAM heatmaps of shape (n, h, w), scaled to [0, 1], for the given
+        classes (default: each image's predicted class), from one forward and
+        one backward pass over the whole batch.
+        """
+        import tensorflow as tf
+        if self._gradcam_model is None:
+            # Last layer with a spatial (n, h, w, c) output
+            conv_layer = next(layer for layer in reversed(self.model.layers) if len(layer.output.shape) == 4)
+            self._gradcam_model = tf.keras.models.Model(self.model.inputs, [conv_layer.output, self.model.output])
+
+        with tf.GradientTape() as tape:
+            conv_output, probabilities = self._gradcam_model(tf.convert_to_tensor(batch), training=False)
+            if class_indices is None:
+                class_indices = tf.argmax(probabilities, axis=1)
+            scores = tf.reduce_sum(probabilities * tf.one_hot(class_indices, probabilities.shape[-1]), axis=1)
+        gradients = tape.gradient(scores, conv_output)
+        weights = tf.reduce_mean(gradients, axis=(1, 2))
+        heatmaps = tf.nn.relu(tf.einsum('nhwc,nc->nhw', conv_output, weights)).numpy()
+        peaks = heatmaps.max(axis=(1, 2), keepdims=True)
+        return heatmaps / np.maximum(peaks, 1e-12)
+
+
+class TFLiteBackend:
+    """Lightweight TFLite runtime (tflite_runtime if installed, else tf.lite)"""
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+
+        self.model_path = model_path
+        threads = num_threads or int(os.getenv('ML_TFLITE_THREADS', '0')) or None
+        self.interpreter = Interpreter(model_path=model_path, num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self._read_details()
+        # The interpreter holds mutable tensors, so calls are serialized
+        self._lock = threading.Lock()
+
+    def _read_details(self):
+        self.input_detail = self.interpreter.get_input_details()[0]
+        outputs = sorted(self.interpreter.get_output_details(), key=lambda d: d['shape'][-1])
+        # Models exported with an extra embedding output: the wider one is the embedding
+        self.output_detail = outputs[0]
+        self.embedding_detail = outputs[-1] if len(outputs) > 1 else None
+
+    def _quantize_input(self, batch):
+        scale, zero_point = self.input_detail['quantization']
+        dtype = self.input_detail['dtype']
+        if scale and dtype in (np.int8, np.uint8):
+            batch = np.round(batch / scale + zero_point)
+            info = np.iinfo(dtype)
+            batch = np.clip(batch, info.min, info.max)
+        return batch.astype(dtype)
+
+    def _dequantize_output(self, output, detail=None):
+        scale, zero_point = (detail or self.output_detail)['quantization']
+        if scale and output.dtype in (np.int8, np.uint8):
+            return (output.astype(np.float32) - zero_point) * scale
+        return output.astype(np.float32)
+
+    def _invoke(self, batch, with_embeddings):
+        batch = self._quantize_input(np.asarray(batch, dtype=np.float32))
+
+        with self._lock:
+            # Resize the input tensor only when the batch size changes
+            if tuple(self.input_detail['shape']) != batch.shape:
+                self.interpreter.resize_tensor_input(self.input_detail['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._read_details()
+
+            self.interpreter.set_tensor(self.input_detail['index'], batch)
+            self.interpreter.invoke()
+            output = self._dequantize_output(self.interpreter.get_tensor(self.output_detail['index']))
+            embeddings = None
+            if with_embeddings and self.embedding_detail:
+                embeddings = self._dequantize_output(
+                    self.interpreter.get_tensor(self.embedding_detail['index']), self.embedding_detail
+                ).reshape(len(batch), -1)
+        return output, embeddings
+
+    def predict_batch(self, batch):
+        """Return class probabilities for a batch of preprocessed images"""
+        return self._invoke(batch, False)[0]
+
+    def predict_batch_with_embeddings(self, batch):
+        """Class probabilities and, if the model exports one, the embedding output (else None)"""
+        return self._invoke(batch, True)
+
+
+def select_backend(keras_path, tflite_path=None, preferred='keras'):
+    """
+    Load the preferred inference backend.
+    A TFLite model is only activated when its parity report passed;
+    otherwise we fall back to the full Keras model.
+    """
+    if preferred == 'tflite' and tflite_path:
+        report = load_parity_report(tflite_path)
+        if report and report.get('passed'):
+            try:
+                return TFLiteBackend(tflite_path)
+            except Exception as e:
+                print(f"Error loading TFLite model, falling back to Keras: {e}")
+        else:
+            print(f"TFLite model {tflite_path} has no passing parity report, using Keras")
+    return KerasBackend(keras_path)
+
+
+def parity_report_path(model_path):
+    """Location of the parity report written next to an exported model"""
+    return f"{model_path}.parity.json"
+
+
+def load_parity_report(model_path):
+    """
+    Read the parity report for an exported model, or None if it is missing
+    or was written for a different file (e.g. the model was re-exported)
+    """
+    try:
+        with open(parity_report_path(model_path)) as f:
+            report = json.load(f)
+        if report.get('candidate_sha256') != file_sha256(model_path):
+            print(f"Parity report of {model_path} does not match the model file, ignoring it")
+            return None
+        return report
+    except (OSError, ValueError):
+        return None
+
+
+def iter_image_paths(folder):
+    """Yield image files under a folder in a stable order"""
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def run_parity_check(reference, candidate, image_dir, image_size, batch_size=32,
+                     min_agreement=PARITY_MIN_AGREEMENT,
+                     max_confidence_delta=PARITY_MAX_CONFIDENCE_DELTA):
+    """
+    Score every image in image_dir with both backends and compare them.
+    The candidate passes only if top-1 agreement and the worst confidence
+    deviation (in percentage points) stay within the thresholds.
+    """
+    total = 0
+    agreed = 0
+    max_delta = 0.0
+    delta_sum = 0.0
+
+    paths = list(iter_image_paths(image_dir))
+    for start in range(0, len(paths), batch_size):
+        batch = np.stack([load_image_array(p, image_size) for p in paths[start:start + batch_size]])
+        ref_preds = reference.predict_batch(batch)
+        cand_preds = candidate.predict_batch(batch)
+
+        ref_idx = np.argmax(ref_preds, axis=1)
+        cand_idx = np.argmax(cand_preds, axis=1)
+        deltas = np.abs(np.max(ref_preds, axis=1) - np.max(cand_preds, axis=1)) * 100
+
+        total += len(batch)
+        agreed += int(np.sum(ref_idx == cand_idx))
+        max_delta = max(max_delta, float(np.max(deltas)))
+        delta_sum += float(np.sum(deltas))
+
+    agreement = agreed / total if total else 0.0
+    passed = total > 0 and agreement >= min_agreement and max_delta <= max_confidence_delta
+
+    return {
+        'reference_backend': reference.name,
+        'candidate_backend': candidate.name,
+        'candidate_model': candidate.model_path,
+        'candidate_sha256': file_sha256(candidate.model_path),
+        'images': total,
+        'agreement': agreement,
+        'max_confidence_delta': max_delta,
+        'mean_confidence_delta': delta_sum / total if total else 0.0,
+        'min_agreement': min_agreement,
+        'max_confidence_delta_allowed': max_confidence_delta,
+        'passed': passed
+    }
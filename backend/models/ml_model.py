@@ -1,38 +1,28 @@
-import os
-import numpy as np
-from tensorflow.keras.models import load_model
-from keras.preprocessing.image import load_img, img_to_array
+from models.model_registry import ModelRegistry, REGISTRY_DIR
+from models.model_config import MODEL_PATH, TFLITE_MODEL_PATH, ML_BACKEND, CLASS_LABELS, REGIONS, IMAGE_SIZE
 
-# Load your trained model
-MODEL_PATH = "models/model.h5"
-model = load_model(MODEL_PATH)
+registry = ModelRegistry(
+    REGISTRY_DIR,
+    legacy_model_path=MODEL_PATH,
+    legacy_labels=CLASS_LABELS,
+    legacy_regions=REGIONS,
+    input_size=IMAGE_SIZE,
+    preferred_backend=ML_BACKEND,
+    legacy_tflite_path=TFLITE_MODEL_PATH
+)
 
-# Class labels (adjust according to your model)
-class_labels = ['pituitary', 'glioma', 'notumor', 'meningioma']
+# Load and warm the active version at startup
+registry.load_active()
 
-# Optional: Brain regions mapping (if your model supports it)
-regions = ["Frontal Lobe", "Parietal Lobe", "Occipital Lobe", "Temporal Lobe"]
 
 def predict_mri(image_path):
     """
     Predict tumor type and confidence for the given MRI image.
+    The result includes the model version that produced it.
     """
-    IMAGE_SIZE = 128  # your model input size
-    img = load_img(image_path, target_size=(IMAGE_SIZE, IMAGE_SIZE))
-    img_array = img_to_array(img) / 255.0
-    img_array = np.expand_dims(img_array, axis=0)
+    return registry.active().predict(image_path)
 
-    preds = model.predict(img_array)
 
-    predicted_index = np.argmax(preds, axis=1)[0]
-    confidence = float(np.max(preds, axis=1)[0] * 100)
-
-    # Optionally map region if your model outputs it
-    region_index = predicted_index if predicted_index < len(regions) else 0
-    region = regions[region_index]
-
-    return {
-        "prediction": class_labels[predicted_index],
-        "confidence": confidence,
-        "region": region
-    }
+def predict_mri_with_embedding(image_path):
+    """predict_mri plus the image's penultimate-layer 'embedding' for similar-case search"""
+    return registry.active().predict(image_path, with_embedding=True)
@@ -0,0 +1,21 @@
+"""
+Settings of the legacy model, shared by the server (models/ml_model.py) and
+the offline tools (export_model.py, manage_models.py, rescoring).
+Importing this module loads nothing, unlike models.ml_model.
+"""
+import os
+
+# Legacy model, served as version 'legacy' when no registry version is active
+MODEL_PATH = "models/model.h5"
+TFLITE_MODEL_PATH = os.getenv('ML_TFLITE_MODEL_PATH', 'models/model.tflite')
+
+# Inference runtime: 'keras' (default) or 'tflite'
+ML_BACKEND = os.getenv('ML_BACKEND', 'keras').lower()
+
+# Class labels of the legacy model (registry versions carry their own labels)
+CLASS_LABELS = ['pituitary', 'glioma', 'notumor', 'meningioma']
+
+# Optional: Brain regions mapping (if your model supports it)
+REGIONS = ["Frontal Lobe", "Parietal Lobe", "Occipital Lobe", "Temporal Lobe"]
+
+IMAGE_SIZE = 128  # model input size
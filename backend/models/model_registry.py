@@ -0,0 +1,282 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from models.ml_backends import select_backend, load_image_array, parity_report_path, file_sha256, KerasBackend
+
+REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', 'models/registry')
+ACTIVE_POINTER = 'ACTIVE'
+METADATA_FILE = 'metadata.json'
+
+# How often (seconds) a worker checks whether the active version changed
+POLL_SECONDS = float(os.getenv('MODEL_REGISTRY_POLL_SECONDS', '10'))
+
+
+class LoadedModel:
+    """A warmed model version together with its metadata"""
+
+    def __init__(self, version, metadata, backend, model_path=None):
+        self.version = version
+        self.metadata = metadata
+        self.backend = backend
+        # Keras model file, used for saliency when the serving backend has no gradients
+        self.model_path = model_path
+        self._saliency_backend = None
+        self.labels = metadata['labels']
+        self.regions = metadata.get('regions') or []
+        self.input_size = metadata.get('input_size', 128)
+
+    def warm_up(self):
+        """Run one dummy forward pass so the first real request is not cold"""
+        dummy = np.zeros((1, self.input_size, self.input_size, 3), dtype=np.float32)
+        self.backend.predict_batch(dummy)
+
+    def format_prediction(self, probabilities):
+        """Map one row of class probabilities to the prediction payload"""
+        predicted_index = int(np.argmax(probabilities))
+        confidence = float(np.max(probabilities) * 100)
+
+        # Optionally map region if your model outputs it
+        region = None
+        if self.regions:
+            region_index = predicted_index if predicted_index < len(self.regions) else 0
+            region = self.regions[region_index]
+
+        return {
+            "prediction": self.labels[predicted_index],
+            "confidence": confidence,
+            "region": region,
+            "model_version": self.version
+        }
+
+    def predict(self, image_path, with_embedding=False):
+        """
+        Predict tumor type and confidence for one image.
+        with_embedding adds the penultimate-layer 'embedding' (None if the backend has none).
+        """
+        batch = np.expand_dims(load_image_array(image_path, self.input_size), axis=0)
+        if not with_embedding:
+            return self.format_prediction(self.backend.predict_batch(batch)[0])
+        preds, embeddings = self.backend.predict_batch_with_embeddings(batch)
+        result = self.format_prediction(preds[0])
+        result['embedding'] = embeddings[0] if embeddings is not None else None
+        return result
+
+    def saliency_batch(self, batch):
+        """Grad-CAM heatmaps for the predicted class of each image in a batch"""
+        backend = self.backend
+        if not hasattr(backend, 'saliency_batch'):
+            # TFLite has no gradients: load the version's Keras model once for saliency
+            if self._saliency_backend is None:
+                self._saliency_backend = KerasBackend(self.model_path)
+            backend = self._saliency_backend
+        return backend.saliency_batch(batch)
+
+    def embed_batch(self, batch):
+        """Penultimate-layer embeddings for a batch of preprocessed images, or None"""
+        return self.backend.predict_batch_with_embeddings(batch)[1]
+
+
+class ModelRegistry:
+    """
+    Directory of versioned models:
+
+        <registry>/<version>/metadata.json   labels, input size, checksums
+        <registry>/<version>/model.h5        (and optionally model.tflite)
+        <registry>/ACTIVE                    name of the active version
+
+    The active version is loaded and warmed in the background and swapped in
+    atomically; requests that already hold the previous LoadedModel finish on it.
+    Without a registry the legacy model path is served as version 'legacy'.
+    """
+
+    def __init__(self, registry_dir, legacy_model_path, legacy_labels, legacy_regions,
+                 input_size=128, preferred_backend='keras', legacy_tflite_path=None):
+        self.registry_dir = registry_dir
+        self.legacy_metadata = {
+            'version': 'legacy',
+            'model_file': legacy_model_path,
+            'tflite_file': legacy_tflite_path,
+            'labels': legacy_labels,
+            'regions': legacy_regions,
+            'input_size': input_size
+        }
+        self.preferred_backend = preferred_backend
+        self._active = None
+        self._lock = threading.Lock()
+        self._startup_lock = threading.Lock()
+        self._loading_version = None
+        self._last_poll = 0.0
+
+    # Registry layout
+
+    def _version_dir(self, version):
+        return os.path.join(self.registry_dir, version)
+
+    def list_versions(self):
+        """Return metadata for every registered version, oldest first"""
+        if not os.path.isdir(self.registry_dir):
+            return []
+        versions = []
+        for name in sorted(os.listdir(self.registry_dir)):
+            metadata = self.read_metadata(name)
+            if metadata:
+                versions.append(metadata)
+        return sorted(versions, key=lambda m: m.get('created_at', ''))
+
+    def read_metadata(self, version):
+        """Read metadata.json for a version, or None if it does not exist"""
+        if version == 'legacy':
+            return dict(self.legacy_metadata)
+        try:
+            with open(os.path.join(self._version_dir(version), METADATA_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def active_version_name(self):
+        """Version named by the ACTIVE pointer, or 'legacy' without a registry"""
+        try:
+            with open(os.path.join(self.registry_dir, ACTIVE_POINTER)) as f:
+                return f.read().strip() or 'legacy'
+        except OSError:
+            return 'legacy'
+
+    def register(self, version, model_path, labels, regions=None, input_size=128, tflite_path=None):
+        """Copy a model into the registry and record its metadata and checksums"""
+        version_dir = self._version_dir(version)
+        if os.path.exists(version_dir):
+            raise ValueError(f"Model version {version} already exists")
+        os.makedirs(version_dir)
+
+        metadata = {
+            'version': version,
+            'labels': labels,
+            'regions': regions or [],
+            'input_size': input_size,
+            'created_at': datetime.utcnow().isoformat()
+        }
+        model_file = os.path.basename(model_path)
+        shutil.copy2(model_path, os.path.join(version_dir, model_file))
+        metadata['model_file'] = model_file
+        metadata['sha256'] = file_sha256(os.path.join(version_dir, model_file))
+
+        if tflite_path:
+            tflite_file = os.path.basename(tflite_path)
+            shutil.copy2(tflite_path, os.path.join(version_dir, tflite_file))
+            metadata['tflite_file'] = tflite_file
+            metadata['tflite_sha256'] = file_sha256(os.path.join(version_dir, tflite_file))
+            if os.path.exists(parity_report_path(tflite_path)):
+                shutil.copy2(parity_report_path(tflite_path),
+                             parity_report_path(os.path.join(version_dir, tflite_file)))
+
+        with open(os.path.join(version_dir, METADATA_FILE), 'w') as f:
+            json.dump(metadata, f, indent=2)
+        return metadata
+
+    def set_active_version(self, version):
+        """Point ACTIVE at a version; every worker picks it up on its next poll"""
+        if not self.read_metadata(version):
+            raise ValueError(f"Unknown model version {version}")
+        os.makedirs(self.registry_dir, exist_ok=True)
+        pointer = os.path.join(self.registry_dir, ACTIVE_POINTER)
+        tmp_pointer = f"{pointer}.{os.getpid()}.tmp"
+        with open(tmp_pointer, 'w') as f:
+            f.write(version)
+        os.replace(tmp_pointer, pointer)
+
+    # Loading and swapping
+
+    def load_version(self, version):
+        """Load, verify and warm a version without activating it"""
+        metadata = self.read_metadata(version)
+        if not metadata:
+            raise ValueError(f"Unknown model version {version}")
+
+        if version == 'legacy':
+            model_path = metadata['model_file']
+            tflite_path = metadata.get('tflite_file')
+        else:
+            version_dir = self._version_dir(version)
+            model_path = os.path.join(version_dir, metadata['model_file'])
+            if file_sha256(model_path) != metadata.get('sha256'):
+                raise ValueError(f"Checksum mismatch for model version {version}")
+
+            tflite_path = None
+            if metadata.get('tflite_file'):
+                tflite_path = os.path.join(version_dir, metadata['tflite_file'])
+                if file_sha256(tflite_path) != metadata.get('tflite_sha256'):
+                    print(f"Checksum mismatch for TFLite model of version {version}, ignoring it")
+                    tflite_path = None
+
+        backend = select_backend(model_path, tflite_path, self.preferred_backend)
+        loaded = LoadedModel(version, metadata, backend, model_path=model_path)
+        loaded.warm_up()
+        return loaded
+
+    def _swap(self, loaded):
+        with self._lock:
+            previous = self._active
+            self._active = loaded
+            if self._loading_version == loaded.version:
+                self._loading_version = None
+        old_version = previous.version if previous else None
+        print(f"Model version {loaded.version} is now active (was {old_version})")
+
+    def load_active(self):
+        """Synchronously load the active version (used at worker startup)"""
+        self._swap(self.load_version(self.active_version_name()))
+        self._last_poll = time.monotonic()
+        return self._active
+
+    def activate_in_background(self, version):
+        """Load and warm a version on a background thread, then swap it in"""
+        with self._lock:
+            if self._loading_version == version:
+                return False
+            self._loading_version = version
+
+        def worker():
+            try:
+                self._swap(self.load_version(version))
+            except Exception as e:
+                print(f"Error loading model version {version}: {e}")
+                with self._lock:
+                    if self._loading_version == version:
+                        self._loading_version = None
+
+        threading.Thread(target=worker, name=f"model-load-{version}", daemon=True).start()
+        return True
+
+    def maybe_reload(self):
+        """Start a background reload if the ACTIVE pointer moved since the last poll"""
+        now = time.monotonic()
+        if now - self._last_poll < POLL_SECONDS:
+            return
+        self._last_poll = now
+
+        wanted = self.active_version_name()
+        current = self._active.version if self._active else None
+        if wanted != current:
+            self.activate_in_background(wanted)
+
+    def active(self):
+        """Return the LoadedModel serving requests right now"""
+        if self._active is None:
+            with self._startup_lock:
+                if self._active is None:
+                    return self.load_active()
+        self.maybe_reload()
+        return self._active
+
+    def status(self):
+        """Summary of the active and loading versions"""
+        return {
+            'active_version': self._active.version if self._active else None,
+            'requested_version': self.active_version_name(),
+            'loading_version': self._loading_version,
+            'backend': self._active.backend.name if self._active else None
+        }
@@ -1,17 +1,310 @@
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from utils.db import db_instance
+from utils.review_queue import (
+    queue_fields, claimable_query, held_claims_query, lease_expiry, QUEUE_SORT, CLAIM_COUNTERS, REVIEW_MAX_CLAIMS
+)
+
+
+def _optional_object_id(value):
+    return ObjectId(value) if value else None
+
+
+def predictions_stats_pipeline():
+    """Aggregation pipeline summarizing predictions by review state and class"""
+    return [
+        {'$facet': {
+            'totals': [{'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'reviewed': {'$sum': {'$cond': ['$reviewed_by_doctor', 1, 0]}},
+                'average_confidence': {'$avg': '$confidence'}
+            }}],
+            'by_class': [{'$group': {'_id': '$prediction', 'count': {'$sum': 1}}}]
+        }}
+    ]
+
+
+def format_predictions_stats(result):
+    """Turn the stats pipeline output into the dashboard payload"""
+    facets = result[0] if result else {}
+    totals = (facets.get('totals') or [{}])[0]
+    total = totals.get('total', 0)
+    reviewed = totals.get('reviewed', 0)
+    return {
+        'total': total,
+        'reviewed': reviewed,
+        'pending_review': total - reviewed,
+        'average_confidence': totals.get('average_confidence'),
+        'by_class': {item['_id']: item['count'] for item in facets.get('by_class', [])}
+    }
+
+
+def doctor_review_counts_pipeline(doctor_id, now=None):
+    """Aggregation pipeline counting a doctor's predictions by review state and live claims"""
+    return [
+        {'$match': {'doctor_id': ObjectId(doctor_id)}},
+        {'$group': {
+            '_id': None,
+            'total': {'$sum': 1},
+            'pending_review': {'$sum': {'$cond': ['$reviewed_by_doctor', 0, 1]}},
+            'claimed': {'$sum': {'$cond': [{'$and': [
+                {'$eq': ['$reviewed_by_doctor', False]},
+                {'$gt': ['$claim_expires_at', now or datetime.utcnow()]}
+            ]}, 1, 0]}}
+        }}
+    ]
+
+
+def format_doctor_review_counts(result):
+    counts = result[0] if result else {}
+    total = counts.get('total', 0)
+    pending_review = counts.get('pending_review', 0)
+    return {
+        'total': total,
+        'pending_review': pending_review,
+        'reviewed': total - pending_review,
+        'claimed': counts.get('claimed', 0)
+    }
+
+
 class Prediction:
-    """
-    Dummy class for storing prediction data.
-    Replace with real DB logic if needed.
-    """
     def __init__(self):
-        self.storage = []
-        self.counter = 1
+        self.collection = db_instance.get_collection('predictions')
+        self.claim_counters = db_instance.get_collection(CLAIM_COUNTERS)
 
     def create_prediction(self, data):
-        data['prediction_id'] = self.counter
-        self.storage.append(data)
-        self.counter += 1
-        return data['prediction_id']
+        """Store a model prediction for an uploaded MRI image"""
+        try:
+            prediction_doc = {
+                'patient_id': _optional_object_id(data.get('patient_id')),
+                'doctor_id': _optional_object_id(data.get('doctor_id')),
+                'appointment_id': _optional_object_id(data.get('appointment_id')),
+                'image_path': data['image_path'],
+                'prediction': data['prediction'],
+                'confidence': data['confidence'],
+                'region': data.get('region'),
+                'model_version': data.get('model_version'),
+                'priority': data.get('priority', 'normal'),
+                'reviewed_by_doctor': False,
+                'doctor_notes': '',
+                'final_diagnosis': '',
+                'review_version': 0,
+                'created_at': datetime.utcnow(),
+                'updated_at': datetime.utcnow()
+            }
+            # Volume uploads: slice counts and the top slices behind the study-level result
+            if data.get('study'):
+                prediction_doc['study'] = data['study']
+            prediction_doc.update(queue_fields(prediction_doc))
+
+            result = self.collection.insert_one(prediction_doc)
+            return str(result.inserted_id)
+        except Exception as e:
+            print(f"Error creating prediction: {e}")
+            return None
 
     def get_all_predictions(self):
-        return self.storage
+        """Get all predictions, newest first"""
+        try:
+            return list(self.collection.find().sort('created_at', -1))
+        except Exception as e:
+            print(f"Error getting predictions: {e}")
+            return []
+
+    def get_patient_predictions(self, patient_id):
+        """Get all predictions for a patient, newest first"""
+        try:
+            return list(self.collection.find({'patient_id': ObjectId(patient_id)}).sort('created_at', -1))
+        except Exception as e:
+            print(f"Error getting patient predictions: {e}")
+            return []
+
+    def get_doctor_predictions(self, doctor_id):
+        """Get all predictions assigned to a doctor, newest first"""
+        try:
+            return list(self.collection.find({'doctor_id': ObjectId(doctor_id)}).sort('created_at', -1))
+        except Exception as e:
+            print(f"Error getting doctor predictions: {e}")
+            return []
+
+    def get_prediction_by_id(self, prediction_id):
+        """Get prediction by ID"""
+        try:
+            return self.collection.find_one({'_id': ObjectId(prediction_id)})
+        except Exception as e:
+            print(f"Error getting prediction by ID: {e}")
+            return None
+
+    def update_prediction_review(self, prediction_id, doctor_notes, final_diagnosis, doctor_id=None):
+        """
+        Record a doctor's review; every review bumps review_version.
+        With doctor_id, only predictions assigned to (or claimed by) that
+        doctor, or still unassigned, can be reviewed, and an unassigned one is
+        assigned to the reviewer in the same update.
+        """
+        try:
+            query = {'_id': ObjectId(prediction_id)}
+            fields = {
+                'reviewed_by_doctor': True,
+                'doctor_notes': doctor_notes,
+                'final_diagnosis': final_diagnosis,
+                'reviewed_at': datetime.utcnow(),
+                'updated_at': datetime.utcnow()
+            }
+            if doctor_id:
+                query['doctor_id'] = {'$in': [ObjectId(doctor_id), None]}
+                fields['doctor_id'] = ObjectId(doctor_id)
+            previous = self.collection.find_one_and_update(
+                query,
+                {
+                    '$set': fields,
+                    # Reviewed predictions leave the review queue
+                    '$unset': {'claim_expires_at': ''},
+                    '$inc': {'review_version': 1}
+                },
+                projection={'doctor_id': 1, 'claim_expires_at': 1}
+            )
+            if not previous:
+                return False
+            if previous.get('doctor_id') and 'claim_expires_at' in previous:
+                self.free_claim_slot(previous['doctor_id'])
+            return True
+        except Exception as e:
+            print(f"Error updating prediction review: {e}")
+            return False
+
+    def set_embedding(self, prediction_id, version, row):
+        """Record where a prediction's embedding is stored"""
+        try:
+            self.collection.update_one(
+                {'_id': ObjectId(prediction_id)},
+                {'$set': {'embedding_version': version, 'embedding_row': row}}
+            )
+            return True
+        except Exception as e:
+            print(f"Error recording prediction embedding: {e}")
+            return False
+
+    def reserve_claim_slot(self, doctor_id, max_claims=REVIEW_MAX_CLAIMS):
+        """
+        Take one of a doctor's claim slots before claiming; False when they
+        already hold max_claims. The check and the increment are one update.
+        """
+        try:
+            doctor_id = ObjectId(doctor_id)
+            self.claim_counters.update_one({'_id': doctor_id}, {'$setOnInsert': {'held': 0}}, upsert=True)
+            result = self.claim_counters.update_one(
+                {'_id': doctor_id, 'held': {'$lt': max_claims}},
+                {'$inc': {'held': 1}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            print(f"Error reserving review claim: {e}")
+            return False
+
+    def free_claim_slot(self, doctor_id):
+        """Give back a claim slot (a claim ended, or a reservation was not used)"""
+        try:
+            self.claim_counters.update_one(
+                {'_id': ObjectId(doctor_id), 'held': {'$gt': 0}},
+                {'$inc': {'held': -1}}
+            )
+        except Exception as e:
+            print(f"Error freeing review claim: {e}")
+
+    def claim_next_review(self, doctor_id):
+        """
+        Atomically assign the most urgent, oldest claimable prediction to a
+        doctor under a lease; returns it, or None when the queue is empty.
+        Call reserve_claim_slot first.
+        """
+        try:
+            now = datetime.utcnow()
+            fields = {'doctor_id': ObjectId(doctor_id), 'claimed_at': now, 'claim_expires_at': lease_expiry(now)}
+            prediction = self.collection.find_one_and_update(
+                claimable_query(now),
+                {'$set': fields, '$inc': {'claim_count': 1}},
+                sort=QUEUE_SORT,
+                return_document=ReturnDocument.BEFORE
+            )
+            if not prediction:
+                return None
+            # Taking over a lapsed claim ends it for the doctor who held it
+            if prediction.get('doctor_id'):
+                self.free_claim_slot(prediction['doctor_id'])
+            prediction.update(fields, claim_count=prediction.get('claim_count', 0) + 1)
+            return prediction
+        except Exception as e:
+            print(f"Error claiming review: {e}")
+            return None
+
+    def _claim_query(self, prediction_id, doctor_id):
+        # A doctor keeps a lapsed claim until someone else claims the prediction
+        return {
+            '_id': ObjectId(prediction_id),
+            'doctor_id': ObjectId(doctor_id),
+            'reviewed_by_doctor': False,
+            'claim_expires_at': {'$exists': True}
+        }
+
+    def renew_review_claim(self, prediction_id, doctor_id):
+        """Extend a doctor's claim; returns the new expiry, or None if the claim is gone"""
+        try:
+            expires_at = lease_expiry()
+            result = self.collection.update_one(
+                self._claim_query(prediction_id, doctor_id),
+                {'$set': {'claim_expires_at': expires_at}}
+            )
+            return expires_at if result.matched_count else None
+        except Exception as e:
+            print(f"Error renewing review claim: {e}")
+            return None
+
+    def release_review_claim(self, prediction_id, doctor_id):
+        """Put a claimed prediction back in the queue (at its original place)"""
+        try:
+            result = self.collection.update_one(
+                self._claim_query(prediction_id, doctor_id),
+                {'$set': {'doctor_id': None, 'claim_expires_at': datetime.utcnow()}}
+            )
+            if not result.matched_count:
+                return False
+            self.free_claim_slot(doctor_id)
+            return True
+        except Exception as e:
+            print(f"Error releasing review claim: {e}")
+            return False
+
+    def get_held_claims(self, doctor_id):
+        """A doctor's claims (lapsed ones first, then soonest to expire)"""
+        try:
+            return list(self.collection.find(held_claims_query(ObjectId(doctor_id))).sort('claim_expires_at', 1))
+        except Exception as e:
+            print(f"Error getting review claims: {e}")
+            return []
+
+    def count_review_queue(self):
+        """Predictions waiting to be claimed"""
+        try:
+            return self.collection.count_documents(claimable_query())
+        except Exception as e:
+            print(f"Error counting review queue: {e}")
+            return 0
+
+    def get_doctor_review_counts(self, doctor_id):
+        """Counts of a doctor's predictions: total, pending_review, reviewed, claimed"""
+        try:
+            return format_doctor_review_counts(list(self.collection.aggregate(doctor_review_counts_pipeline(doctor_id))))
+        except Exception as e:
+            print(f"Error getting doctor review counts: {e}")
+            return format_doctor_review_counts([])
+
+    def get_predictions_stats(self):
+        """Get prediction counts by review state and predicted class"""
+        try:
+            return format_predictions_stats(list(self.collection.aggregate(predictions_stats_pipeline())))
+        except Exception as e:
+            print(f"Error getting prediction stats: {e}")
+            return format_predictions_stats([])
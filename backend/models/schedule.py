@@ -0,0 +1,210 @@
+import calendar
+from datetime import date as date_type, datetime
+from functools import lru_cache
+from math import gcd
+
+# Doctors' availability as weekly templates plus date exceptions.
+# A day's working slots are a bitmask: bit i is the slot starting
+# i * slot_minutes after midnight. Masks are stored as hex strings because
+# 15-minute slots need 96 bits, more than a BSON integer holds.
+
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+DEFAULT_SLOT_MINUTES = 60
+ALLOWED_SLOT_MINUTES = [10, 15, 20, 30, 60]
+
+
+def slot_index(time_slot, slot_minutes):
+    """Bit index of an 'HH:MM' slot, or None if it is invalid or not on the slot grid"""
+    try:
+        hours, minutes = time_slot.split(':')
+        start = int(hours) * 60 + int(minutes)
+    except (AttributeError, ValueError):
+        return None
+    if not 0 <= start < 24 * 60 or start % slot_minutes:
+        return None
+    return start // slot_minutes
+
+
+def slot_label(index, slot_minutes):
+    start = index * slot_minutes
+    return f"{start // 60:02d}:{start % 60:02d}"
+
+
+def encode_slots(time_slots, slot_minutes):
+    """Bitmask for a list of 'HH:MM' slots; raises ValueError for off-grid times"""
+    mask = 0
+    for time_slot in time_slots:
+        index = slot_index(time_slot, slot_minutes)
+        if index is None:
+            raise ValueError(f"Invalid time slot {time_slot!r} for {slot_minutes}-minute slots")
+        mask |= 1 << index
+    return mask
+
+
+@lru_cache(maxsize=4096)
+def decode_mask(mask, slot_minutes):
+    """Sorted 'HH:MM' labels of the bits set in mask (cached: templates repeat weekly)"""
+    labels = []
+    index = 0
+    while mask:
+        if mask & 1:
+            labels.append(slot_label(index, slot_minutes))
+        mask >>= 1
+        index += 1
+    return tuple(labels)
+
+
+def _parse_day(value):
+    return value if isinstance(value, date_type) else datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _infer_slot_minutes(time_slots):
+    """Coarsest grid that fits every legacy slot (60 for the usual hourly lists)"""
+    step = DEFAULT_SLOT_MINUTES
+    for time_slot in time_slots:
+        step = gcd(step, int(time_slot.split(':')[1]))
+    return step
+
+
+def _slot_list(value, name):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError(f"Time slots for {name} must be a list")
+    return value
+
+
+class ScheduleTemplate:
+    """Weekly working-slot masks (Monday first) with per-date overrides"""
+
+    def __init__(self, slot_minutes=DEFAULT_SLOT_MINUTES, weekdays=None, exceptions=None):
+        self.slot_minutes = slot_minutes
+        self.weekdays = list(weekdays or [0] * 7)
+        # 'YYYY-MM-DD' -> mask; 0 marks a day off
+        self.exceptions = dict(exceptions or {})
+
+    @classmethod
+    def from_doctor(cls, doctor):
+        """Template stored on a doctor document, or one built from legacy available_time_slots"""
+        schedule = doctor.get('schedule')
+        if schedule:
+            return cls(
+                schedule.get('slot_minutes', DEFAULT_SLOT_MINUTES),
+                [int(mask, 16) for mask in schedule.get('weekdays', ['0'] * 7)],
+                {day: int(mask, 16) for day, mask in schedule.get('exceptions', {}).items()}
+            )
+
+        # Legacy: the same slots on every day of the week
+        time_slots = [s for s in doctor.get('available_time_slots', []) if slot_index(s, 1) is not None]
+        slot_minutes = _infer_slot_minutes(time_slots)
+        mask = encode_slots(time_slots, slot_minutes)
+        return cls(slot_minutes, [mask] * 7)
+
+    @classmethod
+    def from_request(cls, data):
+        """
+        Template from an API body:
+            {'slot_minutes': 30,
+             'weekdays': {'mon': ['09:00', '09:30'], ...},
+             'exceptions': {'2026-12-25': [], '2026-12-24': ['09:00']}}
+        Raises ValueError for invalid input.
+        """
+        slot_minutes = int(data.get('slot_minutes', DEFAULT_SLOT_MINUTES))
+        if slot_minutes not in ALLOWED_SLOT_MINUTES:
+            raise ValueError(f"slot_minutes must be one of: {', '.join(map(str, ALLOWED_SLOT_MINUTES))}")
+
+        weekdays_data = data.get('weekdays', {})
+        if not isinstance(weekdays_data, dict):
+            raise ValueError("weekdays must be an object of weekday -> time slots")
+        unknown = set(weekdays_data) - set(WEEKDAYS)
+        if unknown:
+            raise ValueError(f"Unknown weekdays: {', '.join(sorted(unknown))}")
+        weekdays = [encode_slots(_slot_list(weekdays_data.get(day), day), slot_minutes) for day in WEEKDAYS]
+
+        exceptions_data = data.get('exceptions', {})
+        if not isinstance(exceptions_data, dict):
+            raise ValueError("exceptions must be an object of date -> time slots")
+        exceptions = {}
+        for day, time_slots in exceptions_data.items():
+            try:
+                day_key = _parse_day(day).isoformat()
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid exception date {day!r}")
+            exceptions[day_key] = encode_slots(_slot_list(time_slots, day), slot_minutes)
+
+        return cls(slot_minutes, weekdays, exceptions)
+
+    def with_weekly_slots(self, time_slots):
+        """
+        Copy with the same slots on every weekday (the legacy available_time_slots
+        form), keeping the date exceptions. Raises ValueError for invalid slots.
+        """
+        time_slots = list(time_slots)
+        slot_minutes = self.slot_minutes
+        if any(slot_index(s, slot_minutes) is None for s in time_slots):
+            if any(slot_index(s, 1) is None for s in time_slots):
+                raise ValueError("Time slots must be 'HH:MM' times")
+            # Move to a grid that fits the new slots and the existing exceptions
+            exception_slots = [s for mask in self.exceptions.values() for s in decode_mask(mask, self.slot_minutes)]
+            slot_minutes = _infer_slot_minutes(time_slots + exception_slots)
+            if slot_minutes not in ALLOWED_SLOT_MINUTES:
+                raise ValueError(f"Time slots must start on multiples of one of: "
+                                 f"{', '.join(map(str, ALLOWED_SLOT_MINUTES))} minutes")
+        mask = encode_slots(time_slots, slot_minutes)
+        exceptions = {day: encode_slots(decode_mask(day_mask, self.slot_minutes), slot_minutes)
+                      for day, day_mask in self.exceptions.items()}
+        return ScheduleTemplate(slot_minutes, [mask] * 7, exceptions)
+
+    def weekly_slots(self):
+        """Slots worked on at least one weekday, for payloads that show a single slot list"""
+        mask = 0
+        for day_mask in self.weekdays:
+            mask |= day_mask
+        return list(decode_mask(mask, self.slot_minutes))
+
+    def to_doc(self):
+        return {
+            'slot_minutes': self.slot_minutes,
+            'weekdays': [format(mask, 'x') for mask in self.weekdays],
+            'exceptions': {day: format(mask, 'x') for day, mask in self.exceptions.items()}
+        }
+
+    def to_response(self):
+        return {
+            'slot_minutes': self.slot_minutes,
+            'weekdays': {day: list(decode_mask(mask, self.slot_minutes)) for day, mask in zip(WEEKDAYS, self.weekdays)},
+            'exceptions': {day: list(decode_mask(mask, self.slot_minutes)) for day, mask in sorted(self.exceptions.items())}
+        }
+
+    def mask_for(self, day):
+        """Working-slot mask for a date ('YYYY-MM-DD' or date)"""
+        day = _parse_day(day)
+        override = self.exceptions.get(day.isoformat())
+        return override if override is not None else self.weekdays[day.weekday()]
+
+    def booked_mask(self, time_slots):
+        """Mask of booked 'HH:MM' slots (off-grid times are ignored)"""
+        mask = 0
+        for time_slot in time_slots:
+            index = slot_index(time_slot, self.slot_minutes)
+            if index is not None:
+                mask |= 1 << index
+        return mask
+
+    def available_slots(self, day, booked=()):
+        """Free 'HH:MM' slots on a date given the booked ones"""
+        return list(decode_mask(self.mask_for(day) & ~self.booked_mask(booked), self.slot_minutes))
+
+    def is_working_slot(self, day, time_slot):
+        index = slot_index(time_slot, self.slot_minutes)
+        return index is not None and bool(self.mask_for(day) >> index & 1)
+
+    def month_availability(self, year, month, booked_by_date=None):
+        """{'YYYY-MM-DD': [free slots]} for every day of a month"""
+        booked_by_date = booked_by_date or {}
+        availability = {}
+        for day_number in range(1, calendar.monthrange(year, month)[1] + 1):
+            day = date_type(year, month, day_number)
+            key = day.isoformat()
+            availability[key] = self.available_slots(day, booked_by_date.get(key, ()))
+        return availability
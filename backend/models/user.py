@@ -1,7 +1,14 @@
 from datetime import datetime
 from bson import ObjectId
+from pymongo import UpdateOne
 import bcrypt
 from utils.db import db_instance
+from models.schedule import ScheduleTemplate
+from utils.user_search import search_fields, search_pipeline, search_truncated
+
+def hash_password(password):
+    """bcrypt hash of a plain-text password"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
 
 class User:
     def __init__(self):
@@ -10,44 +17,45 @@ class User:
     def create_user(self, user_data):
         """Create a new user"""
         try:
-            # Hash password
-            password = user_data['password'].encode('utf-8')
-            hashed_password = bcrypt.hashpw(password, bcrypt.gensalt())
-            
-            user_doc = {
-                'email': user_data['email'],
-                'password': hashed_password,
-                'user_type': user_data['user_type'],  # 'admin', 'doctor', 'patient'
-                'first_name': user_data['first_name'],
-                'last_name': user_data['last_name'],
-                'phone': user_data.get('phone', ''),
-                'created_at': datetime.utcnow(),
-                'is_active': True
-            }
-            
-            # Add role-specific fields
-            if user_data['user_type'] == 'doctor':
-                user_doc.update({
-                    'specialization': user_data.get('specialization', 'Neurology'),
-                    'license_number': user_data.get('license_number', ''),
-                    'experience_years': user_data.get('experience_years', 0),
-                    'available_time_slots': user_data.get('available_time_slots', []),
-                    'approved_by_admin': False
-                })
-            elif user_data['user_type'] == 'patient':
-                user_doc.update({
-                    'date_of_birth': user_data.get('date_of_birth'),
-                    'gender': user_data.get('gender', ''),
-                    'medical_history': user_data.get('medical_history', []),
-                    'emergency_contact': user_data.get('emergency_contact', {})
-                })
-            
+            user_doc = self.build_user_doc(user_data, hash_password(user_data['password']))
             result = self.collection.insert_one(user_doc)
             return str(result.inserted_id)
         except Exception as e:
             print(f"Error creating user: {e}")
             return None
     
+    def build_user_doc(self, user_data, hashed_password):
+        """User document for user_data with an already hashed password"""
+        user_doc = {
+            'email': user_data['email'],
+            'password': hashed_password,
+            'user_type': user_data['user_type'],  # 'admin', 'doctor', 'patient'
+            'first_name': user_data['first_name'],
+            'last_name': user_data['last_name'],
+            'phone': user_data.get('phone', ''),
+            'created_at': datetime.utcnow(),
+            'is_active': True
+        }
+        
+        # Add role-specific fields
+        if user_data['user_type'] == 'doctor':
+            user_doc.update({
+                'specialization': user_data.get('specialization', 'Neurology'),
+                'license_number': user_data.get('license_number', ''),
+                'experience_years': user_data.get('experience_years', 0),
+                'available_time_slots': user_data.get('available_time_slots', []),
+                'approved_by_admin': False
+            })
+        elif user_data['user_type'] == 'patient':
+            user_doc.update({
+                'date_of_birth': user_data.get('date_of_birth'),
+                'gender': user_data.get('gender', ''),
+                'medical_history': user_data.get('medical_history', []),
+                'emergency_contact': user_data.get('emergency_contact', {})
+            })
+        user_doc.update(search_fields(user_doc))
+        return user_doc
+    
     def find_user_by_email(self, email):
         """Find user by email"""
         try:
@@ -64,6 +72,41 @@ class User:
             print(f"Error finding user by ID: {e}")
             return None
     
+    def update_profile(self, user_id, updates):
+        """Update name, email or phone and refresh the search fields"""
+        try:
+            user = self.collection.find_one(
+                {'_id': ObjectId(user_id)}, {'email': 1, 'first_name': 1, 'last_name': 1, 'phone': 1}
+            )
+            if not user:
+                return False
+            user.update(updates)
+            result = self.collection.update_one(
+                {'_id': user['_id']},
+                {'$set': dict(updates, updated_at=datetime.utcnow(), **search_fields(user))}
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            print(f"Error updating profile: {e}")
+            return False
+    
+    def search_users(self, query, user_type=None, page=1, page_size=20):
+        """
+        Ranked matches for a name/email/phone query: (users, total, truncated).
+        When truncated, too many users matched to rank them all: the results
+        come from a subset of the matches and total is a lower bound.
+        """
+        try:
+            pipeline = search_pipeline(query, user_type, page, page_size)
+            if pipeline is None:
+                return [], 0, False
+            result = next(self.collection.aggregate(pipeline), {'results': [], 'total': [], 'candidates': []})
+            total = result['total'][0]['count'] if result['total'] else 0
+            return result['results'], total, search_truncated(result['candidates'])
+        except Exception as e:
+            print(f"Error searching users: {e}")
+            return [], 0, False
+    
     def verify_password(self, password, hashed_password):
         """Verify password"""
         try:
@@ -92,16 +135,71 @@ class User:
             print(f"Error approving doctor: {e}")
             return False
     
+    def approve_doctors(self, doctor_ids):
+        """Approve many doctors in one bulk_write; returns one result per id, in order"""
+        results = [{'id': doctor_id} for doctor_id in doctor_ids]
+        try:
+            ids = [ObjectId(doctor_id) for doctor_id in doctor_ids]
+            doctors = {doc['_id']: doc for doc in self.collection.find(
+                {'_id': {'$in': ids}, 'user_type': 'doctor'}, {'approved_by_admin': 1}
+            )}
+            
+            operations = []
+            for oid, result in zip(ids, results):
+                doctor = doctors.get(oid)
+                if not doctor:
+                    result['error'] = 'Doctor not found'
+                elif doctor.get('approved_by_admin'):
+                    result['error'] = 'Doctor is already approved'
+                else:
+                    operations.append(UpdateOne({'_id': oid}, {'$set': {'approved_by_admin': True}}))
+                    result['updated'] = True
+            
+            if operations:
+                self.collection.bulk_write(operations, ordered=False)
+            for result in results:
+                result.setdefault('updated', False)
+            return results
+        except Exception as e:
+            print(f"Error bulk approving doctors: {e}")
+            for result in results:
+                result['updated'] = False
+                result.setdefault('error', 'Update failed')
+            return results
+    
     def update_doctor_time_slots(self, doctor_id, time_slots):
-        """Update doctor's available time slots"""
+        """
+        Set the same available time slots on every weekday of a doctor's schedule,
+        keeping its date exceptions. Raises ValueError for invalid slots.
+        """
+        schedule = self.get_doctor_schedule(doctor_id)
+        if not schedule:
+            return False
+        return self.update_doctor_schedule(doctor_id, schedule.with_weekly_slots(time_slots))
+    
+    def get_doctor_schedule(self, doctor_id):
+        """ScheduleTemplate for a doctor (built from legacy time slots if none is stored), or None"""
+        try:
+            doctor = self.collection.find_one(
+                {'_id': ObjectId(doctor_id), 'user_type': 'doctor'},
+                {'schedule': 1, 'available_time_slots': 1}
+            )
+            return ScheduleTemplate.from_doctor(doctor) if doctor else None
+        except Exception as e:
+            print(f"Error getting doctor schedule: {e}")
+            return None
+    
+    def update_doctor_schedule(self, doctor_id, template):
+        """Store a doctor's weekly schedule template; callers invalidate the doctor directory"""
         try:
             result = self.collection.update_one(
-                {'_id': ObjectId(doctor_id)},
-                {'$set': {'available_time_slots': time_slots}}
+                {'_id': ObjectId(doctor_id), 'user_type': 'doctor'},
+                # The template replaces the legacy slot list, so only one source remains
+                {'$set': {'schedule': template.to_doc()}, '$unset': {'available_time_slots': ''}}
             )
-            return result.modified_count > 0
+            return result.matched_count > 0
         except Exception as e:
-            print(f"Error updating time slots: {e}")
+            print(f"Error updating doctor schedule: {e}")
             return False
     
     def get_approved_doctors(self):
@@ -0,0 +1,64 @@
+"""
+Re-score historical scans with a model version (typically before activating it).
+
+Usage:
+    python rescore.py v2                          # every stored prediction
+    python rescore.py v2 --source files           # every image in uploads/mri_images
+    python rescore.py v2 --baseline v1            # compare with v1's re-scores instead of stored predictions
+    python rescore.py v2 --workers 4 --batch-size 128 --max-batches 100
+    python rescore.py v2 --status
+
+Results are upserted into prediction_scores, one document per image and
+model version. Runs checkpoint after every batch; rerunning the same command
+after an interruption resumes where it stopped (--restart starts over).
+"""
+import argparse
+import json
+import sys
+
+from utils.db import db_instance
+from utils.rescoring import (
+    Rescorer, ensure_indexes, SOURCES, RESCORE_BATCH_SIZE, RESCORE_WORKERS, RESCORE_DECODE_THREADS
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-score historical scans with a model version')
+    parser.add_argument('version')
+    parser.add_argument('--source', choices=SOURCES, default='predictions')
+    parser.add_argument('--baseline', help='Model version to compare against (default: stored predictions)')
+    parser.add_argument('--batch-size', type=int, default=RESCORE_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=RESCORE_WORKERS, help='Inference processes')
+    parser.add_argument('--decode-threads', type=int, default=RESCORE_DECODE_THREADS)
+    parser.add_argument('--max-batches', type=int, help='Stop after this many batches (resume later)')
+    parser.add_argument('--restart', action='store_true', help='Discard the checkpoint and start over')
+    parser.add_argument('--status', action='store_true', help='Show the current report and exit')
+    args = parser.parse_args()
+
+    if not db_instance.connect():
+        sys.exit(1)
+    ensure_indexes()
+
+    try:
+        rescorer = Rescorer(args.version, args.source, args.baseline, args.batch_size, args.workers, args.decode_threads)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    if args.status:
+        checkpoint = rescorer.status()
+        print(json.dumps(Rescorer.report(checkpoint), indent=2) if checkpoint else 'No re-scoring run yet')
+        return
+
+    def progress(report):
+        print(f"{report['processed']} images scored ({report['run_images_per_second']}/s), "
+              f"agreement {report['agreement']}")
+
+    checkpoint, report = rescorer.run(max_batches=args.max_batches, restart=args.restart, progress=progress)
+    state = 'finished' if report['finished'] else 'paused (rerun to resume)'
+    print(f"Re-scoring {state}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,22 @@
-from flask import Blueprint, request, jsonify
+import csv
+from datetime import datetime
+from flask import Blueprint, request, jsonify, Response
 from models.user import User
-from models.appointment import Appointment
+from models.appointment import Appointment, all_appointments_pipeline
 from models.prediction import Prediction
+from models.schedule import ScheduleTemplate
 from utils.auth_utils import login_required, admin_required
+from utils.doctor_directory import doctor_directory
+from utils.single_flight import coalesce, read_coalescer
+from utils.archival import AppointmentArchiver, include_history_requested
+from utils.dashboard_stats import admin_dashboard_stats
+from utils.bulk_actions import parse_bulk_actions, bulk_response, BulkRequestError
+from utils.user_import import import_jobs, parse_rows, detect_format, MAX_IMPORT_ROWS
+from utils.user_search import MAX_PAGE_SIZE
+from utils.export import (
+    DATASETS, FORMATS, EXPORT_BATCH_SIZE, MAX_EXPORT_BATCH_SIZE, ExportError,
+    build_query, open_cursor, export_chunks, parquet_available
+)
 
 admin_bp = Blueprint('admin', __name__)
 user_model = User()
@@ -12,13 +26,12 @@ prediction_model = Prediction()
 @admin_bp.route('/dashboard', methods=['GET'])
 @login_required
 @admin_required
+@coalesce(scope='role')
 def admin_dashboard():
     """Get admin dashboard statistics"""
     try:
         # Get all doctors
         all_doctors = user_model.get_all_doctors()
-        approved_doctors = [doc for doc in all_doctors if doc.get('approved_by_admin', False)]
-        pending_doctors = [doc for doc in all_doctors if not doc.get('approved_by_admin', False)]
         
         # Get patient count
         from utils.db import db_instance
@@ -26,28 +39,15 @@ def admin_dashboard():
         patient_count = users_collection.count_documents({'user_type': 'patient'})
         
         # Get appointment statistics
-        pending_appointments = appointment_model.get_pending_appointments()
-        appointments_collection = db_instance.get_collection('appointments')
-        total_appointments = appointments_collection.count_documents({})
+        pending_appointments = appointment_model.collection.count_documents({'status': 'pending'})
+        total_appointments = appointment_model.collection.count_documents({})
         
         # Get prediction statistics
         prediction_stats = prediction_model.get_predictions_stats()
         
-        return jsonify({
-            'doctors': {
-                'total': len(all_doctors),
-                'approved': len(approved_doctors),
-                'pending': len(pending_doctors)
-            },
-            'patients': {
-                'total': patient_count
-            },
-            'appointments': {
-                'total': total_appointments,
-                'pending': len(pending_appointments)
-            },
-            'predictions': prediction_stats
-        }), 200
+        return jsonify(admin_dashboard_stats(
+            all_doctors, patient_count, total_appointments, pending_appointments, prediction_stats
+        )), 200
         
     except Exception as e:
         print(f"Admin dashboard error: {e}")
@@ -76,7 +76,7 @@ def get_all_doctors():
                 'approved_by_admin': doctor.get('approved_by_admin', False),
                 'is_active': doctor.get('is_active', True),
                 'created_at': doctor.get('created_at'),
-                'available_time_slots': doctor.get('available_time_slots', [])
+                'available_time_slots': ScheduleTemplate.from_doctor(doctor).weekly_slots()
             }
             doctors_data.append(doctor_data)
         
@@ -94,6 +94,7 @@ def approve_doctor(doctor_id):
     try:
         success = user_model.approve_doctor(doctor_id)
         if success:
+            doctor_directory.invalidate()
             return jsonify({'message': 'Doctor approved successfully'}), 200
         else:
             return jsonify({'error': 'Failed to approve doctor'}), 400
@@ -102,6 +103,28 @@ def approve_doctor(doctor_id):
         print(f"Approve doctor error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@admin_bp.route('/doctors/approve', methods=['PUT'])
+@login_required
+@admin_required
+def bulk_approve_doctors():
+    """Approve many doctors at once. Body: {'ids': [...]}"""
+    try:
+        try:
+            actions, invalid = parse_bulk_actions(request.get_json(silent=True))
+        except BulkRequestError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        results = user_model.approve_doctors([action['id'] for action in actions]) if actions else []
+        response = bulk_response(actions, invalid, results)
+        if response['updated']:
+            doctor_directory.invalidate()
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        print(f"Bulk approve doctors error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @admin_bp.route('/doctors', methods=['POST'])
 @login_required
 @admin_required
@@ -143,6 +166,7 @@ def add_doctor():
         
         # Auto-approve since added by admin
         user_model.approve_doctor(user_id)
+        doctor_directory.invalidate()
         
         return jsonify({
             'message': 'Doctor added successfully',
@@ -153,6 +177,147 @@ def add_doctor():
         print(f"Add doctor error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@admin_bp.route('/users/import', methods=['POST'])
+@login_required
+@admin_required
+def import_users():
+    """
+    Bulk-create doctors and patients from a CSV or NDJSON upload ('file').
+    The import runs in the background; poll GET /users/import/<job_id> for its
+    per-row error report. Valid rows are created even if others fail.
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        fmt = detect_format(upload.filename, request.args.get('format'))
+        try:
+            rows, errors = parse_rows(upload.read(), fmt)
+        except (UnicodeDecodeError, csv.Error) as e:
+            return jsonify({'error': f'Could not parse {fmt} file: {e}'}), 400
+        
+        if len(rows) + len(errors) > MAX_IMPORT_ROWS:
+            return jsonify({
+                'error': f'Uploads are limited to {MAX_IMPORT_ROWS} rows; use import_users.py for larger files'
+            }), 400
+        
+        job_id = import_jobs.start(rows, errors, request.user['user_id'], upload.filename)
+        
+        return jsonify({
+            'message': 'Import started',
+            'job_id': job_id,
+            'status_url': f'/api/admin/users/import/{job_id}'
+        }), 202
+        
+    except Exception as e:
+        print(f"Import users error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@admin_bp.route('/users/import/<job_id>', methods=['GET'])
+@login_required
+@admin_required
+def get_import_job(job_id):
+    """Status of a background import; the report is included once it has finished"""
+    try:
+        job = import_jobs.get(job_id)
+        if not job:
+            return jsonify({'error': 'Import job not found'}), 404
+        
+        return jsonify({
+            'job_id': str(job['_id']),
+            'status': job['status'],
+            'filename': job.get('filename'),
+            'rows': job.get('rows'),
+            'created_at': job.get('created_at'),
+            'started_at': job.get('started_at'),
+            'finished_at': job.get('finished_at'),
+            'report': job.get('report'),
+            'error': job.get('error')
+        }), 200
+        
+    except Exception as e:
+        print(f"Get import job error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@admin_bp.route('/users/search', methods=['GET'])
+@login_required
+@admin_required
+def search_users():
+    """
+    Search patients and doctors by name, email or phone (prefix and typo-tolerant).
+    Query: q, type=patient|doctor, page, per_page
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        user_type = request.args.get('type')
+        if not query:
+            return jsonify({'error': 'q is required'}), 400
+        if user_type and user_type not in ['patient', 'doctor', 'admin']:
+            return jsonify({'error': 'type must be patient, doctor or admin'}), 400
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+            per_page = min(max(int(request.args.get('per_page', 20)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'error': 'page and per_page must be integers'}), 400
+        
+        users, total, truncated = user_model.search_users(query, user_type, page, per_page)
+        results = [{
+            'id': str(user['_id']),
+            'email': user.get('email'),
+            'first_name': user.get('first_name'),
+            'last_name': user.get('last_name'),
+            'phone': user.get('phone', ''),
+            'user_type': user.get('user_type'),
+            'specialization': user.get('specialization'),
+            'approved_by_admin': user.get('approved_by_admin'),
+            'is_active': user.get('is_active', True),
+            'created_at': user.get('created_at'),
+            'score': round(user.get('score', 0), 3)
+        } for user in users]
+        
+        return jsonify({
+            'results': results,
+            'total': total,
+            # Too many matches to rank them all; total is a lower bound
+            'truncated': truncated,
+            'page': page,
+            'per_page': per_page
+        }), 200
+        
+    except Exception as e:
+        print(f"Search users error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@admin_bp.route('/users/<user_id>', methods=['PUT'])
+@login_required
+@admin_required
+def update_user(user_id):
+    """Update a user's name, email or phone"""
+    try:
+        data = request.get_json() or {}
+        updates = {field: str(data[field]).strip() for field in ['email', 'first_name', 'last_name', 'phone'] if field in data}
+        if not updates:
+            return jsonify({'error': 'Nothing to update'}), 400
+        for field in ['email', 'first_name', 'last_name']:
+            if field in updates and not updates[field]:
+                return jsonify({'error': f'{field} cannot be empty'}), 400
+        
+        if 'email' in updates:
+            existing_user = user_model.find_user_by_email(updates['email'])
+            if existing_user and str(existing_user['_id']) != user_id:
+                return jsonify({'error': 'User with this email already exists'}), 400
+        
+        if not user_model.update_profile(user_id, updates):
+            return jsonify({'error': 'User not found'}), 404
+        doctor_directory.invalidate()
+        
+        return jsonify({'message': 'User updated successfully'}), 200
+        
+    except Exception as e:
+        print(f"Update user error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @admin_bp.route('/patients', methods=['GET'])
 @login_required
 @admin_required
@@ -188,29 +353,13 @@ def get_all_patients():
 @admin_bp.route('/appointments', methods=['GET'])
 @login_required
 @admin_required
+@coalesce(scope='role')
 def get_all_appointments():
     """Get all appointments"""
     try:
-        from utils.db import db_instance
-        appointments_collection = db_instance.get_collection('appointments')
-        
-        pipeline = [
-            {'$lookup': {
-                'from': 'users',
-                'localField': 'doctor_id',
-                'foreignField': '_id',
-                'as': 'doctor_info'
-            }},
-            {'$lookup': {
-                'from': 'users',
-                'localField': 'patient_id',
-                'foreignField': '_id',
-                'as': 'patient_info'
-            }},
-            {'$sort': {'created_at': -1}}
-        ]
-        
-        appointments = list(appointments_collection.aggregate(pipeline))
+        appointments = list(appointment_model.collection.aggregate(
+            all_appointments_pipeline(include_history=include_history_requested(request.args))
+        ))
         
         return jsonify({'appointments': appointments}), 200
         
@@ -218,6 +367,30 @@ def get_all_appointments():
         print(f"Get appointments error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@admin_bp.route('/appointments/bulk', methods=['PUT'])
+@login_required
+@admin_required
+def bulk_update_appointments():
+    """
+    Change the status of many appointments at once.
+    Body: {'actions': [{'id', 'status', 'notes'}]} or {'ids': [...], 'status', 'notes'}
+    """
+    try:
+        try:
+            actions, invalid = parse_bulk_actions(
+                request.get_json(silent=True), ['approved', 'rejected', 'completed', 'cancelled']
+            )
+        except BulkRequestError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        results = appointment_model.bulk_update_status(actions) if actions else []
+        
+        return jsonify(bulk_response(actions, invalid, results)), 200
+        
+    except Exception as e:
+        print(f"Bulk update appointments error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @admin_bp.route('/predictions', methods=['GET'])
 @login_required
 @admin_required
@@ -235,17 +408,106 @@ def get_all_predictions():
 @login_required
 @admin_required
 def update_doctor_time_slots(doctor_id):
-    """Update doctor's available time slots"""
+    """Set the same available time slots on every weekday of a doctor's schedule template"""
     try:
-        data = request.get_json()
-        time_slots = data.get('time_slots', [])
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('time_slots', []), list):
+            return jsonify({'error': 'time_slots must be a list'}), 400
         
-        success = user_model.update_doctor_time_slots(doctor_id, time_slots)
+        try:
+            success = user_model.update_doctor_time_slots(doctor_id, data.get('time_slots', []))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         if success:
+            doctor_directory.invalidate()
             return jsonify({'message': 'Time slots updated successfully'}), 200
         else:
-            return jsonify({'error': 'Failed to update time slots'}), 400
+            return jsonify({'error': 'Doctor not found'}), 404
         
     except Exception as e:
         print(f"Update time slots error: {e}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Internal server error'}), 500
+
+@admin_bp.route('/metrics/coalescing', methods=['GET'])
+@login_required
+@admin_required
+def coalescing_metrics():
+    """Share of dashboard/list reads served from a coalesced computation"""
+    try:
+        return jsonify({'coalescing': read_coalescer.metrics()}), 200
+        
+    except Exception as e:
+        print(f"Coalescing metrics error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@admin_bp.route('/export/<dataset>', methods=['GET'])
+@login_required
+@admin_required
+def export_dataset(dataset):
+    """
+    Stream appointments, patients or predictions as CSV, NDJSON or Parquet.
+    Query params: format, from/to (YYYY-MM-DD, inclusive), status, batch_size, gzip,
+    include_history (appointments: also export archived rows)
+    """
+    try:
+        if dataset not in DATASETS:
+            return jsonify({'error': f"dataset must be one of: {', '.join(DATASETS)}"}), 404
+        
+        fmt = request.args.get('format', 'csv').lower()
+        if fmt not in FORMATS:
+            return jsonify({'error': f"format must be one of: {', '.join(FORMATS)}"}), 400
+        if fmt == 'parquet' and not parquet_available():
+            return jsonify({'error': 'Parquet export requires pyarrow'}), 400
+        
+        try:
+            batch_size = int(request.args.get('batch_size', EXPORT_BATCH_SIZE))
+        except ValueError:
+            return jsonify({'error': 'batch_size must be an integer'}), 400
+        batch_size = max(1, min(batch_size, MAX_EXPORT_BATCH_SIZE))
+        compress = request.args.get('gzip', 'false').lower() in ['1', 'true', 'yes']
+        
+        try:
+            query = build_query(
+                dataset,
+                date_from=request.args.get('from'),
+                date_to=request.args.get('to'),
+                status=request.args.get('status')
+            )
+        except ExportError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        cursor = open_cursor(dataset, query, batch_size, include_history_requested(request.args))
+        filename = f"{dataset}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+        mimetype = FORMATS[fmt]
+        if compress:
+            filename += '.gz'
+            mimetype = 'application/gzip'
+        
+        # No Content-Length: the body is sent with chunked transfer encoding
+        return Response(
+            export_chunks(dataset, fmt, cursor, batch_size, compress),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+        
+    except Exception as e:
+        print(f"Export error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@admin_bp.route('/archival', methods=['GET'])
+@login_required
+@admin_required
+def archival_status():
+    """Progress of the appointment archival job and the size of each collection"""
+    try:
+        archiver = AppointmentArchiver()
+        return jsonify({
+            'checkpoint': archiver.status(),
+            'after_days': archiver.after_days,
+            'active_appointments': archiver.active.estimated_document_count(),
+            'archived_appointments': archiver.history.estimated_document_count()
+        }), 200
+        
+    except Exception as e:
+        print(f"Archival status error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
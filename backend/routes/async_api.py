@@ -0,0 +1,200 @@
+import asyncio
+import json
+import time
+from functools import wraps
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from models.async_user import AsyncUser
+from models.async_appointment import AsyncAppointment
+from models.async_prediction import AsyncPrediction
+from utils.auth_utils import bearer_token, verify_token
+from utils.json_utils import json_default
+from utils.archival import include_history_requested
+from utils.dashboard_stats import admin_dashboard_stats, doctor_dashboard_stats, patient_dashboard_stats
+from utils.change_feed import change_feed
+from utils.thumbnails import prediction_image_urls
+from routes.events import HEARTBEAT_SECONDS, MAX_STREAM_SECONDS, RETRY_MS, stream_user, sse
+
+# I/O-bound read endpoints and the event stream served as coroutines in ASGI
+# mode (see asgi.py). They mirror the Flask routes of the same path and return
+# the same payloads.
+
+user_model = AsyncUser()
+appointment_model = AsyncAppointment()
+prediction_model = AsyncPrediction()
+
+ROLE_ERRORS = {
+    'admin': 'Admin privileges required',
+    'doctor': 'Doctor privileges required',
+    'patient': 'Patient privileges required'
+}
+
+
+class MongoJSONResponse(JSONResponse):
+    def render(self, content):
+        return json.dumps(content, default=json_default).encode('utf-8')
+
+
+def requires(role):
+    """Async counterpart of login_required + <role>_required (admins pass every role)"""
+    def decorator(endpoint):
+        @wraps(endpoint)
+        async def decorated(request):
+            token = bearer_token(request.headers.get('Authorization'))
+            if not token:
+                return MongoJSONResponse({'error': 'No token provided'}, status_code=401)
+
+            payload = verify_token(token)
+            if not payload:
+                return MongoJSONResponse({'error': 'Invalid or expired token'}, status_code=401)
+            if payload.get('user_type') not in [role, 'admin']:
+                return MongoJSONResponse({'error': ROLE_ERRORS[role]}, status_code=403)
+
+            request.state.user = payload
+            try:
+                return await endpoint(request)
+            except Exception as e:
+                print(f"Async route error ({request.url.path}): {e}")
+                return MongoJSONResponse({'error': 'Internal server error'}, status_code=500)
+        return decorated
+    return decorator
+
+
+@requires('admin')
+async def admin_dashboard(request):
+    """Get admin dashboard statistics, running the independent queries concurrently"""
+    all_doctors, patient_count, total_appointments, pending_appointments, prediction_stats = await asyncio.gather(
+        user_model.get_all_doctors(),
+        user_model.count_patients(),
+        appointment_model.count_appointments(),
+        appointment_model.count_appointments({'status': 'pending'}),
+        prediction_model.get_predictions_stats()
+    )
+    return MongoJSONResponse(admin_dashboard_stats(
+        all_doctors, patient_count, total_appointments, pending_appointments, prediction_stats
+    ))
+
+
+@requires('admin')
+async def admin_appointments(request):
+    """Get all appointments"""
+    include_history = include_history_requested(request.query_params)
+    return MongoJSONResponse({'appointments': await appointment_model.get_all_appointments(include_history)})
+
+
+@requires('admin')
+async def admin_predictions(request):
+    """Get all predictions"""
+    return MongoJSONResponse({'predictions': await prediction_model.get_all_predictions()})
+
+
+@requires('doctor')
+async def doctor_dashboard(request):
+    """Get doctor dashboard statistics with appointment and prediction queries in parallel"""
+    doctor_id = request.state.user['user_id']
+    appointments, prediction_counts, review_queue_size = await asyncio.gather(
+        appointment_model.get_doctor_appointments(doctor_id),
+        prediction_model.get_doctor_review_counts(doctor_id),
+        prediction_model.count_review_queue()
+    )
+    return MongoJSONResponse(doctor_dashboard_stats(appointments, prediction_counts, review_queue_size))
+
+
+@requires('doctor')
+async def doctor_appointments(request):
+    """Get all appointments for the logged-in doctor"""
+    doctor_id = request.state.user['user_id']
+    include_history = include_history_requested(request.query_params)
+    return MongoJSONResponse({'appointments': await appointment_model.get_doctor_appointments(doctor_id, include_history)})
+
+
+@requires('doctor')
+async def doctor_predictions(request):
+    """Get all predictions assigned to the doctor"""
+    doctor_id = request.state.user['user_id']
+    predictions = await prediction_model.get_doctor_predictions(doctor_id)
+    for prediction in predictions:
+        prediction.update(prediction_image_urls(prediction['_id'], request.state.user))
+    return MongoJSONResponse({'predictions': predictions})
+
+
+@requires('patient')
+async def patient_dashboard(request):
+    """Get patient dashboard statistics with appointment and prediction queries in parallel"""
+    patient_id = request.state.user['user_id']
+    appointments, predictions = await asyncio.gather(
+        appointment_model.get_patient_appointments(patient_id),
+        prediction_model.get_patient_predictions(patient_id)
+    )
+    return MongoJSONResponse(patient_dashboard_stats(appointments, predictions))
+
+
+@requires('patient')
+async def patient_appointments(request):
+    """Get all appointments for the logged-in patient"""
+    patient_id = request.state.user['user_id']
+    include_history = include_history_requested(request.query_params)
+    return MongoJSONResponse({'appointments': await appointment_model.get_patient_appointments(patient_id, include_history)})
+
+
+@requires('patient')
+async def patient_predictions(request):
+    """Get all predictions for the logged-in patient"""
+    patient_id = request.state.user['user_id']
+    predictions = await prediction_model.get_patient_predictions(patient_id)
+    for prediction in predictions:
+        prediction.update(prediction_image_urls(prediction['_id'], request.state.user))
+    return MongoJSONResponse({'predictions': predictions})
+
+
+async def event_stream(request):
+    """
+    Server-sent events as a coroutine: a waiting stream holds no worker thread,
+    so one process serves every open stream (the Flask route caps them per worker).
+    Authenticate with the Authorization header or a ?ticket= from POST /api/events/ticket.
+    """
+    user = stream_user(request.headers.get('Authorization'), request.query_params.get('ticket'))
+    if not user:
+        return MongoJSONResponse({'error': 'Invalid or expired token'}, status_code=401)
+
+    async def generate():
+        # Subscribed once the response starts, so the finally below always runs
+        subscriber = change_feed.subscribe(user, loop=asyncio.get_running_loop())
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode('utf-8')
+            yield sse('ready', {'user_type': user.get('user_type')})
+            started = time.monotonic()
+            while time.monotonic() - started < MAX_STREAM_SECONDS:
+                if subscriber.overflowed:
+                    # Too far behind: tell the client to refetch, then reconnect
+                    yield sse('resync', {})
+                    return
+                try:
+                    event = await asyncio.wait_for(subscriber.events.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield sse(event['type'], event, event.get('event_id'))
+        finally:
+            # Also runs when the client disconnects and the stream is cancelled
+            change_feed.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async_routes = [
+    Route('/api/admin/dashboard', admin_dashboard, methods=['GET']),
+    Route('/api/admin/appointments', admin_appointments, methods=['GET']),
+    Route('/api/admin/predictions', admin_predictions, methods=['GET']),
+    Route('/api/doctor/dashboard', doctor_dashboard, methods=['GET']),
+    Route('/api/doctor/appointments', doctor_appointments, methods=['GET']),
+    Route('/api/doctor/predictions', doctor_predictions, methods=['GET']),
+    Route('/api/patient/dashboard', patient_dashboard, methods=['GET']),
+    Route('/api/patient/appointments', patient_appointments, methods=['GET']),
+    Route('/api/patient/predictions', patient_predictions, methods=['GET']),
+    Route('/api/events/stream', event_stream, methods=['GET'])
+]
@@ -1,11 +1,14 @@
 from flask import Blueprint, request, jsonify
 from models.user import User
+from models.schedule import ScheduleTemplate
 from utils.auth_utils import generate_token
+from utils.rate_limit import rate_limit
 
 auth_bp = Blueprint('auth', __name__)
 user_model = User()
 
 @auth_bp.route('/login', methods=['POST', 'OPTIONS'])
+@rate_limit('login')
 def login():
     """Login endpoint for all user types"""
     if request.method == 'OPTIONS':
@@ -61,7 +64,7 @@ def login():
                 'specialization': user.get('specialization', ''),
                 'license_number': user.get('license_number', ''),
                 'experience_years': user.get('experience_years', 0),
-                'available_time_slots': user.get('available_time_slots', [])
+                'available_time_slots': ScheduleTemplate.from_doctor(user).weekly_slots()
             })
         elif user_type == 'patient':
             user_data.update({
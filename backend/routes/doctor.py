@@ -1,12 +1,56 @@
+import calendar
+import os
+from datetime import date as date_type, datetime, timedelta
+from bson import ObjectId
 from flask import Blueprint, request, jsonify
 from models.appointment import Appointment
+from models.user import User
+from models.schedule import ScheduleTemplate
 from models.prediction import Prediction
 from utils.auth_utils import login_required, doctor_required
+from utils.doctor_directory import doctor_directory
+from utils.single_flight import coalesce
+from utils.archival import include_history_requested
+from utils.dashboard_stats import doctor_dashboard_stats
+from utils.bulk_actions import parse_bulk_actions, bulk_response, BulkRequestError
+from utils.thumbnails import prediction_image_urls
+from utils.review_queue import REVIEW_MAX_CLAIMS, REVIEW_LEASE_MINUTES
 
 doctor_bp = Blueprint('doctor', __name__)
+CALENDAR_MAX_DAYS = int(os.getenv('CALENDAR_MAX_DAYS', '62'))
 appointment_model = Appointment()
+user_model = User()
 prediction_model = Prediction()
 
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+
+def calendar_range(start=None, end=None, date=None, view='week'):
+    """Inclusive (start, end) dates from explicit bounds or a week/month around a date"""
+    if start or end:
+        start_date = _parse_date(start, 'start')
+        end_date = _parse_date(end, 'end')
+    else:
+        anchor = _parse_date(date, 'date') if date else date_type.today()
+        if view == 'month':
+            start_date = anchor.replace(day=1)
+            end_date = anchor.replace(day=calendar.monthrange(anchor.year, anchor.month)[1])
+        elif view == 'week':
+            # Monday to Sunday
+            start_date = anchor - timedelta(days=anchor.weekday())
+            end_date = start_date + timedelta(days=6)
+        else:
+            raise ValueError('view must be week or month')
+    
+    if end_date < start_date:
+        raise ValueError('end must not be before start')
+    if (end_date - start_date).days + 1 > CALENDAR_MAX_DAYS:
+        raise ValueError(f'Date range is limited to {CALENDAR_MAX_DAYS} days')
+    return start_date, end_date
+
 @doctor_bp.route('/appointments', methods=['GET'])
 @login_required
 @doctor_required
@@ -14,7 +58,9 @@ def get_doctor_appointments():
     """Get all appointments for the logged-in doctor"""
     try:
         doctor_id = request.user['user_id']
-        appointments = appointment_model.get_doctor_appointments(doctor_id)
+        appointments = appointment_model.get_doctor_appointments(
+            doctor_id, include_history_requested(request.args)
+        )
         
         return jsonify({'appointments': appointments}), 200
         
@@ -88,6 +134,30 @@ def complete_appointment(appointment_id):
         print(f"Complete appointment error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@doctor_bp.route('/appointments/bulk', methods=['PUT'])
+@login_required
+@doctor_required
+def bulk_update_appointments():
+    """
+    Approve, reject or complete many appointments at once.
+    Body: {'actions': [{'id', 'status', 'notes'}]} or {'ids': [...], 'status', 'notes'}
+    """
+    try:
+        try:
+            actions, invalid = parse_bulk_actions(request.get_json(silent=True), ['approved', 'rejected', 'completed'])
+        except BulkRequestError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Admins may act on any appointment, doctors only on their own
+        doctor_id = None if request.user.get('user_type') == 'admin' else request.user['user_id']
+        results = appointment_model.bulk_update_status(actions, doctor_id) if actions else []
+        
+        return jsonify(bulk_response(actions, invalid, results)), 200
+        
+    except Exception as e:
+        print(f"Bulk update appointments error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @doctor_bp.route('/predictions', methods=['GET'])
 @login_required
 @doctor_required
@@ -96,6 +166,8 @@ def get_doctor_predictions():
     try:
         doctor_id = request.user['user_id']
         predictions = prediction_model.get_doctor_predictions(doctor_id)
+        for prediction in predictions:
+            prediction.update(prediction_image_urls(prediction['_id'], request.user))
         
         return jsonify({'predictions': predictions}), 200
         
@@ -116,50 +188,118 @@ def review_prediction(prediction_id):
         if not doctor_notes or not final_diagnosis:
             return jsonify({'error': 'Doctor notes and final diagnosis are required'}), 400
         
+        # Admins may review any prediction without taking it over
+        doctor_id = None if request.user.get('user_type') == 'admin' else request.user['user_id']
         success = prediction_model.update_prediction_review(
-            prediction_id, doctor_notes, final_diagnosis
+            prediction_id, doctor_notes, final_diagnosis, doctor_id=doctor_id
         )
         
         if success:
             return jsonify({'message': 'Prediction reviewed successfully'}), 200
         else:
-            return jsonify({'error': 'Failed to review prediction'}), 400
+            return jsonify({'error': 'Prediction not found or assigned to another doctor'}), 400
         
     except Exception as e:
         print(f"Review prediction error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@doctor_bp.route('/review-queue', methods=['GET'])
+@login_required
+@doctor_required
+def get_review_queue():
+    """Queue size and the doctor's claims (a lapsed claim is kept until someone else takes it)"""
+    try:
+        claims = prediction_model.get_held_claims(request.user['user_id'])
+        for prediction in claims:
+            prediction.update(prediction_image_urls(prediction['_id'], request.user))
+
+        return jsonify({
+            'available': prediction_model.count_review_queue(),
+            'claims': claims,
+            'max_claims': REVIEW_MAX_CLAIMS,
+            'lease_minutes': REVIEW_LEASE_MINUTES
+        }), 200
+
+    except Exception as e:
+        print(f"Get review queue error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@doctor_bp.route('/review-queue/claim', methods=['POST'])
+@login_required
+@doctor_required
+def claim_review():
+    """
+    Claim the most urgent, oldest unassigned prediction. The claim is a
+    lease: renew it while reviewing, or it returns to the queue on expiry.
+    """
+    try:
+        doctor_id = request.user['user_id']
+        if not prediction_model.reserve_claim_slot(doctor_id):
+            return jsonify({'error': f'Review or release your claimed predictions first (at most {REVIEW_MAX_CLAIMS})'}), 409
+
+        prediction = prediction_model.claim_next_review(doctor_id)
+        if not prediction:
+            prediction_model.free_claim_slot(doctor_id)
+            return jsonify({'prediction': None, 'message': 'No predictions waiting for review'}), 200
+
+        prediction.update(prediction_image_urls(prediction['_id'], request.user))
+        return jsonify({'prediction': prediction}), 200
+
+    except Exception as e:
+        print(f"Claim review error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@doctor_bp.route('/review-queue/<prediction_id>/renew', methods=['PUT'])
+@login_required
+@doctor_required
+def renew_review_claim(prediction_id):
+    """Extend the lease on a claimed prediction"""
+    try:
+        if not ObjectId.is_valid(prediction_id):
+            return jsonify({'error': 'Prediction not found'}), 404
+
+        expires_at = prediction_model.renew_review_claim(prediction_id, request.user['user_id'])
+        if not expires_at:
+            return jsonify({'error': 'Claim expired and the prediction was claimed by another doctor, or it was already reviewed'}), 409
+
+        return jsonify({'claim_expires_at': expires_at}), 200
+
+    except Exception as e:
+        print(f"Renew review claim error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@doctor_bp.route('/review-queue/<prediction_id>/release', methods=['PUT'])
+@login_required
+@doctor_required
+def release_review_claim(prediction_id):
+    """Give a claimed prediction back to the queue"""
+    try:
+        if not ObjectId.is_valid(prediction_id):
+            return jsonify({'error': 'Prediction not found'}), 404
+
+        if not prediction_model.release_review_claim(prediction_id, request.user['user_id']):
+            return jsonify({'error': 'Prediction is not claimed by you'}), 409
+
+        return jsonify({'message': 'Prediction returned to the review queue'}), 200
+
+    except Exception as e:
+        print(f"Release review claim error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @doctor_bp.route('/dashboard', methods=['GET'])
 @login_required
 @doctor_required
+@coalesce(scope='user')
 def doctor_dashboard():
     """Get doctor dashboard statistics"""
     try:
         doctor_id = request.user['user_id']
         
-        # Get appointment statistics
         appointments = appointment_model.get_doctor_appointments(doctor_id)
-        pending_appointments = [apt for apt in appointments if apt['status'] == 'pending']
-        approved_appointments = [apt for apt in appointments if apt['status'] == 'approved']
-        completed_appointments = [apt for apt in appointments if apt['status'] == 'completed']
-        
-        # Get prediction statistics
-        predictions = prediction_model.get_doctor_predictions(doctor_id)
-        pending_reviews = [pred for pred in predictions if not pred['reviewed_by_doctor']]
+        prediction_counts = prediction_model.get_doctor_review_counts(doctor_id)
+        review_queue_size = prediction_model.count_review_queue()
         
-        return jsonify({
-            'appointments': {
-                'total': len(appointments),
-                'pending': len(pending_appointments),
-                'approved': len(approved_appointments),
-                'completed': len(completed_appointments)
-            },
-            'predictions': {
-                'total': len(predictions),
-                'pending_review': len(pending_reviews),
-                'reviewed': len(predictions) - len(pending_reviews)
-            }
-        }), 200
+        return jsonify(doctor_dashboard_stats(appointments, prediction_counts, review_queue_size)), 200
         
     except Exception as e:
         print(f"Doctor dashboard error: {e}")
@@ -176,29 +316,100 @@ def get_doctor_schedule():
             return jsonify({'error': 'Date parameter is required'}), 400
         
         doctor_id = request.user['user_id']
-        
-        # Get appointments for the specific date
-        from utils.db import db_instance
-        appointments_collection = db_instance.get_collection('appointments')
-        
-        pipeline = [
-            {'$match': {
-                'doctor_id': appointment_model.collection.database.client.get_database().get_collection('users').find_one({'_id': doctor_id})['_id'],
-                'appointment_date': date,
-                'status': {'$in': ['pending', 'approved']}
-            }},
-            {'$lookup': {
-                'from': 'users',
-                'localField': 'patient_id',
-                'foreignField': '_id',
-                'as': 'patient_info'
-            }}
-        ]
-        
-        scheduled_appointments = list(appointments_collection.aggregate(pipeline))
+        scheduled_appointments = appointment_model.get_doctor_schedule(doctor_id, date)
         
         return jsonify({'schedule': scheduled_appointments}), 200
         
     except Exception as e:
         print(f"Get doctor schedule error: {e}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Internal server error'}), 500
+
+@doctor_bp.route('/calendar', methods=['GET'])
+@login_required
+@doctor_required
+def get_doctor_calendar():
+    """
+    Appointments for a week or month, grouped by day and time slot.
+    Query params: start and end (YYYY-MM-DD, inclusive), or date plus view=week|month;
+    status (comma-separated, default pending,approved); doctor_id (admins only)
+    """
+    try:
+        try:
+            start_date, end_date = calendar_range(
+                request.args.get('start'), request.args.get('end'),
+                request.args.get('date'), request.args.get('view', 'week')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        statuses = [s for s in request.args.get('status', 'pending,approved').split(',') if s]
+        
+        doctor_id = request.user['user_id']
+        if request.user.get('user_type') == 'admin' and request.args.get('doctor_id'):
+            doctor_id = request.args['doctor_id']
+        if not ObjectId.is_valid(doctor_id):
+            return jsonify({'error': 'Invalid doctor_id'}), 400
+        
+        days = appointment_model.get_doctor_calendar(
+            doctor_id, start_date.isoformat(), end_date.isoformat(), statuses
+        )
+        
+        return jsonify({
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'days': days
+        }), 200
+        
+    except Exception as e:
+        print(f"Get doctor calendar error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def _schedule_doctor_id():
+    """The caller's id, or ?doctor_id= when an admin manages a doctor's schedule"""
+    if request.user.get('user_type') == 'admin' and request.args.get('doctor_id'):
+        return request.args['doctor_id']
+    return request.user['user_id']
+
+@doctor_bp.route('/schedule-template', methods=['GET'])
+@login_required
+@doctor_required
+def get_schedule_template():
+    """Get the weekly schedule template and date exceptions"""
+    try:
+        schedule = user_model.get_doctor_schedule(_schedule_doctor_id())
+        if not schedule:
+            return jsonify({'error': 'Doctor not found'}), 404
+        
+        return jsonify({'schedule': schedule.to_response()}), 200
+        
+    except Exception as e:
+        print(f"Get schedule template error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@doctor_bp.route('/schedule-template', methods=['PUT'])
+@login_required
+@doctor_required
+def update_schedule_template():
+    """
+    Replace the weekly schedule template.
+    Body: {'slot_minutes': 30, 'weekdays': {'mon': ['09:00', ...], ...},
+           'exceptions': {'YYYY-MM-DD': [] (day off) or ['09:00', ...]}}
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        try:
+            template = ScheduleTemplate.from_request(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not user_model.update_doctor_schedule(_schedule_doctor_id(), template):
+            return jsonify({'error': 'Doctor not found'}), 404
+        doctor_directory.invalidate()
+        
+        return jsonify({'message': 'Schedule updated successfully', 'schedule': template.to_response()}), 200
+        
+    except Exception as e:
+        print(f"Update schedule template error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -0,0 +1,123 @@
+import json
+import os
+import queue
+import threading
+import time
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from utils.auth_utils import (
+    bearer_token, verify_token, generate_scoped_token, verify_scoped_token, login_required, admin_required
+)
+from utils.change_feed import change_feed
+from utils.json_utils import json_default
+
+events_bp = Blueprint('events', __name__)
+
+HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+# Clients reconnect after this long; it also bounds how long one connection holds a worker thread
+MAX_STREAM_SECONDS = float(os.getenv('SSE_MAX_STREAM_SECONDS', '300'))
+# Open streams per sync worker process; each holds a worker thread, so keep
+# this well below GUNICORN_THREADS or request handling starves. The ASGI
+# server (asgi.py) serves streams as coroutines without this cap.
+MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', '1'))
+# Lifetime of the ticket EventSource puts in the stream URL
+TICKET_TTL_SECONDS = int(os.getenv('SSE_TICKET_TTL_SECONDS', '30'))
+TICKET_SCOPE = 'events'
+RETRY_MS = 3000
+
+stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+def stream_user(authorization, ticket):
+    """Payload for a session token in the Authorization header or a stream ticket, else None"""
+    token = bearer_token(authorization)
+    return (verify_token(token) if token else None) or verify_scoped_token(ticket, TICKET_SCOPE)
+
+
+def sse(event_name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_name}")
+    lines.append(f"data: {json.dumps(data, default=json_default)}")
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+@events_bp.route('/ticket', methods=['POST'])
+@login_required
+def stream_ticket():
+    """
+    Short-lived ticket for opening an event stream. EventSource cannot send
+    headers, so the ticket goes in the stream URL instead of the session token.
+    """
+    try:
+        ticket = generate_scoped_token(request.user, TICKET_SCOPE, TICKET_TTL_SECONDS)
+        if not ticket:
+            return jsonify({'error': 'Could not issue ticket'}), 500
+        return jsonify({'ticket': ticket, 'expires_in': TICKET_TTL_SECONDS}), 200
+    except Exception as e:
+        print(f"Stream ticket error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@events_bp.route('/stream', methods=['GET'])
+def event_stream():
+    """
+    Server-sent events for appointment and prediction changes visible to the caller.
+    Authenticate with the Authorization header or a ?ticket= from POST /ticket.
+    """
+    user = stream_user(request.headers.get('Authorization'), request.args.get('ticket'))
+    if not user:
+        return jsonify({'error': 'Invalid or expired token'}), 401
+
+    if not stream_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many open event streams, please try again later'})
+        response.headers['Retry-After'] = str(RETRY_MS // 1000)
+        return response, 503
+
+    subscriber = change_feed.subscribe(user)
+
+    def generate():
+        yield f"retry: {RETRY_MS}\n\n".encode('utf-8')
+        yield sse('ready', {'user_type': user.get('user_type')})
+        started = time.monotonic()
+        while time.monotonic() - started < MAX_STREAM_SECONDS:
+            if subscriber.overflowed:
+                # Too far behind: tell the client to refetch, then reconnect
+                yield sse('resync', {})
+                return
+            try:
+                event = subscriber.events.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield b": keep-alive\n\n"
+                continue
+            # Events are shared between subscribers, so they are never modified here
+            yield sse(event['type'], event, event.get('event_id'))
+
+    def close():
+        change_feed.unsubscribe(subscriber)
+        stream_slots.release()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Runs when the server closes the response, even if the client left before
+    # the generator started
+    response.call_on_close(close)
+    return response
+
+
+@events_bp.route('/status', methods=['GET'])
+@login_required
+@admin_required
+def event_status():
+    """Change feed source and connected clients in this worker"""
+    try:
+        return jsonify({
+            'source': change_feed.source,
+            'subscribers': change_feed.subscriber_count()
+        }), 200
+    except Exception as e:
+        print(f"Event status error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
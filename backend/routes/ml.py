@@ -1,14 +1,103 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file
 import os
+import shutil
+import time
 import uuid
-from models.ml_model import predict_mri
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from bson import ObjectId
+from werkzeug.utils import secure_filename
+from models.ml_model import predict_mri, predict_mri_with_embedding, registry
+from models.appointment import Appointment, PRIORITY_ORDER
+from models.prediction import Prediction
+from utils.auth_utils import login_required, media_login_required, admin_required, doctor_required, get_optional_user
+from utils.inference_scheduler import inference_scheduler, SchedulerOverloaded
+from utils.rate_limit import rate_limit, acquire_inflight_slot, release_inflight_slot
+from utils.idempotency import idempotent
+from utils.embeddings import embedding_stores, SEARCH_MODES
+from utils.shadow import shadow_evaluator
+from utils.saliency import saliency_service
+from utils.thumbnails import thumbnail_cache, prediction_image_urls, THUMBNAIL_SIZES, DEFAULT_THUMBNAIL_SIZE
+from utils.volumes import open_volume, extract_zip, score_volume, save_slice, VolumeError, VOLUME_MAX_SLICES
 
 ml_bp = Blueprint('ml', __name__)
+appointment_model = Appointment()
+prediction_model = Prediction()
 
 UPLOAD_FOLDER = 'uploads/mri_images'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Uploaded studies, one folder each
+STUDY_FOLDER = 'uploads/studies'
+
+# Upper bound on how long a request waits for its queued inference
+INFERENCE_TIMEOUT = float(os.getenv('ML_INFERENCE_TIMEOUT', '60'))
+
+# Store a penultimate-layer embedding for every scored image (similar-case search)
+EMBEDDINGS_ENABLED = os.getenv('ML_EMBEDDINGS_ENABLED', 'true').lower() in ['1', 'true', 'yes']
+MAX_SIMILAR_CASES = 50
+
+SIMILAR_CASE_FIELDS = {
+    'prediction': 1, 'confidence': 1, 'region': 1, 'final_diagnosis': 1,
+    'reviewed_by_doctor': 1, 'model_version': 1, 'created_at': 1
+}
+
+def resolve_priority(user):
+    """
+    Doctors and admins may set the priority explicitly; for patients it is
+    derived from their linked (or most urgent active) appointment.
+    Returns (priority, linked appointment or None).
+    """
+    requested = request.form.get('priority')
+    if user and user.get('user_type') in ['doctor', 'admin'] and requested in PRIORITY_ORDER:
+        return requested, None
+    if user and user.get('user_type') == 'patient':
+        appointment = appointment_model.get_linked_appointment(
+            user['user_id'], request.form.get('appointment_id')
+        )
+        if appointment:
+            return appointment.get('priority', 'normal'), appointment
+    return 'normal', None
+
+def find_visible_prediction(prediction_id, projection):
+    """A prediction the caller may see (patients: own, doctors: assigned, admins: all), or None"""
+    if not ObjectId.is_valid(prediction_id):
+        return None
+    query = {'_id': ObjectId(prediction_id)}
+    if request.user.get('user_type') == 'doctor':
+        query['doctor_id'] = ObjectId(request.user['user_id'])
+    elif request.user.get('user_type') == 'patient':
+        query['patient_id'] = ObjectId(request.user['user_id'])
+    return prediction_model.collection.find_one(query, projection)
+
+def send_private_file(path, mimetype=None, max_age=3600):
+    """
+    send_file with ETag/Last-Modified revalidation and byte ranges; the open
+    file goes to the server's wsgi.file_wrapper (sendfile under gunicorn).
+    Scans are per-user, so shared caches must not store them.
+    """
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=max_age)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+def timed_predict(image_path):
+    """Run the primary model and record its inference time (compared against shadow models)"""
+    start = time.perf_counter()
+    result = predict_mri_with_embedding(image_path) if EMBEDDINGS_ENABLED else predict_mri(image_path)
+    result['inference_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+def store_embedding(prediction_id, version, embedding):
+    """Append a prediction's embedding to its model version's store; failures only cost search coverage"""
+    try:
+        row = embedding_stores.get(version).append([prediction_id], embedding)
+        prediction_model.set_embedding(prediction_id, version, row)
+    except Exception as e:
+        print(f"Error storing embedding for prediction {prediction_id}: {e}")
 
 @ml_bp.route('/predict', methods=['POST'])
+@idempotent
+@rate_limit('predict')
 def predict():
     if 'image' not in request.files:
         return jsonify({"success": False, "error": "No image uploaded"}), 400
@@ -17,21 +106,395 @@ def predict():
     if file.filename == '':
         return jsonify({"success": False, "error": "No file selected"}), 400
 
+    user = get_optional_user()
+    priority, appointment = resolve_priority(user)
+    slot, busy = acquire_inflight_slot(priority)
+    if busy:
+        return busy
+
     # Save uploaded image
     filename = f"{uuid.uuid4().hex}_{file.filename}"
     filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
 
     try:
-        result = predict_mri(filepath)
-        return jsonify({
+        file.save(filepath)
+        future = inference_scheduler.submit(timed_predict, filepath, priority=priority)
+        result = future.result(timeout=INFERENCE_TIMEOUT)
+        embedding = result.pop('embedding', None)
+        inference_ms = result.pop('inference_ms', None)
+
+        prediction_id = prediction_model.create_prediction({
+            'patient_id': user['user_id'] if user and user.get('user_type') == 'patient' else None,
+            'doctor_id': appointment['doctor_id'] if appointment else None,
+            'appointment_id': appointment['_id'] if appointment else None,
+            'image_path': filepath,
+            'priority': priority,
+            **result
+        })
+        if prediction_id and embedding is not None:
+            store_embedding(prediction_id, result['model_version'], embedding)
+
+        response = jsonify({
             "success": True,
             "data": {
+                "prediction_id": prediction_id,
                 "prediction": result["prediction"],
                 "confidence": result["confidence"],  # as number for frontend
                 "region": result["region"],
-                "image": filepath
+                "model_version": result["model_version"],
+                "priority": priority,
+                "image": filepath,
+                **prediction_image_urls(prediction_id, user)
             }
         })
+        # Sampled uploads are scored by the candidate model after the response is sent
+        shadow_evaluator.after_response(response, filepath, prediction_id, dict(result, inference_ms=inference_ms))
+        return response
+    except SchedulerOverloaded as e:
+        os.remove(filepath)
+        response = jsonify({"success": False, "error": str(e)})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
+    except FutureTimeoutError:
+        # A job that never started will not read the upload; a running one still needs it
+        if future.cancel():
+            os.remove(filepath)
+        return jsonify({"success": False, "error": "Prediction timed out"}), 503
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        release_inflight_slot(slot)
+
+def save_study(files, folder):
+    """Save the uploaded file(s) of a study; a zipped series is extracted"""
+    paths = []
+    for number, file in enumerate(files):
+        path = os.path.join(folder, f"{number:05d}_{secure_filename(file.filename)}")
+        file.save(path)
+        paths.append(path)
+    if len(paths) == 1 and paths[0].lower().endswith('.zip'):
+        archive = paths[0]
+        paths = extract_zip(archive, folder)
+        os.remove(archive)
+    return paths
+
+def discard_study(folder, slice_paths):
+    """Remove a failed study's uploaded files and any top slices already saved from it"""
+    shutil.rmtree(folder, ignore_errors=True)
+    for path in slice_paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+@ml_bp.route('/predict/volume', methods=['POST'])
+@idempotent
+@rate_limit('predict')
+def predict_volume():
+    """
+    Score a whole study uploaded as 'volume': the files of a DICOM series
+    (or one .zip of them), a multi-frame DICOM, a multi-page TIFF or a NIfTI
+    file. Slices are read and scored in batches and pooled into one
+    prediction; the top slices are saved as images, the best one becomes
+    the prediction's image.
+    """
+    files = [file for file in request.files.getlist('volume') if file.filename]
+    if not files:
+        return jsonify({"success": False, "error": "No volume uploaded"}), 400
+    if len(files) > VOLUME_MAX_SLICES:
+        return jsonify({"success": False, "error": f"A study may have at most {VOLUME_MAX_SLICES} slices"}), 413
+
+    user = get_optional_user()
+    priority, appointment = resolve_priority(user)
+    slot, busy = acquire_inflight_slot(priority)
+    if busy:
+        return busy
+
+    study_id = uuid.uuid4().hex
+    folder = os.path.join(STUDY_FOLDER, study_id)
+    volume = None
+    slice_paths = []
+    stored = False
+    try:
+        os.makedirs(folder)
+        volume = open_volume(save_study(files, folder))
+        if len(volume) > VOLUME_MAX_SLICES:
+            raise VolumeError(f"A study may have at most {VOLUME_MAX_SLICES} slices")
+
+        # One model version for every slice of the study
+        model = registry.active()
+        aggregate, window, skipped = score_volume(
+            volume, model,
+            lambda batch: inference_scheduler.submit(model.backend.predict_batch, batch, priority=priority),
+            timeout=INFERENCE_TIMEOUT
+        )
+        if not aggregate.scored:
+            raise VolumeError("The study has no slices with image content")
+
+        top_slices = []
+        for index, score, probabilities in aggregate.top_slices():
+            slice_result = model.format_prediction(probabilities)
+            slice_path = os.path.join(UPLOAD_FOLDER, f"{study_id}_slice{index:04d}.png")
+            slice_paths.append(slice_path)
+            top_slices.append({
+                'index': index,
+                'score': score * 100,
+                'prediction': slice_result['prediction'],
+                'confidence': slice_result['confidence'],
+                'image_path': save_slice(volume, index, window, slice_path)
+            })
+        result = model.format_prediction(aggregate.probabilities())
+        study = {
+            'format': volume.format,
+            'path': folder,
+            'slices': len(volume),
+            'scored_slices': aggregate.scored,
+            'skipped_slices': skipped,
+            'slice_counts': aggregate.slice_counts(),
+            'top_slices': top_slices
+        }
+        if getattr(volume, 'series_uid', None):
+            study['series_uid'] = str(volume.series_uid)
+
+        prediction_id = prediction_model.create_prediction({
+            'patient_id': user['user_id'] if user and user.get('user_type') == 'patient' else None,
+            'doctor_id': appointment['doctor_id'] if appointment else None,
+            'appointment_id': appointment['_id'] if appointment else None,
+            'image_path': top_slices[0]['image_path'],
+            'priority': priority,
+            'study': study,
+            **result
+        })
+        stored = True
+
+        return jsonify({
+            "success": True,
+            "data": {
+                "prediction_id": prediction_id,
+                "prediction": result["prediction"],
+                "confidence": result["confidence"],
+                "region": result["region"],
+                "model_version": result["model_version"],
+                "priority": priority,
+                "image": top_slices[0]['image_path'],
+                "study": study,
+                **prediction_image_urls(prediction_id, user)
+            }
+        })
+    except VolumeError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except SchedulerOverloaded as e:
+        response = jsonify({"success": False, "error": str(e)})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
+    except FutureTimeoutError:
+        return jsonify({"success": False, "error": "Prediction timed out"}), 503
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+    finally:
+        release_inflight_slot(slot)
+        if volume is not None:
+            volume.close()
+        # Every failure, whatever its response, leaves nothing of the study on disk
+        if not stored:
+            discard_study(folder, slice_paths)
+
+@ml_bp.route('/predictions/<prediction_id>/image', methods=['GET'])
+@media_login_required
+def prediction_image(prediction_id):
+    """The uploaded scan, with ETag/Last-Modified revalidation and byte ranges"""
+    try:
+        prediction = find_visible_prediction(prediction_id, {'image_path': 1})
+        if not prediction or not os.path.exists(prediction.get('image_path') or ''):
+            return jsonify({'error': 'Image not found'}), 404
+
+        return send_private_file(prediction['image_path'])
+
+    except Exception as e:
+        print(f"Prediction image error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@ml_bp.route('/predictions/<prediction_id>/thumbnail', methods=['GET'])
+@media_login_required
+def prediction_thumbnail(prediction_id):
+    """Downsized JPEG of the scan for list views; ?size=128|256|512"""
+    try:
+        try:
+            size = int(request.args.get('size', DEFAULT_THUMBNAIL_SIZE))
+        except ValueError:
+            size = None
+        if size not in THUMBNAIL_SIZES:
+            return jsonify({'error': f"size must be one of: {', '.join(map(str, THUMBNAIL_SIZES))}"}), 400
+
+        prediction = find_visible_prediction(prediction_id, {'image_path': 1})
+        if not prediction or not os.path.exists(prediction.get('image_path') or ''):
+            return jsonify({'error': 'Image not found'}), 404
+
+        path = thumbnail_cache.get(prediction['image_path'], size)
+        return send_private_file(path, mimetype='image/jpeg', max_age=86400)
+
+    except Exception as e:
+        print(f"Prediction thumbnail error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@ml_bp.route('/predictions/<prediction_id>/heatmap', methods=['GET'])
+@login_required
+def prediction_heatmap(prediction_id):
+    """Grad-CAM overlay showing where the model looked, computed on first request and cached"""
+    try:
+        prediction = find_visible_prediction(prediction_id, {'image_path': 1, 'model_version': 1})
+        if not prediction:
+            return jsonify({'error': 'Prediction not found'}), 404
+        if not os.path.exists(prediction.get('image_path') or ''):
+            return jsonify({'error': 'Image not found'}), 404
+
+        version = prediction.get('model_version') or registry.active().version
+        path = saliency_service.get(prediction['image_path'], version)
+
+        return send_private_file(path, mimetype='image/png')
+
+    except FutureTimeoutError:
+        return jsonify({'error': 'Heatmap computation timed out'}), 503
+    except Exception as e:
+        print(f"Prediction heatmap error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@ml_bp.route('/predictions/<prediction_id>/similar', methods=['GET'])
+@login_required
+@doctor_required
+def similar_cases(prediction_id):
+    """
+    Prior scans whose embeddings are closest to this prediction's image.
+    Query: k (default 10), mode=auto|exact|ivf
+    """
+    try:
+        try:
+            k = min(max(int(request.args.get('k', 10)), 1), MAX_SIMILAR_CASES)
+        except ValueError:
+            return jsonify({'error': 'k must be an integer'}), 400
+        mode = request.args.get('mode', 'auto')
+        if mode not in SEARCH_MODES:
+            return jsonify({'error': f"mode must be one of: {', '.join(SEARCH_MODES)}"}), 400
+        if not ObjectId.is_valid(prediction_id):
+            return jsonify({'error': 'Prediction not found'}), 404
+
+        query = {'_id': ObjectId(prediction_id)}
+        if request.user.get('user_type') == 'doctor':
+            query['doctor_id'] = ObjectId(request.user['user_id'])
+        prediction = prediction_model.collection.find_one(query, {'embedding_version': 1, 'embedding_row': 1})
+        if not prediction:
+            return jsonify({'error': 'Prediction not found'}), 404
+        if prediction.get('embedding_version') is None:
+            return jsonify({'error': 'No embedding stored for this prediction'}), 409
+
+        store = embedding_stores.get(prediction['embedding_version'])
+        vector = store.vector(prediction['embedding_row'])
+        if vector is None:
+            return jsonify({'error': 'No embedding stored for this prediction'}), 409
+
+        # Extra candidates: the prediction itself and rows re-embedded by a backfill
+        rows, scores = store.search(vector, 2 * k + 1, mode)
+        ids = store.prediction_ids(rows)
+        matches = {p['_id']: p for p in prediction_model.collection.find(
+            {'_id': {'$in': ids}}, SIMILAR_CASE_FIELDS
+        )}
+
+        similar, seen = [], {prediction['_id']}
+        for oid, score in zip(ids, scores):
+            match = matches.get(oid)
+            if oid in seen or not match:
+                continue
+            seen.add(oid)
+            similar.append({
+                'prediction_id': str(oid),
+                'similarity': round(float(score), 4),
+                'prediction': match.get('prediction'),
+                'confidence': match.get('confidence'),
+                'region': match.get('region'),
+                'final_diagnosis': match.get('final_diagnosis'),
+                'reviewed_by_doctor': match.get('reviewed_by_doctor', False),
+                'model_version': match.get('model_version'),
+                'created_at': match.get('created_at')
+            })
+
+        return jsonify({
+            'prediction_id': prediction_id,
+            'embedding_version': prediction['embedding_version'],
+            'similar': similar[:k]
+        }), 200
+
+    except Exception as e:
+        print(f"Similar cases error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@ml_bp.route('/models', methods=['GET'])
+@login_required
+@admin_required
+def list_models():
+    """List registered model versions and the one this worker is serving"""
+    try:
+        return jsonify({
+            'models': registry.list_versions(),
+            'status': registry.status()
+        }), 200
+
+    except Exception as e:
+        print(f"List models error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@ml_bp.route('/models/<version>/activate', methods=['PUT'])
+@login_required
+@admin_required
+def activate_model(version):
+    """Activate a model version; workers load it in the background and swap it in"""
+    try:
+        registry.set_active_version(version)
+        registry.activate_in_background(version)
+        return jsonify({
+            'message': f'Model version {version} is being activated',
+            'status': registry.status()
+        }), 202
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        print(f"Activate model error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@ml_bp.route('/shadow', methods=['GET'])
+@login_required
+@admin_required
+def shadow_report():
+    """
+    How a shadow (candidate) model compares with the primary on sampled live uploads.
+    Query: version (default SHADOW_MODEL_VERSION), days
+    """
+    try:
+        version = request.args.get('version') or shadow_evaluator.version
+        if not version:
+            return jsonify({'error': 'No shadow model configured; pass ?version='}), 400
+        try:
+            days = int(request.args['days']) if request.args.get('days') else None
+        except ValueError:
+            return jsonify({'error': 'days must be an integer'}), 400
+
+        return jsonify({
+            'report': shadow_evaluator.report(version, days),
+            'worker': shadow_evaluator.status()
+        }), 200
+
+    except Exception as e:
+        print(f"Shadow report error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@ml_bp.route('/scheduler', methods=['GET'])
+@login_required
+@admin_required
+def scheduler_metrics():
+    """Per-priority queue depth, shedding and latency against SLO for this worker"""
+    try:
+        return jsonify({'scheduler': inference_scheduler.metrics()}), 200
+
+    except Exception as e:
+        print(f"Scheduler metrics error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -1,9 +1,15 @@
-from flask import Blueprint, request, jsonify
+import calendar
+from datetime import datetime
+from flask import Blueprint, request, jsonify, make_response, current_app
 from models.user import User
 from models.appointment import Appointment
 from models.prediction import Prediction
 from utils.auth_utils import login_required, patient_required
-from datetime import datetime
+from utils.idempotency import idempotent
+from utils.doctor_directory import doctor_directory
+from utils.archival import include_history_requested
+from utils.dashboard_stats import patient_dashboard_stats
+from utils.thumbnails import prediction_image_urls
 
 patient_bp = Blueprint('patient', __name__)
 user_model = User()
@@ -16,22 +22,17 @@ prediction_model = Prediction()
 def get_available_doctors():
     """Get all approved doctors available for appointments"""
     try:
-        doctors = user_model.get_approved_doctors()
-        
-        # Format response
-        doctors_data = []
-        for doctor in doctors:
-            doctor_data = {
-                'id': str(doctor['_id']),
-                'first_name': doctor['first_name'],
-                'last_name': doctor['last_name'],
-                'specialization': doctor.get('specialization', ''),
-                'experience_years': doctor.get('experience_years', 0),
-                'available_time_slots': doctor.get('available_time_slots', [])
-            }
-            doctors_data.append(doctor_data)
-        
-        return jsonify({'doctors': doctors_data}), 200
+        entry = doctor_directory.get()
+        
+        # Unchanged since the client's copy: no body, no database scan
+        if entry.etag in request.if_none_match:
+            response = make_response('', 304)
+        else:
+            response = current_app.response_class(entry.body, mimetype='application/json')
+        
+        response.set_etag(entry.etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
         
     except Exception as e:
         print(f"Get available doctors error: {e}")
@@ -40,6 +41,7 @@ def get_available_doctors():
 @patient_bp.route('/appointments', methods=['POST'])
 @login_required
 @patient_required
+@idempotent
 def book_appointment():
     """Book a new appointment"""
     try:
@@ -52,6 +54,18 @@ def book_appointment():
             if not data.get(field):
                 return jsonify({'error': f'{field} is required'}), 400
         
+        try:
+            datetime.strptime(data['appointment_date'], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return jsonify({'error': 'appointment_date must be in YYYY-MM-DD format'}), 400
+        
+        # The doctor must work that slot on that date
+        schedule = user_model.get_doctor_schedule(data['doctor_id'])
+        if not schedule:
+            return jsonify({'error': 'Doctor not found'}), 404
+        if not schedule.is_working_slot(data['appointment_date'], data['time_slot']):
+            return jsonify({'error': 'Doctor is not available at this time'}), 400
+        
         # Check if time slot is available
         if not appointment_model.check_time_slot_availability(
             data['doctor_id'], data['appointment_date'], data['time_slot']
@@ -90,7 +104,9 @@ def get_patient_appointments():
     """Get all appointments for the logged-in patient"""
     try:
         patient_id = request.user['user_id']
-        appointments = appointment_model.get_patient_appointments(patient_id)
+        appointments = appointment_model.get_patient_appointments(
+            patient_id, include_history_requested(request.args)
+        )
         
         return jsonify({'appointments': appointments}), 200
         
@@ -104,7 +120,9 @@ def get_patient_appointments():
 def get_appointment_details(appointment_id):
     """Get detailed information about a specific appointment"""
     try:
-        appointment = appointment_model.get_appointment_by_id(appointment_id)
+        appointment = appointment_model.get_appointment_by_id(
+            appointment_id, include_history_requested(request.args)
+        )
         if not appointment:
             return jsonify({'error': 'Appointment not found'}), 404
         
@@ -157,6 +175,8 @@ def get_patient_predictions():
     try:
         patient_id = request.user['user_id']
         predictions = prediction_model.get_patient_predictions(patient_id)
+        for prediction in predictions:
+            prediction.update(prediction_image_urls(prediction['_id'], request.user))
         
         return jsonify({'predictions': predictions}), 200
         
@@ -192,37 +212,10 @@ def patient_dashboard():
     try:
         patient_id = request.user['user_id']
         
-        # Get appointment statistics
         appointments = appointment_model.get_patient_appointments(patient_id)
-        pending_appointments = [apt for apt in appointments if apt['status'] == 'pending']
-        approved_appointments = [apt for apt in appointments if apt['status'] == 'approved']
-        completed_appointments = [apt for apt in appointments if apt['status'] == 'completed']
-        
-        # Get prediction statistics
         predictions = prediction_model.get_patient_predictions(patient_id)
-        recent_predictions = sorted(predictions, key=lambda x: x['created_at'], reverse=True)[:5]
         
-        # Get next appointment
-        upcoming_appointments = [
-            apt for apt in appointments 
-            if apt['status'] in ['pending', 'approved'] and 
-            datetime.strptime(apt['appointment_date'], '%Y-%m-%d') >= datetime.now()
-        ]
-        next_appointment = upcoming_appointments[0] if upcoming_appointments else None
-        
-        return jsonify({
-            'appointments': {
-                'total': len(appointments),
-                'pending': len(pending_appointments),
-                'approved': len(approved_appointments),
-                'completed': len(completed_appointments),
-                'next_appointment': next_appointment
-            },
-            'predictions': {
-                'total': len(predictions),
-                'recent': recent_predictions
-            }
-        }), 200
+        return jsonify(patient_dashboard_stats(appointments, predictions)), 200
         
     except Exception as e:
         print(f"Patient dashboard error: {e}")
@@ -237,30 +230,51 @@ def get_doctor_available_slots(doctor_id):
         date = request.args.get('date')
         if not date:
             return jsonify({'error': 'Date parameter is required'}), 400
-        
-        # Get doctor's available time slots
-        doctor = user_model.find_user_by_id(doctor_id)
-        if not doctor or doctor['user_type'] != 'doctor':
+        try:
+            datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'date must be in YYYY-MM-DD format'}), 400
+        
+        # Doctor's working slots for that date (weekly template and exceptions)
+        schedule = user_model.get_doctor_schedule(doctor_id)
+        if not schedule:
             return jsonify({'error': 'Doctor not found'}), 404
         
-        all_slots = doctor.get('available_time_slots', [])
+        booked_slots = appointment_model.get_booked_slots(doctor_id, date, date).get(date, [])
+        available_slots = schedule.available_slots(date, booked_slots)
         
-        # Get booked slots for the date
-        from utils.db import db_instance
-        appointments_collection = db_instance.get_collection('appointments')
-        from bson import ObjectId
+        return jsonify({'available_slots': available_slots}), 200
+        
+    except Exception as e:
+        print(f"Get doctor available slots error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@patient_bp.route('/doctors/<doctor_id>/availability', methods=['GET'])
+@login_required
+@patient_required
+def get_doctor_month_availability(doctor_id):
+    """Free slots for every day of a month. Query param: month (YYYY-MM)"""
+    try:
+        try:
+            month_start = datetime.strptime(request.args.get('month', ''), '%Y-%m').date()
+        except ValueError:
+            return jsonify({'error': 'month must be in YYYY-MM format'}), 400
         
-        booked_slots = appointments_collection.find({
-            'doctor_id': ObjectId(doctor_id),
-            'appointment_date': date,
-            'status': {'$in': ['pending', 'approved']}
-        })
+        schedule = user_model.get_doctor_schedule(doctor_id)
+        if not schedule:
+            return jsonify({'error': 'Doctor not found'}), 404
         
-        booked_time_slots = [apt['time_slot'] for apt in booked_slots]
-        available_slots = [slot for slot in all_slots if slot not in booked_time_slots]
+        last_day = calendar.monthrange(month_start.year, month_start.month)[1]
+        booked = appointment_model.get_booked_slots(
+            doctor_id, month_start.isoformat(), month_start.replace(day=last_day).isoformat()
+        )
         
-        return jsonify({'available_slots': available_slots}), 200
+        return jsonify({
+            'month': month_start.strftime('%Y-%m'),
+            'slot_minutes': schedule.slot_minutes,
+            'availability': schedule.month_availability(month_start.year, month_start.month, booked)
+        }), 200
         
     except Exception as e:
-        print(f"Get doctor available slots error: {e}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        print(f"Get doctor availability error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import Blueprint, request, jsonify, send_file, Response
+from werkzeug.utils import secure_filename
+from models.user import User
+from models.prediction import Prediction
+from utils.auth_utils import login_required
+from utils.reports import report_context, report_renderer
+from utils.streaming import zip_chunks
+
+reports_bp = Blueprint('reports', __name__)
+user_model = User()
+prediction_model = Prediction()
+
+# Predictions (and their patients/doctors) fetched per round trip for bulk archives
+BULK_BATCH_SIZE = 100
+
+
+def _scope_query(user):
+    """Predictions visible to the caller: all for admins, assigned for doctors, own for patients"""
+    if user.get('user_type') == 'admin':
+        return {}
+    if user.get('user_type') == 'doctor':
+        return {'doctor_id': ObjectId(user['user_id'])}
+    return {'patient_id': ObjectId(user['user_id'])}
+
+
+def _users_by_id(user_ids):
+    ids = list({uid for uid in user_ids if uid})
+    if not ids:
+        return {}
+    users = user_model.collection.find(
+        {'_id': {'$in': ids}},
+        {'first_name': 1, 'last_name': 1, 'email': 1, 'date_of_birth': 1, 'updated_at': 1}
+    )
+    return {u['_id']: u for u in users}
+
+
+def _report_contexts(cursor):
+    """Report contexts for a prediction cursor, looking users up one batch at a time"""
+    batch = []
+    for prediction in cursor:
+        batch.append(prediction)
+        if len(batch) >= BULK_BATCH_SIZE:
+            yield from _batch_contexts(batch)
+            batch = []
+    if batch:
+        yield from _batch_contexts(batch)
+
+
+def _batch_contexts(predictions):
+    users = _users_by_id([p.get('patient_id') for p in predictions] + [p.get('doctor_id') for p in predictions])
+    for prediction in predictions:
+        context = report_context(prediction, users.get(prediction.get('patient_id')), users.get(prediction.get('doctor_id')))
+        context['patient_id'] = str(prediction.get('patient_id') or 'unassigned')
+        yield context
+
+
+def _archive_name(context):
+    folder = secure_filename(f"{context['patient_name']}_{context['patient_id']}") or context['patient_id']
+    return f"{folder}/{context['created_at'][:10]}_{context['prediction_id']}.pdf"
+
+
+@reports_bp.route('/predictions/<prediction_id>', methods=['GET'])
+@login_required
+def prediction_report(prediction_id):
+    """Download the PDF report for one prediction"""
+    try:
+        if not ObjectId.is_valid(prediction_id):
+            return jsonify({'error': 'Prediction not found'}), 404
+
+        query = _scope_query(request.user)
+        query['_id'] = ObjectId(prediction_id)
+        prediction = prediction_model.collection.find_one(query)
+        if not prediction:
+            return jsonify({'error': 'Prediction not found'}), 404
+
+        users = _users_by_id([prediction.get('patient_id'), prediction.get('doctor_id')])
+        context = report_context(prediction, users.get(prediction.get('patient_id')), users.get(prediction.get('doctor_id')))
+        path = report_renderer.get(context)
+
+        return send_file(
+            path,
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f"MRI_Tumor_Report_{prediction_id}.pdf",
+            conditional=True
+        )
+
+    except Exception as e:
+        print(f"Prediction report error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@reports_bp.route('/predictions/bulk', methods=['GET'])
+@login_required
+def bulk_prediction_reports():
+    """
+    Stream a zip of the reports for predictions created in a date range.
+    Query params: from, to (YYYY-MM-DD, inclusive), patient_id (optional)
+    """
+    try:
+        query = _scope_query(request.user)
+
+        created_at = {}
+        try:
+            if request.args.get('from'):
+                created_at['$gte'] = datetime.strptime(request.args['from'], '%Y-%m-%d')
+            if request.args.get('to'):
+                created_at['$lt'] = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1)
+        except ValueError:
+            return jsonify({'error': 'from and to must be dates in YYYY-MM-DD format'}), 400
+        if not created_at:
+            return jsonify({'error': 'A date range (from and/or to) is required'}), 400
+        query['created_at'] = created_at
+
+        patient_id = request.args.get('patient_id')
+        if patient_id:
+            if not ObjectId.is_valid(patient_id):
+                return jsonify({'error': 'Invalid patient_id'}), 400
+            if 'patient_id' in query and query['patient_id'] != ObjectId(patient_id):
+                return jsonify({'error': 'Access denied'}), 403
+            query['patient_id'] = ObjectId(patient_id)
+
+        cursor = prediction_model.collection.find(query, batch_size=BULK_BATCH_SIZE).sort(
+            [('patient_id', 1), ('created_at', 1)]
+        )
+
+        def generate():
+            try:
+                entries = (
+                    (_archive_name(context), path)
+                    for context, path in report_renderer.render_many(_report_contexts(cursor))
+                )
+                yield from zip_chunks(entries)
+            finally:
+                cursor.close()
+
+        filename = f"mri-reports-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.zip"
+        return Response(
+            generate(),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+
+    except Exception as e:
+        print(f"Bulk reports error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
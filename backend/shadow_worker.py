@@ -0,0 +1,56 @@
+"""
+Score sampled live uploads with the shadow (candidate) model.
+
+Web workers only queue sampled uploads in shadow_jobs; this process loads
+the candidate once, lowers its own priority and scores the queue, so the
+candidate never shares a web worker's interpreter, thread pools or memory.
+Run one per host that can read the upload folder.
+
+Usage:
+    python shadow_worker.py                 # SHADOW_MODEL_VERSION
+    python shadow_worker.py --version v3
+    python shadow_worker.py --once          # score what is queued, then exit
+"""
+import argparse
+import os
+import sys
+
+from utils.db import db_instance
+from utils.rescoring import model_registry
+from utils.shadow import ShadowEvaluator, ensure_indexes, SHADOW_MODEL_VERSION, SHADOW_NICENESS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score queued shadow model samples')
+    parser.add_argument('--version', default=SHADOW_MODEL_VERSION, help='Candidate model version')
+    parser.add_argument('--poll-seconds', type=float, default=1.0, help='Wait between checks of an empty queue')
+    parser.add_argument('--niceness', type=int, default=SHADOW_NICENESS)
+    parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+    args = parser.parse_args()
+
+    if not args.version:
+        print("No shadow model version: set SHADOW_MODEL_VERSION or pass --version")
+        sys.exit(1)
+    if not db_instance.connect():
+        sys.exit(1)
+    ensure_indexes()
+
+    try:
+        os.nice(args.niceness)
+    except (AttributeError, OSError) as e:
+        print(f"Could not lower shadow worker priority: {e}")
+
+    # Unlike models.ml_model, this registry does not load the active model
+    model = model_registry().load_version(args.version)
+    evaluator = ShadowEvaluator(version=args.version)
+    print(f"Scoring shadow samples with {args.version}")
+
+    try:
+        handled = evaluator.run(model, args.poll_seconds, until_empty=args.once)
+        print(f"Handled {handled} jobs: {evaluator.stats}")
+    except KeyboardInterrupt:
+        print(f"Stopped: {evaluator.stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import mongomock
+import numpy as np
+import pytest
+from flask import Flask
+
+# Caches and stores written by the code under test go to a scratch folder
+SCRATCH_DIR = tempfile.mkdtemp(prefix='backend-tests-')
+for variable, folder in [('EMBEDDING_DIR', 'embeddings'), ('SALIENCY_CACHE_DIR', 'saliency_cache'),
+                         ('THUMBNAIL_CACHE_DIR', 'thumbnail_cache'), ('MODEL_REGISTRY_DIR', 'registry'),
+                         ('REPORT_CACHE_DIR', 'reports_cache')]:
+    os.environ[variable] = os.path.join(SCRATCH_DIR, folder)
+
+from utils.db import db_instance
+from utils.json_utils import MongoJSONProvider
+
+# Models and stores bind their collections at import time, so the in-memory
+# database has to be in place before any test module imports them
+db_instance.client = mongomock.MongoClient()
+db_instance.db = db_instance.client['healthcare_system_test']
+
+LABELS = ['pituitary', 'glioma', 'notumor', 'meningioma']
+
+
+class FakeModelBackend:
+    """
+    Stands in for the Keras/TFLite runtimes: the predicted class is the
+    image's mean brightness bucket, and the embedding is its mean colour
+    """
+    name = 'fake'
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+    def predict_batch(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        classes = np.minimum((batch.mean(axis=(1, 2, 3)) * len(LABELS)).astype(int), len(LABELS) - 1)
+        probabilities = np.full((len(batch), len(LABELS)), 0.1, dtype=np.float32)
+        probabilities[np.arange(len(batch)), classes] = 0.7
+        return probabilities
+
+    def predict_batch_with_embeddings(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.predict_batch(batch), batch.mean(axis=(1, 2))
+
+    def saliency_batch(self, batch, class_indices=None):
+        batch = np.asarray(batch, dtype=np.float32)
+        heatmaps = batch.mean(axis=3)
+        return heatmaps / np.maximum(heatmaps.max(axis=(1, 2), keepdims=True), 1e-12)
+
+
+# models.ml_model loads the active model when imported; serve the fake instead of TensorFlow
+import models.model_registry
+models.model_registry.select_backend = lambda model_path, tflite_path=None, preferred='keras': FakeModelBackend(model_path)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    yield
+    for name in db_instance.db.list_collection_names():
+        db_instance.db[name].delete_many({})
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = MongoJSONProvider(app)
+    return app
+
+
+@pytest.fixture
+def ml_app(app, tmp_path, monkeypatch):
+    """The ML blueprint with uploads going to a temporary folder"""
+    import routes.ml
+    monkeypatch.setattr(routes.ml, 'UPLOAD_FOLDER', str(tmp_path / 'mri_images'))
+    monkeypatch.setattr(routes.ml, 'STUDY_FOLDER', str(tmp_path / 'studies'))
+    os.makedirs(routes.ml.UPLOAD_FOLDER)
+    app.register_blueprint(routes.ml.ml_bp, url_prefix='/api/ml')
+    return app
+
+
+@pytest.fixture
+def auth_headers():
+    """Authorization header for a user of the given type"""
+    from bson import ObjectId
+    from utils.auth_utils import generate_token
+
+    def headers(user_type, user_id=None):
+        user = {'_id': user_id or ObjectId(), 'email': f'{user_type}@example.com', 'user_type': user_type}
+        return {'Authorization': 'Bearer ' + generate_token(user)}
+    return headers
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from utils.archival import AppointmentArchiver, CHECKPOINT_ID
+
+
+@pytest.fixture
+def archiver():
+    return AppointmentArchiver(after_days=30, batch_size=2)
+
+
+def add_appointments(archiver, count, status='completed', age_days=60):
+    updated_at = datetime.utcnow() - timedelta(days=age_days)
+    docs = [{'_id': ObjectId(), 'status': status, 'updated_at': updated_at, 'patient_id': ObjectId()}
+            for _ in range(count)]
+    archiver.active.insert_many(docs)
+    return [doc['_id'] for doc in docs]
+
+
+def test_moves_only_old_terminal_appointments(archiver):
+    old = add_appointments(archiver, 3) + add_appointments(archiver, 1, status='cancelled')
+    recent = add_appointments(archiver, 1, age_days=1)
+    open_ones = add_appointments(archiver, 2, status='approved')
+
+    checkpoint = archiver.run()
+
+    assert checkpoint['moved'] == 4
+    assert checkpoint['finished_at'] is not None
+    assert sorted(doc['_id'] for doc in archiver.history.find()) == sorted(old)
+    assert all('archived_at' in doc for doc in archiver.history.find())
+    assert sorted(doc['_id'] for doc in archiver.active.find()) == sorted(recent + open_ones)
+
+
+def test_interrupted_run_resumes_from_its_checkpoint(archiver):
+    ids = add_appointments(archiver, 5)
+
+    checkpoint = archiver.run(max_batches=1)
+    assert checkpoint['moved'] == 2
+    assert checkpoint['finished_at'] is None
+    cutoff = checkpoint['cutoff']
+
+    # A later run keeps the original cutoff and continues after the last _id
+    resumed = AppointmentArchiver(after_days=0, batch_size=2)
+    resumed_checkpoint = resumed.run()
+
+    stored = archiver.status()
+    # (BSON dates keep milliseconds)
+    assert abs(stored['cutoff'] - cutoff) < timedelta(milliseconds=1)
+    assert (stored['moved'], stored['batches']) == (5, 3)
+    assert stored['last_id'] == ids[-1]
+    assert resumed_checkpoint['finished_at'] is not None
+    assert archiver.active.count_documents({}) == 0
+    assert archiver.history.count_documents({}) == 5
+
+
+def test_finished_run_starts_over_with_a_new_cutoff(archiver):
+    add_appointments(archiver, 1)
+    first = archiver.run()
+    add_appointments(archiver, 2)
+
+    second = archiver.run()
+
+    assert second['started_at'] >= first['started_at']
+    assert second['moved'] == 2
+    assert archiver.checkpoints.count_documents({'_id': CHECKPOINT_ID}) == 1
+
+
+def test_retried_batch_is_harmless(archiver):
+    ids = add_appointments(archiver, 2)
+    # A crash after copying but before deleting leaves copies in history
+    archiver.history.insert_one({'_id': ids[0], 'status': 'completed', 'stale': True})
+
+    archiver.run()
+
+    assert archiver.history.count_documents({}) == 2
+    assert 'stale' not in archiver.history.find_one({'_id': ids[0]})
+    assert archiver.active.count_documents({}) == 0
+
+
+def test_appointments_changed_mid_batch_stay_active(archiver, monkeypatch):
+    ids = add_appointments(archiver, 2)
+    delete_many = archiver.active.delete_many
+
+    def delete_after_a_status_change(query):
+        archiver.active.update_one({'_id': ids[1]}, {'$set': {'updated_at': datetime.utcnow()}})
+        return delete_many(query)
+
+    monkeypatch.setattr(archiver.active, 'delete_many', delete_after_a_status_change)
+
+    checkpoint = archiver.run(max_batches=1)
+
+    assert checkpoint['moved'] == 1
+    assert [doc['_id'] for doc in archiver.history.find()] == [ids[0]]
+    assert [doc['_id'] for doc in archiver.active.find()] == [ids[1]]
@@ -0,0 +1,96 @@
+import pytest
+from bson import ObjectId
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+import routes.async_api
+from utils.auth_utils import bearer_token, generate_scoped_token, verify_scoped_token
+from routes.async_api import MongoJSONResponse, requires, async_routes
+
+
+@requires('doctor')
+async def whoami(request):
+    return MongoJSONResponse({'user_id': request.state.user['user_id']})
+
+
+@requires('doctor')
+async def broken(request):
+    raise RuntimeError('database unavailable')
+
+
+@pytest.fixture
+def client():
+    return TestClient(Starlette(routes=[Route('/whoami', whoami), Route('/broken', broken)]))
+
+
+@pytest.mark.parametrize('header, token', [
+    ('Bearer abc', 'abc'), ('abc', 'abc'), ('Bearer ', None), ('', None), (None, None)
+])
+def test_bearer_token(header, token):
+    assert bearer_token(header) == token
+
+
+def test_requires_a_token(client):
+    response = client.get('/whoami')
+    assert response.status_code == 401
+    assert response.json() == {'error': 'No token provided'}
+
+
+def test_rejects_invalid_and_scoped_tokens(client):
+    scoped = generate_scoped_token({'user_id': 'u1', 'email': 'd@example.com', 'user_type': 'doctor'}, 'media', 60)
+    assert scoped
+    for token in ['not-a-jwt', scoped]:
+        response = client.get('/whoami', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 401
+        assert response.json() == {'error': 'Invalid or expired token'}
+
+
+def test_checks_the_role_and_lets_admins_through(client, auth_headers):
+    assert client.get('/whoami', headers=auth_headers('patient')).json() == {'error': 'Doctor privileges required'}
+    assert client.get('/whoami', headers=auth_headers('patient')).status_code == 403
+    assert client.get('/whoami', headers=auth_headers('admin')).status_code == 200
+
+
+def test_accepts_a_token_without_the_bearer_prefix(client, auth_headers):
+    token = auth_headers('doctor', 'd1')['Authorization'][len('Bearer '):]
+    response = client.get('/whoami', headers={'Authorization': token})
+    assert response.json() == {'user_id': 'd1'}
+
+
+def test_endpoint_errors_become_500(client, auth_headers):
+    response = client.get('/broken', headers=auth_headers('doctor'))
+    assert response.status_code == 500
+    assert response.json() == {'error': 'Internal server error'}
+
+
+class FakeAsyncPrediction:
+    def __init__(self, predictions):
+        self.predictions = predictions
+        self.calls = []
+
+    async def get_doctor_predictions(self, doctor_id):
+        self.calls.append(('doctor', doctor_id))
+        return [dict(p) for p in self.predictions]
+
+    async def get_patient_predictions(self, patient_id):
+        self.calls.append(('patient', patient_id))
+        return [dict(p) for p in self.predictions]
+
+
+@pytest.mark.parametrize('user_type', ['doctor', 'patient'])
+def test_prediction_lists_include_signed_image_urls(user_type, auth_headers, monkeypatch):
+    prediction_id = ObjectId()
+    predictions = FakeAsyncPrediction([{'_id': prediction_id, 'prediction': 'glioma'}])
+    monkeypatch.setattr(routes.async_api, 'prediction_model', predictions)
+    client = TestClient(Starlette(routes=async_routes))
+
+    response = client.get(f'/api/{user_type}/predictions', headers=auth_headers(user_type, 'u1'))
+    assert response.status_code == 200
+    assert predictions.calls == [(user_type, 'u1')]
+
+    [prediction] = response.json()['predictions']
+    assert prediction['_id'] == str(prediction_id)
+    for field, suffix in [('image_url', 'image'), ('thumbnail_url', 'thumbnail')]:
+        path, signature = prediction[field].split('?sig=')
+        assert path == f'/api/ml/predictions/{prediction_id}/{suffix}'
+        assert verify_scoped_token(signature, f'media:{path}')['user_id'] == 'u1'
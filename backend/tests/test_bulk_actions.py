@@ -0,0 +1,125 @@
+import pytest
+from bson import ObjectId
+from models.appointment import Appointment
+from utils.auth_utils import generate_token
+from utils.bulk_actions import parse_bulk_actions, BulkRequestError, BULK_ACTION_MAX_ITEMS
+
+DOCTOR_STATUSES = ['approved', 'rejected', 'completed']
+
+
+@pytest.fixture
+def appointments():
+    return Appointment()
+
+
+@pytest.fixture
+def doctor_id():
+    return ObjectId()
+
+
+def add_appointment(appointments, doctor_id, status='pending'):
+    appointment_id = appointments.create_appointment({
+        'patient_id': ObjectId(), 'doctor_id': doctor_id, 'appointment_date': '2026-11-02', 'time_slot': '09:00'
+    })
+    appointments.collection.update_one({'_id': ObjectId(appointment_id)}, {'$set': {'status': status}})
+    return appointment_id
+
+
+def status_of(appointments, appointment_id):
+    return appointments.collection.find_one({'_id': ObjectId(appointment_id)})['status']
+
+
+def test_parse_shorthand_and_invalid_items():
+    valid = str(ObjectId())
+    actions, invalid = parse_bulk_actions(
+        {'ids': [valid, 'nope', valid], 'status': 'approved', 'notes': 'ok'}, DOCTOR_STATUSES
+    )
+    assert actions == [{'index': 0, 'id': valid, 'status': 'approved', 'notes': 'ok'}]
+    assert [(item['index'], item['error']) for item in invalid] == [(1, 'Invalid id'), (2, 'Duplicate id')]
+
+
+def test_parse_rejects_statuses_outside_the_allowed_set():
+    _, invalid = parse_bulk_actions({'actions': [{'id': str(ObjectId()), 'status': 'cancelled'}]}, DOCTOR_STATUSES)
+    assert invalid[0]['error'].startswith('status must be one of')
+
+
+@pytest.mark.parametrize('body', [
+    None, [], {}, {'ids': []}, {'ids': 'x'}, {'ids': [str(ObjectId())] * (BULK_ACTION_MAX_ITEMS + 1)}
+])
+def test_parse_rejects_malformed_bodies(body):
+    with pytest.raises(BulkRequestError):
+        parse_bulk_actions(body)
+
+
+def test_allowed_transitions_are_applied(appointments, doctor_id):
+    pending = add_appointment(appointments, doctor_id)
+    approved = add_appointment(appointments, doctor_id, 'approved')
+    actions, _ = parse_bulk_actions({'actions': [
+        {'id': pending, 'status': 'approved', 'notes': 'see you'},
+        {'id': approved, 'status': 'completed'}
+    ]})
+
+    results = appointments.bulk_update_status(actions, str(doctor_id))
+
+    assert [result['updated'] for result in results] == [True, True]
+    assert status_of(appointments, pending) == 'approved'
+    assert status_of(appointments, approved) == 'completed'
+    assert appointments.collection.find_one({'_id': ObjectId(pending)})['doctor_notes'] == 'see you'
+
+
+def test_disallowed_transitions_and_other_doctors_are_refused(appointments, doctor_id):
+    completed = add_appointment(appointments, doctor_id, 'completed')
+    pending = add_appointment(appointments, doctor_id)
+    someone_elses = add_appointment(appointments, ObjectId())
+    actions, _ = parse_bulk_actions({'actions': [
+        {'id': completed, 'status': 'approved'},
+        {'id': pending, 'status': 'completed'},
+        {'id': someone_elses, 'status': 'approved'},
+        {'id': str(ObjectId()), 'status': 'approved'}
+    ]})
+
+    results = appointments.bulk_update_status(actions, str(doctor_id))
+
+    assert [result['updated'] for result in results] == [False] * 4
+    assert results[0]['error'] == 'Cannot change status from completed to approved'
+    assert results[1]['error'] == 'Cannot change status from pending to completed'
+    assert results[2]['error'] == results[3]['error'] == 'Appointment not found'
+    assert status_of(appointments, someone_elses) == 'pending'
+    # Admins (no doctor_id) may act on any appointment
+    assert appointments.bulk_update_status(actions[2:3])[0]['updated']
+
+
+def test_concurrent_change_is_reported(appointments, doctor_id, monkeypatch):
+    raced = add_appointment(appointments, doctor_id)
+    untouched = add_appointment(appointments, doctor_id)
+    bulk_write = appointments.collection.bulk_write
+
+    def bulk_write_after_another_request(operations, **kwargs):
+        appointments.collection.update_one({'_id': ObjectId(raced)}, {'$set': {'status': 'cancelled'}})
+        return bulk_write(operations, **kwargs)
+
+    monkeypatch.setattr(appointments.collection, 'bulk_write', bulk_write_after_another_request)
+    actions, _ = parse_bulk_actions({'ids': [raced, untouched], 'status': 'approved'})
+
+    results = appointments.bulk_update_status(actions, str(doctor_id))
+
+    assert results[0] == {'id': raced, 'status': 'approved', 'updated': False,
+                          'error': 'Appointment was modified by another request'}
+    assert results[1]['updated']
+    assert status_of(appointments, raced) == 'cancelled'
+
+
+def test_bulk_endpoint_reports_every_item_in_order(app, appointments, doctor_id):
+    from routes.doctor import doctor_bp
+    app.register_blueprint(doctor_bp, url_prefix='/api/doctor')
+    token = generate_token({'_id': doctor_id, 'email': 'doctor@example.com', 'user_type': 'doctor'})
+    pending = add_appointment(appointments, doctor_id)
+    completed = add_appointment(appointments, doctor_id, 'completed')
+
+    response = app.test_client().put('/api/doctor/appointments/bulk', headers={'Authorization': f'Bearer {token}'},
+                                     json={'ids': [completed, 'bad', pending], 'status': 'approved'})
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert [(item['index'], item['updated']) for item in body['results']] == [(0, False), (1, False), (2, True)]
+    assert (body['updated'], body['failed']) == (1, 2)
@@ -0,0 +1,97 @@
+from datetime import date
+import pytest
+from bson import ObjectId
+import routes.doctor
+from routes.doctor import calendar_range
+from models.appointment import doctor_calendar_pipeline
+from utils.db import db_instance
+
+
+@pytest.mark.parametrize('kwargs, expected', [
+    ({'date': '2024-03-06'}, (date(2024, 3, 4), date(2024, 3, 10))),
+    ({'date': '2024-03-10'}, (date(2024, 3, 4), date(2024, 3, 10))),
+    ({'date': '2024-02-15', 'view': 'month'}, (date(2024, 2, 1), date(2024, 2, 29))),
+    ({'start': '2024-03-01', 'end': '2024-03-01'}, (date(2024, 3, 1), date(2024, 3, 1))),
+])
+def test_calendar_range(kwargs, expected):
+    assert calendar_range(**kwargs) == expected
+
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({'start': '2024-03-01'}, 'end must be a date'),
+    ({'start': '2024-03-05', 'end': '2024-03-01'}, 'end must not be before start'),
+    ({'start': '2024-01-01', 'end': '2024-03-31'}, 'limited to 62 days'),
+    ({'date': '2024-03-06', 'view': 'year'}, 'view must be week or month'),
+])
+def test_calendar_range_rejects(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        calendar_range(**kwargs)
+
+
+def run_calendar(doctor_id, start, end, statuses):
+    # mongomock has no $lookup with let/pipeline; an equivalent localField
+    # lookup feeds the same grouping stages
+    pipeline = doctor_calendar_pipeline(doctor_id, start, end, statuses)
+    assert '$lookup' in pipeline[1]
+    lookup = {'$lookup': {'from': 'users', 'localField': 'patient_id', 'foreignField': '_id', 'as': 'patient_info'}}
+    return list(db_instance.get_collection('appointments').aggregate(pipeline[:1] + [lookup] + pipeline[2:]))
+
+
+def test_calendar_groups_by_day_and_slot():
+    doctor_id, other_doctor = ObjectId(), ObjectId()
+    patient_id = db_instance.get_collection('users').insert_one({'first_name': 'Pat', 'last_name': 'Lee'}).inserted_id
+    rows = [
+        ('2024-03-05', '10:00', 'approved', doctor_id),
+        ('2024-03-05', '09:00', 'pending', doctor_id),
+        ('2024-03-05', '09:00', 'approved', doctor_id),
+        ('2024-03-06', '11:00', 'approved', doctor_id),
+        ('2024-03-07', '09:00', 'cancelled', doctor_id),
+        ('2024-03-08', '09:00', 'approved', other_doctor),
+        ('2024-03-11', '09:00', 'approved', doctor_id),
+    ]
+    db_instance.get_collection('appointments').insert_many([
+        {'doctor_id': d, 'patient_id': patient_id, 'appointment_date': day, 'time_slot': slot, 'status': status,
+         'priority': 'normal', 'reason': 'Checkup'}
+        for day, slot, status, d in rows
+    ])
+
+    days = run_calendar(str(doctor_id), '2024-03-04', '2024-03-10', ['pending', 'approved'])
+
+    assert [(d['date'], d['total']) for d in days] == [('2024-03-05', 3), ('2024-03-06', 1)]
+    slots = days[0]['slots']
+    assert [(s['time_slot'], len(s['appointments'])) for s in slots] == [('09:00', 2), ('10:00', 1)]
+    assert slots[0]['appointments'][0]['patient']['first_name'] == 'Pat'
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(routes.doctor.appointment_model, 'get_doctor_calendar',
+                        lambda *args: calls.append(args) or [])
+    app.register_blueprint(routes.doctor.doctor_bp, url_prefix='/api/doctor')
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+
+def test_calendar_route_defaults_to_the_callers_week(client, auth_headers):
+    doctor_id = str(ObjectId())
+    response = client.get('/api/doctor/calendar?date=2024-03-06&status=approved',
+                          headers=auth_headers('doctor', doctor_id))
+    assert response.get_json() == {'start': '2024-03-04', 'end': '2024-03-10', 'days': []}
+    assert client.calls == [(doctor_id, '2024-03-04', '2024-03-10', ['approved'])]
+
+
+def test_only_admins_choose_the_doctor(client, auth_headers):
+    doctor_id, other_doctor = str(ObjectId()), str(ObjectId())
+    client.get(f'/api/doctor/calendar?date=2024-03-06&doctor_id={other_doctor}', headers=auth_headers('doctor', doctor_id))
+    client.get(f'/api/doctor/calendar?date=2024-03-06&doctor_id={other_doctor}', headers=auth_headers('admin'))
+    assert [call[0] for call in client.calls] == [doctor_id, other_doctor]
+
+
+@pytest.mark.parametrize('query', ['view=year', 'start=2024-01-01&end=2024-06-01', 'doctor_id=nope'])
+def test_calendar_route_rejects_bad_parameters(client, auth_headers, query):
+    response = client.get(f'/api/doctor/calendar?{query}', headers=auth_headers('admin'))
+    assert response.status_code == 400
+    assert client.calls == []
+
@@ -0,0 +1,100 @@
+import json
+import pytest
+import utils.doctor_directory as doctor_directory_module
+from utils.doctor_directory import DoctorDirectory
+from utils.db import db_instance
+
+
+def add_doctor(first_name, approved=True, **fields):
+    doctor = {
+        'email': f'{first_name.lower()}@example.com', 'user_type': 'doctor',
+        'first_name': first_name, 'last_name': 'Doe', 'is_active': True,
+        'approved_by_admin': approved, 'available_time_slots': ['09:00', '09:30'], **fields
+    }
+    return db_instance.get_collection('users').insert_one(doctor).inserted_id
+
+
+def names(entry):
+    return sorted(d['first_name'] for d in json.loads(entry.body)['doctors'])
+
+
+@pytest.fixture
+def directory(monkeypatch):
+    # Re-read the version counter on every call unless a test says otherwise
+    monkeypatch.setattr(doctor_directory_module, 'VERSION_CHECK_SECONDS', 0)
+    return DoctorDirectory()
+
+
+def test_lists_only_approved_active_doctors(directory):
+    add_doctor('Ann')
+    add_doctor('Bob', approved=False)
+    add_doctor('Cid', is_active=False)
+
+    entry = directory.get()
+
+    assert names(entry) == ['Ann']
+    doctor = json.loads(entry.body)['doctors'][0]
+    assert doctor['available_time_slots'] == ['09:00', '09:30']
+    assert entry.etag == 'doctors-v0'
+
+
+def test_entry_is_reused_until_the_version_moves(directory, monkeypatch):
+    add_doctor('Ann')
+    first = directory.get()
+
+    builds = []
+    build = directory._build
+    monkeypatch.setattr(directory, '_build', lambda version: builds.append(version) or build(version))
+    add_doctor('Bob')
+    assert directory.get() is first
+    assert builds == []
+
+    version = directory.invalidate()
+    second = directory.get()
+    assert builds == [version]
+    assert second.etag == f'doctors-v{version}'
+    assert names(second) == ['Ann', 'Bob']
+
+
+def test_invalidation_reaches_other_workers(directory):
+    other_worker = DoctorDirectory()
+    add_doctor('Ann')
+    assert names(other_worker.get()) == ['Ann']
+
+    add_doctor('Bob')
+    directory.invalidate()
+    assert names(other_worker.get()) == ['Ann', 'Bob']
+
+
+def test_version_is_trusted_for_the_check_interval(monkeypatch):
+    monkeypatch.setattr(doctor_directory_module, 'VERSION_CHECK_SECONDS', 3600)
+    directory, other_worker = DoctorDirectory(), DoctorDirectory()
+    add_doctor('Ann')
+    first = other_worker.get()
+
+    add_doctor('Bob')
+    directory.invalidate()
+    assert other_worker.get() is first
+
+
+def test_doctors_route_answers_304_for_a_current_etag(app, auth_headers, directory, monkeypatch):
+    import routes.patient
+    monkeypatch.setattr(routes.patient, 'doctor_directory', directory)
+    app.register_blueprint(routes.patient.patient_bp, url_prefix='/api/patient')
+    client = app.test_client()
+    headers = auth_headers('patient')
+    add_doctor('Ann')
+
+    response = client.get('/api/patient/doctors', headers=headers)
+    assert response.status_code == 200
+    assert [d['first_name'] for d in response.get_json()['doctors']] == ['Ann']
+    etag = response.headers['ETag']
+
+    cached = client.get('/api/patient/doctors', headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    directory.invalidate()
+    changed = client.get('/api/patient/doctors', headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
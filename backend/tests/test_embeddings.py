@@ -0,0 +1,123 @@
+import os
+import numpy as np
+import pytest
+from bson import ObjectId
+import routes.ml
+from utils.db import db_instance
+from utils.embeddings import EmbeddingStore, EmbeddingStores, normalize, ID_BYTES
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EmbeddingStore('v1', root=str(tmp_path))
+
+
+def random_vectors(count, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def test_append_stores_normalized_float16_rows(store):
+    ids = [ObjectId() for _ in range(3)]
+    assert store.append(ids[:2], random_vectors(2)) == 0
+    assert store.append(ids[2:], random_vectors(1, seed=1)) == 2
+
+    assert store.count() == 3
+    assert store.vectors().dtype == np.float16
+    assert np.linalg.norm(store.vector(2)) == pytest.approx(1, abs=1e-3)
+    assert store.prediction_ids([2, 0]) == [ids[2], ids[0]]
+    assert store.vector(3) is None
+    # A new instance (another worker) reads the same rows
+    assert EmbeddingStore('v1', root=os.path.dirname(store.path)).count() == 3
+
+
+def test_append_rejects_mismatched_input(store):
+    store.append([ObjectId()], random_vectors(1))
+    with pytest.raises(ValueError, match='dimension 8'):
+        store.append([ObjectId()], random_vectors(1, dim=8))
+    with pytest.raises(ValueError, match='One vector per prediction id'):
+        store.append([ObjectId(), ObjectId()], random_vectors(1))
+
+
+def test_partial_row_from_an_interrupted_append_is_dropped(store):
+    store.append([ObjectId()], random_vectors(1))
+    with open(store.vectors_path, 'ab') as f:
+        f.write(b'\x00' * 5)
+    assert store.count() == 1
+
+    store.append([ObjectId()], random_vectors(1, seed=1))
+    assert store.count() == 2
+    assert os.path.getsize(store.ids_path) == 2 * ID_BYTES
+
+
+def test_exact_search_ranks_by_cosine_similarity(store, monkeypatch):
+    import utils.embeddings
+    # Several chunks per scan
+    monkeypatch.setattr(utils.embeddings, 'EXACT_CHUNK_ROWS', 7)
+    vectors = random_vectors(50)
+    store.append([ObjectId() for _ in vectors], vectors)
+
+    rows, scores = store.search(vectors[17], k=5, mode='exact')
+
+    expected = np.argsort(-(normalize(vectors) @ normalize(vectors[17])))[:5]
+    assert list(rows) == list(expected)
+    assert rows[0] == 17 and scores[0] == pytest.approx(1, abs=1e-3)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_ivf_search_finds_neighbours_and_rows_added_after_the_build(store):
+    vectors = random_vectors(400)
+    store.append([ObjectId() for _ in vectors], vectors)
+    assert store.build_ivf(nlist=8) == {'rows': 400, 'nlist': 8}
+
+    rows, _ = store.search(vectors[123], k=3, mode='ivf', nprobe=8)
+    assert rows[0] == 123
+
+    late = random_vectors(1, seed=9)
+    store.append([ObjectId()], late)
+    rows, _ = store.search(late[0], k=1, mode='ivf', nprobe=1)
+    assert list(rows) == [400]
+    assert store.status() == {'version': 'v1', 'rows': 401, 'dim': 16, 'ivf_rows': 400, 'ivf_lists': 8}
+
+
+def test_empty_store(store):
+    rows, scores = store.search(random_vectors(1)[0], k=3)
+    assert len(rows) == len(scores) == 0
+    with pytest.raises(ValueError, match='No embeddings stored'):
+        store.build_ivf()
+
+
+@pytest.fixture
+def similar_client(ml_app, tmp_path, monkeypatch):
+    stores = EmbeddingStores(root=str(tmp_path / 'embeddings'))
+    monkeypatch.setattr(routes.ml, 'embedding_stores', stores)
+    predictions = db_instance.get_collection('predictions')
+    doctor_id = ObjectId()
+    vectors = random_vectors(6)
+    ids = predictions.insert_many([
+        {'doctor_id': doctor_id, 'prediction': 'glioma', 'confidence': 80.0} for _ in vectors
+    ]).inserted_ids
+    rows = stores.get('v1').append(ids, vectors)
+    for offset, prediction_id in enumerate(ids):
+        predictions.update_one({'_id': prediction_id}, {'$set': {'embedding_version': 'v1', 'embedding_row': rows + offset}})
+    return ml_app.test_client(), doctor_id, ids, vectors
+
+
+def test_similar_route_excludes_the_prediction_itself(similar_client, auth_headers):
+    client, doctor_id, ids, vectors = similar_client
+    response = client.get(f'/api/ml/predictions/{ids[0]}/similar?k=3', headers=auth_headers('doctor', doctor_id))
+
+    body = response.get_json()
+    assert response.status_code == 200
+    expected = [str(ids[i]) for i in np.argsort(-(normalize(vectors) @ normalize(vectors[0])))[1:4]]
+    assert [s['prediction_id'] for s in body['similar']] == expected
+    assert body['embedding_version'] == 'v1'
+
+
+def test_similar_route_errors(similar_client, auth_headers):
+    client, doctor_id, ids, _ = similar_client
+    headers = auth_headers('doctor', doctor_id)
+    unembedded = db_instance.get_collection('predictions').insert_one({'doctor_id': doctor_id}).inserted_id
+
+    assert client.get(f'/api/ml/predictions/{unembedded}/similar', headers=headers).status_code == 409
+    assert client.get(f'/api/ml/predictions/{ids[0]}/similar?mode=fast', headers=headers).status_code == 400
+    assert client.get(f'/api/ml/predictions/{ids[0]}/similar', headers=auth_headers('doctor')).status_code == 404
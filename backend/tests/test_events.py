@@ -0,0 +1,156 @@
+import asyncio
+import json
+import threading
+import time
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+import routes.async_api
+import routes.events
+from routes.events import TICKET_SCOPE
+from utils.auth_utils import generate_scoped_token
+from utils.change_feed import ChangeFeed, _event
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    """A change feed without the database reader; tests publish events themselves"""
+    feed = ChangeFeed(mode='poll')
+    monkeypatch.setattr(feed, '_ensure_reader', lambda: None)
+    monkeypatch.setattr(routes.events, 'change_feed', feed)
+    monkeypatch.setattr(routes.async_api, 'change_feed', feed)
+    return feed
+
+
+def event(doctor_id='d1', patient_id='p1'):
+    return _event('appointments', 'update', {'_id': 'a1', 'doctor_id': doctor_id, 'patient_id': patient_id,
+                                             'status': 'approved'})
+
+
+def frames(body):
+    """(event name, data) for every event frame of an SSE body"""
+    result = []
+    for block in body.decode('utf-8').split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            result.append((fields['event'], json.loads(fields['data'])))
+    return result
+
+
+def test_events_are_routed_by_role_and_ownership(feed):
+    admin = feed.subscribe({'user_type': 'admin', 'user_id': 'a'})
+    doctor = feed.subscribe({'user_type': 'doctor', 'user_id': 'd1'})
+    other_doctor = feed.subscribe({'user_type': 'doctor', 'user_id': 'd2'})
+    patient = feed.subscribe({'user_type': 'patient', 'user_id': 'p1'})
+
+    feed.publish(event())
+
+    assert [s.events.qsize() for s in [admin, doctor, other_doctor, patient]] == [1, 1, 0, 1]
+    assert doctor.events.get_nowait()['status'] == 'approved'
+
+
+def test_slow_subscriber_overflows_instead_of_blocking(feed, monkeypatch):
+    import utils.change_feed
+    monkeypatch.setattr(utils.change_feed, 'SUBSCRIBER_QUEUE_SIZE', 2)
+    slow = feed.subscribe({'user_type': 'admin', 'user_id': 'a'})
+    for _ in range(3):
+        feed.publish(event())
+    assert slow.overflowed
+    assert slow.events.qsize() == 2
+
+
+def test_async_subscriber_receives_events_on_its_loop(feed):
+    async def receive():
+        subscriber = feed.subscribe({'user_type': 'admin', 'user_id': 'a'}, loop=asyncio.get_running_loop())
+        threading.Thread(target=feed.publish, args=(event(),)).start()
+        return await asyncio.wait_for(subscriber.events.get(), 5)
+
+    assert asyncio.run(receive())['id'] == 'a1'
+
+
+@pytest.fixture
+def asgi_client(feed, monkeypatch):
+    monkeypatch.setattr(routes.async_api, 'MAX_STREAM_SECONDS', 0.5)
+    monkeypatch.setattr(routes.async_api, 'HEARTBEAT_SECONDS', 0.1)
+    return TestClient(Starlette(routes=routes.async_api.async_routes))
+
+
+def publish_once_subscribed(feed, count=1):
+    def publish():
+        deadline = time.monotonic() + 5
+        while feed.subscriber_count() < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        feed.publish(event())
+    threading.Thread(target=publish).start()
+
+
+def test_async_stream_delivers_events_and_unsubscribes(asgi_client, feed, auth_headers):
+    publish_once_subscribed(feed)
+    response = asgi_client.get('/api/events/stream', headers=auth_headers('doctor', 'd1'))
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    assert response.text.startswith('retry: 3000')
+    assert [name for name, _ in frames(response.content)] == ['ready', 'appointment']
+    assert ': keep-alive' in response.text
+    assert feed.subscriber_count() == 0
+
+
+def test_one_event_loop_serves_many_streams(asgi_client, feed, monkeypatch):
+    # The sync route's per-worker cap is exhausted, and does not apply here
+    monkeypatch.setattr(routes.events, 'stream_slots', threading.BoundedSemaphore(1))
+    routes.events.stream_slots.acquire()
+    app = asgi_client.app
+    tickets = [generate_scoped_token({'user_id': f'p{i}', 'email': f'p{i}@example.com', 'user_type': 'patient'}, TICKET_SCOPE, 30) for i in range(3)]
+
+    async def open_streams():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+            return await asyncio.gather(*[client.get(f'/api/events/stream?ticket={t}') for t in tickets])
+
+    publish_once_subscribed(feed, count=3)
+    responses = asyncio.run(open_streams())
+
+    assert [r.status_code for r in responses] == [200] * 3
+    # Routed by ownership: only p1 sees the appointment
+    assert [[name for name, _ in frames(r.content)] for r in responses] == [
+        ['ready'], ['ready', 'appointment'], ['ready']
+    ]
+
+
+def test_async_stream_rejects_session_tokens_in_the_url(asgi_client, auth_headers):
+    token = auth_headers('admin')['Authorization'][len('Bearer '):]
+    assert asgi_client.get(f'/api/events/stream?ticket={token}').status_code == 401
+    assert asgi_client.get('/api/events/stream').status_code == 401
+
+
+@pytest.fixture
+def flask_client(app, feed, monkeypatch):
+    monkeypatch.setattr(routes.events, 'MAX_STREAM_SECONDS', 0.2)
+    monkeypatch.setattr(routes.events, 'HEARTBEAT_SECONDS', 0.05)
+    monkeypatch.setattr(routes.events, 'stream_slots', threading.BoundedSemaphore(1))
+    app.register_blueprint(routes.events.events_bp, url_prefix='/api/events')
+    return app.test_client()
+
+
+def test_ticket_opens_the_flask_stream(flask_client, feed, auth_headers):
+    ticket = flask_client.post('/api/events/ticket', headers=auth_headers('patient', 'p1')).get_json()['ticket']
+    publish_once_subscribed(feed)
+
+    response = flask_client.get(f'/api/events/stream?ticket={ticket}')
+    body = response.data
+    response.close()
+
+    assert [name for name, _ in frames(body)] == ['ready', 'appointment']
+    assert feed.subscriber_count() == 0
+
+
+def test_flask_stream_answers_503_when_its_slots_are_taken(flask_client, auth_headers):
+    held = flask_client.get('/api/events/stream', headers=auth_headers('admin'), buffered=False)
+    try:
+        busy = flask_client.get('/api/events/stream', headers=auth_headers('admin'))
+        assert busy.status_code == 503
+        assert busy.headers['Retry-After'] == '3'
+    finally:
+        held.close()
+    assert flask_client.get('/api/events/stream', headers=auth_headers('admin')).status_code == 200
@@ -0,0 +1,128 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from utils.db import db_instance
+from utils.export import ExportError, build_query, open_cursor, export_chunks
+from utils.streaming import ChunkSink, gzip_chunks
+
+CREATED = datetime(2024, 3, 5, 10, 30)
+
+
+@pytest.fixture
+def predictions():
+    ids = [ObjectId() for _ in range(5)]
+    db_instance.get_collection('predictions').insert_many([{
+        '_id': prediction_id, 'patient_id': ObjectId(), 'prediction': 'glioma', 'confidence': 0.5 + i / 10,
+        'reviewed_by_doctor': i % 2 == 0, 'created_at': CREATED, 'image_path': '/secret/path.png'
+    } for i, prediction_id in enumerate(ids)])
+    return ids
+
+
+def export(dataset, fmt, batch_size=2, compress=False, **filters):
+    cursor = open_cursor(dataset, build_query(dataset, **filters), batch_size)
+    chunks = list(export_chunks(dataset, fmt, cursor, batch_size, compress))
+    assert all(chunks)
+    return chunks
+
+
+def test_build_query_ranges_and_statuses():
+    assert build_query('predictions', '2024-03-01', '2024-03-05', 'reviewed') == {
+        'reviewed_by_doctor': True,
+        'created_at': {'$gte': datetime(2024, 3, 1), '$lt': datetime(2024, 3, 6)}
+    }
+    # appointment_date is stored as a string, so the bounds stay strings
+    assert build_query('appointments', '2024-03-01', '2024-03-05') == {
+        'appointment_date': {'$gte': '2024-03-01', '$lte': '2024-03-05'}
+    }
+    assert build_query('patients', status='inactive') == {'user_type': 'patient', 'is_active': False}
+
+
+@pytest.mark.parametrize('filters, message', [
+    ({'date_from': '03/01/2024'}, 'from must be a date'),
+    ({'date_to': 'tomorrow'}, 'to must be a date'),
+    ({'status': 'archived'}, 'status must be one of'),
+])
+def test_build_query_rejects_bad_parameters(filters, message):
+    with pytest.raises(ExportError, match=message):
+        build_query('predictions', **filters)
+
+
+def test_csv_exports_only_listed_fields_one_chunk_per_batch(predictions):
+    chunks = export('predictions', 'csv')
+    assert len(chunks) == 3
+
+    rows = list(csv.DictReader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+    assert [row['id'] for row in rows] == [str(i) for i in predictions]
+    assert 'image_path' not in rows[0]
+    assert rows[0]['created_at'] == CREATED.isoformat()
+    assert rows[0]['reviewed_by_doctor'] == 'True'
+
+
+def test_csv_without_rows_is_just_the_header():
+    (chunk,) = export('predictions', 'csv')
+    assert chunk.decode('utf-8').startswith('id,patient_id,')
+    assert chunk.count(b'\n') == 1
+
+
+def test_ndjson_filters_by_status(predictions):
+    lines = b''.join(export('predictions', 'ndjson', status='pending')).decode('utf-8').splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [r['id'] for r in records] == [str(predictions[1]), str(predictions[3])]
+    assert records[0]['confidence'] == pytest.approx(0.6)
+    assert records[0]['doctor_id'] is None
+
+
+def test_parquet_writes_a_row_group_per_batch(predictions):
+    pq = pytest.importorskip('pyarrow.parquet')
+    table = pq.ParquetFile(io.BytesIO(b''.join(export('predictions', 'parquet'))))
+    assert table.metadata.num_row_groups == 3
+    data = table.read()
+    assert data.column('id').to_pylist() == [str(i) for i in predictions]
+    assert data.column('created_at').to_pylist()[0] == CREATED
+
+
+def test_gzip_stream_round_trips(predictions):
+    plain = b''.join(export('predictions', 'csv'))
+    assert gzip.decompress(b''.join(export('predictions', 'csv', compress=True))) == plain
+    assert gzip.decompress(b''.join(gzip_chunks([b'a' * 10, b'', b'b']))) == b'a' * 10 + b'b'
+
+
+def test_chunk_sink_drains_what_was_written():
+    sink = ChunkSink()
+    sink.write(b'ab')
+    sink.write(b'c')
+    assert (sink.tell(), sink.drain(), sink.drain()) == (3, b'abc', b'')
+
+
+@pytest.fixture
+def client(app):
+    import routes.admin
+    app.register_blueprint(routes.admin.admin_bp, url_prefix='/api/admin')
+    return app.test_client()
+
+
+def test_export_route(client, auth_headers, predictions):
+    response = client.get('/api/admin/export/predictions?format=ndjson&gzip=true&batch_size=1',
+                          headers=auth_headers('admin'))
+    assert response.status_code == 200
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.ndjson.gz"')
+    assert len(gzip.decompress(response.data).splitlines()) == len(predictions)
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/api/admin/export/invoices', 404),
+    ('/api/admin/export/predictions?format=xml', 400),
+    ('/api/admin/export/predictions?batch_size=many', 400),
+    ('/api/admin/export/predictions?from=yesterday', 400),
+])
+def test_export_route_rejects_bad_requests(client, auth_headers, path, status):
+    assert client.get(path, headers=auth_headers('admin')).status_code == status
+
+
+def test_export_route_is_admin_only(client, auth_headers):
+    assert client.get('/api/admin/export/predictions', headers=auth_headers('doctor')).status_code == 403
@@ -0,0 +1,47 @@
+import os
+import runpy
+import subprocess
+import sys
+import pytest
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py')
+
+
+def load_config(monkeypatch, **env):
+    for variable in ['ML_BACKEND', 'GUNICORN_PRELOAD']:
+        monkeypatch.delenv(variable, raising=False)
+    for variable, value in env.items():
+        monkeypatch.setenv(variable, value)
+    return runpy.run_path(CONFIG)
+
+
+@pytest.mark.parametrize('env, preload', [
+    ({}, False),
+    ({'ML_BACKEND': 'keras'}, False),
+    ({'ML_BACKEND': 'tflite'}, True),
+    ({'ML_BACKEND': 'TFLite'}, True),
+    ({'ML_BACKEND': 'tflite', 'GUNICORN_PRELOAD': 'false'}, False),
+    ({'ML_BACKEND': 'keras', 'GUNICORN_PRELOAD': 'true'}, True),
+])
+def test_preload_defaults_on_only_for_tflite(monkeypatch, env, preload):
+    assert load_config(monkeypatch, **env)['preload_app'] is preload
+
+
+def test_worker_settings_come_from_the_environment(monkeypatch):
+    config = load_config(monkeypatch, GUNICORN_WORKERS='3', GUNICORN_THREADS='8', GUNICORN_MAX_REQUESTS='0')
+    assert (config['workers'], config['threads'], config['max_requests']) == (3, 8, 0)
+    assert config['worker_class'] == 'gthread'
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/smaps_rollup'), reason='needs Linux smaps_rollup')
+def test_measure_worker_rss_reads_children():
+    from benchmarks.measure_worker_rss import child_pids, read_rollup
+
+    child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    try:
+        assert child.pid in child_pids(os.getpid())
+        values = read_rollup(child.pid)
+        assert values['Rss'] > 0 and values['Pss'] > 0
+    finally:
+        child.kill()
+        child.wait()
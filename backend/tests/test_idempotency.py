@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import request, jsonify
+from utils.idempotency import idempotency_store, idempotent
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def client(app, calls):
+    @app.route('/orders', methods=['POST'])
+    @idempotent
+    def create_order():
+        calls.append(request.get_json())
+        if request.get_json().get('fail'):
+            return jsonify({'error': 'unavailable'}), 503
+        return jsonify({'order': len(calls)}), 201
+
+    return app.test_client()
+
+
+def post(client, key, body):
+    return client.post('/orders', json=body, headers={'Idempotency-Key': key})
+
+
+def test_retry_replays_the_stored_response(client, calls):
+    first = post(client, 'k1', {'item': 'a'})
+    retry = post(client, 'k1', {'item': 'a'})
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json() == {'order': 1}
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert len(calls) == 1
+
+
+def test_key_reused_for_another_request_conflicts(client, calls):
+    post(client, 'k1', {'item': 'a'})
+    response = post(client, 'k1', {'item': 'b'})
+
+    assert response.status_code == 422
+    assert len(calls) == 1
+
+
+def test_keys_are_scoped_per_client(client, calls):
+    post(client, 'k1', {'item': 'a'})
+    response = client.post('/orders', json={'item': 'a'}, headers={'Idempotency-Key': 'k1'},
+                           environ_base={'REMOTE_ADDR': '10.0.0.2'})
+
+    assert response.status_code == 201
+    assert len(calls) == 2
+
+
+def test_requests_without_a_key_always_run(client, calls):
+    client.post('/orders', json={'item': 'a'})
+    client.post('/orders', json={'item': 'a'})
+    assert len(calls) == 2
+
+
+def test_server_errors_are_not_recorded(client, calls):
+    assert post(client, 'k1', {'fail': True}).status_code == 503
+    assert post(client, 'k1', {'fail': True}).status_code == 503
+    assert len(calls) == 2
+    assert idempotency_store.collection.count_documents({}) == 0
+
+
+def test_in_progress_key_conflicts_after_waiting(client, calls, monkeypatch):
+    import utils.idempotency as idempotency_module
+    monkeypatch.setattr(idempotency_module, 'IDEMPOTENCY_WAIT_SECONDS', 0.2)
+    post(client, 'k1', {'item': 'a'})
+    # Another worker holds the key and has not finished
+    idempotency_store.collection.update_one({}, {'$set': {
+        'status': 'in_progress', 'locked_until': datetime.utcnow() + timedelta(minutes=1)
+    }})
+
+    response = post(client, 'k1', {'item': 'a'})
+    assert response.status_code == 409
+    assert len(calls) == 1
+
+
+def test_abandoned_key_is_taken_over_by_the_same_request(client, calls):
+    post(client, 'k1', {'item': 'a'})
+    idempotency_store.collection.update_one({}, {'$set': {
+        'status': 'in_progress', 'locked_until': datetime.utcnow() - timedelta(seconds=1)
+    }})
+
+    response = post(client, 'k1', {'item': 'a'})
+    assert response.status_code == 201
+    assert len(calls) == 2
+    assert post(client, 'k1', {'item': 'a'}).headers['Idempotent-Replayed'] == 'true'
@@ -0,0 +1,111 @@
+import threading
+import time
+import pytest
+from utils.inference_scheduler import InferenceScheduler, SchedulerOverloaded
+
+NO_SHEDDING = {'emergency': 0, 'urgent': 0, 'normal': 0}
+NO_AGING = {'emergency': 0, 'urgent': 0, 'normal': 0}
+SLO_MS = {'emergency': 2000, 'urgent': 5000, 'normal': 30000}
+
+
+def make_scheduler(shed_depth=NO_SHEDDING, aging_seconds=NO_AGING):
+    return InferenceScheduler(workers=1, slo_ms=SLO_MS, shed_depth=shed_depth, aging_seconds=aging_seconds)
+
+
+def wait_for(condition, timeout=5):
+    # Futures resolve before the worker records its stats
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def block_worker(scheduler):
+    """Occupy the single worker until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def blocker():
+        started.set()
+        release.wait(5)
+
+    future = scheduler.submit(blocker, priority='emergency')
+    assert started.wait(5)
+    return release, future
+
+
+def test_serves_highest_priority_first():
+    scheduler = make_scheduler()
+    release, blocker = block_worker(scheduler)
+    order = []
+    futures = [
+        scheduler.submit(order.append, name, priority=priority)
+        for name, priority in [('n1', 'normal'), ('u1', 'urgent'), ('e1', 'emergency'), ('n2', 'normal'), ('u2', 'urgent')]
+    ]
+    release.set()
+    for future in [blocker] + futures:
+        future.result(timeout=5)
+
+    assert order == ['e1', 'u1', 'u2', 'n1', 'n2']
+    wait_for(lambda: scheduler.metrics()['classes']['normal']['completed'] == 2)
+    metrics = scheduler.metrics()
+    assert metrics['queue_depth'] == 0
+    assert metrics['classes']['emergency']['completed'] == 2
+
+
+def test_unknown_priority_is_normal():
+    scheduler = make_scheduler()
+    assert scheduler.submit(lambda: 'ok', priority='whenever').result(timeout=5) == 'ok'
+    assert scheduler.metrics()['classes']['normal']['submitted'] == 1
+
+
+def test_sheds_low_priority_work_when_deep():
+    scheduler = make_scheduler(shed_depth={'emergency': 0, 'urgent': 4, 'normal': 2})
+    release, blocker = block_worker(scheduler)
+    queued = [scheduler.submit(time.sleep, 0, priority='normal') for _ in range(2)]
+
+    with pytest.raises(SchedulerOverloaded) as excinfo:
+        scheduler.submit(time.sleep, 0, priority='normal')
+    assert excinfo.value.priority == 'normal'
+    assert excinfo.value.depth == 2
+    assert excinfo.value.retry_after == 30
+
+    # Higher classes are still admitted at the same depth, emergencies always
+    queued.append(scheduler.submit(time.sleep, 0, priority='urgent'))
+    queued += [scheduler.submit(time.sleep, 0, priority='emergency') for _ in range(3)]
+    assert scheduler.depth() == 6
+
+    release.set()
+    for future in [blocker] + queued:
+        future.result(timeout=5)
+    assert scheduler.metrics()['classes']['normal']['shed'] == 1
+
+
+def test_overdue_work_is_promoted():
+    scheduler = make_scheduler(aging_seconds={'emergency': 0, 'urgent': 0, 'normal': 0.05})
+    release, blocker = block_worker(scheduler)
+    order = []
+    futures = [scheduler.submit(order.append, 'normal', priority='normal')]
+    time.sleep(0.1)
+    futures.append(scheduler.submit(order.append, 'urgent', priority='urgent'))
+    release.set()
+    for future in [blocker] + futures:
+        future.result(timeout=5)
+
+    assert order == ['normal', 'urgent']
+    assert scheduler.metrics()['classes']['normal']['promoted'] == 1
+
+
+def test_failures_reach_the_caller():
+    scheduler = make_scheduler()
+
+    def fail():
+        raise RuntimeError('model error')
+
+    with pytest.raises(RuntimeError):
+        scheduler.submit(fail).result(timeout=5)
+    wait_for(lambda: scheduler.metrics()['classes']['normal']['failed'] == 1)
+
+
+def test_classes_follow_appointment_priorities():
+    from models.appointment import PRIORITY_ORDER
+    assert list(make_scheduler().metrics()['classes']) == PRIORITY_ORDER
@@ -0,0 +1,148 @@
+import json
+import numpy as np
+import pytest
+from PIL import Image
+import models.ml_backends as ml_backends
+from models.ml_backends import (
+    file_sha256, iter_image_paths, load_image_array, load_parity_report, parity_report_path,
+    run_parity_check, select_backend
+)
+
+
+class FakeBackend:
+    """Returns fixed probabilities per image, keyed by its mean pixel value"""
+
+    def __init__(self, name, model_path, probabilities):
+        self.name = name
+        self.model_path = model_path
+        self.probabilities = probabilities
+
+    def predict_batch(self, batch):
+        return np.array([self.probabilities[int(round(image.mean() * 255))] for image in batch])
+
+
+@pytest.fixture
+def validation_dir(tmp_path):
+    folder = tmp_path / 'validation'
+    (folder / 'nested').mkdir(parents=True)
+    for shade in (10, 20, 30):
+        Image.new('L', (40, 40), shade).save(folder / f'{shade}.png')
+    Image.new('RGB', (40, 40), (40, 40, 40)).save(folder / 'nested' / '40.jpg')
+    (folder / 'notes.txt').write_text('not an image')
+    return folder
+
+
+@pytest.fixture
+def candidate_file(tmp_path):
+    path = tmp_path / 'model.tflite'
+    path.write_bytes(b'exported model')
+    return str(path)
+
+
+def write_report(model_path, **fields):
+    report = dict({'passed': True, 'candidate_sha256': file_sha256(model_path)}, **fields)
+    with open(parity_report_path(model_path), 'w') as f:
+        json.dump(report, f)
+
+
+REFERENCE = {
+    10: [0.9, 0.05, 0.05, 0.0],
+    20: [0.1, 0.8, 0.1, 0.0],
+    30: [0.0, 0.2, 0.7, 0.1],
+    40: [0.0, 0.0, 0.05, 0.95]
+}
+
+
+def test_images_are_found_and_normalized(validation_dir):
+    paths = list(iter_image_paths(validation_dir))
+    assert [p.rsplit('/', 1)[-1] for p in paths] == ['10.png', '20.png', '30.png', '40.jpg']
+
+    image = load_image_array(paths[0], 16)
+    assert image.shape == (16, 16, 3) and image.dtype == np.float32
+    assert image.max() == pytest.approx(10 / 255)
+
+
+def test_matching_candidate_passes(validation_dir, candidate_file):
+    reference = FakeBackend('keras', 'model.h5', REFERENCE)
+    candidate = FakeBackend('tflite', candidate_file, {k: [p + 0.005 for p in v] for k, v in REFERENCE.items()})
+
+    report = run_parity_check(reference, candidate, validation_dir, 16, batch_size=3)
+
+    assert report['images'] == 4
+    assert report['agreement'] == 1.0
+    assert report['max_confidence_delta'] == pytest.approx(0.5)
+    assert report['candidate_sha256'] == file_sha256(candidate_file)
+    assert report['passed']
+
+
+def test_disagreeing_candidate_fails(validation_dir, candidate_file):
+    reference = FakeBackend('keras', 'model.h5', REFERENCE)
+    flipped = {**REFERENCE, 30: [0.0, 0.8, 0.1, 0.1]}
+
+    report = run_parity_check(reference, FakeBackend('tflite', candidate_file, flipped), validation_dir, 16)
+
+    assert report['agreement'] == 0.75
+    assert not report['passed']
+
+
+def test_confidence_drift_fails(validation_dir, candidate_file):
+    reference = FakeBackend('keras', 'model.h5', REFERENCE)
+    drifted = {**REFERENCE, 10: [0.85, 0.1, 0.05, 0.0]}
+
+    report = run_parity_check(reference, FakeBackend('tflite', candidate_file, drifted), validation_dir, 16,
+                              max_confidence_delta=2.0)
+
+    assert report['agreement'] == 1.0
+    assert report['max_confidence_delta'] == pytest.approx(5.0)
+    assert not report['passed']
+
+
+def test_empty_validation_set_fails(tmp_path, candidate_file):
+    reference = FakeBackend('keras', 'model.h5', REFERENCE)
+    report = run_parity_check(reference, FakeBackend('tflite', candidate_file, REFERENCE), tmp_path, 16)
+    assert report['images'] == 0 and not report['passed']
+
+
+def test_report_is_bound_to_the_model_file(candidate_file):
+    assert load_parity_report(candidate_file) is None
+
+    write_report(candidate_file)
+    assert load_parity_report(candidate_file)['passed']
+
+    # Re-exporting the model invalidates the old report
+    with open(candidate_file, 'wb') as f:
+        f.write(b'another export')
+    assert load_parity_report(candidate_file) is None
+
+
+class LoadedBackend:
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    monkeypatch.setattr(ml_backends, 'KerasBackend', type('KerasBackend', (LoadedBackend,), {'name': 'keras'}))
+    monkeypatch.setattr(ml_backends, 'TFLiteBackend', type('TFLiteBackend', (LoadedBackend,), {'name': 'tflite'}))
+
+
+def test_select_backend_activates_only_a_passing_tflite_model(backends, candidate_file):
+    assert select_backend('model.h5', candidate_file, 'tflite').name == 'keras'
+
+    write_report(candidate_file, passed=False)
+    assert select_backend('model.h5', candidate_file, 'tflite').name == 'keras'
+
+    write_report(candidate_file)
+    backend = select_backend('model.h5', candidate_file, 'tflite')
+    assert (backend.name, backend.model_path) == ('tflite', candidate_file)
+    assert select_backend('model.h5', candidate_file, 'keras').name == 'keras'
+
+
+def test_select_backend_falls_back_when_tflite_fails_to_load(backends, candidate_file, monkeypatch):
+    write_report(candidate_file)
+
+    def broken(model_path):
+        raise RuntimeError('unsupported op')
+
+    monkeypatch.setattr(ml_backends, 'TFLiteBackend', broken)
+    assert select_backend('model.h5', candidate_file, 'tflite').name == 'keras'
@@ -0,0 +1,122 @@
+import threading
+import time
+import numpy as np
+import pytest
+import models.model_registry as model_registry
+from models.model_registry import ModelRegistry
+
+LABELS = ['pituitary', 'glioma', 'notumor', 'meningioma']
+
+
+class FakeBackend:
+    name = 'fake'
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        # The registered file's content picks the predicted class
+        with open(model_path) as f:
+            self.predicted = int(f.read())
+
+    def predict_batch(self, batch):
+        probabilities = np.full((len(batch), len(LABELS)), 0.1)
+        probabilities[:, self.predicted] = 0.7
+        return probabilities
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    loads = []
+
+    def select_backend(model_path, tflite_path=None, preferred='keras'):
+        loads.append(model_path)
+        return FakeBackend(model_path)
+
+    monkeypatch.setattr(model_registry, 'select_backend', select_backend)
+    monkeypatch.setattr(model_registry, 'POLL_SECONDS', 0)
+    return loads
+
+
+@pytest.fixture
+def registry(tmp_path, loads):
+    legacy = tmp_path / 'legacy.h5'
+    legacy.write_text('2')
+    return ModelRegistry(str(tmp_path / 'registry'), str(legacy), LABELS, ['Frontal Lobe'], input_size=8)
+
+
+def model_file(tmp_path, name, predicted):
+    path = tmp_path / name
+    path.write_text(str(predicted))
+    return str(path)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_legacy_model_without_a_registry(registry, tmp_path):
+    image = tmp_path / 'scan.png'
+    from PIL import Image
+    Image.new('RGB', (20, 20)).save(image)
+
+    result = registry.active().predict(str(image))
+
+    assert result == {'prediction': 'notumor', 'confidence': pytest.approx(70.0),
+                      'region': 'Frontal Lobe', 'model_version': 'legacy'}
+    assert registry.status()['active_version'] == 'legacy'
+
+
+def test_register_records_checksums(registry, tmp_path):
+    metadata = registry.register('v2', model_file(tmp_path, 'v2.h5', 1), LABELS)
+
+    assert metadata['model_file'] == 'v2.h5'
+    assert len(metadata['sha256']) == 64
+    assert [m['version'] for m in registry.list_versions()] == ['v2']
+    with pytest.raises(ValueError):
+        registry.register('v2', model_file(tmp_path, 'again.h5', 1), LABELS)
+    with pytest.raises(ValueError):
+        registry.set_active_version('v9')
+
+
+def test_activation_swaps_in_the_background(registry, tmp_path, loads):
+    registry.active()
+    registry.register('v2', model_file(tmp_path, 'v2.h5', 1), LABELS)
+    held = registry.active()
+
+    registry.set_active_version('v2')
+    assert registry.active_version_name() == 'v2'
+    wait_for(lambda: registry.active().version == 'v2')
+
+    # A request that already held the previous version finishes on it
+    assert held.version == 'legacy'
+    assert registry.active().format_prediction(np.array([0.1, 0.7, 0.1, 0.1]))['prediction'] == 'glioma'
+    assert len(loads) == 2
+
+
+def test_tampered_version_is_not_activated(registry, tmp_path):
+    registry.active()
+    registry.register('v2', model_file(tmp_path, 'v2.h5', 1), LABELS)
+    (tmp_path / 'registry' / 'v2' / 'v2.h5').write_text('3')
+
+    with pytest.raises(ValueError, match='Checksum mismatch'):
+        registry.load_version('v2')
+
+    registry.set_active_version('v2')
+    registry.active()
+    wait_for(lambda: registry.status()['loading_version'] is None)
+    assert registry.active().version == 'legacy'
+
+
+def test_concurrent_requests_start_one_load(registry, tmp_path, loads):
+    registry.active()
+    registry.register('v2', model_file(tmp_path, 'v2.h5', 1), LABELS)
+    registry.set_active_version('v2')
+
+    threads = [threading.Thread(target=registry.active) for _ in range(8)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    wait_for(lambda: registry.active().version == 'v2')
+
+    assert loads.count(str(tmp_path / 'registry' / 'v2' / 'v2.h5')) == 1
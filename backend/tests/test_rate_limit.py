@@ -0,0 +1,181 @@
+from datetime import datetime, timedelta
+import io
+import pytest
+from PIL import Image
+import utils.rate_limit as rate_limit_module
+from utils.rate_limit import (
+    MemoryBucketStore, MongoBucketStore, MemoryInflightLimiter, MongoInflightLimiter, get_limit, rate_limit,
+    acquire_inflight_slot, release_inflight_slot
+)
+from utils.auth_utils import generate_token
+from bson import ObjectId
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit_module.time, 'monotonic', clock)
+    monkeypatch.setattr(rate_limit_module.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'mongo'])
+def store(request, clock):
+    return MemoryBucketStore() if request.param == 'memory' else MongoBucketStore()
+
+
+def test_get_limit_reads_env(monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_UPLOAD', '20/10')
+    assert get_limit('upload') == (20.0, 2.0)
+    assert get_limit('login') == (5.0, 5 / 60)
+
+
+def test_bucket_allows_a_burst_then_refills(store, clock):
+    capacity, rate = 3, 0.5
+    assert [store.consume('k', capacity, rate)[0] for _ in range(3)] == [True, True, True]
+
+    allowed, retry_after = store.consume('k', capacity, rate)
+    assert not allowed
+    assert retry_after == pytest.approx(2.0)
+
+    clock.now += 1
+    allowed, retry_after = store.consume('k', capacity, rate)
+    assert not allowed
+    assert retry_after == pytest.approx(1.0)
+
+    clock.now += 1
+    assert store.consume('k', capacity, rate)[0]
+    assert not store.consume('k', capacity, rate)[0]
+
+
+def test_bucket_never_exceeds_capacity(store, clock):
+    store.consume('k', 2, 1)
+    clock.now += 3600
+    assert [store.consume('k', 2, 1)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_buckets_are_per_key(store, clock):
+    assert store.consume('a', 1, 1)[0]
+    assert not store.consume('a', 1, 1)[0]
+    assert store.consume('b', 1, 1)[0]
+
+
+def test_decorator_answers_429_with_retry_after(app, clock, monkeypatch):
+    monkeypatch.setattr(rate_limit_module, 'bucket_store', MemoryBucketStore())
+    monkeypatch.setenv('RATE_LIMIT_PING', '2/60')
+
+    @app.route('/ping')
+    @rate_limit('ping')
+    def ping():
+        return 'pong'
+
+    client = app.test_client()
+    assert [client.get('/ping').status_code for _ in range(2)] == [200, 200]
+    response = client.get('/ping')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '30'
+    # Another client has its own bucket
+    assert client.get('/ping', environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 200
+
+
+LIMITS = {'emergency': 0, 'urgent': 2, 'normal': 1}
+
+
+@pytest.fixture(params=['memory', 'mongo'])
+def limiter(request, monkeypatch):
+    limiter = MemoryInflightLimiter(LIMITS) if request.param == 'memory' else MongoInflightLimiter(LIMITS)
+    monkeypatch.setattr(rate_limit_module, 'inflight_inferences', limiter)
+    monkeypatch.setattr(rate_limit_module, 'INFLIGHT_LIMITS', LIMITS)
+    return limiter
+
+
+def test_default_caps_leave_room_for_scheduler_shedding():
+    from utils.inference_scheduler import SHED_DEPTH
+    assert rate_limit_module.INFLIGHT_LIMITS['emergency'] == 0
+    assert rate_limit_module.INFLIGHT_LIMITS['normal'] > SHED_DEPTH['normal']
+    assert rate_limit_module.INFLIGHT_LIMITS['urgent'] > SHED_DEPTH['urgent']
+
+
+def test_each_priority_has_its_own_slots(app, limiter):
+    with app.app_context():
+        normal, busy = acquire_inflight_slot('normal')
+        assert normal is not None and busy is None
+        _, busy = acquire_inflight_slot('normal')
+        assert busy[1] == 503 and busy[0].headers['Retry-After'] == '1'
+
+        # A full normal class does not hold back urgent or emergency work
+        urgent = [acquire_inflight_slot('urgent')[0] for _ in range(2)]
+        assert None not in urgent
+        assert acquire_inflight_slot('urgent')[1] is not None
+        assert [acquire_inflight_slot('emergency') for _ in range(10)] == [(None, None)] * 10
+
+        release_inflight_slot(normal)
+        assert acquire_inflight_slot('normal')[0] is not None
+
+
+def test_shared_slots_are_created_on_first_use():
+    limiter = MongoInflightLimiter(LIMITS)
+    assert limiter.collection.count_documents({}) == 0
+
+    token = limiter.acquire('urgent')
+
+    assert limiter.collection.count_documents({}) == 2
+    assert limiter.acquire('urgent') is not None
+    assert limiter.acquire('urgent') is None
+    limiter.release(token)
+    assert limiter.acquire('urgent') is not None
+
+
+def test_abandoned_shared_slot_is_reclaimed():
+    limiter = MongoInflightLimiter(LIMITS)
+    token = limiter.acquire('normal')
+    # Its worker died: the lease runs out
+    limiter.collection.update_one({'_id': token[0]}, {'$set': {'lease_until': datetime.utcnow() - timedelta(seconds=1)}})
+
+    reclaimed = limiter.acquire('normal')
+    assert reclaimed is not None
+    # The dead holder's late release must not free the new lease
+    limiter.release(token)
+    assert limiter.acquire('normal') is None
+
+
+def test_limiter_errors_fail_open(app, monkeypatch):
+    class Broken:
+        def acquire(self, priority):
+            raise RuntimeError('database down')
+
+    monkeypatch.setattr(rate_limit_module, 'inflight_inferences', Broken())
+    with app.app_context():
+        assert acquire_inflight_slot('normal') == (None, None)
+
+
+def scan():
+    image = io.BytesIO()
+    Image.new('RGB', (32, 32), (200, 200, 200)).save(image, format='PNG')
+    image.seek(0)
+    return image
+
+
+def test_predict_admits_emergencies_when_routine_slots_are_full(ml_app, limiter):
+    client = ml_app.test_client()
+    doctor = {'Authorization': 'Bearer ' + generate_token({'_id': ObjectId(), 'email': 'd@x', 'user_type': 'doctor'})}
+    with ml_app.app_context():
+        held = acquire_inflight_slot('normal')[0]
+
+    busy = client.post('/api/ml/predict', data={'image': (scan(), 'scan.png')}, headers=doctor)
+    assert busy.status_code == 503
+
+    response = client.post('/api/ml/predict', data={'image': (scan(), 'scan.png'), 'priority': 'emergency'},
+                           headers=doctor)
+    assert response.status_code == 200
+    assert response.get_json()['data']['priority'] == 'emergency'
+    release_inflight_slot(held)
+    assert client.post('/api/ml/predict', data={'image': (scan(), 'scan.png')}, headers=doctor).status_code == 200
@@ -0,0 +1,139 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import pytest
+from bson import ObjectId
+import utils.reports as reports_module
+from utils.db import db_instance
+from utils.reports import ReportRenderer, report_context
+from models.user import User
+
+pytest.importorskip('reportlab')
+
+
+@pytest.fixture
+def renderer(tmp_path):
+    return ReportRenderer(cache_dir=str(tmp_path / 'reports'), workers=2)
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    calls = []
+    render = reports_module.render_report_pdf
+
+    def counting_render(context, path):
+        calls.append(context['prediction_id'])
+        return render(context, path)
+    monkeypatch.setattr(reports_module, 'render_report_pdf', counting_render)
+    return calls
+
+
+def make_prediction(review_version=0):
+    return {'_id': ObjectId(), 'prediction': 'glioma', 'confidence': 91.5,
+            'review_version': review_version, 'created_at': datetime(2024, 3, 5)}
+
+
+def make_context(patient=None):
+    return report_context(make_prediction(), patient or {'first_name': 'Pat', 'last_name': 'Lee'})
+
+
+def test_renders_on_threads_not_spawned_processes(renderer):
+    assert isinstance(renderer._pool(), ThreadPoolExecutor)
+
+
+def test_report_is_rendered_once_and_cached(renderer, renders):
+    context = make_context()
+    path = renderer.get(context)
+
+    assert open(path, 'rb').read(5) == b'%PDF-'
+    assert renderer.get(dict(context)) == path
+    assert renders == [context['prediction_id']]
+
+
+def test_profile_update_invalidates_the_report(renderer, renders):
+    prediction = make_prediction()
+    patient = {'first_name': 'Pat', 'last_name': 'Lee'}
+    first = renderer.get(report_context(prediction, patient))
+
+    patient['updated_at'] = datetime(2024, 4, 1)
+    second = renderer.get(report_context(prediction, patient))
+
+    assert second != first
+    assert len(renders) == 2
+    assert os.listdir(renderer.cache_dir) == [os.path.basename(second)]
+
+
+def test_concurrent_requests_share_one_render(renderer, renders):
+    context = make_context()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        paths = list(pool.map(lambda _: renderer.get(context), range(4)))
+    assert len(set(paths)) == 1
+    assert 1 <= len(renders) <= 4 and os.path.exists(paths[0])
+
+
+def test_render_many_keeps_input_order(renderer, renders):
+    contexts = [make_context() for _ in range(5)]
+    renderer.get(contexts[2])
+
+    results = list(renderer.render_many(contexts, window=2))
+
+    assert [c['prediction_id'] for c, _ in results] == [c['prediction_id'] for c in contexts]
+    assert all(os.path.exists(path) for _, path in results)
+    assert len(renders) == 5
+
+
+def test_profile_edits_stamp_updated_at():
+    user_id = db_instance.get_collection('users').insert_one({
+        'email': 'pat@example.com', 'first_name': 'Pat', 'last_name': 'Lee', 'phone': ''
+    }).inserted_id
+    assert User().update_profile(str(user_id), {'last_name': 'Smith'})
+    assert isinstance(User().find_user_by_id(str(user_id))['updated_at'], datetime)
+
+
+@pytest.fixture
+def client(app, renderer, monkeypatch):
+    import routes.reports
+    monkeypatch.setattr(routes.reports, 'report_renderer', renderer)
+    app.register_blueprint(routes.reports.reports_bp, url_prefix='/api/reports')
+    return app.test_client()
+
+
+@pytest.fixture
+def patient_prediction():
+    users = db_instance.get_collection('users')
+    patient_id = users.insert_one({'email': 'pat@example.com', 'first_name': 'Pat', 'last_name': 'Lee'}).inserted_id
+    prediction_id = db_instance.get_collection('predictions').insert_one({
+        'patient_id': patient_id, 'prediction': 'glioma', 'confidence': 91.5, 'created_at': datetime(2024, 3, 5)
+    }).inserted_id
+    return patient_id, prediction_id
+
+
+def test_report_route_rerenders_after_a_profile_edit(client, auth_headers, renders, patient_prediction):
+    patient_id, prediction_id = patient_prediction
+    headers = auth_headers('patient', patient_id)
+    url = f'/api/reports/predictions/{prediction_id}'
+
+    assert client.get(url, headers=headers).status_code == 200
+    assert client.get(url, headers=headers).status_code == 200
+    assert len(renders) == 1
+
+    User().update_profile(str(patient_id), {'first_name': 'Patricia'})
+    assert client.get(url, headers=headers).status_code == 200
+    assert len(renders) == 2
+
+
+def test_report_route_is_scoped_to_the_patient(client, auth_headers, patient_prediction):
+    _, prediction_id = patient_prediction
+    response = client.get(f'/api/reports/predictions/{prediction_id}', headers=auth_headers('patient'))
+    assert response.status_code == 404
+
+
+def test_bulk_route_streams_a_zip(client, auth_headers, patient_prediction):
+    patient_id, prediction_id = patient_prediction
+    response = client.get('/api/reports/predictions/bulk?from=2024-03-01&to=2024-03-31',
+                          headers=auth_headers('admin'))
+    assert response.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(response.data)).namelist()
+    assert names == [f'Pat_Lee_{patient_id}/2024-03-05_{prediction_id}.pdf']
@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from PIL import Image
+import utils.rescoring as rescoring
+from models.model_config import CLASS_LABELS, REGIONS, IMAGE_SIZE
+from models.model_registry import ModelRegistry
+from utils.rescoring import Rescorer, _walk_images, _path_key
+from utils.db import db_instance
+
+BACKEND = os.path.dirname(os.path.dirname(__file__))
+
+
+def test_offline_tools_share_the_config_without_loading_the_model():
+    code = (
+        "import sys, export_model, manage_models, utils.rescoring\n"
+        "from models import model_config\n"
+        "assert 'models.ml_model' not in sys.modules\n"
+        "assert export_model.MODEL_PATH == utils.rescoring.MODEL_PATH == model_config.MODEL_PATH\n"
+        "assert manage_models.DEFAULT_LABELS.split(',') == model_config.CLASS_LABELS\n"
+    )
+    subprocess.run([sys.executable, '-c', code], cwd=BACKEND, check=True)
+
+
+def test_legacy_version_uses_the_shared_config():
+    metadata = rescoring.model_registry().read_metadata('legacy')
+    assert (metadata['labels'], metadata['regions'], metadata['input_size']) == (CLASS_LABELS, REGIONS, IMAGE_SIZE)
+
+
+def write_image(path, brightness):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new('RGB', (16, 16), (brightness,) * 3).save(path)
+    return path
+
+
+def test_walk_images_follows_key_order_and_resumes(tmp_path):
+    root = str(tmp_path)
+    for name in ['b.png', 'a/z.png', 'a/b/c.png', 'ab.jpg']:
+        write_image(os.path.join(root, name), 0)
+    open(os.path.join(root, 'notes.txt'), 'w').close()
+    walked = list(_walk_images(root))
+
+    assert [os.path.relpath(p, root) for p in walked] == ['a/b/c.png', 'a/z.png', 'ab.jpg', 'b.png']
+    assert [_path_key(p) for p in walked] == sorted(_path_key(p) for p in walked)
+    assert list(_walk_images(root, _path_key(walked[1]))) == walked[2:]
+
+
+class InlineProcessPool(ThreadPoolExecutor):
+    """The scorer pool on threads of this process, where the fake backend is installed"""
+
+    def __init__(self, max_workers, initializer, initargs, mp_context=None):
+        super().__init__(max_workers=max_workers, initializer=initializer, initargs=initargs)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(rescoring, 'REGISTRY_DIR', str(tmp_path / 'registry'))
+    monkeypatch.setattr(rescoring, 'ProcessPoolExecutor', InlineProcessPool)
+    model = tmp_path / 'v2.h5'
+    model.write_text('weights')
+    registry = rescoring.model_registry()
+    registry.register('v2', str(model), CLASS_LABELS, REGIONS, input_size=8)
+    return registry
+
+
+@pytest.fixture
+def scans(tmp_path):
+    folder = tmp_path / 'uploads'
+    # The fake backend predicts the brightness bucket: 0 pituitary ... 3 meningioma
+    paths = [write_image(str(folder / f'scan{i}.png'), brightness) for i, brightness in enumerate([10, 250, 100, 170, 20])]
+    with open(folder / 'scan5.png', 'wb') as f:
+        f.write(b'not an image')
+    predictions = db_instance.get_collection('predictions')
+    predictions.insert_one({'image_path': paths[0], 'prediction': 'pituitary', 'confidence': 70.0})
+    predictions.insert_one({'image_path': paths[1], 'prediction': 'glioma', 'confidence': 90.0})
+    return str(folder), paths
+
+
+def test_rescoring_files_compares_with_stored_predictions(registry, scans):
+    folder, paths = scans
+    checkpoint, report = Rescorer('v2', source='files', batch_size=2, workers=1, folder=folder).run()
+
+    assert (report['processed'], report['failed'], report['finished']) == (6, 1, True)
+    assert (report['compared'], report['agreement']) == (2, 0.5)
+    assert report['changes'] == {'glioma->meningioma': 1}
+    scores = {s['image_path']: s for s in db_instance.get_collection('prediction_scores').find({'model_version': 'v2'})}
+    assert [scores[p]['prediction'] for p in paths] == ['pituitary', 'meningioma', 'glioma', 'notumor', 'pituitary']
+    assert scores[paths[0]]['prediction_id'] is not None
+
+
+def test_interrupted_run_resumes_after_its_last_batch(registry, scans):
+    folder, _ = scans
+    _, report = Rescorer('v2', source='files', batch_size=2, workers=1, folder=folder).run(max_batches=2)
+    assert (report['processed'], report['finished']) == (4, False)
+
+    checkpoint, report = Rescorer('v2', source='files', batch_size=2, workers=1, folder=folder).run()
+    assert (report['processed'], report['finished']) == (6, True)
+    assert db_instance.get_collection('prediction_scores').count_documents({}) == 5
+
+
+def test_unknown_version_or_source(registry):
+    with pytest.raises(ValueError, match='Unknown model version'):
+        Rescorer('v9')
+    with pytest.raises(ValueError, match='source must be one of'):
+        Rescorer('v2', source='s3')
@@ -0,0 +1,209 @@
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from models.prediction import Prediction
+from utils.auth_utils import generate_token
+from utils.review_queue import recount_claims, REVIEW_MAX_CLAIMS
+
+
+@pytest.fixture
+def predictions():
+    return Prediction()
+
+
+def add_prediction(predictions, priority='normal', doctor_id=None):
+    return predictions.create_prediction({
+        'image_path': 'scan.jpg', 'prediction': 'glioma', 'confidence': 90, 'priority': priority, 'doctor_id': doctor_id
+    })
+
+
+def claim(predictions, doctor_id):
+    """What the claim endpoint does: take a slot, then the next prediction"""
+    if not predictions.reserve_claim_slot(doctor_id):
+        return 'cap'
+    prediction = predictions.claim_next_review(doctor_id)
+    if not prediction:
+        predictions.free_claim_slot(doctor_id)
+        return None
+    return str(prediction['_id'])
+
+
+def held_count(predictions, doctor_id):
+    counter = predictions.claim_counters.find_one({'_id': ObjectId(doctor_id)})
+    return counter['held'] if counter else 0
+
+
+def expire_lease(predictions, prediction_id):
+    predictions.collection.update_one({'_id': ObjectId(prediction_id)},
+                                      {'$set': {'claim_expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+
+
+def review(predictions, prediction_id, doctor_id):
+    return predictions.update_prediction_review(prediction_id, 'notes', 'glioma', doctor_id=doctor_id)
+
+
+def test_claims_most_urgent_then_oldest(predictions):
+    normal = add_prediction(predictions)
+    urgent = add_prediction(predictions, 'urgent')
+    emergency = add_prediction(predictions, 'emergency')
+    add_prediction(predictions, doctor_id=str(ObjectId()))  # assigned through an appointment: not queued
+
+    claimed = [claim(predictions, str(ObjectId())) for _ in range(4)]
+
+    assert claimed == [emergency, urgent, normal, None]
+    assert predictions.count_review_queue() == 0
+
+
+def test_claim_assigns_the_prediction_under_a_lease(predictions):
+    add_prediction(predictions)
+    doctor_id = str(ObjectId())
+
+    prediction = predictions.claim_next_review(doctor_id)
+
+    stored = predictions.collection.find_one({'_id': prediction['_id']})
+    assert stored['doctor_id'] == ObjectId(doctor_id)
+    assert stored['claim_count'] == prediction['claim_count'] == 1
+    assert stored['claim_expires_at'] > datetime.utcnow()
+
+
+def test_cap_on_held_claims(predictions):
+    for _ in range(REVIEW_MAX_CLAIMS + 1):
+        add_prediction(predictions)
+    doctor_id = str(ObjectId())
+
+    claimed = [claim(predictions, doctor_id) for _ in range(REVIEW_MAX_CLAIMS)]
+    assert None not in claimed
+    assert claim(predictions, doctor_id) == 'cap'
+    assert held_count(predictions, doctor_id) == REVIEW_MAX_CLAIMS
+
+    # Reviewing or releasing frees a slot
+    assert review(predictions, claimed[0], doctor_id)
+    assert predictions.release_review_claim(claimed[1], doctor_id)
+    assert held_count(predictions, doctor_id) == REVIEW_MAX_CLAIMS - 2
+    assert claim(predictions, doctor_id) == claimed[1]
+
+
+def test_empty_queue_gives_the_slot_back(predictions):
+    doctor_id = str(ObjectId())
+    assert claim(predictions, doctor_id) is None
+    assert held_count(predictions, doctor_id) == 0
+
+
+def test_renew_extends_only_the_holders_lease(predictions):
+    add_prediction(predictions)
+    doctor_id, other_id = str(ObjectId()), str(ObjectId())
+    prediction_id = claim(predictions, doctor_id)
+    expire_lease(predictions, prediction_id)
+
+    # A lapsed claim is kept until someone else takes it
+    assert predictions.renew_review_claim(prediction_id, other_id) is None
+    assert predictions.renew_review_claim(prediction_id, doctor_id) > datetime.utcnow()
+    assert predictions.count_review_queue() == 0
+
+
+def test_expired_lease_returns_to_the_queue(predictions):
+    add_prediction(predictions)
+    doctor_id, other_id = str(ObjectId()), str(ObjectId())
+    prediction_id = claim(predictions, doctor_id)
+    assert not review(predictions, prediction_id, other_id)
+
+    expire_lease(predictions, prediction_id)
+    assert [str(p['_id']) for p in predictions.get_held_claims(doctor_id)] == [prediction_id]
+    assert claim(predictions, other_id) == prediction_id
+
+    # The takeover ends the first doctor's claim and frees their slot
+    assert held_count(predictions, doctor_id) == 0
+    assert predictions.get_held_claims(doctor_id) == []
+    assert predictions.renew_review_claim(prediction_id, doctor_id) is None
+    assert not predictions.release_review_claim(prediction_id, doctor_id)
+    assert review(predictions, prediction_id, other_id)
+    assert held_count(predictions, other_id) == 0
+
+
+def test_release_puts_the_prediction_back_in_place(predictions):
+    first = add_prediction(predictions)
+    add_prediction(predictions)
+    doctor_id = str(ObjectId())
+    assert claim(predictions, doctor_id) == first
+
+    assert predictions.release_review_claim(first, doctor_id)
+    assert not predictions.release_review_claim(first, doctor_id)
+    assert predictions.collection.find_one({'_id': ObjectId(first)})['doctor_id'] is None
+    assert claim(predictions, str(ObjectId())) == first
+
+
+def test_reviewing_an_unassigned_prediction_records_the_reviewer(predictions):
+    prediction_id = add_prediction(predictions)
+    doctor_id = str(ObjectId())
+
+    assert review(predictions, prediction_id, doctor_id)
+
+    stored = predictions.collection.find_one({'_id': ObjectId(prediction_id)})
+    assert stored['doctor_id'] == ObjectId(doctor_id)
+    assert stored['reviewed_by_doctor'] and 'claim_expires_at' not in stored
+    assert predictions.count_review_queue() == 0
+    assert claim(predictions, str(ObjectId())) is None
+
+
+def test_recount_rebuilds_drifted_counters(predictions):
+    for _ in range(2):
+        add_prediction(predictions)
+    doctor_id = str(ObjectId())
+    claim(predictions, doctor_id)
+    predictions.claim_counters.update_one({'_id': ObjectId(doctor_id)}, {'$set': {'held': REVIEW_MAX_CLAIMS}})
+    predictions.claim_counters.insert_one({'_id': ObjectId(), 'held': 2})
+
+    assert recount_claims() == 1
+    assert held_count(predictions, doctor_id) == 1
+    assert predictions.claim_counters.count_documents({}) == 1
+
+
+def test_claim_endpoint(app, predictions):
+    from routes.doctor import doctor_bp
+    app.register_blueprint(doctor_bp, url_prefix='/api/doctor')
+    doctor_id = ObjectId()
+    headers = {'Authorization': 'Bearer ' + generate_token({'_id': doctor_id, 'email': 'd@example.com', 'user_type': 'doctor'})}
+    client = app.test_client()
+    for _ in range(REVIEW_MAX_CLAIMS + 1):
+        add_prediction(predictions)
+
+    for _ in range(REVIEW_MAX_CLAIMS):
+        response = client.post('/api/doctor/review-queue/claim', headers=headers)
+        assert response.status_code == 200
+        assert response.get_json()['prediction']['thumbnail_url'].startswith('/api/ml/predictions/')
+    assert client.post('/api/doctor/review-queue/claim', headers=headers).status_code == 409
+
+    queue = client.get('/api/doctor/review-queue', headers=headers).get_json()
+    assert (queue['available'], len(queue['claims']), queue['max_claims']) == (1, REVIEW_MAX_CLAIMS, REVIEW_MAX_CLAIMS)
+
+    prediction_id = queue['claims'][0]['_id']
+    assert client.put(f'/api/doctor/review-queue/{prediction_id}/renew', headers=headers).status_code == 200
+    assert client.put(f'/api/doctor/review-queue/{prediction_id}/release', headers=headers).status_code == 200
+    assert client.put(f'/api/doctor/review-queue/{prediction_id}/release', headers=headers).status_code == 409
+    assert client.post('/api/doctor/review-queue/claim', headers=headers).status_code == 200
+
+
+def test_review_endpoint_lets_admins_review_without_taking_over(app, predictions, auth_headers):
+    from routes.doctor import doctor_bp
+    app.register_blueprint(doctor_bp, url_prefix='/api/doctor')
+    client = app.test_client()
+    doctor_id = str(ObjectId())
+    add_prediction(predictions)
+    prediction_id = claim(predictions, doctor_id)
+    body = {'doctor_notes': 'notes', 'final_diagnosis': 'glioma'}
+
+    response = client.put(f'/api/doctor/predictions/{prediction_id}/review', json=body, headers=auth_headers('doctor'))
+    assert response.status_code == 400
+
+    response = client.put(f'/api/doctor/predictions/{prediction_id}/review', json=body, headers=auth_headers('admin'))
+    assert response.status_code == 200
+    stored = predictions.collection.find_one({'_id': ObjectId(prediction_id)})
+    assert stored['doctor_id'] == ObjectId(doctor_id)
+    assert stored['reviewed_by_doctor'] and stored['review_version'] == 1
+    # The claim the doctor held is given back
+    assert held_count(predictions, doctor_id) == 0
+
+    unassigned = add_prediction(predictions)
+    response = client.put(f'/api/doctor/predictions/{unassigned}/review', json=body, headers=auth_headers('admin'))
+    assert response.status_code == 200
+    assert predictions.collection.find_one({'_id': ObjectId(unassigned)})['doctor_id'] is None
@@ -0,0 +1,96 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from utils.saliency import SaliencyService, _Job
+
+
+class SaliencyModel:
+    """Heatmaps are the images' brightness; records the size of each batch"""
+    input_size = 16
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def saliency_batch(self, batch, class_indices=None):
+        self.batch_sizes.append(len(batch))
+        return batch.mean(axis=3)
+
+
+@pytest.fixture
+def model():
+    return SaliencyModel()
+
+
+@pytest.fixture
+def service(tmp_path, model, monkeypatch):
+    service = SaliencyService(cache_dir=str(tmp_path / 'cache'), batch_wait_ms=0)
+    monkeypatch.setattr(service, '_model', lambda version: model)
+    return service
+
+
+def write_image(path, value):
+    Image.fromarray(np.full((24, 24, 3), value, dtype=np.uint8)).save(path)
+    return str(path)
+
+
+def job(service, image_path, name):
+    job = _Job(image_path, 'v1', service.cache_path(name, 'v1'))
+    job.future.set_running_or_notify_cancel()
+    return job
+
+
+def test_unreadable_image_fails_only_its_own_job(service, model, tmp_path):
+    broken = tmp_path / 'broken.png'
+    broken.write_bytes(b'not an image')
+    jobs = [job(service, write_image(tmp_path / 'a.png', 60), 'a'),
+            job(service, str(broken), 'broken'),
+            job(service, str(tmp_path / 'missing.png'), 'missing'),
+            job(service, write_image(tmp_path / 'b.png', 200), 'b')]
+
+    service._compute('v1', jobs)
+
+    assert model.batch_sizes == [2]
+    for good in [jobs[0], jobs[3]]:
+        assert os.path.exists(good.future.result(0))
+    assert jobs[1].future.exception(0) is not None
+    assert isinstance(jobs[2].future.exception(0), OSError)
+    assert service.stats == dict(service.stats, computed=2, failed=2, batches=1)
+
+
+def test_batch_with_no_readable_images_skips_the_model(service, model, tmp_path):
+    jobs = [job(service, str(tmp_path / 'missing.png'), 'missing')]
+    service._compute('v1', jobs)
+
+    assert model.batch_sizes == []
+    assert jobs[0].future.exception(0) is not None
+    assert service.stats == dict(service.stats, failed=1, batches=0)
+
+
+def test_model_failure_fails_the_whole_batch(service, tmp_path, monkeypatch):
+    def unavailable(version):
+        raise KeyError(version)
+    monkeypatch.setattr(service, '_model', unavailable)
+    jobs = [job(service, write_image(tmp_path / 'a.png', 60), 'a'),
+            job(service, write_image(tmp_path / 'b.png', 200), 'b')]
+
+    service._compute('v1', jobs)
+
+    assert all(isinstance(j.future.exception(0), KeyError) for j in jobs)
+    assert service.stats['failed'] == 2
+
+
+def test_get_computes_once_then_serves_the_cache(service, model, tmp_path):
+    image_path = write_image(tmp_path / 'scan.png', 120)
+
+    path = service.get(image_path, 'v1', timeout=5)
+    assert os.path.exists(path)
+    with Image.open(path) as overlay:
+        assert overlay.size == (24, 24)
+
+    assert service.get(image_path, 'v1', timeout=5) == path
+    assert model.batch_sizes == [1]
+    assert service.stats == dict(service.stats, computed=1, cache_hits=1)
+
+    with pytest.raises(OSError):
+        service.get(str(tmp_path / 'missing.png'), 'v1', timeout=5)
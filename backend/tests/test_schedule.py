@@ -0,0 +1,95 @@
+import pytest
+from models.schedule import ScheduleTemplate, encode_slots, decode_mask, slot_index
+
+# 2026-11-02 is a Monday
+MONDAY, TUESDAY = '2026-11-02', '2026-11-03'
+
+
+def test_masks_round_trip():
+    mask = encode_slots(['09:00', '09:30', '23:30'], 30)
+    assert mask == 1 << 18 | 1 << 19 | 1 << 47
+    assert decode_mask(mask, 30) == ('09:00', '09:30', '23:30')
+    # 15-minute grids need more bits than a BSON integer
+    assert decode_mask(encode_slots(['23:45'], 15), 15) == ('23:45',)
+
+
+@pytest.mark.parametrize('time_slot', ['09:10', '24:00', 'nine', None])
+def test_off_grid_and_invalid_slots(time_slot):
+    assert slot_index(time_slot, 30) is None
+    with pytest.raises(ValueError):
+        encode_slots([time_slot], 30)
+
+
+def test_weekdays_and_exceptions():
+    template = ScheduleTemplate.from_request({
+        'slot_minutes': 30,
+        'weekdays': {'mon': ['09:00', '09:30'], 'tue': ['14:00']},
+        'exceptions': {'2026-11-09': [], '2026-11-10': ['08:30']}
+    })
+
+    assert template.available_slots(MONDAY) == ['09:00', '09:30']
+    assert template.available_slots(TUESDAY) == ['14:00']
+    assert template.available_slots('2026-11-04') == []
+    # Exceptions override the weekday, an empty list is a day off
+    assert template.available_slots('2026-11-09') == []
+    assert template.available_slots('2026-11-10') == ['08:30']
+    assert template.is_working_slot(MONDAY, '09:30')
+    assert not template.is_working_slot(MONDAY, '10:00')
+
+
+def test_booked_slots_are_removed():
+    template = ScheduleTemplate.from_request({'weekdays': {'mon': ['09:00', '10:00', '11:00']}})
+    assert template.available_slots(MONDAY, ['10:00', '10:30', 'bad']) == ['09:00', '11:00']
+
+    month = template.month_availability(2026, 11, {MONDAY: ['09:00']})
+    assert len(month) == 30
+    assert month[MONDAY] == ['10:00', '11:00']
+    assert month['2026-11-09'] == ['09:00', '10:00', '11:00']
+
+
+def test_stored_form_round_trips():
+    template = ScheduleTemplate.from_request({
+        'slot_minutes': 15,
+        'weekdays': {'fri': ['23:45']},
+        'exceptions': {'2026-12-25': []}
+    })
+    doc = template.to_doc()
+    assert doc['weekdays'][4] == format(1 << 95, 'x')
+
+    restored = ScheduleTemplate.from_doctor({'schedule': doc})
+    assert restored.to_response() == template.to_response()
+    assert restored.to_response()['exceptions'] == {'2026-12-25': []}
+
+
+def test_legacy_slot_lists_apply_to_every_weekday():
+    template = ScheduleTemplate.from_doctor({'available_time_slots': ['09:00', '10:30', 'bogus']})
+    assert template.slot_minutes == 30
+    assert template.available_slots(MONDAY) == template.available_slots('2026-11-08') == ['09:00', '10:30']
+
+
+@pytest.mark.parametrize('data', [
+    {'slot_minutes': 7},
+    {'weekdays': {'someday': []}},
+    {'weekdays': ['mon']},
+    {'weekdays': {'mon': '09:00'}},
+    {'exceptions': {'not-a-date': []}},
+    {'exceptions': [1]},
+    {'slot_minutes': 60, 'weekdays': {'mon': ['09:30']}}
+])
+def test_invalid_requests(data):
+    with pytest.raises(ValueError):
+        ScheduleTemplate.from_request(data)
+
+
+def test_weekly_slots_move_to_a_finer_grid():
+    template = ScheduleTemplate.from_request({
+        'weekdays': {'mon': ['09:00']}, 'exceptions': {'2026-12-24': ['10:00']}
+    })
+
+    updated = template.with_weekly_slots(['09:00', '09:15'])
+
+    assert updated.slot_minutes == 15
+    assert updated.weekly_slots() == ['09:00', '09:15']
+    assert updated.available_slots('2026-12-24') == ['10:00']
+    with pytest.raises(ValueError):
+        template.with_weekly_slots(['09:07'])
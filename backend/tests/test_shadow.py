@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from flask import Response
+import routes.ml
+import utils.shadow
+from utils.db import db_instance
+from utils.shadow import ShadowEvaluator, COLLECTION, SHADOW_MAX_ATTEMPTS
+
+PRIMARY = {'model_version': 'v1', 'prediction': 'glioma', 'confidence': 0.9, 'inference_ms': 40.0}
+
+
+class CandidateModel:
+    def __init__(self, prediction='glioma', confidence=0.8, error=None):
+        self.prediction = prediction
+        self.confidence = confidence
+        self.error = error
+        self.calls = []
+
+    def predict(self, image_path):
+        self.calls.append(image_path)
+        if self.error:
+            raise self.error
+        return {'model_version': 'v2', 'prediction': self.prediction, 'confidence': self.confidence}
+
+
+@pytest.fixture
+def evaluator():
+    return ShadowEvaluator(version='v2', sample_rate=1.0, queue_size=3)
+
+
+def queue(evaluator, image_path='scan.png', primary=PRIMARY):
+    response = Response()
+    evaluator.after_response(response, image_path, str(ObjectId()), dict(primary, region='left'))
+    response.close()
+
+
+def test_sampled_upload_is_queued_once_the_response_closes(evaluator):
+    response = Response()
+    evaluator.after_response(response, 'scan.png', str(ObjectId()), dict(PRIMARY, region='left'))
+    assert evaluator.jobs.count_documents({}) == 0
+
+    response.close()
+    job = evaluator.jobs.find_one()
+    assert job['status'] == 'queued'
+    assert job['model_version'] == 'v2'
+    assert job['primary'] == PRIMARY
+    assert job['expires_at'] > job['created_at']
+    assert evaluator.stats['sampled'] == 1
+
+
+def test_disabled_or_unsampled_uploads_are_not_queued(evaluator, monkeypatch):
+    for disabled in [ShadowEvaluator(version='', sample_rate=1.0), ShadowEvaluator(version='v2', sample_rate=0)]:
+        assert not disabled.enabled()
+        queue(disabled)
+
+    monkeypatch.setattr(utils.shadow.random, 'random', lambda: 0.5)
+    queue(ShadowEvaluator(version='v2', sample_rate=0.5))
+    assert evaluator.jobs.count_documents({}) == 0
+
+
+def test_full_queue_drops_samples(evaluator):
+    for _ in range(5):
+        queue(evaluator)
+    assert evaluator.jobs.count_documents({}) == 3
+    assert evaluator.stats == dict(evaluator.stats, sampled=3, dropped=2)
+
+
+def test_score_stores_the_comparison_and_removes_the_job(evaluator):
+    queue(evaluator)
+    model = CandidateModel(prediction='meningioma', confidence=0.6)
+
+    assert evaluator.run(model, until_empty=True) == 1
+    assert model.calls == ['scan.png']
+    assert evaluator.jobs.count_documents({}) == 0
+
+    result = db_instance.get_collection(COLLECTION).find_one()
+    assert result['shadow']['prediction'] == 'meningioma'
+    assert result['agreed'] is False
+    assert result['confidence_delta'] == pytest.approx(-0.3)
+    assert result['queued_seconds'] >= 0
+    assert evaluator.stats['scored'] == 1
+
+
+def test_failed_job_is_retried_then_dropped(evaluator):
+    queue(evaluator)
+    model = CandidateModel(error=OSError('missing upload'))
+
+    for attempt in range(SHADOW_MAX_ATTEMPTS):
+        evaluator.score(evaluator.claim(), model)
+        assert evaluator.jobs.find_one()['status'] == 'queued'
+    assert evaluator.stats['failed'] == SHADOW_MAX_ATTEMPTS
+
+    evaluator.score(evaluator.claim(), model)
+    assert evaluator.jobs.count_documents({}) == 0
+    assert len(model.calls) == SHADOW_MAX_ATTEMPTS
+
+
+def test_claim_takes_jobs_whose_lease_expired(evaluator):
+    queue(evaluator)
+    job = evaluator.claim()
+    assert evaluator.claim() is None
+
+    evaluator.jobs.update_one({'_id': job['_id']}, {'$set': {'lease_until': datetime.utcnow() - timedelta(seconds=1)}})
+    reclaimed = evaluator.claim()
+    assert reclaimed['_id'] == job['_id']
+    assert reclaimed['attempts'] == 2
+
+
+def test_claim_ignores_other_versions(evaluator):
+    queue(evaluator)
+    assert ShadowEvaluator(version='v3').claim() is None
+
+
+def test_report_summarises_agreement_and_latency(evaluator):
+    for prediction in ['glioma', 'glioma', 'notumor']:
+        queue(evaluator)
+        evaluator.score(evaluator.claim(), CandidateModel(prediction=prediction, confidence=0.8))
+
+    report = evaluator.report()
+    assert report['shadow_version'] == 'v2'
+    assert report['compared'] == 3
+    assert report['agreement'] == pytest.approx(2 / 3, abs=1e-4)
+    assert report['mean_abs_confidence_delta'] == pytest.approx(0.1)
+    assert report['changes'] == {'glioma->notumor': 1}
+    assert report['latency_ms']['primary']['p50'] == 40.0
+    assert report['latency_ms']['shadow']['p95'] is not None
+
+    assert evaluator.report('v3')['compared'] == 0
+    assert evaluator.report('v3')['agreement'] is None
+
+
+def test_shadow_route(ml_app, auth_headers, evaluator, monkeypatch):
+    monkeypatch.setattr(routes.ml, 'shadow_evaluator', evaluator)
+    queue(evaluator)
+    client = ml_app.test_client()
+
+    response = client.get('/api/ml/shadow', headers=auth_headers('admin'))
+    assert response.status_code == 200
+    assert response.json['report']['compared'] == 0
+    assert response.json['worker']['queue_depth'] == 1
+
+    assert client.get('/api/ml/shadow?days=x', headers=auth_headers('admin')).status_code == 400
+    assert client.get('/api/ml/shadow', headers=auth_headers('doctor')).status_code == 403
+
+    monkeypatch.setattr(evaluator, 'version', '')
+    response = client.get('/api/ml/shadow', headers=auth_headers('admin'))
+    assert response.status_code == 400
@@ -0,0 +1,116 @@
+import threading
+import time
+import pytest
+from flask import jsonify, request
+from bson import ObjectId
+from utils.single_flight import SingleFlight, coalesce, read_coalescer
+from utils.json_utils import MongoJSONProvider
+
+
+def run_concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions, results = [], []
+
+    def slow():
+        executions.append(1)
+        release.wait(5)
+        return 'body'
+
+    leader = run_concurrently(1, lambda: results.append(flight.do('k', slow)))
+    wait_for(lambda: flight.metrics()['in_flight'] == 1)
+    followers = run_concurrently(4, lambda: results.append(flight.do('k', slow)))
+    wait_for(lambda: flight._calls['k'].waiters == 4)
+    release.set()
+    for thread in leader + followers:
+        thread.join(5)
+
+    assert len(executions) == 1
+    assert sorted(results) == [('body', False)] + [('body', True)] * 4
+    assert flight.metrics() == {'requests': 5, 'executions': 1, 'coalesced': 4,
+                                'in_flight': 0, 'coalescing_ratio': 0.8}
+
+
+def test_sequential_calls_are_not_cached():
+    flight = SingleFlight()
+    assert flight.do('k', lambda: 1) == (1, False)
+    assert flight.do('k', lambda: 2) == (2, False)
+    assert flight.metrics()['coalesced'] == 0
+
+
+def test_errors_reach_every_waiter_and_are_not_kept():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        release.wait(5)
+        raise ValueError('boom')
+
+    def call():
+        try:
+            flight.do('k', failing)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = run_concurrently(1, call)
+    wait_for(lambda: flight.metrics()['in_flight'] == 1)
+    threads += run_concurrently(2, call)
+    wait_for(lambda: flight._calls['k'].waiters == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == ['boom'] * 3
+    assert flight.do('k', lambda: 'ok') == ('ok', False)
+
+
+@pytest.fixture
+def client(app):
+    @app.route('/reports')
+    @coalesce(scope='user')
+    def reports():
+        return jsonify({'user': request.user['user_id'], 'page': request.args.get('page')}), 200
+
+    @app.before_request
+    def authenticate():
+        request.user = {'user_id': request.headers['X-User'], 'user_type': 'doctor'}
+
+    return app.test_client()
+
+
+def test_coalesced_view_keys_by_caller_and_query(client, monkeypatch):
+    keys = []
+    do = read_coalescer.do
+    monkeypatch.setattr(read_coalescer, 'do', lambda key, fn: keys.append(key) or do(key, fn))
+
+    first = client.get('/reports?page=1', headers={'X-User': 'a'})
+    client.get('/reports?page=2', headers={'X-User': 'a'})
+    client.get('/reports?page=1', headers={'X-User': 'b'})
+
+    assert first.status_code == 200
+    assert first.get_json() == {'user': 'a', 'page': '1'}
+    assert first.content_type == 'application/json'
+    assert len(set(keys)) == 3
+
+
+def test_mongo_json_provider_hides_bytes(app):
+    user_id = ObjectId()
+    with app.app_context():
+        body = app.json.dumps({'_id': user_id, 'password': b'$2b$hash'})
+    assert isinstance(app.json, MongoJSONProvider)
+    assert app.json.loads(body) == {'_id': str(user_id), 'password': None}
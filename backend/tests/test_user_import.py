@@ -0,0 +1,107 @@
+import threading
+import time
+import bcrypt
+import pytest
+import utils.user_import as user_import_module
+from utils.db import db_instance
+from utils.user_import import UserImporter, ImportJobs, parse_rows, detect_format, validate_row, ensure_indexes
+
+CSV = b'''email,password,user_type,first_name,last_name,phone,specialization,license_number,available_time_slots
+doc@example.com,secret1,doctor,Dana,Doe,555,Neurology,L-1,09:00;09:30
+pat@example.com,secret2,patient,Pat,Lee,,,,
+bad-email,secret3,patient,Bad,Row,,,,
+pat@example.com,secret4,patient,Dup,Row,,,,
+'''
+
+
+@pytest.fixture
+def hashed_on(monkeypatch):
+    """Thread names the passwords were hashed on; hashing is cheap for the tests"""
+    threads = []
+
+    def fast_hash(password):
+        threads.append(threading.current_thread().name)
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=4))
+    monkeypatch.setattr(user_import_module, 'hash_password', fast_hash)
+    return threads
+
+
+def users():
+    return db_instance.get_collection('users')
+
+
+def test_parse_rows_reports_bad_ndjson_lines():
+    rows, errors = parse_rows(b'{"email": "a@example.com"}\nnot json\n[1]\n\n', 'ndjson')
+    assert rows == [(1, {'email': 'a@example.com'})]
+    assert [(e['row'], e['error'][:12]) for e in errors] == [(2, 'Invalid JSON'), (3, 'Each line mu')]
+
+
+def test_detect_format():
+    assert detect_format('users.jsonl') == 'ndjson'
+    assert detect_format('users.txt', 'NDJSON') == 'ndjson'
+    assert detect_format('users.csv') == 'csv'
+
+
+@pytest.mark.parametrize('row, error', [
+    ({'user_type': 'admin'}, 'user_type must be one of'),
+    ({'user_type': 'patient', 'email': 'a@example.com', 'first_name': 'A'}, 'last_name is required'),
+    ({'user_type': 'patient', 'email': 'a@example.com', 'first_name': 'A', 'last_name': 'B', 'password': '123'},
+     'Password must be at least 6 characters'),
+])
+def test_validate_row(row, error):
+    assert validate_row(row).startswith(error)
+
+
+def test_import_reports_every_row(hashed_on):
+    rows, errors = parse_rows(CSV, 'csv')
+    report = UserImporter(chunk_size=1, hash_workers=4).import_rows(rows, errors)
+
+    assert report['created_by_type'] == {'doctor': 1, 'patient': 1}
+    assert [(e['row'], e['error']) for e in report['errors']] == [
+        (4, 'Invalid email address'), (5, 'Duplicate email in import file')
+    ]
+    doctor = users().find_one({'email': 'doc@example.com'})
+    assert doctor['approved_by_admin'] is True
+    assert doctor['available_time_slots'] == ['09:00', '09:30']
+    assert bcrypt.checkpw(b'secret1', doctor['password'])
+
+
+def test_passwords_are_hashed_on_threads_of_this_process(hashed_on):
+    rows = [(n, {'email': f'p{n}@example.com', 'password': 'secret', 'user_type': 'patient',
+                 'first_name': 'P', 'last_name': str(n)}) for n in range(8)]
+    UserImporter(hash_workers=4).import_rows(rows)
+
+    assert len(hashed_on) == 8
+    assert all(name.startswith('password-hash') for name in hashed_on)
+
+
+def test_existing_and_racing_emails_are_reported(hashed_on):
+    ensure_indexes()
+    users().insert_one({'email': 'pat@example.com', 'user_type': 'patient'})
+    importer = UserImporter(hash_workers=1)
+    rows, _ = parse_rows(CSV, 'csv')
+
+    report = importer.import_rows(rows[:2])
+    assert report['created'] == 1
+    assert report['errors'] == [{'row': 3, 'email': 'pat@example.com', 'error': 'User with this email already exists'}]
+
+    # Created by someone else between the email check and the insert
+    importer._existing_emails = lambda emails: set()
+    report = importer.import_rows(rows[:1])
+    assert report['errors'][0]['error'] == 'User with this email already exists'
+
+
+def test_import_job_records_its_report(hashed_on):
+    jobs = ImportJobs()
+    rows, errors = parse_rows(CSV, 'csv')
+    job_id = jobs.start(rows, errors, 'admin-1', 'users.csv')
+
+    deadline = time.monotonic() + 5
+    while jobs.get(job_id)['status'] in ('queued', 'running'):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    job = jobs.get(job_id)
+    assert job['status'] == 'completed'
+    assert job['report']['created'] == 2
+    assert job['expires_at'] > job['finished_at']
@@ -0,0 +1,101 @@
+import pytest
+import routes.admin
+import utils.user_search as user_search_module
+from utils.db import db_instance
+from utils.user_search import (
+    normalize, search_tokens, search_fields, search_pipeline, search_truncated, backfill, trigrams
+)
+
+JANE = {'first_name': 'Jané', 'last_name': "O'Neil", 'email': 'jane.oneil@example.com', 'phone': '+1 (555) 010-2000'}
+
+
+def test_normalize_strips_accents_and_punctuation():
+    assert normalize("Jané O'Neil-Smith") == ['jane', 'o', 'neil', 'smith']
+    assert normalize(None) == []
+
+
+def test_tokens_cover_names_email_and_phone():
+    assert search_tokens(JANE) == ['jane', 'o', 'neil', 'janeoneil', 'oneil', '15550102000', '5550102000']
+
+
+def test_search_fields_store_prefixes_and_trigrams():
+    fields = search_fields(JANE)
+    assert {'ja', 'jan', 'jane', 'ne', 'neil', '555', '5550102000'} <= set(fields['search_prefixes'])
+    # Single-letter tokens have no prefix of the minimum length
+    assert 'o' not in fields['search_prefixes']
+    assert trigrams('neil') <= set(fields['search_trigrams'])
+    assert fields['search_prefixes'] == sorted(fields['search_prefixes'])
+
+
+def prefix_match(pipeline):
+    return pipeline[0]['$match']['search_prefixes']['$all']
+
+
+def test_pipeline_reads_a_phone_number_as_one_token():
+    assert prefix_match(search_pipeline('+1 (555) 010-2000')) == ['15550102000']
+    assert prefix_match(search_pipeline('jane 555')) == ['jane', '555']
+
+
+def test_pipeline_filters_by_type_in_both_branches():
+    pipeline = search_pipeline('jane', 'doctor', page=3, page_size=10)
+    assert pipeline[0]['$match']['user_type'] == 'doctor'
+    fuzzy = pipeline[2]['$unionWith']['pipeline'][0]['$match']
+    assert fuzzy['user_type'] == 'doctor'
+    assert fuzzy['search_trigrams']['$in'] == sorted(trigrams('jane'))
+    results = pipeline[-1]['$facet']['results']
+    assert {'$skip': 20} in results and {'$limit': 10} in results
+
+
+def test_two_letter_queries_match_prefixes_only():
+    pipeline = search_pipeline('jo')
+    assert not any('$unionWith' in stage for stage in pipeline)
+    assert pipeline[-2]['$addFields']['_overlap'] == 0
+
+
+@pytest.mark.parametrize('query', ['', '  ', 'a', '!!'])
+def test_nothing_searchable(query):
+    assert search_pipeline(query) is None
+
+
+def test_truncation_is_reported_per_branch(monkeypatch):
+    monkeypatch.setattr(user_search_module, 'SEARCH_CANDIDATE_LIMIT', 10)
+    assert not search_truncated([{'_id': True, 'count': 10}, {'_id': False, 'count': 3}])
+    assert search_truncated([{'_id': True, 'count': 2}, {'_id': False, 'count': 11}])
+
+
+def test_backfill_updates_users_in_batches():
+    users = db_instance.get_collection('users')
+    users.insert_many([dict(JANE, email=f'user{i}@example.com') for i in range(5)])
+    users.update_one({'email': 'user0@example.com'}, {'$set': search_fields(JANE)})
+    progress = []
+
+    assert backfill(batch_size=2, missing_only=True, progress=progress.append) == 4
+    assert progress == [2, 4]
+    assert users.count_documents({'search_prefixes': 'user3'}) == 1
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    calls = []
+    user = dict(JANE, _id='u1', user_type='patient', score=1.23456)
+    monkeypatch.setattr(routes.admin.user_model, 'search_users',
+                        lambda *args: calls.append(args) or ([user], 1, False))
+    app.register_blueprint(routes.admin.admin_bp, url_prefix='/api/admin')
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+
+def test_search_route(client, auth_headers):
+    response = client.get('/api/admin/users/search?q=jane&type=patient&per_page=500', headers=auth_headers('admin'))
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['results'][0]['score'] == 1.235
+    assert (body['total'], body['truncated'], body['per_page']) == (1, False, 100)
+    assert client.calls == [('jane', 'patient', 1, 100)]
+
+
+@pytest.mark.parametrize('query', ['', 'q=jane&type=nurse', 'q=jane&page=two'])
+def test_search_route_rejects_bad_parameters(client, auth_headers, query):
+    assert client.get(f'/api/admin/users/search?{query}', headers=auth_headers('admin')).status_code == 400
+    assert client.calls == []
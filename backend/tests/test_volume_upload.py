@@ -0,0 +1,99 @@
+import io
+import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import numpy as np
+import pytest
+from PIL import Image
+import routes.ml
+
+
+def tiff_study(pages=4):
+    """A multi-page TIFF with a bright square on every page"""
+    frames = []
+    for page in range(pages):
+        gray = np.zeros((32, 32), dtype=np.uint8)
+        gray[8:24, 8:24] = 60 + 40 * page
+        frames.append(Image.fromarray(gray))
+    data = io.BytesIO()
+    frames[0].save(data, format='TIFF', save_all=True, append_images=frames[1:])
+    data.seek(0)
+    return data
+
+
+@pytest.fixture
+def client(ml_app):
+    return ml_app.test_client()
+
+
+@pytest.fixture
+def closed_volumes(monkeypatch):
+    """Volumes the route opened, recording whether each was closed"""
+    opened = []
+
+    def open_volume(paths):
+        volume = real_open_volume(paths)
+        real_close = volume.close
+        opened.append({'closed': False})
+
+        def close():
+            opened[-1]['closed'] = True
+            real_close()
+        volume.close = close
+        return volume
+
+    real_open_volume = routes.ml.open_volume
+    monkeypatch.setattr(routes.ml, 'open_volume', open_volume)
+    return opened
+
+
+def post_study(client, data=None, filename='study.tif'):
+    return client.post('/api/ml/predict/volume', data={'volume': (data or tiff_study(), filename)},
+                       content_type='multipart/form-data')
+
+
+def study_files():
+    studies = os.listdir(routes.ml.STUDY_FOLDER) if os.path.isdir(routes.ml.STUDY_FOLDER) else []
+    return studies, os.listdir(routes.ml.UPLOAD_FOLDER)
+
+
+def test_scored_study_keeps_its_files(client, closed_volumes):
+    response = post_study(client)
+    assert response.status_code == 200
+    study = response.json['data']['study']
+    assert study['format'] == 'tiff'
+    assert study['slices'] == 4
+    assert closed_volumes == [{'closed': True}]
+
+    studies, uploads = study_files()
+    assert len(studies) == 1
+    assert sorted(uploads) == sorted(os.path.basename(s['image_path']) for s in study['top_slices'])
+
+
+def test_failure_after_slices_are_saved_removes_everything(client, closed_volumes, monkeypatch):
+    def unavailable(data):
+        raise RuntimeError('database unavailable')
+    monkeypatch.setattr(routes.ml.prediction_model, 'create_prediction', unavailable)
+
+    response = post_study(client)
+    assert response.status_code == 500
+    assert study_files() == ([], [])
+    assert closed_volumes == [{'closed': True}]
+
+
+def test_timeout_removes_the_study(client, closed_volumes, monkeypatch):
+    def timed_out(*args, **kwargs):
+        raise FutureTimeoutError()
+    monkeypatch.setattr(routes.ml, 'score_volume', timed_out)
+
+    response = post_study(client)
+    assert response.status_code == 503
+    assert response.json['error'] == 'Prediction timed out'
+    assert study_files() == ([], [])
+    assert closed_volumes == [{'closed': True}]
+
+
+def test_unreadable_study_is_rejected_and_removed(client):
+    response = post_study(client, io.BytesIO(b'not a volume'), 'study.bin')
+    assert response.status_code == 400
+    assert 'Unsupported volume format' in response.json['error']
+    assert study_files() == ([], [])
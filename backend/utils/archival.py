@@ -0,0 +1,120 @@
+import os
+import time
+from datetime import datetime, timedelta
+from pymongo import ReplaceOne
+from utils.db import db_instance
+from models.appointment import HISTORY_COLLECTION
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+# Appointments in these states never change again
+TERMINAL_STATUSES = ['completed', 'cancelled', 'rejected']
+
+CHECKPOINT_ID = 'appointments'
+
+
+def include_history_requested(args):
+    """True when a request asks for archived appointments (?include_history=true)"""
+    return args.get('include_history', 'false').lower() in ['1', 'true', 'yes']
+
+
+def ensure_indexes():
+    """Index the archival scan on the active collection and the history lookups"""
+    try:
+        db_instance.get_collection('appointments').create_index([('status', 1), ('updated_at', 1)])
+        history = db_instance.get_collection(HISTORY_COLLECTION)
+        history.create_index([('patient_id', 1), ('appointment_date', 1)])
+        history.create_index([('doctor_id', 1), ('appointment_date', 1)])
+    except Exception as e:
+        print(f"Error creating archival indexes: {e}")
+
+
+class AppointmentArchiver:
+    """
+    Moves terminal-state appointments older than a cutoff from `appointments`
+    to `appointments_history`, one batch at a time in _id order.
+    Progress is checkpointed after every batch, so an interrupted run resumes
+    where it stopped (with the same cutoff) instead of starting over.
+    """
+
+    def __init__(self, after_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.active = db_instance.get_collection('appointments')
+        self.history = db_instance.get_collection(HISTORY_COLLECTION)
+        self.checkpoints = db_instance.get_collection('archival_checkpoints')
+
+    def _query(self, cutoff, last_id):
+        query = {'status': {'$in': TERMINAL_STATUSES}, 'updated_at': {'$lt': cutoff}}
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        return query
+
+    def status(self):
+        """The current checkpoint, or None if no run has started"""
+        return self.checkpoints.find_one({'_id': CHECKPOINT_ID})
+
+    def _start_or_resume(self):
+        checkpoint = self.status()
+        if checkpoint and not checkpoint.get('finished_at'):
+            return checkpoint
+        checkpoint = {
+            '_id': CHECKPOINT_ID,
+            'cutoff': datetime.utcnow() - timedelta(days=self.after_days),
+            'last_id': None,
+            'moved': 0,
+            'batches': 0,
+            'started_at': datetime.utcnow(),
+            'finished_at': None
+        }
+        self.checkpoints.replace_one({'_id': CHECKPOINT_ID}, checkpoint, upsert=True)
+        return checkpoint
+
+    def archive_batch(self, cutoff, last_id):
+        """Move one batch; returns (moved, last _id scanned) or (0, None) when done"""
+        batch = list(self.active.find(self._query(cutoff, last_id)).sort('_id', 1).limit(self.batch_size))
+        if not batch:
+            return 0, None
+
+        ids = [doc['_id'] for doc in batch]
+        archived_at = datetime.utcnow()
+        # Upserts make a retried batch (crash between copy and delete) harmless
+        self.history.bulk_write(
+            [ReplaceOne({'_id': doc['_id']}, dict(doc, archived_at=archived_at), upsert=True) for doc in batch],
+            ordered=False
+        )
+        # Delete only documents still matching the archival filter
+        result = self.active.delete_many({'_id': {'$in': ids}, **self._query(cutoff, None)})
+
+        if result.deleted_count < len(ids):
+            # Some changed after they were copied: keep them active and drop the stale copies
+            still_active = [doc['_id'] for doc in self.active.find({'_id': {'$in': ids}}, {'_id': 1})]
+            if still_active:
+                self.history.delete_many({'_id': {'$in': still_active}})
+        return result.deleted_count, ids[-1]
+
+    def run(self, max_batches=None, pause_seconds=0.0, progress=None):
+        """Archive until nothing is left (or max_batches); returns the checkpoint"""
+        checkpoint = self._start_or_resume()
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            moved, last_id = self.archive_batch(checkpoint['cutoff'], checkpoint['last_id'])
+            if last_id is None:
+                checkpoint['finished_at'] = datetime.utcnow()
+                self.checkpoints.update_one({'_id': CHECKPOINT_ID}, {'$set': {'finished_at': checkpoint['finished_at']}})
+                break
+
+            checkpoint['last_id'] = last_id
+            checkpoint['moved'] += moved
+            checkpoint['batches'] += 1
+            self.checkpoints.update_one({'_id': CHECKPOINT_ID}, {
+                '$set': {'last_id': last_id, 'updated_at': datetime.utcnow()},
+                '$inc': {'moved': moved, 'batches': 1}
+            })
+            batches += 1
+            if progress:
+                progress(checkpoint)
+            if pause_seconds:
+                # Leave room for foreground traffic between batches
+                time.sleep(pause_seconds)
+        return checkpoint
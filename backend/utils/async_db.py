@@ -0,0 +1,36 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class AsyncDatabase:
+    """asyncio counterpart of utils.db.Database, used by the ASGI routes"""
+
+    def __init__(self):
+        self.client = None
+        self.db = None
+        
+    def connect(self):
+        try:
+            mongo_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+            self.client = AsyncIOMotorClient(mongo_uri)
+            self.db = self.client['healthcare_system']
+            print("Connected to MongoDB (async) successfully!")
+            return True
+        except Exception as e:
+            print(f"Error connecting to MongoDB (async): {e}")
+            return False
+    
+    def get_collection(self, collection_name):
+        if self.db is None and not self.connect():
+            print("ERROR: Could not connect to MongoDB (async).")
+            return None
+        return self.db[collection_name]
+    
+    def close_connection(self):
+        if self.client:
+            self.client.close()
+
+# Global async database instance
+async_db_instance = AsyncDatabase()
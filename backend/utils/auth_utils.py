@@ -1,11 +1,13 @@
 import jwt
 import os
+import time
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify, current_app
 from models.user import User
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
+MEDIA_URL_TTL_SECONDS = int(os.getenv('MEDIA_URL_TTL_SECONDS', '900'))
 
 def generate_token(user_data):
     """Generate JWT token for user"""
@@ -22,29 +24,86 @@ def generate_token(user_data):
         print(f"Error generating token: {e}")
         return None
 
-def verify_token(token):
-    """Verify JWT token"""
+def _decode_token(token):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        return payload
+        return jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+def verify_token(token):
+    """Verify JWT token"""
+    payload = _decode_token(token)
+    # Scoped tokens only work for the one purpose they were issued for
+    if not payload or 'scope' in payload:
+        return None
+    return payload
+
+def generate_scoped_token(user, scope, ttl_seconds, expires_at=None):
+    """
+    Short-lived token valid for a single purpose, for URLs that cannot carry an
+    Authorization header and may end up in access logs
+    """
+    try:
+        payload = {
+            'user_id': user['user_id'],
+            'email': user['email'],
+            'user_type': user['user_type'],
+            'scope': scope,
+            'exp': expires_at or datetime.utcnow() + timedelta(seconds=ttl_seconds)
+        }
+        return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
+    except Exception as e:
+        print(f"Error generating scoped token: {e}")
+        return None
+
+def verify_scoped_token(token, scope):
+    """Payload of a token issued for this scope, else None"""
+    payload = _decode_token(token) if token else None
+    if not payload or payload.get('scope') != scope:
+        return None
+    return payload
+
+def sign_media_path(path, user):
+    """
+    path?sig=... for an <img src>, which cannot send headers: the signature is
+    a token valid only for this path. Expiry is rounded up to a whole
+    MEDIA_URL_TTL_SECONDS window (so it lasts one to two windows) and the URL
+    stays the same within a window, which keeps the browser cache useful.
+    """
+    window = max(MEDIA_URL_TTL_SECONDS, 1)
+    expires_at = datetime.utcfromtimestamp((int(time.time()) // window + 2) * window)
+    signature = generate_scoped_token(user, f"media:{path}", window, expires_at=expires_at)
+    return f"{path}?sig={signature}" if signature else path
+
+def bearer_token(authorization):
+    """Token from an Authorization header value (with or without the 'Bearer ' prefix), else None"""
+    token = authorization
+    if token and token.startswith('Bearer '):
+        token = token[7:]
+    return token or None
+
+def request_token():
+    """Token from the Authorization header of the current Flask request, else None"""
+    return bearer_token(request.headers.get('Authorization'))
+
+def get_optional_user():
+    """Return the token payload if a valid token was sent, else None"""
+    token = request_token()
+    if not token:
+        return None
+    return verify_token(token)
+
 def login_required(f):
     """Decorator to require login for protected routes"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
+        token = request_token()
         if not token:
             return jsonify({'error': 'No token provided'}), 401
         
         try:
-            # Remove 'Bearer ' prefix if present
-            if token.startswith('Bearer '):
-                token = token[7:]
-            
             payload = verify_token(token)
             if not payload:
                 return jsonify({'error': 'Invalid or expired token'}), 401
@@ -57,6 +116,27 @@ def login_required(f):
     
     return decorated
 
+def media_login_required(f):
+    """
+    login_required for media URLs used as <img src>, which cannot send headers:
+    without an Authorization header the URL must carry a ?sig= from
+    sign_media_path for this exact path
+    """
+    protected = login_required(f)
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        signature = request.args.get('sig')
+        if request_token() or not signature:
+            return protected(*args, **kwargs)
+        payload = verify_scoped_token(signature, f"media:{request.path}")
+        if not payload:
+            return jsonify({'error': 'Invalid or expired media URL'}), 401
+        request.user = payload
+        return f(*args, **kwargs)
+    
+    return decorated
+
 def admin_required(f):
     """Decorator to require admin privileges"""
     @wraps(f)
@@ -0,0 +1,66 @@
+import os
+from bson import ObjectId
+
+BULK_ACTION_MAX_ITEMS = int(os.getenv('BULK_ACTION_MAX_ITEMS', '500'))
+
+
+class BulkRequestError(ValueError):
+    """Malformed bulk request body"""
+
+
+def parse_bulk_actions(data, allowed_statuses=None):
+    """
+    Read a bulk request body, either
+        {'actions': [{'id': ..., 'status': ..., 'notes': ...}, ...]}
+    or the shorthand
+        {'ids': [...], 'status': ..., 'notes': ...}.
+    Returns (actions, invalid): valid actions and per-item error results,
+    each tagged with its position in the request.
+    """
+    if not isinstance(data, dict):
+        raise BulkRequestError('Request body must be a JSON object')
+
+    if 'actions' in data:
+        items = data['actions']
+    elif 'ids' in data:
+        items = data['ids'] if isinstance(data['ids'], list) else None
+        if items is not None:
+            items = [{'id': item_id, 'status': data.get('status'), 'notes': data.get('notes', '')} for item_id in items]
+    else:
+        raise BulkRequestError('actions or ids is required')
+
+    if not isinstance(items, list) or not items:
+        raise BulkRequestError('At least one item is required')
+    if len(items) > BULK_ACTION_MAX_ITEMS:
+        raise BulkRequestError(f'At most {BULK_ACTION_MAX_ITEMS} items per request')
+
+    actions, invalid, seen = [], [], set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            item = {'id': item}
+        item_id = str(item.get('id', ''))
+        status = item.get('status')
+        result = {'index': index, 'id': item_id}
+
+        if not ObjectId.is_valid(item_id):
+            result['error'] = 'Invalid id'
+        elif item_id in seen:
+            result['error'] = 'Duplicate id'
+        elif allowed_statuses is not None and status not in allowed_statuses:
+            result['error'] = f"status must be one of: {', '.join(allowed_statuses)}"
+
+        if 'error' in result:
+            result['updated'] = False
+            invalid.append(result)
+            continue
+        seen.add(item_id)
+        actions.append({'index': index, 'id': item_id, 'status': status, 'notes': item.get('notes', '')})
+    return actions, invalid
+
+
+def bulk_response(actions, invalid, results):
+    """Per-item results in request order, with totals"""
+    merged = invalid + [dict(result, index=action['index']) for action, result in zip(actions, results)]
+    merged.sort(key=lambda result: result['index'])
+    updated = sum(1 for result in merged if result.get('updated'))
+    return {'results': merged, 'updated': updated, 'failed': len(merged) - updated}
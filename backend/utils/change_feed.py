@@ -0,0 +1,243 @@
+import asyncio
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from pymongo.errors import OperationFailure, PyMongoError
+from utils.db import db_instance
+
+# Collections whose changes are pushed to clients, and the event type for each
+WATCHED = {'appointments': 'appointment', 'predictions': 'prediction'}
+
+# Fields sent with each event; clients refetch or patch what they display
+EVENT_FIELDS = {
+    'appointments': ['patient_id', 'doctor_id', 'status', 'priority', 'appointment_date', 'time_slot', 'updated_at'],
+    'predictions': ['patient_id', 'doctor_id', 'appointment_id', 'prediction', 'confidence',
+                    'priority', 'reviewed_by_doctor', 'updated_at']
+}
+
+CHANGE_FEED_MODE = os.getenv('CHANGE_FEED_MODE', 'auto')  # auto, change_stream, poll
+POLL_SECONDS = float(os.getenv('CHANGE_FEED_POLL_SECONDS', '2'))
+# Polling re-reads this far back so writes that commit out of order are not missed
+POLL_LOOKBACK_SECONDS = float(os.getenv('CHANGE_FEED_POLL_LOOKBACK_SECONDS', '5'))
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv('CHANGE_FEED_QUEUE_SIZE', '1000'))
+
+# Raised by watch() on a standalone mongod (change streams need a replica set)
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+
+def ensure_indexes():
+    """updated_at indexes used by the polling tailer"""
+    try:
+        for name in WATCHED:
+            db_instance.get_collection(name).create_index('updated_at')
+    except Exception as e:
+        print(f"Error creating change feed indexes: {e}")
+
+
+class Subscriber:
+    """One connected client and the events waiting to be sent to it"""
+
+    def __init__(self, user):
+        self.user = user
+        self.events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when the client fell too far behind and must refetch
+        self.overflowed = False
+
+    def deliver(self, event):
+        """Queue an event (called from the reader thread)"""
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def wants(self, event):
+        user_type = self.user.get('user_type')
+        if user_type == 'admin':
+            return True
+        if user_type == 'doctor':
+            return event.get('doctor_id') == self.user.get('user_id')
+        return event.get('patient_id') == self.user.get('user_id')
+
+
+class AsyncSubscriber(Subscriber):
+    """
+    Subscriber read by a coroutine in ASGI mode: events are handed over to
+    its event loop, so an open stream holds no thread while it waits
+    """
+
+    def __init__(self, user, loop):
+        super().__init__(user)
+        self.loop = loop
+        self.events = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The event loop has shut down
+            self.overflowed = True
+
+    def _put(self, event):
+        try:
+            self.events.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+def _event(collection, operation, doc):
+    event = {'type': WATCHED[collection], 'operation': operation, 'id': str(doc['_id'])}
+    for field in EVENT_FIELDS[collection]:
+        value = doc.get(field)
+        event[field] = str(value) if field.endswith('_id') and value is not None else value
+    return event
+
+
+class ChangeFeed:
+    """
+    Fans out appointment and prediction changes to subscribed clients.
+    Each process runs one reader thread while it has subscribers: a change
+    stream on replica sets, or a tailer polling updated_at on a standalone
+    mongod. Events are routed by role and ownership.
+    """
+
+    def __init__(self, mode=CHANGE_FEED_MODE):
+        self.mode = mode
+        self.source = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        # Process the running reader belongs to, or None when it has stopped
+        self._reader_pid = None
+        self._ids = itertools.count(1)
+
+    def _ensure_reader(self):
+        # Called with the lock held. Threads do not survive fork, so a reader
+        # inherited from the parent process does not count
+        if self._reader_pid == os.getpid():
+            return
+        self._reader_pid = os.getpid()
+        threading.Thread(target=self._run, name='change-feed', daemon=True).start()
+
+    def _stop_if_idle(self):
+        """True (and the reader marked stopped) once the last subscriber has left"""
+        with self._lock:
+            if self._subscribers:
+                return False
+            self._reader_pid = None
+            return True
+
+    def subscribe(self, user, loop=None):
+        """Register a client; pass the running event loop when a coroutine reads its events"""
+        subscriber = AsyncSubscriber(user, loop) if loop else Subscriber(user)
+        with self._lock:
+            self._ensure_reader()
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event):
+        """Deliver an event to every subscriber allowed to see it"""
+        event['event_id'] = next(self._ids)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.overflowed or not subscriber.wants(event):
+                continue
+            subscriber.deliver(event)
+
+    def _run(self):
+        backoff = 1
+        while True:
+            try:
+                if self.mode == 'poll':
+                    self._poll()
+                else:
+                    self._watch()
+                # The readers only return once nobody is subscribed
+                return
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED and self.mode == 'auto':
+                    print("Change streams unavailable (standalone mongod), falling back to polling")
+                    self.mode = 'poll'
+                    continue
+                print(f"Change feed error: {e}")
+            except Exception as e:
+                print(f"Change feed error: {e}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+            if self._stop_if_idle():
+                return
+
+    def _watch(self):
+        self.source = 'change_stream'
+        pipeline = [{'$match': {
+            'ns.coll': {'$in': list(WATCHED)},
+            'operationType': {'$in': ['insert', 'update', 'replace']}
+        }}]
+        resume_token = None
+        while True:
+            try:
+                with db_instance.db.watch(pipeline, full_document='updateLookup', resume_after=resume_token,
+                                          max_await_time_ms=int(POLL_SECONDS * 1000)) as stream:
+                    while stream.alive:
+                        if self._stop_if_idle():
+                            return
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        resume_token = stream.resume_token
+                        doc = change.get('fullDocument')
+                        if doc:
+                            operation = 'insert' if change['operationType'] == 'insert' else 'update'
+                            self.publish(_event(change['ns']['coll'], operation, doc))
+            except OperationFailure:
+                raise
+            except PyMongoError as e:
+                # Transient errors: resume from the last delivered change
+                print(f"Change stream interrupted, resuming: {e}")
+                time.sleep(1)
+
+    def _poll(self):
+        self.source = 'poll'
+        collections = {name: db_instance.get_collection(name) for name in WATCHED}
+        projection = {field: 1 for fields in EVENT_FIELDS.values() for field in fields}
+        projection['created_at'] = 1
+        since = datetime.utcnow()
+        # (collection, _id, updated_at) already published, to skip lookback repeats
+        seen, seen_order = set(), deque()
+        while True:
+            time.sleep(POLL_SECONDS)
+            if self._stop_if_idle():
+                return
+            now = datetime.utcnow()
+            window_start = since - timedelta(seconds=POLL_LOOKBACK_SECONDS)
+            for name, collection in collections.items():
+                for doc in collection.find({'updated_at': {'$gt': window_start}}, projection).sort('updated_at', 1):
+                    key = (name, doc['_id'], doc.get('updated_at'))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    seen_order.append((key, now))
+                    created_at, updated_at = doc.get('created_at'), doc.get('updated_at')
+                    # Both timestamps are set (separately) on insert
+                    fresh = created_at and updated_at and abs((updated_at - created_at).total_seconds()) < 1
+                    operation = 'insert' if fresh else 'update'
+                    self.publish(_event(name, operation, doc))
+            since = now
+            # Forget keys that have left the lookback window
+            cutoff = now - timedelta(seconds=POLL_LOOKBACK_SECONDS + POLL_SECONDS)
+            while seen_order and seen_order[0][1] < cutoff:
+                seen.discard(seen_order.popleft()[0])
+
+
+# Global change feed instance
+change_feed = ChangeFeed()
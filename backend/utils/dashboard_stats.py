@@ -0,0 +1,75 @@
+from datetime import datetime
+
+# Dashboard summaries shared by the Flask routes and the async (ASGI) routes
+
+
+def count_by_status(appointments, status):
+    return len([apt for apt in appointments if apt['status'] == status])
+
+
+def admin_dashboard_stats(all_doctors, patient_count, total_appointments, pending_appointments, prediction_stats):
+    """Admin dashboard payload"""
+    approved_doctors = [doc for doc in all_doctors if doc.get('approved_by_admin', False)]
+    return {
+        'doctors': {
+            'total': len(all_doctors),
+            'approved': len(approved_doctors),
+            'pending': len(all_doctors) - len(approved_doctors)
+        },
+        'patients': {
+            'total': patient_count
+        },
+        'appointments': {
+            'total': total_appointments,
+            'pending': pending_appointments
+        },
+        'predictions': prediction_stats
+    }
+
+
+def doctor_dashboard_stats(appointments, prediction_counts, review_queue_size):
+    """Doctor dashboard payload; prediction_counts come from the doctor review counts pipeline"""
+    return {
+        'appointments': {
+            'total': len(appointments),
+            'pending': count_by_status(appointments, 'pending'),
+            'approved': count_by_status(appointments, 'approved'),
+            'completed': count_by_status(appointments, 'completed')
+        },
+        'predictions': {
+            'total': prediction_counts['total'],
+            'pending_review': prediction_counts['pending_review'],
+            'reviewed': prediction_counts['reviewed']
+        },
+        'review_queue': {
+            'available': review_queue_size,
+            'claimed': prediction_counts['claimed']
+        }
+    }
+
+
+def patient_dashboard_stats(appointments, predictions):
+    """Patient dashboard payload"""
+    recent_predictions = sorted(predictions, key=lambda x: x['created_at'], reverse=True)[:5]
+
+    # Get next appointment
+    upcoming_appointments = [
+        apt for apt in appointments
+        if apt['status'] in ['pending', 'approved'] and
+        datetime.strptime(apt['appointment_date'], '%Y-%m-%d') >= datetime.now()
+    ]
+    next_appointment = upcoming_appointments[0] if upcoming_appointments else None
+
+    return {
+        'appointments': {
+            'total': len(appointments),
+            'pending': count_by_status(appointments, 'pending'),
+            'approved': count_by_status(appointments, 'approved'),
+            'completed': count_by_status(appointments, 'completed'),
+            'next_appointment': next_appointment
+        },
+        'predictions': {
+            'total': len(predictions),
+            'recent': recent_predictions
+        }
+    }
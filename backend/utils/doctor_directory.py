@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+import time
+from pymongo import ReturnDocument
+from utils.db import db_instance
+from models.user import User
+from models.schedule import ScheduleTemplate
+
+# How long (seconds) a worker trusts its last read of the version counter
+VERSION_CHECK_SECONDS = float(os.getenv('DOCTOR_DIRECTORY_VERSION_CHECK_SECONDS', '1'))
+
+COUNTER_ID = 'doctor_directory'
+
+
+class DirectoryEntry:
+    """One serialized snapshot of the approved-doctor list"""
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = f"doctors-v{version}"
+
+
+class DoctorDirectory:
+    """
+    In-process cache of the approved-doctor directory.
+    A version counter in Mongo is bumped on every admin write that changes
+    the directory; workers rebuild their copy only when it moves.
+    """
+
+    def __init__(self):
+        self.counters = db_instance.get_collection('counters')
+        self.user_model = User()
+        self._entry = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current_version(self):
+        """Read the shared version counter"""
+        counter = self.counters.find_one({'_id': COUNTER_ID})
+        return counter['version'] if counter else 0
+
+    def invalidate(self):
+        """Bump the shared version so every worker rebuilds its copy"""
+        try:
+            counter = self.counters.find_one_and_update(
+                {'_id': COUNTER_ID},
+                {'$inc': {'version': 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            with self._lock:
+                self._entry = None
+            return counter['version']
+        except Exception as e:
+            print(f"Error invalidating doctor directory: {e}")
+            return None
+
+    def _build(self, version):
+        doctors_data = []
+        for doctor in self.user_model.get_approved_doctors():
+            doctors_data.append({
+                'id': str(doctor['_id']),
+                'first_name': doctor['first_name'],
+                'last_name': doctor['last_name'],
+                'specialization': doctor.get('specialization', ''),
+                'experience_years': doctor.get('experience_years', 0),
+                'available_time_slots': ScheduleTemplate.from_doctor(doctor).weekly_slots()
+            })
+        body = json.dumps({'doctors': doctors_data}).encode('utf-8')
+        return DirectoryEntry(version, body)
+
+    def get(self):
+        """Return the current DirectoryEntry, rebuilding it only if the version moved"""
+        entry = self._entry
+        now = time.monotonic()
+        if entry and now - self._checked_at < VERSION_CHECK_SECONDS:
+            return entry
+
+        version = self.current_version()
+        self._checked_at = now
+        if entry and entry.version == version:
+            return entry
+
+        with self._lock:
+            entry = self._entry
+            if entry and entry.version == version:
+                return entry
+            entry = self._build(version)
+            self._entry = entry
+            return entry
+
+
+# Global directory instance
+doctor_directory = DoctorDirectory()
@@ -0,0 +1,263 @@
+import fcntl
+import json
+import os
+import threading
+import numpy as np
+from bson import ObjectId
+
+# Penultimate-layer embeddings of scored images, one store per model version
+# (embeddings of different models are not comparable):
+#
+#   <EMBEDDING_DIR>/<version>/vectors.f16   rows of L2-normalized float16 vectors
+#   <EMBEDDING_DIR>/<version>/ids.bin       12-byte prediction ObjectId per row
+#   <EMBEDDING_DIR>/<version>/meta.json     vector dimension
+#   <EMBEDDING_DIR>/<version>/ivf.npz       optional IVF index over the first rows
+#
+# Files are append-only and shared by all worker processes; appends are
+# serialized with a lock file and readers memory-map the rows written so far.
+
+EMBEDDING_DIR = os.getenv('EMBEDDING_DIR', 'embeddings')
+# Rows converted to float32 per step of an exact scan
+EXACT_CHUNK_ROWS = int(os.getenv('EMBEDDING_EXACT_CHUNK_ROWS', '65536'))
+# Lists probed per IVF query
+IVF_NPROBE = int(os.getenv('EMBEDDING_IVF_NPROBE', '16'))
+# Stores smaller than this are always scanned exactly
+IVF_MIN_ROWS = int(os.getenv('EMBEDDING_IVF_MIN_ROWS', '50000'))
+SEARCH_MODES = ['auto', 'exact', 'ivf']
+
+ID_BYTES = 12
+VECTOR_DTYPE = np.float16
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, rows, k):
+    """(rows, scores) of the k highest scores, best first"""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        scores, rows = scores[best], rows[best]
+    order = np.argsort(-scores, kind='stable')
+    return rows[order], scores[order]
+
+
+class EmbeddingStore:
+    """Append-only float16 embedding file for one model version, with exact and IVF search"""
+
+    def __init__(self, version, root=EMBEDDING_DIR):
+        self.version = version
+        self.path = os.path.join(root, version)
+        self.vectors_path = os.path.join(self.path, 'vectors.f16')
+        self.ids_path = os.path.join(self.path, 'ids.bin')
+        self.meta_path = os.path.join(self.path, 'meta.json')
+        self.ivf_path = os.path.join(self.path, 'ivf.npz')
+        self.dim = self._read_dim()
+        self._lock = threading.Lock()
+        self._mapped = (0, None)
+        self._ivf = (None, None)
+
+    def _read_dim(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)['dim']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _row_bytes(self):
+        return self.dim * np.dtype(VECTOR_DTYPE).itemsize
+
+    def count(self):
+        """Rows fully written to both files"""
+        if not self.dim:
+            return 0
+        try:
+            return min(os.path.getsize(self.vectors_path) // self._row_bytes(),
+                       os.path.getsize(self.ids_path) // ID_BYTES)
+        except OSError:
+            return 0
+
+    # Writing
+
+    def append(self, prediction_ids, vectors):
+        """Append embeddings for prediction ids; returns the first row number"""
+        vectors = normalize(np.atleast_2d(vectors)).astype(VECTOR_DTYPE)
+        id_bytes = b''.join(ObjectId(pid).binary for pid in prediction_ids)
+        if len(vectors) != len(prediction_ids):
+            raise ValueError("One vector per prediction id is required")
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self.dim is None:
+                self.dim = self._read_dim()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, 'w') as f:
+                    json.dump({'dim': self.dim, 'dtype': 'float16', 'normalized': True}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding has dimension {vectors.shape[1]}, store {self.version} expects {self.dim}")
+
+            row = self.count()
+            with open(self.vectors_path, 'ab') as vectors_file, open(self.ids_path, 'ab') as ids_file:
+                # Drop a partial row left by an interrupted append
+                vectors_file.truncate(row * self._row_bytes())
+                ids_file.truncate(row * ID_BYTES)
+                vectors_file.write(vectors.tobytes())
+                ids_file.write(id_bytes)
+        return row
+
+    # Reading
+
+    def vectors(self):
+        """Memory-mapped (rows, dim) float16 array of everything written so far"""
+        rows = self.count()
+        mapped_rows, mapped = self._mapped
+        if rows != mapped_rows or mapped is None:
+            mapped = np.memmap(self.vectors_path, dtype=VECTOR_DTYPE, mode='r', shape=(rows, self.dim)) if rows else None
+            self._mapped = (rows, mapped)
+        return mapped
+
+    def vector(self, row):
+        vectors = self.vectors()
+        if vectors is None or not 0 <= row < len(vectors):
+            return None
+        return np.asarray(vectors[row], dtype=np.float32)
+
+    def prediction_ids(self, rows):
+        with open(self.ids_path, 'rb') as f:
+            ids = []
+            for row in rows:
+                f.seek(int(row) * ID_BYTES)
+                ids.append(ObjectId(f.read(ID_BYTES)))
+        return ids
+
+    # Search
+
+    def _scan(self, vectors, query, rows=None, start=0):
+        """Scores of query against vectors (all, or the given row numbers), in float32 chunks"""
+        if rows is not None:
+            return np.asarray(vectors[rows], dtype=np.float32) @ query
+        scores = np.empty(len(vectors) - start, dtype=np.float32)
+        buffer = np.empty((min(EXACT_CHUNK_ROWS, len(scores)), self.dim), dtype=np.float32)
+        for offset in range(start, len(vectors), EXACT_CHUNK_ROWS):
+            chunk = vectors[offset:offset + EXACT_CHUNK_ROWS]
+            block = buffer[:len(chunk)]
+            block[...] = chunk
+            np.dot(block, query, out=scores[offset - start:offset - start + len(chunk)])
+        return scores
+
+    def search_exact(self, query, k):
+        vectors = self.vectors()
+        if vectors is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self._scan(vectors, normalize(query))
+        return _top_k(scores, np.arange(len(scores)), k)
+
+    def load_ivf(self):
+        """The IVF index (reloaded when the file changes), or None"""
+        try:
+            mtime = os.path.getmtime(self.ivf_path)
+        except OSError:
+            return None
+        cached_mtime, index = self._ivf
+        if cached_mtime != mtime:
+            with self._lock:
+                with np.load(self.ivf_path) as data:
+                    index = {name: data[name] for name in data.files}
+                self._ivf = (mtime, index)
+        return index
+
+    def search_ivf(self, query, k, nprobe=IVF_NPROBE):
+        """Approximate top-k: scan the nprobe closest lists plus rows added since the index was built"""
+        index = self.load_ivf()
+        if index is None:
+            return self.search_exact(query, k)
+        vectors = self.vectors()
+        query = normalize(query)
+
+        centroids, order, offsets = index['centroids'], index['order'], index['offsets']
+        probe = np.argpartition(-(centroids @ query), min(nprobe, len(centroids)) - 1)[:nprobe]
+        rows = np.sort(np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probe]))
+        scores = self._scan(vectors, query, rows)
+
+        indexed = int(index['rows'])
+        if len(vectors) > indexed:
+            scores = np.concatenate([scores, self._scan(vectors, query, start=indexed)])
+            rows = np.concatenate([rows, np.arange(indexed, len(vectors))])
+        return _top_k(scores, rows, k)
+
+    def search(self, query, k=10, mode='auto', nprobe=IVF_NPROBE):
+        """Top-k (row, score) pairs by cosine similarity"""
+        if mode == 'ivf' or (mode == 'auto' and self.count() >= IVF_MIN_ROWS):
+            return self.search_ivf(query, k, nprobe)
+        return self.search_exact(query, k)
+
+    # Index building
+
+    def build_ivf(self, nlist=None, sample_size=100000, iterations=10, seed=0):
+        """
+        Cluster the stored vectors (spherical k-means on a sample) and write
+        an IVF index: centroids plus row numbers grouped by nearest centroid.
+        """
+        vectors = self.vectors()
+        if vectors is None:
+            raise ValueError(f"No embeddings stored for model version {self.version}")
+        rows = len(vectors)
+        nlist = nlist or max(1, int(np.sqrt(rows)))
+        rng = np.random.default_rng(seed)
+
+        sample = np.asarray(vectors[np.sort(rng.choice(rows, min(sample_size, rows), replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), min(nlist, len(sample)), replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=len(centroids)) == 0
+            # Re-seed empty lists with random sample points
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize(sums)
+
+        assignment = np.empty(rows, dtype=np.int32)
+        for start in range(0, rows, EXACT_CHUNK_ROWS):
+            chunk = np.asarray(vectors[start:start + EXACT_CHUNK_ROWS], dtype=np.float32)
+            assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+
+        order = np.argsort(assignment, kind='stable').astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))])
+
+        tmp_path = f"{self.ivf_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, centroids=centroids.astype(np.float32), order=order, offsets=offsets, rows=rows)
+        os.replace(tmp_path, self.ivf_path)
+        return {'rows': rows, 'nlist': len(centroids)}
+
+    def status(self):
+        index = self.load_ivf()
+        return {
+            'version': self.version,
+            'rows': self.count(),
+            'dim': self.dim,
+            'ivf_rows': int(index['rows']) if index else None,
+            'ivf_lists': len(index['centroids']) if index else None
+        }
+
+
+class EmbeddingStores:
+    """One EmbeddingStore per model version, opened on first use"""
+
+    def __init__(self, root=EMBEDDING_DIR):
+        self.root = root
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def get(self, version):
+        with self._lock:
+            if version not in self._stores:
+                self._stores[version] = EmbeddingStore(version, self.root)
+            return self._stores[version]
+
+
+# Global embedding stores
+embedding_stores = EmbeddingStores()
@@ -0,0 +1,220 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta
+from bson import ObjectId
+from utils.db import db_instance
+from models.appointment import match_with_history
+from utils.streaming import ChunkSink, gzip_chunks
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+MAX_EXPORT_BATCH_SIZE = 10000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+# Exported columns per dataset as (field, type); '_id' is exported as 'id'.
+# Only these fields are projected, so large or sensitive fields
+# (password hashes, medical history) never leave the database.
+DATASETS = {
+    'appointments': {
+        'collection': 'appointments',
+        # Archived rows are only exported with include_history
+        'has_history': True,
+        'query': {},
+        # appointment_date is stored as a YYYY-MM-DD string
+        'date_field': 'appointment_date',
+        'date_is_string': True,
+        'statuses': {s: {'status': s} for s in ['pending', 'approved', 'rejected', 'completed', 'cancelled']},
+        'fields': [
+            ('_id', 'string'), ('patient_id', 'string'), ('doctor_id', 'string'),
+            ('appointment_date', 'string'), ('time_slot', 'string'), ('status', 'string'),
+            ('priority', 'string'), ('reason', 'string'), ('symptoms', 'string'),
+            ('notes', 'string'), ('created_at', 'timestamp'), ('updated_at', 'timestamp')
+        ]
+    },
+    'patients': {
+        'collection': 'users',
+        'query': {'user_type': 'patient'},
+        'date_field': 'created_at',
+        'date_is_string': False,
+        'statuses': {'active': {'is_active': True}, 'inactive': {'is_active': False}},
+        'fields': [
+            ('_id', 'string'), ('email', 'string'), ('first_name', 'string'),
+            ('last_name', 'string'), ('phone', 'string'), ('date_of_birth', 'string'),
+            ('gender', 'string'), ('is_active', 'bool'), ('created_at', 'timestamp')
+        ]
+    },
+    'predictions': {
+        'collection': 'predictions',
+        'query': {},
+        'date_field': 'created_at',
+        'date_is_string': False,
+        'statuses': {'reviewed': {'reviewed_by_doctor': True}, 'pending': {'reviewed_by_doctor': False}},
+        'fields': [
+            ('_id', 'string'), ('patient_id', 'string'), ('doctor_id', 'string'),
+            ('appointment_id', 'string'), ('prediction', 'string'), ('confidence', 'float'),
+            ('region', 'string'), ('model_version', 'string'), ('priority', 'string'),
+            ('reviewed_by_doctor', 'bool'), ('final_diagnosis', 'string'),
+            ('created_at', 'timestamp'), ('updated_at', 'timestamp')
+        ]
+    }
+}
+
+
+class ExportError(ValueError):
+    """Invalid export parameters"""
+
+
+def _column_name(field):
+    return 'id' if field == '_id' else field
+
+
+def _parse_day(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ExportError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def build_query(dataset, date_from=None, date_to=None, status=None):
+    """Mongo filter for a dataset, an inclusive date range and a status"""
+    spec = DATASETS[dataset]
+    query = dict(spec['query'])
+
+    if status:
+        if status not in spec['statuses']:
+            raise ExportError(f"status must be one of: {', '.join(spec['statuses'])}")
+        query.update(spec['statuses'][status])
+
+    date_range = {}
+    if date_from:
+        start = _parse_day(date_from, 'from')
+        date_range['$gte'] = date_from if spec['date_is_string'] else start
+    if date_to:
+        end = _parse_day(date_to, 'to')
+        if spec['date_is_string']:
+            date_range['$lte'] = date_to
+        else:
+            date_range['$lt'] = end + timedelta(days=1)
+    if date_range:
+        query[spec['date_field']] = date_range
+
+    return query
+
+
+def open_cursor(dataset, query, batch_size=EXPORT_BATCH_SIZE, include_history=False):
+    """
+    Cursor over the exported fields only, fetched batch_size documents at a time.
+    With include_history, archived appointments follow the active ones.
+    """
+    spec = DATASETS[dataset]
+    collection = db_instance.get_collection(spec['collection'])
+    projection = {field: 1 for field, _ in spec['fields']}
+    if include_history and spec.get('has_history'):
+        # Not re-sorted by _id: that would be a blocking sort over the whole export
+        pipeline = match_with_history(query, include_history=True) + [{'$project': projection}]
+        return collection.aggregate(pipeline, batchSize=batch_size)
+    return collection.find(query, projection, batch_size=batch_size).sort('_id', 1)
+
+
+def _export_value(value, kind):
+    if value is None:
+        return None
+    if isinstance(value, ObjectId):
+        return str(value)
+    if kind == 'timestamp':
+        return value if isinstance(value, datetime) else None
+    if kind == 'float':
+        return float(value)
+    if kind == 'bool':
+        return bool(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _rows(cursor, fields, batch_size):
+    """Group cursor documents into lists of typed rows"""
+    batch = []
+    for doc in cursor:
+        batch.append([_export_value(doc.get(field), kind) for field, kind in fields])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _text_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _csv_chunks(batches, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([_column_name(field) for field, _ in fields])
+    for batch in batches:
+        writer.writerows([_text_value(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _ndjson_chunks(batches, fields):
+    columns = [_column_name(field) for field, _ in fields]
+    for batch in batches:
+        lines = [
+            json.dumps(dict(zip(columns, [_text_value(value) for value in row])))
+            for row in batch
+        ]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _parquet_chunks(batches, fields):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {'string': pa.string(), 'float': pa.float64(), 'bool': pa.bool_(), 'timestamp': pa.timestamp('ms')}
+    schema = pa.schema([(_column_name(field), types[kind]) for field, kind in fields])
+    sink = ChunkSink()
+    # Every batch becomes one row group, written out before the next is read
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def export_chunks(dataset, fmt, cursor, batch_size=EXPORT_BATCH_SIZE, compress=False):
+    """Byte chunks of a dataset export, holding at most one batch in memory"""
+    fields = DATASETS[dataset]['fields']
+    writers = {'csv': _csv_chunks, 'ndjson': _ndjson_chunks, 'parquet': _parquet_chunks}
+    try:
+        chunks = writers[fmt](_rows(cursor, fields, batch_size), fields)
+        if compress:
+            chunks = gzip_chunks(chunks)
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+    finally:
+        cursor.close()
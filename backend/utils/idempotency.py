@@ -0,0 +1,193 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, jsonify, make_response, current_app
+from bson import Binary
+from pymongo.errors import DuplicateKeyError
+from utils.db import db_instance
+from utils.auth_utils import get_optional_user
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# How long a stored response can be replayed
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+
+# How long a duplicate waits for the original request to finish
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '60'))
+
+POLL_INTERVAL = 0.1
+
+
+class IdempotencyStore:
+    """TTL-indexed store of idempotency key -> recorded response"""
+
+    def __init__(self):
+        self.collection = db_instance.get_collection('idempotency_keys')
+        # Requests in this process that currently own a key
+        self.local_events = {}
+        self.lock = threading.Lock()
+
+    def ensure_indexes(self):
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def acquire(self, key, fingerprint):
+        """
+        Claim a key. Returns None if the caller now owns it, otherwise the
+        existing record (completed, or in progress by another request).
+        """
+        now = datetime.utcnow()
+        try:
+            self.collection.insert_one({
+                '_id': key,
+                'fingerprint': fingerprint,
+                'status': 'in_progress',
+                'locked_until': now + timedelta(seconds=IDEMPOTENCY_WAIT_SECONDS),
+                'created_at': now,
+                'expires_at': now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+            })
+        except DuplicateKeyError:
+            # Take over keys whose owner died without finishing, but only for the
+            # same request; a mismatched retry must not extend someone else's lock
+            record = self.collection.find_one_and_update(
+                {'_id': key, 'fingerprint': fingerprint, 'status': 'in_progress',
+                 'locked_until': {'$lt': now}},
+                {'$set': {'locked_until': now + timedelta(seconds=IDEMPOTENCY_WAIT_SECONDS)}}
+            )
+            if record:
+                self._register_local(key)
+                return None
+            # The owner may have released the key in the meantime; claim it again
+            return self.collection.find_one({'_id': key}) or self.acquire(key, fingerprint)
+
+        self._register_local(key)
+        return None
+
+    def _register_local(self, key):
+        with self.lock:
+            self.local_events[key] = threading.Event()
+
+    def _finish_local(self, key):
+        with self.lock:
+            event = self.local_events.pop(key, None)
+        if event:
+            event.set()
+
+    def complete(self, key, status_code, body, content_type):
+        """Record the response for a key owned by the caller"""
+        self.collection.update_one({'_id': key}, {'$set': {
+            'status': 'completed',
+            'response': {
+                'status_code': status_code,
+                'body': Binary(body),
+                'content_type': content_type
+            }
+        }})
+        self._finish_local(key)
+
+    def release(self, key):
+        """Forget a key whose request failed so it can be retried"""
+        self.collection.delete_one({'_id': key, 'status': 'in_progress'})
+        self._finish_local(key)
+
+    def wait(self, key):
+        """Wait for another request holding the key; return its record"""
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+
+        with self.lock:
+            event = self.local_events.get(key)
+        if event:
+            # Same process: block on the owner instead of polling the database
+            event.wait(IDEMPOTENCY_WAIT_SECONDS)
+
+        while True:
+            record = self.collection.find_one({'_id': key})
+            if not record or record['status'] == 'completed' or time.monotonic() >= deadline:
+                return record
+            time.sleep(POLL_INTERVAL)
+
+
+idempotency_store = IdempotencyStore()
+
+
+def ensure_indexes():
+    """Create the TTL index for stored responses"""
+    try:
+        idempotency_store.ensure_indexes()
+    except Exception as e:
+        print(f"Error creating idempotency indexes: {e}")
+
+
+def request_fingerprint():
+    """Hash of the request so a key cannot be reused for a different payload"""
+    digest = hashlib.sha256(f"{request.method} {request.path}".encode('utf-8'))
+
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f"{name}={value}".encode('utf-8'))
+        for name, file in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            digest.update(f"{name}:{file.filename}".encode('utf-8'))
+            for chunk in iter(lambda: file.stream.read(1024 * 1024), b''):
+                digest.update(chunk)
+            file.stream.seek(0)
+    else:
+        digest.update(request.get_data(cache=True))
+
+    return digest.hexdigest()
+
+
+def _replay(record):
+    stored = record['response']
+    response = current_app.response_class(
+        bytes(stored['body']),
+        status=stored['status_code'],
+        content_type=stored['content_type']
+    )
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(f):
+    """
+    Decorator honouring the Idempotency-Key header.
+    The first request with a key runs normally and its response is stored;
+    retries replay it, and concurrent duplicates wait for the first one.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        client_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not client_key:
+            return f(*args, **kwargs)
+        if len(client_key) > 255:
+            return jsonify({'error': f'{IDEMPOTENCY_HEADER} is too long'}), 400
+
+        user = getattr(request, 'user', None) or get_optional_user()
+        scope = f"user:{user['user_id']}" if user else f"ip:{request.remote_addr}"
+        key = f"{scope}:{request.endpoint}:{client_key}"
+        fingerprint = request_fingerprint()
+
+        record = idempotency_store.acquire(key, fingerprint)
+        if record is not None:
+            if record['fingerprint'] != fingerprint:
+                return jsonify({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'}), 422
+            if record['status'] != 'completed':
+                record = idempotency_store.wait(key)
+            if record and record['status'] == 'completed':
+                return _replay(record)
+            return jsonify({'error': 'A request with this idempotency key is still in progress'}), 409
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            idempotency_store.release(key)
+            raise
+
+        # Throttling and server errors are not recorded so the client can retry them
+        if response.status_code == 429 or response.status_code >= 500 or response.is_streamed:
+            idempotency_store.release(key)
+        else:
+            idempotency_store.complete(key, response.status_code, response.get_data(), response.content_type)
+        return response
+    return decorated
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from models.appointment import PRIORITY_ORDER
+
+# Highest priority first: the appointment priorities
+PRIORITIES = PRIORITY_ORDER
+
+
+def _env_per_priority(prefix, defaults):
+    return {p: float(os.getenv(f'{prefix}_{p.upper()}', defaults[p])) for p in PRIORITIES}
+
+
+# Latency objectives (ms, queue wait + inference) per class
+SLO_MS = _env_per_priority('INFERENCE_SLO_MS', {'emergency': 2000, 'urgent': 5000, 'normal': 30000})
+
+# Total queue depth at which new work of a class is shed (0 = never shed)
+SHED_DEPTH = _env_per_priority('INFERENCE_SHED_DEPTH', {'emergency': 0, 'urgent': 64, 'normal': 16})
+
+# Seconds a queued item may wait before it is served ahead of higher classes
+AGING_SECONDS = _env_per_priority('INFERENCE_AGING_SECONDS', {'emergency': 0, 'urgent': 10, 'normal': 20})
+
+WORKERS = int(os.getenv('ML_INFERENCE_WORKERS', '1'))
+LATENCY_SAMPLES = 500
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when low-priority work is shed under overload"""
+
+    def __init__(self, priority, depth, retry_after):
+        super().__init__(f"Inference queue is overloaded ({depth} queued), {priority} work is being shed")
+        self.priority = priority
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class _Job:
+    __slots__ = ('func', 'args', 'priority', 'enqueued_at', 'future')
+
+    def __init__(self, func, args, priority):
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.future = Future()
+
+
+class _ClassStats:
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = 0
+        self.promoted = 0
+        self.slo_violations = 0
+        self.latencies_ms = deque(maxlen=LATENCY_SAMPLES)
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class InferenceScheduler:
+    """
+    Multi-level priority queue in front of the model.
+    Workers always serve the highest non-empty class, except that an item
+    waiting longer than its class' aging limit is served first (starvation
+    protection). Under overload, new low-priority work is rejected.
+    """
+
+    def __init__(self, workers=WORKERS, slo_ms=SLO_MS, shed_depth=SHED_DEPTH, aging_seconds=AGING_SECONDS):
+        self.workers = workers
+        self.slo_ms = slo_ms
+        self.shed_depth = shed_depth
+        self.aging_seconds = aging_seconds
+        self._queues = {p: deque() for p in PRIORITIES}
+        self._stats = {p: _ClassStats() for p in PRIORITIES}
+        self._cond = threading.Condition()
+        self._pid = None
+
+    def _ensure_workers(self):
+        # Threads do not survive fork, so start them lazily in each process
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        for i in range(self.workers):
+            threading.Thread(target=self._worker_loop, name=f"inference-worker-{i}", daemon=True).start()
+
+    def depth(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def submit(self, func, *args, priority='normal'):
+        """Queue func(*args) at the given priority and return a Future"""
+        if priority not in self._queues:
+            priority = 'normal'
+
+        with self._cond:
+            self._ensure_workers()
+            depth = self.depth()
+            limit = self.shed_depth[priority]
+            if limit and depth >= limit:
+                self._stats[priority].shed += 1
+                retry_after = max(1, int(self.slo_ms[priority] / 1000))
+                raise SchedulerOverloaded(priority, depth, retry_after)
+
+            job = _Job(func, args, priority)
+            self._queues[priority].append(job)
+            self._stats[priority].submitted += 1
+            self._cond.notify()
+        return job.future
+
+    def _next_job(self):
+        now = time.monotonic()
+
+        # Starvation protection: the longest-overdue head item goes first
+        overdue = None
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            aging = self.aging_seconds[priority]
+            if queue and aging:
+                overdue_by = now - queue[0].enqueued_at - aging
+                if overdue_by > 0 and (overdue is None or overdue_by > overdue[0]):
+                    overdue = (overdue_by, priority)
+        if overdue:
+            self._stats[overdue[1]].promoted += 1
+            return self._queues[overdue[1]].popleft()
+
+        for priority in PRIORITIES:
+            if self._queues[priority]:
+                return self._queues[priority].popleft()
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = job.func(*job.args)
+            except BaseException as e:
+                job.future.set_exception(e)
+                failed = True
+            else:
+                job.future.set_result(result)
+                failed = False
+
+            latency_ms = (time.monotonic() - job.enqueued_at) * 1000
+            with self._cond:
+                stats = self._stats[job.priority]
+                if failed:
+                    stats.failed += 1
+                else:
+                    stats.completed += 1
+                stats.latencies_ms.append(latency_ms)
+                if latency_ms > self.slo_ms[job.priority]:
+                    stats.slo_violations += 1
+
+    def metrics(self):
+        """Per-priority queue depth, throughput, shedding and latency against SLO"""
+        with self._cond:
+            classes = {}
+            for priority in PRIORITIES:
+                stats = self._stats[priority]
+                latencies = list(stats.latencies_ms)
+                classes[priority] = {
+                    'queue_depth': len(self._queues[priority]),
+                    'submitted': stats.submitted,
+                    'completed': stats.completed,
+                    'failed': stats.failed,
+                    'shed': stats.shed,
+                    'promoted': stats.promoted,
+                    'slo_ms': self.slo_ms[priority],
+                    'slo_violations': stats.slo_violations,
+                    'latency_p50_ms': _percentile(latencies, 50),
+                    'latency_p95_ms': _percentile(latencies, 95)
+                }
+            return {
+                'workers': self.workers,
+                'queue_depth': self.depth(),
+                'classes': classes
+            }
+
+
+# Global scheduler instance
+inference_scheduler = InferenceScheduler()
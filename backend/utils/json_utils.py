@@ -0,0 +1,27 @@
+from datetime import date
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+
+def json_default(o):
+    """Serialize MongoDB values the same way for Flask and ASGI responses"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, bytes):
+        # Never serialize raw bytes such as password hashes
+        return None
+    if isinstance(o, date):
+        return http_date(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """JSON provider that understands the values stored in MongoDB documents"""
+
+    @staticmethod
+    def default(o):
+        try:
+            return json_default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
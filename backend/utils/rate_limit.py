@@ -0,0 +1,247 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, jsonify
+from pymongo import ReturnDocument
+from utils.db import db_instance
+from utils.auth_utils import get_optional_user
+from utils.inference_scheduler import PRIORITIES, SHED_DEPTH, WORKERS
+
+# 'memory' (per process) or 'mongo' (shared by every worker process)
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+
+# Per-route limits as "<burst capacity>/<seconds to refill it>"
+DEFAULT_LIMITS = {
+    'predict': '10/60',
+    'login': '5/60'
+}
+
+# Maximum number of inferences in flight per priority (0 = uncapped): per
+# worker process with the memory backend, across all workers with the mongo
+# backend. Emergencies are never capped; by default the other classes admit
+# the scheduler's shedding depth plus the running inferences, so within a
+# worker the scheduler sheds low-priority work before this cap turns it away.
+INFLIGHT_LIMITS = {
+    p: int(os.getenv(f'ML_MAX_INFLIGHT_{p.upper()}', int(SHED_DEPTH[p]) + WORKERS if SHED_DEPTH[p] else 0))
+    for p in PRIORITIES
+}
+
+# A shared in-flight slot held longer than this (its worker died) is reclaimed
+INFLIGHT_LEASE_SECONDS = int(os.getenv('ML_INFLIGHT_LEASE_SECONDS', '600'))
+
+TRUST_PROXY = os.getenv('TRUST_PROXY', 'false').lower() == 'true'
+
+
+def get_limit(name):
+    """Return (capacity, refill rate per second) for a named route limit"""
+    spec = os.getenv(f'RATE_LIMIT_{name.upper()}', DEFAULT_LIMITS.get(name, '60/60'))
+    capacity, period = spec.split('/')
+    capacity = float(capacity)
+    return capacity, capacity / float(period)
+
+
+class MemoryBucketStore:
+    """Token buckets kept in this process"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.last_prune = time.monotonic()
+
+    def _prune(self, now):
+        # Drop buckets idle long enough to be full again
+        if now - self.last_prune < 60:
+            return
+        self.last_prune = now
+        for key, (_, updated, idle_ttl) in list(self.buckets.items()):
+            if now - updated > idle_ttl:
+                del self.buckets[key]
+
+    def consume(self, key, capacity, rate):
+        """Take one token; return (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        with self.lock:
+            self._prune(now)
+            tokens, updated, _ = self.buckets.get(key, (capacity, now, 0))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, capacity / rate)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class MongoBucketStore:
+    """Token buckets in MongoDB, updated atomically so all workers share them"""
+
+    def __init__(self):
+        self.collection = db_instance.get_collection('rate_limits')
+
+    def ensure_indexes(self):
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def consume(self, key, capacity, rate):
+        """Take one token; return (allowed, seconds until a token is available)"""
+        now = time.time()
+        expires_at = datetime.utcnow() + timedelta(seconds=capacity / rate)
+        refilled = {'$min': [capacity, {'$add': [
+            {'$ifNull': ['$tokens', capacity]},
+            {'$multiply': [{'$subtract': [now, {'$ifNull': ['$updated', now]}]}, rate]}
+        ]}]}
+        pipeline = [
+            {'$set': {'tokens': refilled, 'updated': now, 'expires_at': expires_at}},
+            {'$set': {'allowed': {'$gte': ['$tokens', 1]}}},
+            {'$set': {'tokens': {'$cond': ['$allowed', {'$subtract': ['$tokens', 1]}, '$tokens']}}}
+        ]
+        bucket = self.collection.find_one_and_update(
+            {'_id': key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        if bucket['allowed']:
+            return True, 0
+        return False, (1 - bucket['tokens']) / rate
+
+
+bucket_store = MongoBucketStore() if RATE_LIMIT_BACKEND == 'mongo' else MemoryBucketStore()
+
+
+def ensure_indexes():
+    """Create the TTL index used by the shared backend"""
+    try:
+        if isinstance(bucket_store, MongoBucketStore):
+            bucket_store.ensure_indexes()
+    except Exception as e:
+        print(f"Error creating rate limit indexes: {e}")
+
+
+def client_key():
+    """Rate limit key: the authenticated user id, else the client IP"""
+    user = get_optional_user()
+    if user:
+        return f"user:{user['user_id']}"
+    if TRUST_PROXY and request.headers.get('X-Forwarded-For'):
+        return f"ip:{request.headers['X-Forwarded-For'].split(',')[0].strip()}"
+    return f"ip:{request.remote_addr}"
+
+
+def rate_limit(name):
+    """Decorator applying the named token-bucket limit per user or IP"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                return f(*args, **kwargs)
+
+            capacity, rate = get_limit(name)
+            try:
+                allowed, retry_after = bucket_store.consume(f"{name}:{client_key()}", capacity, rate)
+            except Exception as e:
+                # Fail open: an unavailable limiter must not take the API down
+                print(f"Rate limiter error: {e}")
+                allowed, retry_after = True, 0
+
+            if not allowed:
+                response = jsonify({'error': 'Too many requests, please try again later'})
+                response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+                return response, 429
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+class MemoryInflightLimiter:
+    """In-flight caps enforced within this process"""
+
+    def __init__(self, limits):
+        self.semaphores = {priority: threading.BoundedSemaphore(limit) for priority, limit in limits.items() if limit}
+
+    def acquire(self, priority):
+        """Take a slot without blocking; return a token, or None when all are busy"""
+        return priority if self.semaphores[priority].acquire(blocking=False) else None
+
+    def release(self, token):
+        self.semaphores[token].release()
+
+
+class MongoInflightLimiter:
+    """In-flight caps shared by every worker: one leased document per slot"""
+
+    def __init__(self, limits):
+        self.collection = db_instance.get_collection('inflight_slots')
+        self.slot_ids = {priority: [f'inference:{priority}:{i}' for i in range(limit)]
+                         for priority, limit in limits.items() if limit}
+        # Priorities whose slot documents this process has created
+        self._ensured = set()
+
+    def ensure_slots(self, priority):
+        for slot_id in self.slot_ids[priority]:
+            self.collection.update_one(
+                {'_id': slot_id},
+                {'$setOnInsert': {'lease_until': datetime.min, 'holder': None}},
+                upsert=True
+            )
+
+    def acquire(self, priority):
+        """Lease a free (or abandoned) slot; return its token, or None when all are busy"""
+        # Created on first use rather than at startup, which may run while the database is down
+        if priority not in self._ensured:
+            self.ensure_slots(priority)
+            self._ensured.add(priority)
+
+        now = datetime.utcnow()
+        holder = uuid.uuid4().hex
+        slot = self.collection.find_one_and_update(
+            {'_id': {'$in': self.slot_ids[priority]}, 'lease_until': {'$lt': now}},
+            {'$set': {'holder': holder,
+                      'lease_until': now + timedelta(seconds=INFLIGHT_LEASE_SECONDS)}},
+            projection={'_id': 1}
+        )
+        return (slot['_id'], holder) if slot else None
+
+    def release(self, token):
+        slot_id, holder = token
+        # Only the current holder frees the slot; a reclaimed lease is left alone
+        self.collection.update_one(
+            {'_id': slot_id, 'holder': holder},
+            {'$set': {'lease_until': datetime.min, 'holder': None}}
+        )
+
+
+inflight_inferences = (
+    MongoInflightLimiter(INFLIGHT_LIMITS) if RATE_LIMIT_BACKEND == 'mongo'
+    else MemoryInflightLimiter(INFLIGHT_LIMITS)
+)
+
+
+def acquire_inflight_slot(priority):
+    """
+    Take an in-flight inference slot for a priority, once the upload has been
+    read and its priority resolved. Returns (token, None), or (None, 503
+    response) when that priority's slots are all busy. Release the token with
+    release_inflight_slot; uncapped priorities get a None token.
+    """
+    if not INFLIGHT_LIMITS.get(priority):
+        return None, None
+    try:
+        token = inflight_inferences.acquire(priority)
+    except Exception as e:
+        # Fail open like the rate limiter; the scheduler still sheds overload
+        print(f"In-flight limiter error: {e}")
+        return None, None
+
+    if token is None:
+        response = jsonify({'success': False, 'error': 'Server is busy, please try again shortly'})
+        response.headers['Retry-After'] = '1'
+        return None, (response, 503)
+    return token, None
+
+
+def release_inflight_slot(token):
+    if token is None:
+        return
+    try:
+        inflight_inferences.release(token)
+    except Exception as e:
+        print(f"In-flight limiter error: {e}")
@@ -0,0 +1,208 @@
+import glob
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from collections import deque
+from utils.single_flight import SingleFlight
+
+REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR', 'reports_cache')
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+
+# Renders in flight at once while building a bulk archive
+REPORT_BULK_WINDOW = int(os.getenv('REPORT_BULK_WINDOW', str(max(1, REPORT_WORKERS) * 4)))
+
+
+def _name(user):
+    if not user:
+        return ''
+    return f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
+
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M UTC') if isinstance(value, datetime) else str(value or '')
+
+
+def _profile_stamp(user):
+    """Milliseconds of the user's last profile update, 0 if never updated"""
+    updated_at = (user or {}).get('updated_at')
+    return int(updated_at.timestamp() * 1000) if isinstance(updated_at, datetime) else 0
+
+
+def report_context(prediction, patient=None, doctor=None):
+    """Plain values a report is rendered from"""
+    confidence = prediction.get('confidence')
+    return {
+        'prediction_id': str(prediction['_id']),
+        'review_version': prediction.get('review_version', 0),
+        # Names and contact details come from the profiles, so their edits invalidate the PDF too
+        'profile_version': f"{_profile_stamp(patient)}-{_profile_stamp(doctor)}",
+        'patient_name': _name(patient),
+        'patient_email': (patient or {}).get('email', ''),
+        'date_of_birth': str((patient or {}).get('date_of_birth') or ''),
+        'doctor_name': _name(doctor),
+        'prediction': prediction.get('prediction', ''),
+        'confidence': f"{confidence:.2f}%" if isinstance(confidence, (int, float)) else '',
+        'region': prediction.get('region') or '',
+        'model_version': prediction.get('model_version') or '',
+        'created_at': _format_time(prediction.get('created_at')),
+        'reviewed': bool(prediction.get('reviewed_by_doctor')),
+        'final_diagnosis': prediction.get('final_diagnosis') or '',
+        'doctor_notes': prediction.get('doctor_notes') or '',
+        'reviewed_at': _format_time(prediction.get('reviewed_at')),
+        'image_path': prediction.get('image_path') or ''
+    }
+
+
+def render_report_pdf(context, path):
+    """Render one prediction report to path (runs on a report worker thread)"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    width, height = A4
+    pdf = canvas.Canvas(tmp_path, pagesize=A4)
+    pdf.setTitle(f"MRI Tumor Detection Report {context['prediction_id']}")
+
+    y = height - 25 * mm
+    pdf.setFont('Helvetica-Bold', 16)
+    pdf.drawString(20 * mm, y, 'MRI Tumor Detection Report')
+    y -= 12 * mm
+
+    sections = [
+        ('Patient', [
+            ('Name', context['patient_name']),
+            ('Email', context['patient_email']),
+            ('Date of birth', context['date_of_birth'])
+        ]),
+        ('Analysis', [
+            ('Prediction', context['prediction']),
+            ('Confidence', context['confidence']),
+            ('Region', context['region']),
+            ('Model version', context['model_version']),
+            ('Analyzed at', context['created_at'])
+        ]),
+        ('Doctor review', [
+            ('Doctor', context['doctor_name']),
+            ('Status', 'Reviewed' if context['reviewed'] else 'Pending review'),
+            ('Final diagnosis', context['final_diagnosis']),
+            ('Notes', context['doctor_notes']),
+            ('Reviewed at', context['reviewed_at'] if context['reviewed'] else '')
+        ])
+    ]
+    for title, rows in sections:
+        pdf.setFont('Helvetica-Bold', 12)
+        pdf.drawString(20 * mm, y, title)
+        y -= 7 * mm
+        pdf.setFont('Helvetica', 11)
+        for label, value in rows:
+            pdf.drawString(25 * mm, y, f"{label}:")
+            pdf.drawString(65 * mm, y, str(value)[:90])
+            y -= 6 * mm
+        y -= 4 * mm
+
+    if context['image_path'] and os.path.exists(context['image_path']):
+        image_height = min(100 * mm, y - 20 * mm)
+        if image_height > 20 * mm:
+            pdf.drawImage(ImageReader(context['image_path']), 20 * mm, y - image_height,
+                          width=width - 40 * mm, height=image_height, preserveAspectRatio=True, anchor='nw')
+
+    pdf.setFont('Helvetica-Oblique', 8)
+    pdf.drawString(20 * mm, 12 * mm, f"Report {context['prediction_id']} (review v{context['review_version']}) "
+                                     f"generated {_format_time(datetime.utcnow())}")
+    pdf.save()
+    os.replace(tmp_path, path)
+    return path
+
+
+class ReportRenderer:
+    """
+    Renders prediction reports on a thread pool and caches the PDFs on disk.
+    The cache key is (prediction id, review version, patient and doctor profile
+    update times), so a report is rendered once per review or profile edit and
+    older versions are removed when a new one is written.
+    """
+
+    def __init__(self, cache_dir=REPORT_CACHE_DIR, workers=REPORT_WORKERS):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def _pool(self):
+        # Pool threads do not survive fork, so each process starts its own lazily.
+        # Threads, not processes: a spawned renderer would re-import the app and load the model
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='report-renderer'
+                ) if self.workers else None
+            return self._executor
+
+    def cache_path(self, context):
+        return os.path.join(
+            self.cache_dir,
+            f"{context['prediction_id']}-v{context['review_version']}-{context['profile_version']}.pdf"
+        )
+
+    def _remove_stale(self, prediction_id, keep):
+        for path in glob.glob(os.path.join(self.cache_dir, f"{prediction_id}-v*.pdf")):
+            if path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _render(self, context, path):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        pool = self._pool()
+        if pool is None:
+            render_report_pdf(context, path)
+        else:
+            pool.submit(render_report_pdf, context, path).result()
+        self._remove_stale(context['prediction_id'], path)
+        return path
+
+    def get(self, context):
+        """Path of the cached PDF for a report context, rendering it if needed"""
+        path = self.cache_path(context)
+        if os.path.exists(path):
+            return path
+        # Concurrent requests for the same report share one render
+        result, _ = self._flight.do(path, lambda: self._render(context, path))
+        return result
+
+    def render_many(self, contexts, window=REPORT_BULK_WINDOW):
+        """
+        Yield (context, path) in input order, rendering missing reports in
+        parallel with at most `window` renders outstanding.
+        """
+        pool = self._pool()
+        pending = deque()
+        for context in contexts:
+            path = self.cache_path(context)
+            if os.path.exists(path) or pool is None:
+                future = None
+            else:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                future = pool.submit(render_report_pdf, context, path)
+            pending.append((context, path, future))
+            while len(pending) > window or (pending and pending[0][2] is None):
+                yield self._collect(*pending.popleft())
+        while pending:
+            yield self._collect(*pending.popleft())
+
+    def _collect(self, context, path, future):
+        if future is not None:
+            future.result()
+            self._remove_stale(context['prediction_id'], path)
+            return context, path
+        return context, self.get(context)
+
+
+report_renderer = ReportRenderer()
@@ -0,0 +1,315 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+from pymongo import UpdateOne
+from utils.db import db_instance
+from models.ml_backends import load_image_array, IMAGE_EXTENSIONS
+from models.model_registry import ModelRegistry, LoadedModel, REGISTRY_DIR
+from models.model_config import MODEL_PATH, TFLITE_MODEL_PATH, ML_BACKEND, CLASS_LABELS, REGIONS, IMAGE_SIZE
+
+RESCORE_BATCH_SIZE = int(os.getenv('RESCORE_BATCH_SIZE', '64'))
+RESCORE_WORKERS = int(os.getenv('RESCORE_WORKERS', str(os.cpu_count() or 1)))
+RESCORE_DECODE_THREADS = int(os.getenv('RESCORE_DECODE_THREADS', '4'))
+UPLOAD_FOLDER = 'uploads/mri_images'
+SOURCES = ['predictions', 'files']
+
+SCORES_COLLECTION = 'prediction_scores'
+CHECKPOINTS_COLLECTION = 'rescoring_checkpoints'
+
+
+def model_registry():
+    return ModelRegistry(
+        REGISTRY_DIR,
+        legacy_model_path=MODEL_PATH,
+        legacy_labels=CLASS_LABELS,
+        legacy_regions=REGIONS,
+        input_size=IMAGE_SIZE,
+        preferred_backend=ML_BACKEND,
+        legacy_tflite_path=TFLITE_MODEL_PATH
+    )
+
+
+def ensure_indexes():
+    try:
+        scores = db_instance.get_collection(SCORES_COLLECTION)
+        scores.create_index([('image_path', 1), ('model_version', 1)], unique=True)
+        scores.create_index([('prediction_id', 1), ('model_version', 1)])
+        db_instance.get_collection('predictions').create_index('image_path')
+    except Exception as e:
+        print(f"Error creating rescoring indexes: {e}")
+
+
+# Inference worker processes: each loads the model once
+
+_worker_model = None
+
+
+def _init_worker(version):
+    global _worker_model
+    _worker_model = model_registry().load_version(version)
+
+
+def _score_batch(images):
+    """Class probabilities for a stacked batch, run in a worker process"""
+    return _worker_model.backend.predict_batch(images)
+
+
+def _decode(path, image_size):
+    try:
+        return load_image_array(path, image_size)
+    except Exception as e:
+        print(f"Error decoding {path}: {e}")
+        return None
+
+
+def _path_key(path):
+    """Checkpoint key of a file: its path components, compared as a list"""
+    return path.split(os.sep)
+
+
+def _walk_images(folder, after=None):
+    """
+    Image paths under folder in _path_key order, skipping those up to 'after'.
+    Files and subdirectories are visited together by name (os.walk would list
+    a directory's files before its subdirectories, which is not key order).
+    """
+    try:
+        entries = sorted(os.scandir(folder), key=lambda entry: entry.name)
+    except OSError as e:
+        print(f"Error listing {folder}: {e}")
+        return
+    for entry in entries:
+        key = _path_key(entry.path)
+        if entry.is_dir():
+            # Skip subtrees that sort entirely before the checkpoint
+            if after is None or key >= after[:len(key)]:
+                yield from _walk_images(entry.path, after)
+        elif entry.name.lower().endswith(IMAGE_EXTENSIONS) and (after is None or key > after):
+            yield entry.path
+
+
+class Rescorer:
+    """
+    Re-scores historical scans with one model version.
+
+    Image paths stream from stored predictions (in _id order) or from the
+    upload folder (in sorted order). Each batch is decoded on a thread pool,
+    scored on a process pool and upserted into prediction_scores keyed by
+    (image_path, model_version). Batches complete in order and the checkpoint
+    advances after each write, so a killed run resumes after the last batch
+    it wrote; re-written batches are harmless upserts.
+    """
+
+    def __init__(self, version, source='predictions', baseline=None, batch_size=RESCORE_BATCH_SIZE,
+                 workers=RESCORE_WORKERS, decode_threads=RESCORE_DECODE_THREADS, folder=UPLOAD_FOLDER):
+        if source not in SOURCES:
+            raise ValueError(f"source must be one of: {', '.join(SOURCES)}")
+        self.registry = model_registry()
+        self.metadata = self.registry.read_metadata(version)
+        if not self.metadata:
+            raise ValueError(f"Unknown model version {version}")
+        self.version = version
+        self.source = source
+        # Version to compare against; None compares with each prediction as originally stored
+        self.baseline = baseline
+        self.batch_size = batch_size
+        self.workers = workers
+        self.decode_threads = decode_threads
+        self.folder = folder
+        self.checkpoint_id = f"{version}:{source}"
+        self.predictions = db_instance.get_collection('predictions')
+        self.scores = db_instance.get_collection(SCORES_COLLECTION)
+        self.checkpoints = db_instance.get_collection(CHECKPOINTS_COLLECTION)
+
+    # Checkpoints
+
+    def status(self):
+        return self.checkpoints.find_one({'_id': self.checkpoint_id})
+
+    def _start_or_resume(self, restart=False):
+        checkpoint = self.status()
+        if checkpoint and not checkpoint.get('finished_at') and not restart:
+            return checkpoint
+        checkpoint = {
+            '_id': self.checkpoint_id,
+            'model_version': self.version,
+            'source': self.source,
+            'baseline': self.baseline,
+            'last_key': None,
+            'processed': 0,
+            'failed': 0,
+            'compared': 0,
+            'agreed': 0,
+            'confidence_delta_sum': 0.0,
+            'changes': {},
+            'seconds': 0.0,
+            'started_at': datetime.utcnow(),
+            'finished_at': None
+        }
+        self.checkpoints.replace_one({'_id': self.checkpoint_id}, checkpoint, upsert=True)
+        return checkpoint
+
+    # Streaming work items: {'key', 'image_path', 'prediction_id', 'baseline'}
+
+    def _baselines(self, items):
+        """Attach the result each image is compared against"""
+        paths = [item['image_path'] for item in items]
+        if self.source == 'files':
+            found = self.predictions.find({'image_path': {'$in': paths}}, {'image_path': 1, 'prediction': 1, 'confidence': 1})
+            originals = {doc['image_path']: doc for doc in found}
+            for item in items:
+                original = originals.get(item['image_path'])
+                item['baseline'] = original
+                item['prediction_id'] = original['_id'] if original else None
+        if self.baseline:
+            found = self.scores.find(
+                {'image_path': {'$in': paths}, 'model_version': self.baseline},
+                {'image_path': 1, 'prediction': 1, 'confidence': 1}
+            )
+            baselines = {doc['image_path']: doc for doc in found}
+            for item in items:
+                item['baseline'] = baselines.get(item['image_path'])
+        return items
+
+    def _prediction_batches(self, last_key):
+        query = {'image_path': {'$exists': True}}
+        while True:
+            batch_query = dict(query, _id={'$gt': last_key}) if last_key is not None else query
+            docs = list(self.predictions.find(
+                batch_query, {'image_path': 1, 'prediction': 1, 'confidence': 1}
+            ).sort('_id', 1).limit(self.batch_size))
+            if not docs:
+                return
+            last_key = docs[-1]['_id']
+            yield self._baselines([{
+                'key': doc['_id'], 'image_path': doc['image_path'], 'prediction_id': doc['_id'], 'baseline': doc
+            } for doc in docs])
+
+    def _file_batches(self, last_key):
+        batch = []
+        for path in _walk_images(self.folder, last_key):
+            batch.append({'key': _path_key(path), 'image_path': path, 'prediction_id': None, 'baseline': None})
+            if len(batch) >= self.batch_size:
+                yield self._baselines(batch)
+                batch = []
+        if batch:
+            yield self._baselines(batch)
+
+    def batches(self, last_key):
+        if self.source == 'predictions':
+            return self._prediction_batches(last_key)
+        return self._file_batches(last_key)
+
+    # Scoring
+
+    def _write(self, items, decoded, probabilities, model):
+        """Upsert one batch's results; returns the checkpoint increments"""
+        stats = {'processed': len(items), 'failed': 0, 'compared': 0, 'agreed': 0, 'confidence_delta_sum': 0.0}
+        changes = {}
+        scored_at = datetime.utcnow()
+        operations = []
+        rows = iter(probabilities)
+        for item, image in zip(items, decoded):
+            if image is None:
+                stats['failed'] += 1
+                continue
+            result = model.format_prediction(next(rows))
+            operations.append(UpdateOne(
+                {'image_path': item['image_path'], 'model_version': self.version},
+                {'$set': dict(result, prediction_id=item['prediction_id'], scored_at=scored_at)},
+                upsert=True
+            ))
+            baseline = item.get('baseline')
+            if baseline and baseline.get('prediction'):
+                stats['compared'] += 1
+                if baseline['prediction'] == result['prediction']:
+                    stats['agreed'] += 1
+                else:
+                    change = f"{baseline['prediction']}->{result['prediction']}"
+                    changes[change] = changes.get(change, 0) + 1
+                stats['confidence_delta_sum'] += abs(result['confidence'] - (baseline.get('confidence') or 0))
+        if operations:
+            self.scores.bulk_write(operations, ordered=False)
+        return stats, changes
+
+    def run(self, max_batches=None, restart=False, progress=None):
+        """Score until the source is exhausted (or max_batches); returns (checkpoint, report)"""
+        checkpoint = self._start_or_resume(restart)
+        # Formats results in this process; the backend lives in the workers
+        formatter = LoadedModel(self.version, self.metadata, backend=None)
+        image_size = self.metadata.get('input_size', IMAGE_SIZE)
+        in_flight = self.workers * 2
+        started = time.monotonic()
+        batches, run_processed, last_elapsed = 0, 0, 0.0
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.version,),
+                                 mp_context=multiprocessing.get_context('spawn')) as scorers, \
+                ThreadPoolExecutor(max_workers=self.decode_threads) as decoders:
+            pending = deque()
+            source = self.batches(checkpoint['last_key'])
+            exhausted = False
+            while True:
+                # Keep decoding and scoring ahead of the writes
+                while not exhausted and len(pending) < in_flight and (max_batches is None or batches + len(pending) < max_batches):
+                    items = next(source, None)
+                    if items is None:
+                        exhausted = True
+                        break
+                    decoded = list(decoders.map(lambda item: _decode(item['image_path'], image_size), items))
+                    images = [image for image in decoded if image is not None]
+                    future = scorers.submit(_score_batch, np.stack(images)) if images else None
+                    pending.append((items, decoded, future))
+                if not pending:
+                    break
+
+                items, decoded, future = pending.popleft()
+                probabilities = future.result() if future else []
+                stats, changes = self._write(items, decoded, probabilities, formatter)
+                elapsed = time.monotonic() - started
+                stats['seconds'] = elapsed - last_elapsed
+                increments = dict(stats, **{f"changes.{change}": count for change, count in changes.items()})
+                self.checkpoints.update_one({'_id': self.checkpoint_id}, {
+                    '$set': {'last_key': items[-1]['key'], 'updated_at': datetime.utcnow()},
+                    '$inc': increments
+                })
+                checkpoint['last_key'] = items[-1]['key']
+                for field, value in stats.items():
+                    checkpoint[field] += value
+                for change, count in changes.items():
+                    checkpoint['changes'][change] = checkpoint['changes'].get(change, 0) + count
+                batches += 1
+                run_processed += stats['processed']
+                last_elapsed = elapsed
+                if progress:
+                    progress(self.report(checkpoint, run_processed, elapsed))
+
+            if exhausted and not pending:
+                checkpoint['finished_at'] = datetime.utcnow()
+                self.checkpoints.update_one({'_id': self.checkpoint_id}, {'$set': {'finished_at': checkpoint['finished_at']}})
+        return checkpoint, self.report(checkpoint, run_processed, time.monotonic() - started)
+
+    @staticmethod
+    def report(checkpoint, run_images=None, run_seconds=None):
+        """Throughput and agreement summary for a checkpoint"""
+        compared = checkpoint.get('compared', 0)
+        seconds = checkpoint.get('seconds', 0.0)
+        report = {
+            'model_version': checkpoint.get('model_version'),
+            'source': checkpoint.get('source'),
+            'baseline': checkpoint.get('baseline') or 'stored predictions',
+            'processed': checkpoint.get('processed', 0),
+            'failed': checkpoint.get('failed', 0),
+            'images_per_second': round(checkpoint.get('processed', 0) / seconds, 1) if seconds else None,
+            'compared': compared,
+            'agreement': round(checkpoint.get('agreed', 0) / compared, 4) if compared else None,
+            'mean_confidence_delta': round(checkpoint.get('confidence_delta_sum', 0.0) / compared, 2) if compared else None,
+            'changes': dict(sorted(checkpoint.get('changes', {}).items(), key=lambda item: -item[1])),
+            'finished': bool(checkpoint.get('finished_at'))
+        }
+        if run_seconds:
+            report['run_images_per_second'] = round(run_images / run_seconds, 1)
+        return report
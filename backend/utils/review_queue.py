@@ -0,0 +1,110 @@
+import os
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from utils.db import db_instance
+from models.appointment import PRIORITY_ORDER
+
+# Review work queue over the predictions collection.
+#
+# Unreviewed predictions that are not assigned through an appointment carry a
+# claim_expires_at: they can be claimed once it has passed (immediately for
+# new ones). A doctor claims the most urgent, oldest claimable prediction in
+# one find-and-modify, which assigns it to them (doctor_id) and sets a lease;
+# a lease that expires without a review puts the prediction back in the queue
+# for anyone, and reviewing it takes it out for good.
+#
+# A doctor holds a claim until they review or release it, or until another
+# doctor claims it after the lease expired. Held claims are counted per doctor
+# in review_claim_counters, and a claim first takes a slot there with a $inc
+# conditional on the count being under REVIEW_MAX_CLAIMS, so concurrent
+# claims cannot exceed the cap.
+
+REVIEW_LEASE_MINUTES = float(os.getenv('REVIEW_LEASE_MINUTES', '15'))
+# Claims a doctor may hold at once
+REVIEW_MAX_CLAIMS = int(os.getenv('REVIEW_MAX_CLAIMS', '3'))
+BACKFILL_BATCH_SIZE = 1000
+
+CLAIM_COUNTERS = 'review_claim_counters'
+QUEUE_INDEX = 'review_queue'
+QUEUE_SORT = [('priority_rank', 1), ('created_at', 1)]
+
+
+def priority_rank(priority):
+    """Sort key of a priority: 0 is the most urgent"""
+    return PRIORITY_ORDER.index(priority) if priority in PRIORITY_ORDER else len(PRIORITY_ORDER)
+
+
+def queue_fields(prediction):
+    """Queue fields for a new prediction; only unassigned ones enter the queue"""
+    fields = {'priority_rank': priority_rank(prediction.get('priority'))}
+    if not prediction.get('doctor_id') and not prediction.get('reviewed_by_doctor'):
+        fields['claim_expires_at'] = prediction['created_at']
+    return fields
+
+
+def claimable_query(now=None):
+    return {'reviewed_by_doctor': False, 'claim_expires_at': {'$lte': now or datetime.utcnow()}}
+
+
+def held_claims_query(doctor_id):
+    """Claims a doctor still holds, including lapsed ones nobody else has claimed yet"""
+    return {'doctor_id': doctor_id, 'reviewed_by_doctor': False, 'claim_expires_at': {'$exists': True}}
+
+
+def lease_expiry(now=None, lease_minutes=REVIEW_LEASE_MINUTES):
+    return (now or datetime.utcnow()) + timedelta(minutes=lease_minutes)
+
+
+def ensure_indexes():
+    try:
+        predictions = db_instance.get_collection('predictions')
+        # Only queued predictions are indexed, so the index stays as small as the backlog
+        predictions.create_index(
+            QUEUE_SORT + [('claim_expires_at', 1)],
+            name=QUEUE_INDEX,
+            partialFilterExpression={'reviewed_by_doctor': False, 'claim_expires_at': {'$exists': True}}
+        )
+        predictions.create_index([('doctor_id', 1), ('reviewed_by_doctor', 1)])
+    except Exception as e:
+        print(f"Error creating review queue indexes: {e}")
+
+
+def backfill(batch_size=BACKFILL_BATCH_SIZE, progress=None):
+    """Add queue fields to predictions created before the queue existed; returns the count updated"""
+    collection = db_instance.get_collection('predictions')
+    query = {'priority_rank': {'$exists': False}}
+    projection = {'priority': 1, 'doctor_id': 1, 'reviewed_by_doctor': 1, 'created_at': 1}
+    updated, last_id = 0, None
+    while True:
+        batch_query = dict(query, _id={'$gt': last_id}) if last_id is not None else query
+        batch = list(collection.find(batch_query, projection).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return updated
+        collection.bulk_write([
+            UpdateOne({'_id': p['_id']}, {'$set': queue_fields(dict(p, created_at=p.get('created_at') or datetime.utcnow()))})
+            for p in batch
+        ], ordered=False)
+        updated += len(batch)
+        last_id = batch[-1]['_id']
+        if progress:
+            progress(updated)
+
+
+def recount_claims():
+    """
+    Rebuild the claim counters from the claims held in predictions (they drift
+    only if a process dies mid-claim); returns the number of doctors holding
+    claims. Run while no one is claiming.
+    """
+    predictions = db_instance.get_collection('predictions')
+    counters = db_instance.get_collection(CLAIM_COUNTERS)
+    held = {
+        row['_id']: row['held'] for row in predictions.aggregate([
+            {'$match': {'doctor_id': {'$ne': None}, 'reviewed_by_doctor': False, 'claim_expires_at': {'$exists': True}}},
+            {'$group': {'_id': '$doctor_id', 'held': {'$sum': 1}}}
+        ])
+    }
+    counters.delete_many({'_id': {'$nin': list(held)}})
+    for doctor_id, count in held.items():
+        counters.update_one({'_id': doctor_id}, {'$set': {'held': count}}, upsert=True)
+    return len(held)
@@ -0,0 +1,168 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from PIL import Image
+from models.ml_backends import load_image_array
+from models.model_registry import file_sha256
+from utils.single_flight import SingleFlight
+
+SALIENCY_CACHE_DIR = os.getenv('SALIENCY_CACHE_DIR', 'saliency_cache')
+# Heatmaps computed per backward pass, and how long a job waits for others to join it
+SALIENCY_BATCH_SIZE = int(os.getenv('SALIENCY_BATCH_SIZE', '8'))
+SALIENCY_BATCH_WAIT_MS = float(os.getenv('SALIENCY_BATCH_WAIT_MS', '25'))
+SALIENCY_TIMEOUT = float(os.getenv('SALIENCY_TIMEOUT', '60'))
+OVERLAY_ALPHA = 0.45
+
+
+def colorize(heatmap):
+    """Map a [0, 1] heatmap to RGB with a jet-style blue-green-red ramp"""
+    value = np.clip(heatmap, 0.0, 1.0)[..., None]
+    rgb = np.clip(1.5 - np.abs(4.0 * value - np.array([3.0, 2.0, 1.0])), 0.0, 1.0)
+    return (rgb * 255).astype(np.uint8)
+
+
+def render_overlay(image_path, heatmap, path):
+    """Blend a heatmap over the original image (at its own size) and write a PNG"""
+    with Image.open(image_path) as original:
+        image = original.convert('RGB')
+    resized = Image.fromarray((np.clip(heatmap, 0.0, 1.0) * 255).astype(np.uint8)).resize(image.size, Image.BILINEAR)
+    overlay = Image.fromarray(colorize(np.asarray(resized, dtype=np.float32) / 255.0))
+    blended = Image.blend(image, overlay, OVERLAY_ALPHA)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    blended.save(tmp_path, format='PNG')
+    os.replace(tmp_path, path)
+    return path
+
+
+class _Job:
+    __slots__ = ('image_path', 'version', 'path', 'future')
+
+    def __init__(self, image_path, version, path):
+        self.image_path = image_path
+        self.version = version
+        self.path = path
+        self.future = Future()
+
+
+class SaliencyService:
+    """
+    Grad-CAM overlays computed on demand and cached on disk under
+    <cache>/<model version>/<image sha256>.png, so each image is explained
+    once per model. Missing overlays are computed on one background thread
+    per process that batches whatever jobs are queued together; concurrent
+    requests for the same overlay share one job.
+    """
+
+    def __init__(self, cache_dir=SALIENCY_CACHE_DIR, batch_size=SALIENCY_BATCH_SIZE, batch_wait_ms=SALIENCY_BATCH_WAIT_MS):
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self._jobs = queue.Queue()
+        self._flight = SingleFlight()
+        self._models = {}
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {'cache_hits': 0, 'computed': 0, 'batches': 0, 'failed': 0}
+
+    def cache_path(self, image_hash, version):
+        return os.path.join(self.cache_dir, version, f"{image_hash}.png")
+
+    def get(self, image_path, version, timeout=SALIENCY_TIMEOUT):
+        """Path of the overlay for an image under a model version, computing it if needed"""
+        path = self.cache_path(file_sha256(image_path), version)
+        if os.path.exists(path):
+            self.stats['cache_hits'] += 1
+            return path
+        result, _ = self._flight.do(path, lambda: self._submit(image_path, version, path).result(timeout))
+        return result
+
+    def _submit(self, image_path, version, path):
+        job = _Job(image_path, version, path)
+        with self._lock:
+            # Threads do not survive fork, so start the worker lazily in each process
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='saliency', daemon=True).start()
+        self._jobs.put(job)
+        return job.future
+
+    def _next_batch(self):
+        jobs = [self._jobs.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(jobs) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                jobs.append(self._jobs.get(timeout=remaining) if remaining > 0 else self._jobs.get_nowait())
+            except queue.Empty:
+                break
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._next_batch()
+            by_version = {}
+            for job in jobs:
+                if job.future.set_running_or_notify_cancel():
+                    by_version.setdefault(job.version, []).append(job)
+            for version, group in by_version.items():
+                self._compute(version, group)
+
+    def _compute(self, version, jobs):
+        try:
+            model = self._model(version)
+        except Exception as e:
+            self.stats['failed'] += len(jobs)
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+
+        # An unreadable upload only fails its own job; the rest share the backward pass
+        images, decoded = [], []
+        for job in jobs:
+            try:
+                images.append(load_image_array(job.image_path, model.input_size))
+                decoded.append(job)
+            except Exception as e:
+                self.stats['failed'] += 1
+                job.future.set_exception(e)
+        if not decoded:
+            return
+
+        try:
+            heatmaps = model.saliency_batch(np.stack(images))
+            self.stats['batches'] += 1
+        except Exception as e:
+            self.stats['failed'] += len(decoded)
+            for job in decoded:
+                job.future.set_exception(e)
+            return
+
+        for job, heatmap in zip(decoded, heatmaps):
+            try:
+                job.future.set_result(render_overlay(job.image_path, heatmap, job.path))
+                self.stats['computed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                job.future.set_exception(e)
+
+    def _model(self, version):
+        from models.ml_model import registry
+        active = registry.active()
+        if active.version == version:
+            return active
+        if version not in self._models:
+            # Keep at most one non-active version loaded for older predictions
+            self._models = {version: registry.load_version(version)}
+        return self._models[version]
+
+    def status(self):
+        return dict(self.stats, queue_depth=self._jobs.qsize())
+
+
+# Global saliency service
+saliency_service = SaliencyService()
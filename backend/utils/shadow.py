@@ -0,0 +1,214 @@
+import os
+import random
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from bson import ObjectId
+from pymongo import ReturnDocument
+from utils.db import db_instance
+
+# Candidate registry version scored in the shadow of live traffic ('' = off)
+SHADOW_MODEL_VERSION = os.getenv('SHADOW_MODEL_VERSION', '')
+# Share of /api/ml/predict requests also scored by the candidate
+SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', '0.1'))
+# Pending shadow jobs; beyond this, samples are dropped rather than queued
+SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', '100'))
+# Niceness of the shadow worker process
+SHADOW_NICENESS = int(os.getenv('SHADOW_NICENESS', '19'))
+# A claimed job whose worker died is retried after this long
+SHADOW_LEASE_SECONDS = int(os.getenv('SHADOW_LEASE_SECONDS', '300'))
+SHADOW_MAX_ATTEMPTS = 3
+# Jobs nobody scored (no shadow worker running) are dropped after this long
+SHADOW_JOB_TTL_HOURS = int(os.getenv('SHADOW_JOB_TTL_HOURS', '24'))
+# Latency samples used for the report percentiles
+REPORT_LATENCY_SAMPLES = 10000
+
+COLLECTION = 'shadow_results'
+JOBS_COLLECTION = 'shadow_jobs'
+
+
+def ensure_indexes():
+    try:
+        db_instance.get_collection(COLLECTION).create_index([('shadow.model_version', 1), ('created_at', -1)])
+        jobs = db_instance.get_collection(JOBS_COLLECTION)
+        jobs.create_index([('status', 1), ('created_at', 1)])
+        jobs.create_index('expires_at', expireAfterSeconds=0)
+    except Exception as e:
+        print(f"Error creating shadow result indexes: {e}")
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'mean': None}
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        'p50': round(float(np.percentile(values, 50)), 1),
+        'p95': round(float(np.percentile(values, 95)), 1),
+        'mean': round(float(values.mean()), 1)
+    }
+
+
+class ShadowEvaluator:
+    """
+    Scores a sample of live uploads with a candidate model without touching
+    the request path or the web workers' CPU: once a sampled response has
+    been sent, a job is queued in MongoDB, and a separate low-priority
+    process (shadow_worker.py) loads the candidate once and scores the
+    queue. When the queue is full, samples are dropped.
+    """
+
+    def __init__(self, version=SHADOW_MODEL_VERSION, sample_rate=SHADOW_SAMPLE_RATE, queue_size=SHADOW_QUEUE_SIZE):
+        self.version = version
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.jobs = db_instance.get_collection(JOBS_COLLECTION)
+        # Counters for this process (samples in web workers, scores in the shadow worker)
+        self.stats = {'sampled': 0, 'dropped': 0, 'scored': 0, 'failed': 0}
+
+    def enabled(self):
+        return bool(self.version) and self.sample_rate > 0
+
+    def after_response(self, response, image_path, prediction_id, primary):
+        """Maybe queue this upload for the candidate once the response is closed"""
+        if not self.enabled() or random.random() >= self.sample_rate:
+            return
+        primary = {key: primary.get(key) for key in ['model_version', 'prediction', 'confidence', 'inference_ms']}
+        response.call_on_close(lambda: self._enqueue(image_path, prediction_id, primary))
+
+    def _enqueue(self, image_path, prediction_id, primary):
+        try:
+            if self.jobs.count_documents({'status': 'queued'}, limit=self.queue_size) >= self.queue_size:
+                self.stats['dropped'] += 1
+                return
+            now = datetime.utcnow()
+            self.jobs.insert_one({
+                'status': 'queued',
+                'model_version': self.version,
+                'image_path': image_path,
+                'prediction_id': ObjectId(prediction_id) if prediction_id else None,
+                'primary': primary,
+                'attempts': 0,
+                'created_at': now,
+                'expires_at': now + timedelta(hours=SHADOW_JOB_TTL_HOURS)
+            })
+            self.stats['sampled'] += 1
+        except Exception as e:
+            print(f"Error queueing shadow job: {e}")
+
+    # Shadow worker side
+
+    def claim(self):
+        """Take the oldest queued job (or one whose worker died), or None"""
+        now = datetime.utcnow()
+        return self.jobs.find_one_and_update(
+            {'model_version': self.version, '$or': [
+                {'status': 'queued'},
+                {'status': 'running', 'lease_until': {'$lt': now}}
+            ]},
+            {'$set': {'status': 'running', 'lease_until': now + timedelta(seconds=SHADOW_LEASE_SECONDS)},
+             '$inc': {'attempts': 1}},
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def score(self, job, model):
+        """Score one claimed job with the candidate and store the comparison"""
+        if job['attempts'] > SHADOW_MAX_ATTEMPTS:
+            # Its failures were already counted; stop retrying
+            self.jobs.delete_one({'_id': job['_id']})
+            return
+        try:
+            start = time.perf_counter()
+            result = model.predict(job['image_path'])
+            shadow = {
+                'model_version': result['model_version'],
+                'prediction': result['prediction'],
+                'confidence': result['confidence'],
+                'inference_ms': (time.perf_counter() - start) * 1000
+            }
+            primary = job['primary']
+            db_instance.get_collection(COLLECTION).insert_one({
+                'prediction_id': job.get('prediction_id'),
+                'image_path': job['image_path'],
+                'primary': primary,
+                'shadow': shadow,
+                'agreed': shadow['prediction'] == primary['prediction'],
+                'confidence_delta': shadow['confidence'] - primary['confidence'],
+                'queued_seconds': (datetime.utcnow() - job['created_at']).total_seconds(),
+                'created_at': datetime.utcnow()
+            })
+            self.jobs.delete_one({'_id': job['_id']})
+            self.stats['scored'] += 1
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"Shadow scoring error for {job['image_path']}: {e}")
+            # Back in the queue for another attempt
+            self.jobs.update_one({'_id': job['_id']}, {'$set': {'status': 'queued'}, '$unset': {'lease_until': ''}})
+
+    def run(self, model, poll_seconds=1.0, until_empty=False):
+        """Score queued jobs forever, or until the queue is empty; returns the number handled"""
+        handled = 0
+        while True:
+            job = self.claim()
+            if job is None:
+                if until_empty:
+                    return handled
+                time.sleep(poll_seconds)
+                continue
+            self.score(job, model)
+            handled += 1
+
+    def status(self):
+        try:
+            queue_depth = self.jobs.count_documents({'status': 'queued'})
+        except Exception as e:
+            print(f"Error counting shadow jobs: {e}")
+            queue_depth = None
+        return dict(self.stats, version=self.version or None, sample_rate=self.sample_rate,
+                    queue_depth=queue_depth)
+
+    def report(self, version=None, days=None):
+        """Agreement, confidence deltas and latency of a candidate against the primary model"""
+        query = {'shadow.model_version': version or self.version}
+        if days:
+            query['created_at'] = {'$gte': datetime.utcnow() - timedelta(days=days)}
+        collection = db_instance.get_collection(COLLECTION)
+
+        totals = next(collection.aggregate([
+            {'$match': query},
+            {'$group': {
+                '_id': None,
+                'compared': {'$sum': 1},
+                'agreed': {'$sum': {'$cond': ['$agreed', 1, 0]}},
+                'mean_confidence_delta': {'$avg': '$confidence_delta'},
+                'mean_abs_confidence_delta': {'$avg': {'$abs': '$confidence_delta'}},
+                'max_abs_confidence_delta': {'$max': {'$abs': '$confidence_delta'}}
+            }}
+        ]), None)
+        changes = collection.aggregate([
+            {'$match': dict(query, agreed=False)},
+            {'$group': {'_id': {'primary': '$primary.prediction', 'shadow': '$shadow.prediction'}, 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}}
+        ])
+        latest = list(collection.find(
+            query, {'primary.inference_ms': 1, 'shadow.inference_ms': 1}
+        ).sort('created_at', -1).limit(REPORT_LATENCY_SAMPLES))
+
+        compared = totals['compared'] if totals else 0
+        return {
+            'shadow_version': query['shadow.model_version'],
+            'compared': compared,
+            'agreement': round(totals['agreed'] / compared, 4) if compared else None,
+            'mean_confidence_delta': totals and totals['mean_confidence_delta'],
+            'mean_abs_confidence_delta': totals and totals['mean_abs_confidence_delta'],
+            'max_abs_confidence_delta': totals and totals['max_abs_confidence_delta'],
+            'changes': {f"{c['_id']['primary']}->{c['_id']['shadow']}": c['count'] for c in changes},
+            'latency_ms': {
+                'primary': _percentiles([r['primary']['inference_ms'] for r in latest if r['primary'].get('inference_ms') is not None]),
+                'shadow': _percentiles([r['shadow']['inference_ms'] for r in latest])
+            }
+        }
+
+
+# Global shadow evaluator
+shadow_evaluator = ShadowEvaluator()
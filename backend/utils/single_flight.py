@@ -0,0 +1,99 @@
+import threading
+from functools import wraps
+from flask import request, make_response, current_app
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Lets identical concurrent calls share one execution.
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.executions = 0
+
+    def do(self, key, fn):
+        """Return (result, shared) for fn(), coalescing concurrent calls on key"""
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.executions += 1
+            call.event.set()
+        return call.result, False
+
+    def metrics(self):
+        """Requests seen, backend executions and the share that was coalesced"""
+        with self._lock:
+            requests, executions = self.requests, self.executions
+            in_flight = len(self._calls)
+        coalesced = requests - executions - in_flight
+        return {
+            'requests': requests,
+            'executions': executions,
+            'coalesced': coalesced,
+            'in_flight': in_flight,
+            'coalescing_ratio': coalesced / requests if requests else 0.0
+        }
+
+
+# Shared by all coalesced routes in this process
+read_coalescer = SingleFlight()
+
+
+def coalesce(scope='user'):
+    """
+    Decorator for read-only views: identical in-flight requests (same route,
+    query string and caller scope) share one computation and one serialized body.
+    scope='user' keys by the caller's id, scope='role' by their user type.
+    Must be applied after login_required.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            caller = request.user['user_id'] if scope == 'user' else request.user['user_type']
+            key = (request.endpoint, caller, tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))))
+
+            def render():
+                response = make_response(f(*args, **kwargs))
+                return response.status_code, response.get_data(), response.content_type
+
+            (status_code, body, content_type), _ = read_coalescer.do(key, render)
+            return current_app.response_class(body, status=status_code, content_type=content_type)
+        return decorated
+    return decorator
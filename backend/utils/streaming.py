@@ -0,0 +1,74 @@
+import zipfile
+import zlib
+
+
+class ChunkSink:
+    """
+    Write-only, unseekable file object that collects bytes for a streaming response.
+    Writers (csv, pyarrow, zipfile) write into it; the response generator
+    drains whatever has accumulated and yields it as the next chunk.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+            self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        """Return and forget the bytes written since the last drain"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip-compress an iterable of byte chunks without buffering the whole stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def zip_chunks(entries, chunk_size=64 * 1024):
+    """
+    Stream a zip archive of (archive name, file path) entries.
+    Files are copied in chunk_size pieces and the archive is written to an
+    unseekable sink, so neither the files nor the archive are held in memory.
+    """
+    sink = ChunkSink()
+    # PDFs and images are already compressed, so entries are stored as-is
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in entries:
+            with open(path, 'rb') as source, archive.open(arcname, 'w', force_zip64=True) as dest:
+                for data in iter(lambda: source.read(chunk_size), b''):
+                    dest.write(data)
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+    # Remaining entry trailers and the central directory
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import threading
+from PIL import Image
+from utils.auth_utils import sign_media_path
+from utils.single_flight import SingleFlight
+
+THUMBNAIL_CACHE_DIR = os.getenv('THUMBNAIL_CACHE_DIR', 'thumbnail_cache')
+THUMBNAIL_SIZES = [128, 256, 512]
+DEFAULT_THUMBNAIL_SIZE = int(os.getenv('THUMBNAIL_SIZE', '256'))
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', '80'))
+
+
+def prediction_image_urls(prediction_id, user):
+    """
+    URLs of a prediction's scan and its list-view thumbnail, signed for the
+    given user (a token payload) so they work as <img src>; unsigned for
+    anonymous uploads
+    """
+    base = f"/api/ml/predictions/{prediction_id}"
+    urls = {'image_url': f"{base}/image", 'thumbnail_url': f"{base}/thumbnail"}
+    if user:
+        urls = {key: sign_media_path(url, user) for key, url in urls.items()}
+    return urls
+
+
+def render_thumbnail(image_path, size, path):
+    """Write a JPEG no larger than size x size (aspect ratio kept)"""
+    with Image.open(image_path) as image:
+        # JPEG sources decode directly at a reduced scale
+        image.draft('RGB', (size, size))
+        image = image.convert('L' if image.mode in ('L', 'I', 'I;16', 'F') else 'RGB')
+        image.thumbnail((size, size), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+class ThumbnailCache:
+    """
+    Downsized copies of uploaded scans, rendered on first request and kept
+    under <cache>/<size>/. A thumbnail older than its source is re-rendered;
+    concurrent requests for the same thumbnail share one render.
+    """
+
+    def __init__(self, cache_dir=THUMBNAIL_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._flight = SingleFlight()
+
+    def cache_path(self, image_path, size):
+        key = hashlib.sha1(os.path.abspath(image_path).encode('utf-8')).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        return os.path.join(self.cache_dir, str(size), f"{key}_{name}.jpg")
+
+    def get(self, image_path, size=DEFAULT_THUMBNAIL_SIZE):
+        """Path of the thumbnail for an image, rendering it if missing or stale"""
+        path = self.cache_path(image_path, size)
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(image_path):
+                return path
+        except OSError:
+            pass
+        result, _ = self._flight.do(path, lambda: render_thumbnail(image_path, size, path))
+        return result
+
+
+# Global thumbnail cache
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,251 @@
+import csv
+import io
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from utils.db import db_instance
+from utils.doctor_directory import doctor_directory
+from models.user import User, hash_password
+
+IMPORT_CHUNK_SIZE = int(os.getenv('USER_IMPORT_CHUNK_SIZE', '1000'))
+IMPORT_HASH_WORKERS = int(os.getenv('USER_IMPORT_HASH_WORKERS', str(os.cpu_count() or 1)))
+# Uploads run as background jobs in a web worker; larger files go through import_users.py
+MAX_IMPORT_ROWS = int(os.getenv('USER_IMPORT_MAX_ROWS', '5000'))
+# How long finished import jobs (and their reports) are kept
+IMPORT_JOB_TTL_DAYS = int(os.getenv('USER_IMPORT_JOB_TTL_DAYS', '7'))
+
+IMPORTABLE_TYPES = ['doctor', 'patient']
+REQUIRED_FIELDS = {
+    # Same requirements as POST /api/admin/doctors and /api/auth/signup
+    'doctor': ['email', 'first_name', 'last_name', 'phone', 'specialization', 'license_number'],
+    'patient': ['email', 'first_name', 'last_name']
+}
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+DUPLICATE_KEY_ERROR = 11000
+
+
+def ensure_indexes():
+    """Unique email index, so concurrent imports and signups cannot create duplicates"""
+    try:
+        User().collection.create_index('email', unique=True)
+    except Exception as e:
+        # Existing duplicate emails prevent the index; imports still check for duplicates
+        print(f"Error creating users email index: {e}")
+    try:
+        import_jobs.collection.create_index('expires_at', expireAfterSeconds=0)
+    except Exception as e:
+        print(f"Error creating import job indexes: {e}")
+
+
+def parse_rows(data, fmt):
+    """Return [(row_number, row dict)] and [errors] for CSV or NDJSON bytes"""
+    rows, errors = [], []
+    text = data.decode('utf-8-sig')
+    if fmt == 'csv':
+        # The header is line 1, so the first record is row 2
+        for number, row in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+            rows.append((number, {k.strip(): (v or '').strip() for k, v in row.items() if k}))
+    else:
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                errors.append({'row': number, 'email': None, 'error': f'Invalid JSON: {e}'})
+                continue
+            if not isinstance(row, dict):
+                errors.append({'row': number, 'email': None, 'error': 'Each line must be a JSON object'})
+                continue
+            rows.append((number, row))
+    return rows, errors
+
+
+def _normalize(row):
+    """Coerce CSV strings into the types create_user stores"""
+    user_data = dict(row)
+    if isinstance(user_data.get('experience_years'), str):
+        user_data['experience_years'] = int(user_data['experience_years'] or 0)
+    if isinstance(user_data.get('available_time_slots'), str):
+        user_data['available_time_slots'] = [s.strip() for s in user_data['available_time_slots'].split(';') if s.strip()]
+    return user_data
+
+
+def validate_row(row):
+    """Error message for an invalid row, or None"""
+    user_type = row.get('user_type')
+    if user_type not in IMPORTABLE_TYPES:
+        return f"user_type must be one of: {', '.join(IMPORTABLE_TYPES)}"
+    for field in REQUIRED_FIELDS[user_type]:
+        if not row.get(field):
+            return f'{field} is required'
+    if not EMAIL_PATTERN.match(str(row['email'])):
+        return 'Invalid email address'
+    if not row.get('password'):
+        return 'password is required'
+    if len(str(row['password'])) < 6:
+        return 'Password must be at least 6 characters'
+    try:
+        int(row.get('experience_years') or 0)
+    except (TypeError, ValueError):
+        return 'experience_years must be a number'
+    return None
+
+
+class UserImporter:
+    """
+    Bulk-creates doctors and patients: validates every row, checks all emails
+    against the database in one query, hashes passwords on a thread pool and
+    inserts in unordered chunks so one bad row does not stop the rest.
+    """
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, hash_workers=IMPORT_HASH_WORKERS):
+        self.user_model = User()
+        self.chunk_size = chunk_size
+        self.hash_workers = hash_workers
+
+    def _hash_passwords(self, passwords):
+        if self.hash_workers <= 1 or len(passwords) < 2:
+            return [hash_password(p) for p in passwords]
+        # bcrypt releases the GIL while hashing, so threads use every core
+        # without spawning processes that would re-import the app and its model
+        with ThreadPoolExecutor(max_workers=self.hash_workers, thread_name_prefix='password-hash') as pool:
+            return list(pool.map(hash_password, passwords))
+
+    def _existing_emails(self, emails):
+        existing = self.user_model.collection.find({'email': {'$in': emails}}, {'email': 1})
+        return {user['email'] for user in existing}
+
+    def import_rows(self, rows, errors=None, approve_doctors=True):
+        """Create users for [(row_number, row)]; returns the per-row report"""
+        errors = list(errors or [])
+        total = len(rows) + len(errors)
+
+        valid, seen = [], set()
+        for number, row in rows:
+            error = validate_row(row)
+            email = str(row.get('email', '')).strip()
+            if not error and email in seen:
+                error = 'Duplicate email in import file'
+            if error:
+                errors.append({'row': number, 'email': email or None, 'error': error})
+                continue
+            seen.add(email)
+            row = _normalize(row)
+            row['email'] = email
+            valid.append((number, row))
+
+        existing = self._existing_emails(list(seen)) if seen else set()
+        pending = []
+        for number, row in valid:
+            if row['email'] in existing:
+                errors.append({'row': number, 'email': row['email'], 'error': 'User with this email already exists'})
+            else:
+                pending.append((number, row))
+
+        hashes = self._hash_passwords([str(row['password']) for _, row in pending])
+
+        created = {'doctor': 0, 'patient': 0}
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = pending[start:start + self.chunk_size]
+            docs = []
+            for (number, row), hashed in zip(chunk, hashes[start:start + self.chunk_size]):
+                doc = self.user_model.build_user_doc(row, hashed)
+                if doc['user_type'] == 'doctor' and approve_doctors:
+                    # Imported by an admin, like POST /api/admin/doctors
+                    doc['approved_by_admin'] = True
+                docs.append(doc)
+
+            failed = {}
+            try:
+                self.user_model.collection.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get('writeErrors', []):
+                    if write_error.get('code') == DUPLICATE_KEY_ERROR:
+                        failed[write_error['index']] = 'User with this email already exists'
+                    else:
+                        failed[write_error['index']] = write_error.get('errmsg', 'Insert failed')
+
+            for index, ((number, row), doc) in enumerate(zip(chunk, docs)):
+                if index in failed:
+                    errors.append({'row': number, 'email': row['email'], 'error': failed[index]})
+                else:
+                    created[doc['user_type']] += 1
+
+        errors.sort(key=lambda item: item['row'])
+        return {
+            'total': total,
+            'created': sum(created.values()),
+            'created_by_type': created,
+            'failed': len(errors),
+            'errors': errors
+        }
+
+
+def detect_format(filename, fmt=None):
+    """'csv' or 'ndjson' from an explicit format or the file extension"""
+    fmt = (fmt or '').lower()
+    if fmt in ('csv', 'ndjson'):
+        return fmt
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+class ImportJobs:
+    """
+    Uploaded imports run one at a time on a background thread of the worker
+    that received them; their status and report are kept in MongoDB so any
+    worker can answer a status poll.
+    """
+
+    def __init__(self):
+        self.collection = db_instance.get_collection('user_import_jobs')
+        self.executor = None
+
+    def start(self, rows, errors, admin_id, filename=None):
+        """Queue an import; returns the job id"""
+        job_id = self.collection.insert_one({
+            'status': 'queued',
+            'filename': filename,
+            'rows': len(rows) + len(errors),
+            'created_by': admin_id,
+            'created_at': datetime.utcnow()
+        }).inserted_id
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='user-import')
+        self.executor.submit(self._run, job_id, rows, errors)
+        return str(job_id)
+
+    def _run(self, job_id, rows, errors):
+        self.collection.update_one({'_id': job_id}, {'$set': {
+            'status': 'running', 'started_at': datetime.utcnow()
+        }})
+        try:
+            report = UserImporter().import_rows(rows, errors)
+            if report['created_by_type']['doctor']:
+                doctor_directory.invalidate()
+            update = {'status': 'completed', 'report': report}
+        except Exception as e:
+            print(f"Import job {job_id} error: {e}")
+            update = {'status': 'failed', 'error': 'Import failed'}
+
+        finished_at = datetime.utcnow()
+        update.update({'finished_at': finished_at,
+                       'expires_at': finished_at + timedelta(days=IMPORT_JOB_TTL_DAYS)})
+        self.collection.update_one({'_id': job_id}, {'$set': update})
+
+    def get(self, job_id):
+        """Job document, or None for an unknown id"""
+        try:
+            return self.collection.find_one({'_id': ObjectId(job_id)})
+        except Exception as e:
+            print(f"Error getting import job: {e}")
+            return None
+
+
+import_jobs = ImportJobs()
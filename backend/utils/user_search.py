@@ -0,0 +1,161 @@
+import os
+import re
+import unicodedata
+from pymongo import UpdateOne
+from utils.db import db_instance
+
+# Precomputed search keys stored on each user document:
+#   search_prefixes - every prefix (2+ chars) of each normalized name/email/phone token
+#   search_trigrams - character trigrams of the same tokens, for typo-tolerant matching
+# Both are multikey-indexed together with user_type.
+
+MIN_PREFIX = 2
+MAX_PREFIX = 20
+# Candidates scored per query and branch; bounds the work for very common
+# prefixes and trigrams. A query with more is answered from an arbitrary
+# subset of its candidates and reported as truncated.
+SEARCH_CANDIDATE_LIMIT = int(os.getenv('SEARCH_CANDIDATE_LIMIT', '2000'))
+# Share of the query's trigrams a fuzzy match must contain
+FUZZY_MIN_OVERLAP = float(os.getenv('SEARCH_FUZZY_MIN_OVERLAP', '0.5'))
+MAX_PAGE_SIZE = 100
+BACKFILL_BATCH_SIZE = int(os.getenv('SEARCH_BACKFILL_BATCH_SIZE', '1000'))
+
+SEARCH_RESULT_FIELDS = {
+    'email': 1, 'first_name': 1, 'last_name': 1, 'phone': 1, 'user_type': 1,
+    'specialization': 1, 'approved_by_admin': 1, 'is_active': 1, 'created_at': 1
+}
+
+
+def normalize(text):
+    """Lowercase ASCII words: accents stripped, punctuation removed"""
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode('ascii')
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def search_tokens(user):
+    """Normalized tokens a user can be found by"""
+    tokens = normalize(user.get('first_name')) + normalize(user.get('last_name'))
+    email = str(user.get('email') or '').lower()
+    local_part = email.split('@')[0]
+    # The whole local part (e.g. 'jane.doe' -> 'janedoe') and its pieces
+    tokens += [''.join(normalize(local_part))] + normalize(local_part)
+    phone = re.sub(r'\D', '', str(user.get('phone') or ''))
+    if phone:
+        tokens.append(phone)
+        # National number without a country code
+        if len(phone) > 10:
+            tokens.append(phone[-10:])
+    return [t for t in dict.fromkeys(tokens) if t]
+
+
+def trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def search_fields(user):
+    """search_prefixes and search_trigrams for a user document"""
+    prefixes, grams = set(), set()
+    for token in search_tokens(user):
+        for length in range(MIN_PREFIX, min(len(token), MAX_PREFIX) + 1):
+            prefixes.add(token[:length])
+        grams |= trigrams(token)
+    return {'search_prefixes': sorted(prefixes), 'search_trigrams': sorted(grams)}
+
+
+def ensure_indexes():
+    """Multikey indexes behind the admin user search"""
+    try:
+        collection = db_instance.get_collection('users')
+        collection.create_index([('user_type', 1), ('search_prefixes', 1)])
+        collection.create_index([('user_type', 1), ('search_trigrams', 1)])
+    except Exception as e:
+        print(f"Error creating user search indexes: {e}")
+
+
+def backfill(batch_size=BACKFILL_BATCH_SIZE, missing_only=False, progress=None):
+    """Recompute search fields for existing users in _id order; returns the count updated"""
+    collection = db_instance.get_collection('users')
+    query = {'search_prefixes': {'$exists': False}} if missing_only else {}
+    projection = {'email': 1, 'first_name': 1, 'last_name': 1, 'phone': 1}
+    updated, last_id = 0, None
+    while True:
+        batch_query = dict(query, _id={'$gt': last_id}) if last_id is not None else query
+        batch = list(collection.find(batch_query, projection).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return updated
+        collection.bulk_write(
+            [UpdateOne({'_id': user['_id']}, {'$set': search_fields(user)}) for user in batch],
+            ordered=False
+        )
+        updated += len(batch)
+        last_id = batch[-1]['_id']
+        if progress:
+            progress(updated)
+
+
+def search_pipeline(query, user_type=None, page=1, page_size=20):
+    """
+    Ranked search: documents whose prefixes contain every query token rank
+    first, then fuzzy matches by the share of query trigrams they contain.
+    Each branch reads at most SEARCH_CANDIDATE_LIMIT + 1 candidates; the
+    extra one only tells whether the branch was cut off. The result has
+    'results', 'total' and per-branch 'candidates' counts.
+    Returns None when the query has nothing searchable.
+    """
+    tokens = [t[:MAX_PREFIX] for t in normalize(query)]
+    digits = re.sub(r'\D', '', query)
+    if digits and len(digits) >= MIN_PREFIX and digits not in tokens:
+        # '+1 (555) 010-2000' is one phone token, not four
+        tokens = [t for t in tokens if not t.isdigit()] + [digits[:MAX_PREFIX]]
+    tokens = [t for t in tokens if len(t) >= MIN_PREFIX]
+    if not tokens:
+        return None
+
+    query_grams = sorted(set().union(*(trigrams(t) for t in tokens if len(t) >= 3)))
+    type_match = {'user_type': user_type} if user_type else {}
+
+    # Prefix hits and fuzzy-only hits are gathered separately, each through its
+    # own index and limit, so common trigrams cannot crowd out exact matches
+    stages = [
+        {'$match': dict(type_match, search_prefixes={'$all': tokens})},
+        {'$limit': SEARCH_CANDIDATE_LIMIT + 1}
+    ]
+    if query_grams:
+        stages.append({'$unionWith': {'coll': 'users', 'pipeline': [
+            {'$match': dict(type_match, search_trigrams={'$in': query_grams},
+                            search_prefixes={'$not': {'$all': tokens}})},
+            {'$limit': SEARCH_CANDIDATE_LIMIT + 1}
+        ]}})
+        overlap = {'$divide': [
+            {'$size': {'$setIntersection': ['$search_trigrams', query_grams]}},
+            len(query_grams)
+        ]}
+    else:
+        overlap = 0
+
+    matched = {'$match': {'$or': [{'_prefix_match': True}, {'_overlap': {'$gte': FUZZY_MIN_OVERLAP}}]}}
+    return stages + [
+        {'$addFields': {
+            '_prefix_match': {'$setIsSubset': [tokens, '$search_prefixes']},
+            '_overlap': overlap
+        }},
+        {'$facet': {
+            'results': [
+                matched,
+                {'$addFields': {'score': {'$add': [{'$cond': ['$_prefix_match', 1, 0]}, '$_overlap']}}},
+                {'$sort': {'score': -1, 'last_name': 1, 'first_name': 1, '_id': 1}},
+                {'$skip': (page - 1) * page_size},
+                {'$limit': page_size},
+                {'$project': dict(SEARCH_RESULT_FIELDS, score=1)}
+            ],
+            'total': [matched, {'$count': 'count'}],
+            # Candidates read per branch (prefix / fuzzy), before filtering
+            'candidates': [{'$group': {'_id': '$_prefix_match', 'count': {'$sum': 1}}}]
+        }}
+    ]
+
+
+def search_truncated(candidates):
+    """True when a branch of search_pipeline hit SEARCH_CANDIDATE_LIMIT"""
+    return any(branch['count'] > SEARCH_CANDIDATE_LIMIT for branch in candidates)
@@ -0,0 +1,392 @@
+import heapq
+import os
+import shutil
+import threading
+import zipfile
+from collections.abc import Sequence
+import numpy as np
+from PIL import Image
+
+# MRI studies uploaded as a volume instead of a single 2D image:
+#
+#   DICOM series   one file per slice (several files, or one .zip)
+#   DICOM          one multi-frame file
+#   TIFF           one multi-page file
+#   NIfTI          .nii / .nii.gz
+#
+# Slices are read one at a time and scored in fixed-size batches, so memory
+# depends on the batch size and the slice size, never on the number of slices.
+
+# Slices scored per forward pass (two batches are in memory: one scoring, one filling)
+VOLUME_BATCH_SIZE = int(os.getenv('VOLUME_BATCH_SIZE', '16'))
+# Highest-scoring slices kept per study and saved as images
+VOLUME_TOP_SLICES = int(os.getenv('VOLUME_TOP_SLICES', '5'))
+VOLUME_MAX_SLICES = int(os.getenv('VOLUME_MAX_SLICES', '2000'))
+# Uncompressed size limit of a zipped series
+VOLUME_MAX_EXTRACTED_MB = int(os.getenv('VOLUME_MAX_EXTRACTED_MB', '2048'))
+# Slices with less foreground than this (share of non-black pixels) are not scored
+VOLUME_MIN_FOREGROUND = float(os.getenv('VOLUME_MIN_FOREGROUND', '0.01'))
+# Slices sampled to estimate the intensity window when the file does not carry one
+WINDOW_SAMPLE_SLICES = 32
+WINDOW_SAMPLE_PIXELS = 4096
+WINDOW_PERCENTILES = (0.5, 99.5)
+
+VOLUME_FORMATS = ['dicom', 'tiff', 'nifti']
+DICOM_EXTENSIONS = ('.dcm', '.dicom', '.ima')
+NO_TUMOR_LABEL = 'notumor'
+
+
+class VolumeError(ValueError):
+    """An upload that cannot be read as a volume"""
+
+
+def _require(module):
+    try:
+        return __import__(module)
+    except ImportError:
+        raise VolumeError(f"Reading this format requires the '{module}' package")
+
+
+def is_dicom_file(path):
+    """DICOM Part 10 files carry 'DICM' after a 128-byte preamble"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(128)
+            return f.read(4) == b'DICM'
+    except OSError:
+        return False
+
+
+def _first(value):
+    return value[0] if isinstance(value, Sequence) and not isinstance(value, str) else value
+
+
+def _to_float(pixels):
+    pixels = np.asarray(pixels, dtype=np.float32)
+    # Colour slices are scored on their luminance
+    return pixels.mean(axis=-1) if pixels.ndim == 3 else pixels
+
+
+class TiffVolume:
+    """Multi-page TIFF; each page is a slice, decoded when it is read"""
+    format = 'tiff'
+    window = None
+    invert = False
+
+    def __init__(self, path):
+        self._image = Image.open(path)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return getattr(self._image, 'n_frames', 1)
+
+    def slice(self, index):
+        with self._lock:
+            self._image.seek(index)
+            page = self._image
+            if page.mode in ('P', 'RGBA', 'LA', '1'):
+                page = page.convert('L')
+            return _to_float(page)
+
+    def close(self):
+        self._image.close()
+
+
+class NiftiVolume:
+    """
+    NIfTI volume read through nibabel's array proxy, so only the requested
+    slice is loaded (scaled by scl_slope/scl_inter). Slices are taken along
+    the axis closest to superior-inferior (axial), first volume of 4D files.
+    """
+    format = 'nifti'
+    window = None
+    invert = False
+
+    def __init__(self, path):
+        nibabel = _require('nibabel')
+        self._image = nibabel.load(path)
+        shape = self._image.shape
+        if len(shape) < 3:
+            raise VolumeError("NIfTI file is not a volume")
+        codes = nibabel.aff2axcodes(self._image.affine)
+        self.axis = next((i for i, code in enumerate(codes[:3]) if code in ('S', 'I')), 2)
+        self._slices = shape[self.axis]
+        self._extra = (0,) * (len(shape) - 3)
+
+    def __len__(self):
+        return self._slices
+
+    def slice(self, index):
+        key = [slice(None)] * 3
+        key[self.axis] = index
+        pixels = np.asarray(self._image.dataobj[tuple(key) + self._extra], dtype=np.float32)
+        # Voxel axes run left-to-right, posterior-to-anterior: rotate so anterior is up, as scans are viewed
+        return np.rot90(pixels)
+
+    def close(self):
+        pass
+
+
+class DicomSeries:
+    """
+    DICOM slices, one file each. Headers are read without pixel data to
+    order the slices along the scan direction (ImagePositionPatient, then
+    InstanceNumber); a slice's pixels are decoded only when it is read.
+    Files of other series than the largest one, and non-image files
+    (DICOMDIR), are ignored.
+    """
+    format = 'dicom'
+
+    def __init__(self, paths):
+        pydicom = _require('pydicom')
+        self._pydicom = pydicom
+        series = {}
+        for path in paths:
+            try:
+                header = pydicom.dcmread(path, stop_before_pixels=True)
+            except Exception:
+                continue
+            if 'Rows' not in header:
+                continue
+            series.setdefault(header.get('SeriesInstanceUID'), []).append((path, header))
+        if not series:
+            raise VolumeError("No DICOM image files found")
+
+        self.series_uid, files = max(series.items(), key=lambda item: len(item[1]))
+        files.sort(key=lambda item: self._sort_key(*item))
+        self.paths = [path for path, _ in files]
+        headers = [header for _, header in files]
+        self.window = self._window(headers[len(headers) // 2])
+        self.invert = headers[0].get('PhotometricInterpretation') == 'MONOCHROME1'
+        self.modality = headers[0].get('Modality')
+
+    @staticmethod
+    def _sort_key(path, header):
+        position = header.get('ImagePositionPatient')
+        orientation = header.get('ImageOrientationPatient')
+        if position is not None and orientation is not None and len(orientation) == 6:
+            normal = np.cross(np.asarray(orientation[:3], dtype=float), np.asarray(orientation[3:], dtype=float))
+            return (0, float(np.dot(normal, np.asarray(position, dtype=float))), path)
+        number = header.get('InstanceNumber')
+        return (1, float(number) if number is not None else 0.0, path)
+
+    @staticmethod
+    def _window(header):
+        """(low, high) from the file's display window, or None"""
+        center, width = header.get('WindowCenter'), header.get('WindowWidth')
+        if center is None or width is None:
+            return None
+        # Multi-valued windows list presets; the first is the default
+        center, width = float(_first(center)), float(_first(width))
+        if width <= 0:
+            return None
+        return center - width / 2, center + width / 2
+
+    def __len__(self):
+        return len(self.paths)
+
+    def slice(self, index):
+        dataset = self._pydicom.dcmread(self.paths[index])
+        pixels = _to_float(dataset.pixel_array)
+        # Modality LUT: stored values to physical units (e.g. Hounsfield)
+        return pixels * float(dataset.get('RescaleSlope', 1) or 1) + float(dataset.get('RescaleIntercept', 0) or 0)
+
+    def close(self):
+        pass
+
+
+class DicomMultiframe(DicomSeries):
+    """One multi-frame DICOM file; each frame is a slice"""
+
+    def __init__(self, path):
+        pydicom = _require('pydicom')
+        self._pydicom = pydicom
+        header = pydicom.dcmread(path, stop_before_pixels=True)
+        self.path = path
+        self.paths = [path]
+        self.series_uid = header.get('SeriesInstanceUID')
+        self.frames = int(header.get('NumberOfFrames', 1) or 1)
+        self.window = self._window(header)
+        self.invert = header.get('PhotometricInterpretation') == 'MONOCHROME1'
+        self.modality = header.get('Modality')
+        self._slope = float(header.get('RescaleSlope', 1) or 1)
+        self._intercept = float(header.get('RescaleIntercept', 0) or 0)
+        self._decoded = None
+
+    def __len__(self):
+        return self.frames
+
+    def slice(self, index):
+        try:
+            # pydicom >= 3 decodes a single frame
+            from pydicom.pixels import pixel_array
+            pixels = pixel_array(self.path, index=index)
+        except ImportError:
+            # Older pydicom decodes every frame at once: keep them for the other slices
+            if self._decoded is None:
+                self._decoded = self._pydicom.dcmread(self.path).pixel_array
+            pixels = self._decoded[index] if self.frames > 1 else self._decoded
+        return _to_float(pixels) * self._slope + self._intercept
+
+
+def open_volume(paths):
+    """Open uploaded file(s) as a volume; several files are read as one DICOM series"""
+    if len(paths) > 1:
+        return DicomSeries(paths)
+    path = paths[0]
+    name = path.lower()
+    if name.endswith(('.nii', '.nii.gz')):
+        return NiftiVolume(path)
+    if name.endswith(('.tif', '.tiff')):
+        return TiffVolume(path)
+    if name.endswith(DICOM_EXTENSIONS) or is_dicom_file(path):
+        pydicom = _require('pydicom')
+        frames = int(pydicom.dcmread(path, stop_before_pixels=True).get('NumberOfFrames', 1) or 1)
+        return DicomMultiframe(path) if frames > 1 else DicomSeries([path])
+    raise VolumeError("Unsupported volume format: upload a DICOM series (files or .zip), a multi-page TIFF or a NIfTI file")
+
+
+def extract_zip(path, folder, max_files=VOLUME_MAX_SLICES, max_mb=VOLUME_MAX_EXTRACTED_MB):
+    """Extract a zipped DICOM series file by file (flattened, names sanitized); returns the paths"""
+    paths = []
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise VolumeError("The uploaded .zip file is not a valid archive")
+    with archive:
+        members = [member for member in archive.infolist() if not member.is_dir()]
+        if len(members) > max_files:
+            raise VolumeError(f"Archive has more than {max_files} files")
+        if sum(member.file_size for member in members) > max_mb * 1024 * 1024:
+            raise VolumeError(f"Archive expands to more than {max_mb} MB")
+        for number, member in enumerate(members):
+            # Flatten to numbered names: member paths cannot escape the folder
+            target = os.path.join(folder, f"zip{number:05d}_{os.path.basename(member.filename)}")
+            with archive.open(member) as source, open(target, 'wb') as destination:
+                shutil.copyfileobj(source, destination, 1024 * 1024)
+            paths.append(target)
+    return paths
+
+
+def estimate_window(volume, samples=WINDOW_SAMPLE_SLICES, pixels=WINDOW_SAMPLE_PIXELS):
+    """
+    Intensity window (low, high) for a volume without one: robust
+    percentiles of a strided pixel sample from evenly spaced slices, so
+    every slice is normalized the same way without reading the whole volume.
+    """
+    indices = np.unique(np.linspace(0, len(volume) - 1, min(samples, len(volume))).astype(int))
+    values = []
+    for index in indices:
+        data = volume.slice(index)
+        step = max(1, int(np.sqrt(data.size / pixels)))
+        values.append(data[::step, ::step].ravel())
+    low, high = np.percentile(np.concatenate(values), WINDOW_PERCENTILES)
+    if high <= low:
+        high = low + 1.0
+    return float(low), float(high)
+
+
+def window_slice(pixels, window, invert=False):
+    """Map raw slice values to 8-bit grayscale through the volume's window"""
+    low, high = window
+    gray = np.clip((pixels - low) * (255.0 / (high - low)), 0, 255).astype(np.uint8)
+    return 255 - gray if invert else gray
+
+
+def slice_input(gray, image_size, out):
+    """
+    Write a grayscale slice into out as the model input: the same RGB,
+    nearest-resized, [0, 1] array load_image_array gives for a grayscale image.
+    """
+    resized = np.asarray(Image.fromarray(gray, mode='L').resize((image_size, image_size), Image.NEAREST))
+    np.multiply(resized[..., None], 1 / 255.0, out=out, casting='unsafe')
+
+
+def save_slice(volume, index, window, path):
+    """Write one windowed slice as a PNG (used for the study's top slices)"""
+    gray = window_slice(volume.slice(index), window, volume.invert)
+    Image.fromarray(gray, mode='L').save(path, format='PNG')
+    return path
+
+
+class StudyAggregate:
+    """
+    Running per-study summary with bounded state: slice counts per predicted
+    label and a heap of the k slices most likely to show a tumor
+    (1 - P(notumor), or the top-1 probability for label sets without one).
+    """
+
+    def __init__(self, labels, top_k=VOLUME_TOP_SLICES):
+        self.labels = labels
+        self.top_k = top_k
+        self.no_tumor = labels.index(NO_TUMOR_LABEL) if NO_TUMOR_LABEL in labels else None
+        self.counts = np.zeros(len(labels), dtype=np.int64)
+        self.scored = 0
+        self._heap = []
+
+    def add(self, indices, probabilities):
+        self.scored += len(indices)
+        self.counts += np.bincount(np.argmax(probabilities, axis=1), minlength=len(self.labels))
+        if self.no_tumor is not None:
+            scores = 1.0 - probabilities[:, self.no_tumor]
+        else:
+            scores = probabilities.max(axis=1)
+        for index, score, row in zip(indices, scores, probabilities):
+            item = (float(score), -int(index), row.copy())
+            if len(self._heap) < self.top_k:
+                heapq.heappush(self._heap, item)
+            elif item[:2] > self._heap[0][:2]:
+                heapq.heapreplace(self._heap, item)
+
+    def top_slices(self):
+        """(slice index, score, probabilities), most suspicious first"""
+        return [(-index, score, row) for score, index, row in sorted(self._heap, key=lambda item: item[:2], reverse=True)]
+
+    def probabilities(self):
+        """Study-level class probabilities: the mean over the top slices"""
+        return np.mean([row for _, _, row in self._heap], axis=0)
+
+    def slice_counts(self):
+        return {label: int(count) for label, count in zip(self.labels, self.counts)}
+
+
+def score_volume(volume, model, submit, batch_size=VOLUME_BATCH_SIZE, top_k=VOLUME_TOP_SLICES,
+                 min_foreground=VOLUME_MIN_FOREGROUND, timeout=None):
+    """
+    Stream a volume through the model and aggregate it.
+
+    submit(batch) queues one batch for inference and returns a Future of its
+    class probabilities (waited for up to timeout seconds). While one batch
+    is scored the next is filled, into two preallocated buffers.
+    Returns (StudyAggregate, window, number of blank slices skipped).
+    """
+    window = volume.window or estimate_window(volume)
+    size = model.input_size
+    buffers = [np.empty((batch_size, size, size, 3), dtype=np.float32) for _ in range(2)]
+    aggregate = StudyAggregate(model.labels, top_k)
+    pending = None
+    filled, indices, skipped, current = 0, [], 0, 0
+
+    def collect(job):
+        future, job_indices = job
+        aggregate.add(job_indices, np.asarray(future.result(timeout))[:len(job_indices)])
+
+    for index in range(len(volume)):
+        gray = window_slice(volume.slice(index), window, volume.invert)
+        if np.count_nonzero(gray) < min_foreground * gray.size:
+            skipped += 1
+            continue
+        slice_input(gray, size, buffers[current][filled])
+        indices.append(index)
+        filled += 1
+        if filled == batch_size:
+            job = (submit(buffers[current]), indices)
+            if pending:
+                collect(pending)
+            pending, current, filled, indices = job, 1 - current, 0, []
+
+    if pending:
+        collect(pending)
+    if filled:
+        collect((submit(buffers[current][:filled]), indices))
+    return aggregate, window, skipped
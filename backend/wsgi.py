@@ -0,0 +1,15 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app (the default in gunicorn.conf.py for ML_BACKEND=tflite) this module is imported
+once in the gunicorn master: the Flask app is created and the active model
+is loaded and warmed before workers are forked, so every worker shares the
+model weights copy-on-write instead of loading its own copy.
+"""
+from app import create_app
+
+app = create_app()
+if app is None:
+    raise RuntimeError("Failed to create application!")
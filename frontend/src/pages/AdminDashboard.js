@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { toast } from 'react-toastify';
-import { adminService } from '../utils/auth';
+import { adminService, eventService } from '../utils/auth';
 
 const AdminDashboard = () => {
   const [dashboardData, setDashboardData] = useState(null);
@@ -8,6 +8,19 @@ const AdminDashboard = () => {
 
   useEffect(() => {
     fetchDashboardData();
+
+    // Refresh when appointments or predictions change instead of polling;
+    // bursts of events are folded into one refetch
+    let refreshTimer = null;
+    const scheduleRefresh = () => {
+      clearTimeout(refreshTimer);
+      refreshTimer = setTimeout(fetchDashboardData, 500);
+    };
+    const unsubscribe = eventService.subscribe(scheduleRefresh, scheduleRefresh);
+    return () => {
+      clearTimeout(refreshTimer);
+      unsubscribe();
+    };
   }, []);
 
   const fetchDashboardData = async () => {
@@ -1,8 +1,24 @@
 // DownloadReports.js
 import jsPDF from "jspdf";
+import { reportService } from "../utils/auth";
 
 const DownloadReports = ({ user, prediction, uploadedImageUrl }) => {
-  const downloadReport = () => {
+  const downloadReport = async () => {
+    // Prefer the server-rendered report once the prediction has been stored
+    const predictionId = prediction.data.prediction_id;
+    if (predictionId) {
+      const result = await reportService.downloadPredictionReport(predictionId);
+      if (result.success) {
+        const url = URL.createObjectURL(result.data);
+        const link = document.createElement("a");
+        link.href = url;
+        link.download = `MRI_Tumor_Report_${predictionId}.pdf`;
+        link.click();
+        URL.revokeObjectURL(url);
+        return;
+      }
+    }
+
     const doc = new jsPDF();
 
     doc.setFontSize(16);
@@ -110,6 +110,47 @@ export const authService = {
 };
 
 export const adminService = {
+  // Ranked patient/doctor search by name, email or phone
+  async searchUsers(query, { type, page = 1, perPage = 20 } = {}) {
+    try {
+      const response = await api.get("/admin/users/search", {
+        params: { q: query, type, page, per_page: perPage },
+      });
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to search users",
+      };
+    }
+  },
+
+  // Update a user's name, email or phone
+  async updateUser(userId, updates) {
+    try {
+      const response = await api.put(`/admin/users/${userId}`, updates);
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to update user",
+      };
+    }
+  },
+
+  // Approve many doctors in one request
+  async approveDoctors(doctorIds) {
+    try {
+      const response = await api.put("/admin/doctors/approve", { ids: doctorIds });
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to approve doctors",
+      };
+    }
+  },
+
   // Get dashboard stats
   async getDashboard() {
     try {
@@ -229,6 +270,60 @@ export const doctorService = {
     }
   },
 
+  // Get the weekly schedule template
+  async getScheduleTemplate() {
+    try {
+      const response = await api.get("/doctor/schedule-template");
+      return { success: true, data: response.data.schedule };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to fetch schedule",
+      };
+    }
+  },
+
+  // Replace the weekly schedule template ({ slot_minutes, weekdays, exceptions })
+  async updateScheduleTemplate(schedule) {
+    try {
+      const response = await api.put("/doctor/schedule-template", schedule);
+      return { success: true, data: response.data.schedule };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to update schedule",
+      };
+    }
+  },
+
+  // Get appointments for the week (or month) containing date, grouped by day and slot
+  async getCalendar(date, view = "week") {
+    try {
+      const response = await api.get("/doctor/calendar", {
+        params: { date, view },
+      });
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to fetch calendar",
+      };
+    }
+  },
+
+  // Apply [{ id, status, notes }] status changes in one request
+  async bulkUpdateAppointments(actions) {
+    try {
+      const response = await api.put("/doctor/appointments/bulk", { actions });
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to update appointments",
+      };
+    }
+  },
+
   // Approve appointment
   async approveAppointment(appointmentId, notes = "") {
     try {
@@ -308,6 +403,58 @@ export const doctorService = {
       };
     }
   },
+
+  // Review queue: size and my claims
+  async getReviewQueue() {
+    try {
+      const response = await api.get("/doctor/review-queue");
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to fetch review queue",
+      };
+    }
+  },
+
+  // Claim the next prediction to review (null when the queue is empty)
+  async claimReview() {
+    try {
+      const response = await api.post("/doctor/review-queue/claim");
+      return { success: true, data: response.data.prediction };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to claim a review",
+      };
+    }
+  },
+
+  // Extend the lease while still reviewing
+  async renewReviewClaim(predictionId) {
+    try {
+      const response = await api.put(`/doctor/review-queue/${predictionId}/renew`);
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to renew claim",
+      };
+    }
+  },
+
+  // Return a claimed prediction to the queue
+  async releaseReviewClaim(predictionId) {
+    try {
+      const response = await api.put(`/doctor/review-queue/${predictionId}/release`);
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to release claim",
+      };
+    }
+  },
 };
 
 export const patientService = {
@@ -338,9 +485,12 @@ export const patientService = {
   },
 
   // Book appointment
-  async bookAppointment(appointmentData) {
+  async bookAppointment(appointmentData, idempotencyKey = crypto.randomUUID()) {
     try {
-      const response = await api.post("/patient/appointments", appointmentData);
+      // Reuse the same key when retrying so the booking is not duplicated
+      const response = await api.post("/patient/appointments", appointmentData, {
+        headers: { "Idempotency-Key": idempotencyKey },
+      });
       return { success: true, data: response.data };
     } catch (error) {
       return {
@@ -405,15 +555,71 @@ export const patientService = {
       };
     }
   },
+
+  // Get a doctor's free slots for every day of a month (YYYY-MM)
+  async getDoctorMonthAvailability(doctorId, month) {
+    try {
+      const response = await api.get(
+        `/patient/doctors/${doctorId}/availability?month=${month}`
+      );
+      return { success: true, data: response.data.availability };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to fetch availability",
+      };
+    }
+  },
 };
 
 export const mlService = {
+  // <img>-ready URL for an image_url/thumbnail_url from the API.
+  // Images cannot send headers, so the API signs these URLs (?sig=) for a
+  // short time; fetch the list again for fresh ones.
+  mediaUrl(url, params = {}) {
+    const [path, search = ""] = url.split("?");
+    const query = new URLSearchParams(search);
+    Object.entries(params).forEach(([key, value]) => query.set(key, value));
+    return `${API_BASE_URL}${path.replace(/^\/api/, "")}?${query}`;
+  },
+
+  // Grad-CAM overlay for a prediction as an object URL (revoke when done)
+  async getHeatmap(predictionId) {
+    try {
+      const response = await api.get(`/ml/predictions/${predictionId}/heatmap`, {
+        responseType: "blob",
+      });
+      return { success: true, data: URL.createObjectURL(response.data) };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.status === 404 ? "Heatmap not available" : "Failed to load heatmap",
+      };
+    }
+  },
+
+  // Prior scans that look most like a prediction's image
+  async getSimilarCases(predictionId, k = 10) {
+    try {
+      const response = await api.get(`/ml/predictions/${predictionId}/similar`, {
+        params: { k },
+      });
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to fetch similar cases",
+      };
+    }
+  },
+
   // Predict brain tumor
-  async predictTumor(formData) {
+  async predictTumor(formData, idempotencyKey = crypto.randomUUID()) {
     try {
       const response = await api.post("/ml/predict", formData, {
         headers: {
           "Content-Type": "multipart/form-data",
+          "Idempotency-Key": idempotencyKey,
         },
       });
       return { success: true, data: response.data };
@@ -425,6 +631,24 @@ export const mlService = {
     }
   },
 
+  // Predict a whole study: DICOM series (files or .zip), multi-page TIFF or NIfTI
+  async predictVolume(formData, idempotencyKey = crypto.randomUUID()) {
+    try {
+      const response = await api.post("/ml/predict/volume", formData, {
+        headers: {
+          "Content-Type": "multipart/form-data",
+          "Idempotency-Key": idempotencyKey,
+        },
+      });
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to process study",
+      };
+    }
+  },
+
   // Batch predict
   async batchPredict(formData) {
     try {
@@ -469,4 +693,114 @@ export const mlService = {
   },
 };
 
+export const reportService = {
+  // Download the server-rendered PDF report for a prediction
+  async downloadPredictionReport(predictionId) {
+    try {
+      const response = await api.get(`/reports/predictions/${predictionId}`, {
+        responseType: "blob",
+      });
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to download report",
+      };
+    }
+  },
+
+  // Download a zip of reports for predictions created between from and to (YYYY-MM-DD)
+  async downloadReportsArchive(from, to, patientId = null) {
+    try {
+      const params = { from, to };
+      if (patientId) params.patient_id = patientId;
+      const response = await api.get("/reports/predictions/bulk", {
+        params,
+        responseType: "blob",
+      });
+      return { success: true, data: response.data };
+    } catch (error) {
+      return {
+        success: false,
+        error: error.response?.data?.error || "Failed to download reports",
+      };
+    }
+  },
+};
+
+// Reconnect delays for the event stream: doubled after every connection
+// that fails before the stream opens (e.g. 503 when the server is at its
+// stream limit), capped at MAX_STREAM_RETRY_MS
+const STREAM_RETRY_MS = 3000;
+const MAX_STREAM_RETRY_MS = 60000;
+// After this many failed connections, refetch on a slow timer until a stream opens
+const STREAM_FAILURES_BEFORE_POLLING = 3;
+const STREAM_POLL_MS = 60000;
+
+export const eventService = {
+  // Subscribe to appointment/prediction changes; returns an unsubscribe function.
+  // EventSource cannot send headers, so each connection uses a short-lived
+  // ticket in the query string instead of the session token.
+  subscribe(onEvent, onResync = () => {}) {
+    if (!localStorage.getItem("token")) return () => {};
+
+    let source = null;
+    let timer = null;
+    let pollTimer = null;
+    let failures = 0;
+    let closed = false;
+    const stopPolling = () => {
+      clearInterval(pollTimer);
+      pollTimer = null;
+    };
+    const retry = () => {
+      if (closed) return;
+      const delay = Math.min(STREAM_RETRY_MS * 2 ** failures, MAX_STREAM_RETRY_MS);
+      failures += 1;
+      if (failures >= STREAM_FAILURES_BEFORE_POLLING && !pollTimer) {
+        pollTimer = setInterval(onResync, STREAM_POLL_MS);
+      }
+      // Jitter so clients turned away together do not all return together
+      timer = setTimeout(connect, delay / 2 + Math.random() * (delay / 2));
+    };
+    const connect = async () => {
+      let ticket;
+      try {
+        ticket = (await api.post("/events/ticket")).data.ticket;
+      } catch (error) {
+        retry();
+        return;
+      }
+      if (closed) return;
+      source = new EventSource(
+        `${API_BASE_URL}/events/stream?ticket=${encodeURIComponent(ticket)}`
+      );
+      const handle = (event) => onEvent(JSON.parse(event.data));
+      source.addEventListener("ready", () => {
+        // Changes may have been missed while polling
+        if (pollTimer) onResync();
+        failures = 0;
+        stopPolling();
+      });
+      source.addEventListener("appointment", handle);
+      source.addEventListener("prediction", handle);
+      // Sent when this client fell behind; refetch everything
+      source.addEventListener("resync", onResync);
+      // The ticket has expired by the time the browser would retry, so
+      // reconnect with a new one
+      source.onerror = () => {
+        source.close();
+        retry();
+      };
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      stopPolling();
+      if (source) source.close();
+    };
+  },
+};
+
 export default api;